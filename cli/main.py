@@ -37,6 +37,8 @@ from cli.utils import (
 )
 from tradingagents.default_config import DEFAULT_CONFIG
 from tradingagents.graph.trading_graph import TradingAgentsGraph
+from tradingagents.agents.utils.debate_log import render_history
+from tradingagents.llm_adapters.streaming import stream_listener
 from tradingagents.utils.logging_manager import get_logger
 
 # 加载环境变量
@@ -48,6 +50,7 @@ DEFAULT_MAX_TOOL_ARGS_LENGTH = 100
 DEFAULT_MAX_CONTENT_LENGTH = 200
 DEFAULT_MAX_DISPLAY_MESSAGES = 12
 DEFAULT_REFRESH_RATE = 4
+DEFAULT_STREAM_PREVIEW_CHARS = 1500
 DEFAULT_API_KEY_DISPLAY_LENGTH = 12
 
 # 初始化日志系统
@@ -203,6 +206,14 @@ class MessageBuffer:
             self.report_sections[section_name] = content
             self._update_current_report()
 
+    def update_streaming_output(self, agent, partial_text, done):
+        # 模型生成过程中在面板显示部分输出，生成结束后恢复为最新的报告章节
+        if done or not partial_text:
+            self._update_current_report()
+            return
+        preview = partial_text[-DEFAULT_STREAM_PREVIEW_CHARS:]
+        self.current_report = f"### {agent} (生成中...)\n{preview}"
+
     def _update_current_report(self):
         # For the panel display, only show the most recently updated section
         latest_section = None
@@ -1264,305 +1275,314 @@ def run_analysis():
         # 跟踪已完成的分析师，避免重复提示
         completed_analysts = set()
 
-        for chunk in graph.graph.stream(init_agent_state, **args):
-            if len(chunk["messages"]) > 0:
-                # Get the last message from the chunk
-                last_message = chunk["messages"][-1]
-
-                # Extract message content and type
-                if hasattr(last_message, "content"):
-                    content = extract_content_string(last_message.content)  # Use the helper function
-                    msg_type = "Reasoning"
-                else:
-                    content = str(last_message)
-                    msg_type = "System"
-
-                # Add message to buffer
-                message_buffer.add_message(msg_type, content)                
-
-                # If it's a tool call, add it to tool calls
-                if hasattr(last_message, "tool_calls"):
-                    for tool_call in last_message.tool_calls:
-                        # Handle both dictionary and object tool calls
-                        if isinstance(tool_call, dict):
-                            message_buffer.add_tool_call(
-                                tool_call["name"], tool_call["args"]
-                            )
-                        else:
-                            message_buffer.add_tool_call(tool_call.name, tool_call.args)
-
-                # Update reports and agent status based on chunk content
-                # Analyst Team Reports
-                if "market_report" in chunk and chunk["market_report"]:
-                    # 只在第一次完成时显示提示
-                    if "market_report" not in completed_analysts:
-                        ui.show_success("📈 市场分析完成")
-                        completed_analysts.add("market_report")
-                        # 调试信息（写入日志文件）
-                        logger.info(f"首次显示市场分析完成提示，已完成分析师: {completed_analysts}")
+        # 注册流式输出监听，模型生成过程中实时刷新分析面板
+        def on_llm_stream(agent, partial_text, done):
+            message_buffer.update_streaming_output(agent, partial_text, done)
+            update_display(layout)
+
+        with stream_listener(on_llm_stream):
+            for chunk in graph.graph.stream(init_agent_state, **args):
+                if len(chunk["messages"]) > 0:
+                    # Get the last message from the chunk
+                    last_message = chunk["messages"][-1]
+
+                    # Extract message content and type
+                    if hasattr(last_message, "content"):
+                        content = extract_content_string(last_message.content)  # Use the helper function
+                        msg_type = "Reasoning"
                     else:
-                        # 调试信息（写入日志文件）
-                        logger.debug(f"跳过重复的市场分析完成提示，已完成分析师: {completed_analysts}")
-
-                    message_buffer.update_report_section(
-                        "market_report", chunk["market_report"]
-                    )
-                    message_buffer.update_agent_status("Market Analyst", "completed")
-                    # Set next analyst to in_progress
-                    if "social" in selections["analysts"]:
-                        message_buffer.update_agent_status(
-                            "Social Analyst", "in_progress"
-                        )
+                        content = str(last_message)
+                        msg_type = "System"
+
+                    # Add message to buffer
+                    message_buffer.add_message(msg_type, content)                
+
+                    # If it's a tool call, add it to tool calls
+                    if hasattr(last_message, "tool_calls"):
+                        for tool_call in last_message.tool_calls:
+                            # Handle both dictionary and object tool calls
+                            if isinstance(tool_call, dict):
+                                message_buffer.add_tool_call(
+                                    tool_call["name"], tool_call["args"]
+                                )
+                            else:
+                                message_buffer.add_tool_call(tool_call.name, tool_call.args)
+
+                    # Update reports and agent status based on chunk content
+                    # Analyst Team Reports
+                    if "market_report" in chunk and chunk["market_report"]:
+                        # 只在第一次完成时显示提示
+                        if "market_report" not in completed_analysts:
+                            ui.show_success("📈 市场分析完成")
+                            completed_analysts.add("market_report")
+                            # 调试信息（写入日志文件）
+                            logger.info(f"首次显示市场分析完成提示，已完成分析师: {completed_analysts}")
+                        else:
+                            # 调试信息（写入日志文件）
+                            logger.debug(f"跳过重复的市场分析完成提示，已完成分析师: {completed_analysts}")
 
-                if "sentiment_report" in chunk and chunk["sentiment_report"]:
-                    # 只在第一次完成时显示提示
-                    if "sentiment_report" not in completed_analysts:
-                        ui.show_success("💭 情感分析完成")
-                        completed_analysts.add("sentiment_report")
-                        # 调试信息（写入日志文件）
-                        logger.info(f"首次显示情感分析完成提示，已完成分析师: {completed_analysts}")
-                    else:
-                        # 调试信息（写入日志文件）
-                        logger.debug(f"跳过重复的情感分析完成提示，已完成分析师: {completed_analysts}")
-
-                    message_buffer.update_report_section(
-                        "sentiment_report", chunk["sentiment_report"]
-                    )
-                    message_buffer.update_agent_status("Social Analyst", "completed")
-                    # Set next analyst to in_progress
-                    if "news" in selections["analysts"]:
-                        message_buffer.update_agent_status(
-                            "News Analyst", "in_progress"
+                        message_buffer.update_report_section(
+                            "market_report", chunk["market_report"]
                         )
+                        message_buffer.update_agent_status("Market Analyst", "completed")
+                        # Set next analyst to in_progress
+                        if "social" in selections["analysts"]:
+                            message_buffer.update_agent_status(
+                                "Social Analyst", "in_progress"
+                            )
 
-                if "news_report" in chunk and chunk["news_report"]:
-                    # 只在第一次完成时显示提示
-                    if "news_report" not in completed_analysts:
-                        ui.show_success("📰 新闻分析完成")
-                        completed_analysts.add("news_report")
-                        # 调试信息（写入日志文件）
-                        logger.info(f"首次显示新闻分析完成提示，已完成分析师: {completed_analysts}")
-                    else:
-                        # 调试信息（写入日志文件）
-                        logger.debug(f"跳过重复的新闻分析完成提示，已完成分析师: {completed_analysts}")
-
-                    message_buffer.update_report_section(
-                        "news_report", chunk["news_report"]
-                    )
-                    message_buffer.update_agent_status("News Analyst", "completed")
-                    # Set next analyst to in_progress
-                    if "fundamentals" in selections["analysts"]:
-                        message_buffer.update_agent_status(
-                            "Fundamentals Analyst", "in_progress"
-                        )
+                    if "sentiment_report" in chunk and chunk["sentiment_report"]:
+                        # 只在第一次完成时显示提示
+                        if "sentiment_report" not in completed_analysts:
+                            ui.show_success("💭 情感分析完成")
+                            completed_analysts.add("sentiment_report")
+                            # 调试信息（写入日志文件）
+                            logger.info(f"首次显示情感分析完成提示，已完成分析师: {completed_analysts}")
+                        else:
+                            # 调试信息（写入日志文件）
+                            logger.debug(f"跳过重复的情感分析完成提示，已完成分析师: {completed_analysts}")
 
-                if "fundamentals_report" in chunk and chunk["fundamentals_report"]:
-                    # 只在第一次完成时显示提示
-                    if "fundamentals_report" not in completed_analysts:
-                        ui.show_success("📊 基本面分析完成")
-                        completed_analysts.add("fundamentals_report")
-                        # 调试信息（写入日志文件）
-                        logger.info(f"首次显示基本面分析完成提示，已完成分析师: {completed_analysts}")
-                    else:
-                        # 调试信息（写入日志文件）
-                        logger.debug(f"跳过重复的基本面分析完成提示，已完成分析师: {completed_analysts}")
-
-                    message_buffer.update_report_section(
-                        "fundamentals_report", chunk["fundamentals_report"]
-                    )
-                    message_buffer.update_agent_status(
-                        "Fundamentals Analyst", "completed"
-                    )
-                    # Set all research team members to in_progress
-                    update_research_team_status("in_progress")
-
-                # Research Team - Handle Investment Debate State
-                if (
-                    "investment_debate_state" in chunk
-                    and chunk["investment_debate_state"]
-                ):
-                    debate_state = chunk["investment_debate_state"]
-
-                    # Update Bull Researcher status and report
-                    if "bull_history" in debate_state and debate_state["bull_history"]:
-                        # 显示研究团队开始工作
-                        if "research_team_started" not in completed_analysts:
-                            ui.show_progress("🔬 研究团队开始深度分析...")
-                            completed_analysts.add("research_team_started")
-
-                        # Keep all research team members in progress
-                        update_research_team_status("in_progress")
-                        # Extract latest bull response
-                        bull_responses = debate_state["bull_history"].split("\n")
-                        latest_bull = bull_responses[-1] if bull_responses else ""
-                        if latest_bull:
-                            message_buffer.add_message("Reasoning", latest_bull)
-                            # Update research report with bull's latest analysis
-                            message_buffer.update_report_section(
-                                "investment_plan",
-                                f"### Bull Researcher Analysis\n{latest_bull}",
+                        message_buffer.update_report_section(
+                            "sentiment_report", chunk["sentiment_report"]
+                        )
+                        message_buffer.update_agent_status("Social Analyst", "completed")
+                        # Set next analyst to in_progress
+                        if "news" in selections["analysts"]:
+                            message_buffer.update_agent_status(
+                                "News Analyst", "in_progress"
                             )
 
-                    # Update Bear Researcher status and report
-                    if "bear_history" in debate_state and debate_state["bear_history"]:
-                        # Keep all research team members in progress
-                        update_research_team_status("in_progress")
-                        # Extract latest bear response
-                        bear_responses = debate_state["bear_history"].split("\n")
-                        latest_bear = bear_responses[-1] if bear_responses else ""
-                        if latest_bear:
-                            message_buffer.add_message("Reasoning", latest_bear)
-                            # Update research report with bear's latest analysis
-                            message_buffer.update_report_section(
-                                "investment_plan",
-                                f"{message_buffer.report_sections['investment_plan']}\n\n### Bear Researcher Analysis\n{latest_bear}",
+                    if "news_report" in chunk and chunk["news_report"]:
+                        # 只在第一次完成时显示提示
+                        if "news_report" not in completed_analysts:
+                            ui.show_success("📰 新闻分析完成")
+                            completed_analysts.add("news_report")
+                            # 调试信息（写入日志文件）
+                            logger.info(f"首次显示新闻分析完成提示，已完成分析师: {completed_analysts}")
+                        else:
+                            # 调试信息（写入日志文件）
+                            logger.debug(f"跳过重复的新闻分析完成提示，已完成分析师: {completed_analysts}")
+
+                        message_buffer.update_report_section(
+                            "news_report", chunk["news_report"]
+                        )
+                        message_buffer.update_agent_status("News Analyst", "completed")
+                        # Set next analyst to in_progress
+                        if "fundamentals" in selections["analysts"]:
+                            message_buffer.update_agent_status(
+                                "Fundamentals Analyst", "in_progress"
                             )
 
-                    # Update Research Manager status and final decision
-                    if (
-                        "judge_decision" in debate_state
-                        and debate_state["judge_decision"]
-                    ):
-                        # 显示研究团队完成
-                        if "research_team" not in completed_analysts:
-                            ui.show_success("🔬 研究团队分析完成")
-                            completed_analysts.add("research_team")
+                    if "fundamentals_report" in chunk and chunk["fundamentals_report"]:
+                        # 只在第一次完成时显示提示
+                        if "fundamentals_report" not in completed_analysts:
+                            ui.show_success("📊 基本面分析完成")
+                            completed_analysts.add("fundamentals_report")
+                            # 调试信息（写入日志文件）
+                            logger.info(f"首次显示基本面分析完成提示，已完成分析师: {completed_analysts}")
+                        else:
+                            # 调试信息（写入日志文件）
+                            logger.debug(f"跳过重复的基本面分析完成提示，已完成分析师: {completed_analysts}")
 
-                        # Keep all research team members in progress until final decision
-                        update_research_team_status("in_progress")
-                        message_buffer.add_message(
-                            "Reasoning",
-                            f"Research Manager: {debate_state['judge_decision']}",
-                        )
-                        # Update research report with final decision
                         message_buffer.update_report_section(
-                            "investment_plan",
-                            f"{message_buffer.report_sections['investment_plan']}\n\n### Research Manager Decision\n{debate_state['judge_decision']}",
+                            "fundamentals_report", chunk["fundamentals_report"]
                         )
-                        # Mark all research team members as completed
-                        update_research_team_status("completed")
-                        # Set first risk analyst to in_progress
                         message_buffer.update_agent_status(
-                            "Risky Analyst", "in_progress"
+                            "Fundamentals Analyst", "completed"
                         )
+                        # Set all research team members to in_progress
+                        update_research_team_status("in_progress")
 
-                # Trading Team
-                if (
-                    "trader_investment_plan" in chunk
-                    and chunk["trader_investment_plan"]
-                ):
-                    # 显示交易团队开始工作
-                    if "trading_team_started" not in completed_analysts:
-                        ui.show_progress("💼 交易团队制定投资计划...")
-                        completed_analysts.add("trading_team_started")
-
-                    # 显示交易团队完成
-                    if "trading_team" not in completed_analysts:
-                        ui.show_success("💼 交易团队计划完成")
-                        completed_analysts.add("trading_team")
-
-                    message_buffer.update_report_section(
-                        "trader_investment_plan", chunk["trader_investment_plan"]
-                    )
-                    # Set first risk analyst to in_progress
-                    message_buffer.update_agent_status("Risky Analyst", "in_progress")
-
-                # Risk Management Team - Handle Risk Debate State
-                if "risk_debate_state" in chunk and chunk["risk_debate_state"]:
-                    risk_state = chunk["risk_debate_state"]
-
-                    # Update Risky Analyst status and report
+                    # Research Team - Handle Investment Debate State
                     if (
-                        "current_risky_response" in risk_state
-                        and risk_state["current_risky_response"]
+                        "investment_debate_state" in chunk
+                        and chunk["investment_debate_state"]
                     ):
-                        # 显示风险管理团队开始工作
-                        if "risk_team_started" not in completed_analysts:
-                            ui.show_progress("⚖️ 风险管理团队评估投资风险...")
-                            completed_analysts.add("risk_team_started")
-
-                        message_buffer.update_agent_status(
-                            "Risky Analyst", "in_progress"
-                        )
-                        message_buffer.add_message(
-                            "Reasoning",
-                            f"Risky Analyst: {risk_state['current_risky_response']}",
-                        )
-                        # Update risk report with risky analyst's latest analysis only
-                        message_buffer.update_report_section(
-                            "final_trade_decision",
-                            f"### Risky Analyst Analysis\n{risk_state['current_risky_response']}",
-                        )
+                        debate_state = chunk["investment_debate_state"]
+                        debate_turns = chunk.get("investment_debate_turns", [])
+                        bull_history = render_history(debate_turns, speaker="Bull")
+                        bear_history = render_history(debate_turns, speaker="Bear")
+
+                        # Update Bull Researcher status and report
+                        if bull_history:
+                            # 显示研究团队开始工作
+                            if "research_team_started" not in completed_analysts:
+                                ui.show_progress("🔬 研究团队开始深度分析...")
+                                completed_analysts.add("research_team_started")
+
+                            # Keep all research team members in progress
+                            update_research_team_status("in_progress")
+                            # Extract latest bull response
+                            bull_responses = bull_history.split("\n")
+                            latest_bull = bull_responses[-1] if bull_responses else ""
+                            if latest_bull:
+                                message_buffer.add_message("Reasoning", latest_bull)
+                                # Update research report with bull's latest analysis
+                                message_buffer.update_report_section(
+                                    "investment_plan",
+                                    f"### Bull Researcher Analysis\n{latest_bull}",
+                                )
+
+                        # Update Bear Researcher status and report
+                        if bear_history:
+                            # Keep all research team members in progress
+                            update_research_team_status("in_progress")
+                            # Extract latest bear response
+                            bear_responses = bear_history.split("\n")
+                            latest_bear = bear_responses[-1] if bear_responses else ""
+                            if latest_bear:
+                                message_buffer.add_message("Reasoning", latest_bear)
+                                # Update research report with bear's latest analysis
+                                message_buffer.update_report_section(
+                                    "investment_plan",
+                                    f"{message_buffer.report_sections['investment_plan']}\n\n### Bear Researcher Analysis\n{latest_bear}",
+                                )
+
+                        # Update Research Manager status and final decision
+                        if (
+                            "judge_decision" in debate_state
+                            and debate_state["judge_decision"]
+                        ):
+                            # 显示研究团队完成
+                            if "research_team" not in completed_analysts:
+                                ui.show_success("🔬 研究团队分析完成")
+                                completed_analysts.add("research_team")
+
+                            # Keep all research team members in progress until final decision
+                            update_research_team_status("in_progress")
+                            message_buffer.add_message(
+                                "Reasoning",
+                                f"Research Manager: {debate_state['judge_decision']}",
+                            )
+                            # Update research report with final decision
+                            message_buffer.update_report_section(
+                                "investment_plan",
+                                f"{message_buffer.report_sections['investment_plan']}\n\n### Research Manager Decision\n{debate_state['judge_decision']}",
+                            )
+                            # Mark all research team members as completed
+                            update_research_team_status("completed")
+                            # Set first risk analyst to in_progress
+                            message_buffer.update_agent_status(
+                                "Risky Analyst", "in_progress"
+                            )
 
-                    # Update Safe Analyst status and report
+                    # Trading Team
                     if (
-                        "current_safe_response" in risk_state
-                        and risk_state["current_safe_response"]
+                        "trader_investment_plan" in chunk
+                        and chunk["trader_investment_plan"]
                     ):
-                        message_buffer.update_agent_status(
-                            "Safe Analyst", "in_progress"
-                        )
-                        message_buffer.add_message(
-                            "Reasoning",
-                            f"Safe Analyst: {risk_state['current_safe_response']}",
-                        )
-                        # Update risk report with safe analyst's latest analysis only
-                        message_buffer.update_report_section(
-                            "final_trade_decision",
-                            f"### Safe Analyst Analysis\n{risk_state['current_safe_response']}",
-                        )
+                        # 显示交易团队开始工作
+                        if "trading_team_started" not in completed_analysts:
+                            ui.show_progress("💼 交易团队制定投资计划...")
+                            completed_analysts.add("trading_team_started")
+
+                        # 显示交易团队完成
+                        if "trading_team" not in completed_analysts:
+                            ui.show_success("💼 交易团队计划完成")
+                            completed_analysts.add("trading_team")
 
-                    # Update Neutral Analyst status and report
-                    if (
-                        "current_neutral_response" in risk_state
-                        and risk_state["current_neutral_response"]
-                    ):
-                        message_buffer.update_agent_status(
-                            "Neutral Analyst", "in_progress"
-                        )
-                        message_buffer.add_message(
-                            "Reasoning",
-                            f"Neutral Analyst: {risk_state['current_neutral_response']}",
-                        )
-                        # Update risk report with neutral analyst's latest analysis only
                         message_buffer.update_report_section(
-                            "final_trade_decision",
-                            f"### Neutral Analyst Analysis\n{risk_state['current_neutral_response']}",
+                            "trader_investment_plan", chunk["trader_investment_plan"]
                         )
+                        # Set first risk analyst to in_progress
+                        message_buffer.update_agent_status("Risky Analyst", "in_progress")
+
+                    # Risk Management Team - Handle Risk Debate State
+                    if "risk_debate_state" in chunk and chunk["risk_debate_state"]:
+                        risk_state = chunk["risk_debate_state"]
+
+                        # Update Risky Analyst status and report
+                        if (
+                            "current_risky_response" in risk_state
+                            and risk_state["current_risky_response"]
+                        ):
+                            # 显示风险管理团队开始工作
+                            if "risk_team_started" not in completed_analysts:
+                                ui.show_progress("⚖️ 风险管理团队评估投资风险...")
+                                completed_analysts.add("risk_team_started")
+
+                            message_buffer.update_agent_status(
+                                "Risky Analyst", "in_progress"
+                            )
+                            message_buffer.add_message(
+                                "Reasoning",
+                                f"Risky Analyst: {risk_state['current_risky_response']}",
+                            )
+                            # Update risk report with risky analyst's latest analysis only
+                            message_buffer.update_report_section(
+                                "final_trade_decision",
+                                f"### Risky Analyst Analysis\n{risk_state['current_risky_response']}",
+                            )
 
-                    # Update Portfolio Manager status and final decision
-                    if "judge_decision" in risk_state and risk_state["judge_decision"]:
-                        # 显示风险管理团队完成
-                        if "risk_management" not in completed_analysts:
-                            ui.show_success("⚖️ 风险管理团队分析完成")
-                            completed_analysts.add("risk_management")
+                        # Update Safe Analyst status and report
+                        if (
+                            "current_safe_response" in risk_state
+                            and risk_state["current_safe_response"]
+                        ):
+                            message_buffer.update_agent_status(
+                                "Safe Analyst", "in_progress"
+                            )
+                            message_buffer.add_message(
+                                "Reasoning",
+                                f"Safe Analyst: {risk_state['current_safe_response']}",
+                            )
+                            # Update risk report with safe analyst's latest analysis only
+                            message_buffer.update_report_section(
+                                "final_trade_decision",
+                                f"### Safe Analyst Analysis\n{risk_state['current_safe_response']}",
+                            )
 
-                        message_buffer.update_agent_status(
-                            "Portfolio Manager", "in_progress"
-                        )
-                        message_buffer.add_message(
-                            "Reasoning",
-                            f"Portfolio Manager: {risk_state['judge_decision']}",
-                        )
-                        # Update risk report with final decision only
-                        message_buffer.update_report_section(
-                            "final_trade_decision",
-                            f"### Portfolio Manager Decision\n{risk_state['judge_decision']}",
-                        )
-                        # Mark risk analysts as completed
-                        message_buffer.update_agent_status("Risky Analyst", "completed")
-                        message_buffer.update_agent_status("Safe Analyst", "completed")
-                        message_buffer.update_agent_status(
-                            "Neutral Analyst", "completed"
-                        )
-                        message_buffer.update_agent_status(
-                            "Portfolio Manager", "completed"
-                        )
+                        # Update Neutral Analyst status and report
+                        if (
+                            "current_neutral_response" in risk_state
+                            and risk_state["current_neutral_response"]
+                        ):
+                            message_buffer.update_agent_status(
+                                "Neutral Analyst", "in_progress"
+                            )
+                            message_buffer.add_message(
+                                "Reasoning",
+                                f"Neutral Analyst: {risk_state['current_neutral_response']}",
+                            )
+                            # Update risk report with neutral analyst's latest analysis only
+                            message_buffer.update_report_section(
+                                "final_trade_decision",
+                                f"### Neutral Analyst Analysis\n{risk_state['current_neutral_response']}",
+                            )
+
+                        # Update Portfolio Manager status and final decision
+                        if "judge_decision" in risk_state and risk_state["judge_decision"]:
+                            # 显示风险管理团队完成
+                            if "risk_management" not in completed_analysts:
+                                ui.show_success("⚖️ 风险管理团队分析完成")
+                                completed_analysts.add("risk_management")
+
+                            message_buffer.update_agent_status(
+                                "Portfolio Manager", "in_progress"
+                            )
+                            message_buffer.add_message(
+                                "Reasoning",
+                                f"Portfolio Manager: {risk_state['judge_decision']}",
+                            )
+                            # Update risk report with final decision only
+                            message_buffer.update_report_section(
+                                "final_trade_decision",
+                                f"### Portfolio Manager Decision\n{risk_state['judge_decision']}",
+                            )
+                            # Mark risk analysts as completed
+                            message_buffer.update_agent_status("Risky Analyst", "completed")
+                            message_buffer.update_agent_status("Safe Analyst", "completed")
+                            message_buffer.update_agent_status(
+                                "Neutral Analyst", "completed"
+                            )
+                            message_buffer.update_agent_status(
+                                "Portfolio Manager", "completed"
+                            )
 
-                # Update the display
-                update_display(layout)
+                    # Update the display
+                    update_display(layout)
 
-            trace.append(chunk)
+                trace.append(chunk)
 
         # 显示最终决策阶段
         ui.show_step_header(5, "投资决策生成 | Investment Decision Generation")
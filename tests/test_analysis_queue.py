@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+测试Web分析任务队列
+用模拟的LLM和数据层提交100个分析，验证同时运行的分析数不超过工作线程数、
+每个用户的并发限制、排队位置和预计等待时间，以及排队/运行中任务的取消
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from web.utils.analysis_queue import AnalysisCancelledError, AnalysisJobQueue, QueueFullError
+
+
+class StubAnalysis:
+    """模拟一次分析：获取数据 + 若干次LLM调用，记录同时运行的分析数"""
+
+    def __init__(self, llm_latency: float = 0.004, llm_calls: int = 3):
+        self.llm_latency = llm_latency
+        self.llm_calls = llm_calls
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.running_by_user = {}
+        self.max_running_by_user = 0
+        self.completed = []
+
+    def _fetch_data(self, symbol: str) -> dict:
+        time.sleep(self.llm_latency / 2)
+        return {"symbol": symbol, "close": 10.0}
+
+    def _call_llm(self, prompt: str) -> str:
+        time.sleep(self.llm_latency)
+        return f"分析: {prompt}"
+
+    def __call__(self, analysis_id: str, user: str, symbol: str, progress_callback=None):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            self.running_by_user[user] = self.running_by_user.get(user, 0) + 1
+            self.max_running_by_user = max(self.max_running_by_user, self.running_by_user[user])
+        try:
+            data = self._fetch_data(symbol)
+            for step in range(self.llm_calls):
+                if progress_callback:
+                    progress_callback(step)
+                self._call_llm(f"{data['symbol']} step {step}")
+            with self.lock:
+                self.completed.append(analysis_id)
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.running_by_user[user] -= 1
+
+
+def _wait_until(predicate, timeout: float = 10.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.005)
+    return predicate()
+
+
+def test_load_100_analyses_respects_caps():
+    """100个分析（10个用户）突发提交，同时运行数不超过工作线程数，每用户不超过1个"""
+    queue = AnalysisJobQueue(max_workers=4, max_per_user=1, max_queued=200)
+    stub = StubAnalysis()
+
+    start = time.perf_counter()
+    for i in range(100):
+        user = f"user{i % 10}"
+        queue.submit(f"analysis_{i}", stub, f"analysis_{i}", user, f"00{i:04d}", user=user)
+    assert _wait_until(lambda: len(stub.completed) == 100, timeout=30)
+    elapsed = time.perf_counter() - start
+    queue.shutdown()
+
+    print(f"\n100个分析完成耗时 {elapsed:.2f}s; 最大同时运行 {stub.max_running}, "
+          f"单用户最大同时运行 {stub.max_running_by_user}")
+    assert stub.max_running <= 4
+    assert stub.max_running_by_user == 1
+    assert sorted(stub.completed) == sorted(f"analysis_{i}" for i in range(100))
+    assert all(queue.get_status(f"analysis_{i}") == 'completed' for i in range(100))
+    assert queue.get_stats()['running'] == 0
+
+
+def test_position_and_estimated_wait():
+    """排队位置从1开始，预计等待时间随位置递增"""
+    queue = AnalysisJobQueue(max_workers=2, max_per_user=10, estimated_duration=60)
+    release = threading.Event()
+    for i in range(2):
+        queue.submit(f"running_{i}", release.wait, user="u")
+    assert _wait_until(lambda: queue.get_stats()['running'] == 2)
+    for i in range(5):
+        queue.submit(f"queued_{i}", release.wait, user="u")
+
+    assert [queue.get_position(f"queued_{i}") for i in range(5)] == [1, 2, 3, 4, 5]
+    assert queue.get_position("running_0") is None
+    # 两个工作线程都在运行：第1、2位等待最早结束的任务，之后每两个任务多等一个平均耗时
+    waits = [queue.estimate_wait(f"queued_{i}") for i in range(5)]
+    assert waits == pytest.approx([60, 60, 120, 120, 180], abs=1)
+
+    release.set()
+    queue.shutdown()
+
+
+def test_user_limit_does_not_block_other_users():
+    """某用户达到并发上限时，其他用户排在后面的任务仍可执行"""
+    queue = AnalysisJobQueue(max_workers=2, max_per_user=1)
+    release = threading.Event()
+    queue.submit("a1", release.wait, user="alice")
+    queue.submit("a2", release.wait, user="alice")
+    queue.submit("b1", release.wait, user="bob")
+    assert _wait_until(lambda: queue.get_status("b1") == 'running')
+    assert queue.get_status("a2") == 'queued'
+    release.set()
+    assert _wait_until(lambda: queue.get_status("a2") == 'completed')
+    queue.shutdown()
+
+
+def test_cancel_queued_and_running():
+    """取消排队中的任务立即生效；运行中的任务在下一个进度节点中止"""
+    queue = AnalysisJobQueue(max_workers=1, max_per_user=5)
+    steps = []
+    started = threading.Event()
+
+    def long_analysis():
+        job = queue.get_job("running")
+        started.set()
+        for step in range(500):
+            job.raise_if_cancelled()
+            steps.append(step)
+            time.sleep(0.002)
+
+    never_run = []
+    queue.submit("running", long_analysis, user="u")
+    queue.submit("queued", lambda: never_run.append(1), user="u")
+    assert started.wait(5)
+
+    assert queue.cancel("queued")
+    assert queue.get_status("queued") == 'cancelled'
+    assert queue.get_position("queued") is None
+
+    assert queue.cancel("running")
+    assert _wait_until(lambda: queue.get_status("running") == 'cancelled')
+    assert len(steps) < 500
+    assert never_run == []
+    assert not queue.cancel("running")
+    queue.shutdown()
+
+
+def test_cancel_during_graph_execution(monkeypatch, tmp_path):
+    """通过 run_stock_analysis 运行替身分析图：取消后在模型流式输出时中止，节点的 except Exception 不会吞掉取消"""
+    from types import SimpleNamespace
+
+    from tradingagents.graph import trading_graph
+    from tradingagents.llm_adapters.streaming import get_stream_listener
+    from tradingagents.utils import stock_validator
+    from web.utils.analysis_jobs import run_analysis_job
+
+    for name in ("TRADINGAGENTS_DATA_DIR", "TRADINGAGENTS_RESULTS_DIR", "TRADINGAGENTS_CACHE_DIR"):
+        monkeypatch.setenv(name, str(tmp_path / name.lower()))
+    monkeypatch.setenv("DASHSCOPE_API_KEY", "test")
+    monkeypatch.setenv("FINNHUB_API_KEY", "test")
+    monkeypatch.setattr(stock_validator, "prepare_stock_data", lambda **kwargs: SimpleNamespace(
+        is_valid=True, stock_name="平安银行", market_type="A股", cache_status="cached"))
+
+    cancel = threading.Event()
+    llm_calls = []
+
+    class StubGraph:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def propagate(self, symbol, analysis_date):
+            for i in range(100):
+                try:
+                    # 模拟节点中的LLM调用：流式输出经监听器推送到界面，节点对异常兜底处理
+                    llm_calls.append(i)
+                    get_stream_listener().on_done("market_analyst", f"第{i}次调用的输出")
+                    cancel.set()
+                except Exception:
+                    pass
+            return {'final_trade_decision': "持有"}, {'action': "持有"}
+
+    monkeypatch.setattr(trading_graph, "TradingAgentsGraph", StubGraph)
+
+    class Tracker:
+        def __init__(self):
+            self.streams, self.failed, self.completed = [], None, False
+
+        def update_progress(self, message, step=None):
+            pass
+
+        def update_stream(self, agent, text, done=False):
+            self.streams.append(text)
+
+        def mark_completed(self, message, results=None):
+            self.completed = True
+
+        def mark_failed(self, error):
+            self.failed = error
+
+    tracker, saved = Tracker(), []
+    params = {'stock_symbol': "000001", 'analysis_date': "2025-01-02", 'analysts': ['market'],
+              'research_depth': 1, 'llm_provider': 'dashscope', 'llm_model': 'qwen-turbo', 'market_type': 'A股'}
+    status = run_analysis_job("cancel_in_graph", params, tracker, cancel_check=cancel.is_set,
+                              save_result=lambda **kwargs: saved.append(kwargs['status']))
+
+    assert status == 'cancelled'
+    assert llm_calls == [0, 1]
+    assert tracker.streams == ["第0次调用的输出"]
+    assert tracker.failed == "Analysis cancelled by user" and not tracker.completed
+    assert saved == []
+
+
+def test_queue_full_rejects_submission():
+    """排队数达到上限时拒绝新任务"""
+    queue = AnalysisJobQueue(max_workers=1, max_queued=2)
+    release = threading.Event()
+    queue.submit("running", release.wait)
+    assert _wait_until(lambda: queue.get_stats()['running'] == 1)
+    queue.submit("q1", release.wait)
+    queue.submit("q2", release.wait)
+    with pytest.raises(QueueFullError):
+        queue.submit("q3", release.wait)
+    release.set()
+    queue.shutdown()
+
+
+def test_failed_job_and_status_check(monkeypatch):
+    """任务异常记为失败；check_analysis_status 以队列状态为准"""
+    from web.utils import analysis_queue, thread_tracker
+
+    queue = AnalysisJobQueue(max_workers=1)
+    monkeypatch.setattr(analysis_queue, "_analysis_queue", queue)
+    release = threading.Event()
+    queue.submit("blocker", release.wait)
+    queue.submit("waiting", release.wait)
+    assert _wait_until(lambda: queue.get_status("blocker") == 'running')
+    assert thread_tracker.check_analysis_status("blocker") == 'running'
+    assert thread_tracker.check_analysis_status("waiting") == 'queued'
+    release.set()
+
+    def broken():
+        raise ValueError("数据源不可用")
+
+    job = queue.submit("broken", broken)
+    assert _wait_until(lambda: job.status == 'failed')
+    assert "数据源不可用" in job.error
+    with pytest.raises(AnalysisCancelledError):
+        job.cancel_event.set()
+        job.raise_if_cancelled()
+    queue.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+测试跨进程分析任务队列和分析工作进程
+使用SQLite队列作为Redis的本地替身，验证多进程领取任务不重复、每用户并发限制跨进程生效、
+进度通过 AsyncProgressTracker 的文件键写入、取消和工作进程退出后的超时处理，
+并对比Web进程内执行与多个工作进程执行的吞吐量（CPU密集的模拟分析）
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from web.analysis_worker import run_worker
+from web.utils.analysis_jobs import run_analysis_job
+from web.utils.analysis_queue import AnalysisJobQueue, QueueFullError
+from web.utils.async_progress_tracker import AsyncProgressTracker, get_progress_by_id
+from web.utils.distributed_queue import SQLiteJobQueue
+
+JOBS = 16
+WORKERS = 4
+
+# 工作进程：使用与测试相同的CPU密集模拟分析
+WORKER_SCRIPT = """
+import os, sys
+sys.path.insert(0, os.environ["TEST_PROJECT_ROOT"])
+sys.path.insert(0, os.path.join(os.environ["TEST_PROJECT_ROOT"], "tests"))
+from test_analysis_workers import cpu_bound_analysis, discard_result
+from web.analysis_worker import run_worker
+from web.utils.distributed_queue import SQLiteJobQueue
+backend = SQLiteJobQueue(os.environ["TEST_QUEUE_DB"], max_per_user=100, max_queued=1000)
+print("ready", flush=True)
+run_worker(backend, concurrency=1, runner=cpu_bound_analysis, save_result=discard_result, poll_interval=0.02)
+"""
+
+
+def cpu_bound_analysis(progress_callback=None, stream_callback=None, **params):
+    """模拟分析：数据整理和指标计算为纯Python计算（持有GIL），按阶段报告进度"""
+    total = 0
+    for stage in range(4):
+        if progress_callback:
+            progress_callback(f"📊 阶段 {stage + 1}: {params['stock_symbol']}")
+        total += sum(i * i % 7 for i in range(150_000))
+    return {'success': True, 'stock_symbol': params['stock_symbol'], 'state': {}, 'decision': {'checksum': total}}
+
+
+def discard_result(**kwargs):
+    return True
+
+
+def _params(i: int) -> dict:
+    return {'stock_symbol': f"{600000 + i}", 'analysis_date': "2025-01-02", 'analysts': ['market'],
+            'research_depth': 1, 'llm_provider': 'dashscope', 'llm_model': 'qwen-turbo', 'market_type': 'A股'}
+
+
+def _wait_until(predicate, timeout: float = 60.0, interval: float = 0.02):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(interval)
+    return predicate()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """进度文件写入临时目录的 ./data 下"""
+    monkeypatch.setenv("REDIS_ENABLED", "false")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def _progress(analysis_id: str) -> dict:
+    return get_progress_by_id(analysis_id)
+
+
+def test_throughput_in_process_vs_workers(workdir, monkeypatch):
+    """同样的任务：Web进程内线程池 vs 多个工作进程"""
+    # Web进程内执行：4个工作线程共享一个GIL
+    queue = AnalysisJobQueue(max_workers=WORKERS, max_per_user=100, max_queued=1000)
+    start = time.perf_counter()
+    for i in range(JOBS):
+        analysis_id = f"inproc_{i}"
+        tracker = AsyncProgressTracker(analysis_id, ['market'], 1, 'dashscope')
+        queue.submit(analysis_id, run_analysis_job, analysis_id, _params(i), tracker,
+                     runner=cpu_bound_analysis, save_result=discard_result, user=f"u{i}")
+    assert _wait_until(lambda: all(queue.get_status(f"inproc_{i}") == 'completed' for i in range(JOBS)))
+    in_process = time.perf_counter() - start
+    queue.shutdown()
+
+    # 多个工作进程从SQLite队列领取任务
+    db_path = str(workdir / "jobs.db")
+    backend = SQLiteJobQueue(db_path, max_per_user=100, max_queued=1000)
+    env = dict(os.environ, TEST_PROJECT_ROOT=project_root, TEST_QUEUE_DB=db_path)
+    workers = [subprocess.Popen([sys.executable, "-c", WORKER_SCRIPT], env=env, cwd=str(workdir),
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+               for _ in range(WORKERS)]
+    try:
+        for worker in workers:
+            assert worker.stdout.readline().strip() == "ready"
+        start = time.perf_counter()
+        for i in range(JOBS):
+            backend.submit(f"worker_{i}", _params(i), user=f"u{i}")
+        assert _wait_until(lambda: all(backend.get_status(f"worker_{i}") == 'completed' for i in range(JOBS)))
+        multi_worker = time.perf_counter() - start
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.wait()
+
+    print(f"\n{JOBS}个CPU密集分析: Web进程内{WORKERS}线程 {in_process:.2f}s ({JOBS / in_process:.1f}个/s), "
+          f"{WORKERS}个工作进程 {multi_worker:.2f}s ({JOBS / multi_worker:.1f}个/s), CPU核数 {os.cpu_count()}")
+
+    for i in range(JOBS):
+        assert _progress(f"worker_{i}")['status'] == 'completed'
+        assert _progress(f"inproc_{i}")['status'] == 'completed'
+    claimed_by = {row[0] for row in backend._connection().execute("SELECT worker FROM analysis_jobs")}
+    assert len(claimed_by) > 1
+    if (os.cpu_count() or 1) >= WORKERS:
+        assert multi_worker * 1.5 < in_process
+
+
+def test_concurrent_claims_are_exclusive_and_respect_user_limit(workdir):
+    """多个工作线程并发领取，每个任务只执行一次，单用户同时运行不超过上限"""
+    backend = SQLiteJobQueue(str(workdir / "jobs.db"), max_per_user=1, max_queued=1000)
+    for i in range(40):
+        backend.submit(f"job_{i}", _params(i), user=f"user{i % 4}")
+
+    lock = threading.Lock()
+    executions, running, max_running = [], {}, {}
+
+    def runner(progress_callback=None, stream_callback=None, **params):
+        user = f"user{(int(params['stock_symbol']) - 600000) % 4}"
+        with lock:
+            executions.append(params['stock_symbol'])
+            running[user] = running.get(user, 0) + 1
+            max_running[user] = max(max_running.get(user, 0), running[user])
+        time.sleep(0.01)
+        with lock:
+            running[user] -= 1
+        return {'success': True}
+
+    stop = threading.Event()
+    threads = [threading.Thread(target=run_worker, args=(backend,),
+                                kwargs=dict(concurrency=3, worker_id=f"w{n}", runner=runner,
+                                            save_result=discard_result, stop_event=stop, poll_interval=0.01))
+               for n in range(3)]
+    for thread in threads:
+        thread.start()
+    assert _wait_until(lambda: all(backend.get_status(f"job_{i}") == 'completed' for i in range(40)))
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(executions) == sorted(f"{600000 + i}" for i in range(40))
+    assert max(max_running.values()) == 1
+
+
+def test_position_cancel_and_queue_limit(workdir):
+    """排队位置、预计等待、取消排队任务、排队上限"""
+    backend = SQLiteJobQueue(str(workdir / "jobs.db"), max_per_user=5, max_queued=3, estimated_duration=100)
+    for i in range(3):
+        backend.submit(f"job_{i}", _params(i))
+    with pytest.raises(QueueFullError):
+        backend.submit("job_3", _params(3))
+
+    assert [backend.get_position(f"job_{i}") for i in range(3)] == [1, 2, 3]
+    assert backend.estimate_wait("job_2") == pytest.approx(300)
+    assert backend.cancel("job_0")
+    assert backend.get_status("job_0") == 'cancelled'
+    assert backend.get_position("job_1") == 1
+
+    job = backend.claim("w1")
+    assert job['job_id'] == "job_1" and job['payload'] == _params(1)
+    assert backend.estimate_wait("job_2") == pytest.approx(100)
+    assert backend.cancel("job_1")
+    assert backend.is_cancel_requested("job_1")
+    assert backend.get_status("job_1") == 'running'
+
+
+def test_worker_stops_cancelled_analysis(workdir, monkeypatch):
+    """运行中的任务被取消后，工作进程在下一个进度节点中止，进度记为失败"""
+    from web import analysis_worker
+    monkeypatch.setattr(analysis_worker, "CANCEL_CHECK_INTERVAL", 0.0)
+    backend = SQLiteJobQueue(str(workdir / "jobs.db"))
+    backend.submit("slow", _params(0))
+    started = threading.Event()
+    stages = []
+
+    def slow_runner(progress_callback=None, stream_callback=None, **params):
+        for stage in range(200):
+            progress_callback(f"阶段 {stage}")
+            stages.append(stage)
+            started.set()
+            time.sleep(0.01)
+        return {'success': True}
+
+    stop = threading.Event()
+    thread = threading.Thread(target=run_worker, args=(backend,),
+                              kwargs=dict(runner=slow_runner, save_result=discard_result,
+                                          stop_event=stop, poll_interval=0.01))
+    thread.start()
+    assert started.wait(10)
+    backend.cancel("slow")
+    assert _wait_until(lambda: backend.get_status("slow") == 'cancelled', timeout=10)
+    stop.set()
+    thread.join()
+    assert len(stages) < 200
+    assert _progress("slow")['status'] == 'failed'
+
+
+def test_stale_running_job_is_failed(workdir):
+    """工作进程退出（心跳超时）后，运行中的任务标记为失败，不再占用用户并发名额"""
+    backend = SQLiteJobQueue(str(workdir / "jobs.db"), max_per_user=1)
+    backend.submit("orphan", _params(0), user="alice")
+    backend.submit("next", _params(1), user="alice")
+    assert backend.claim("dead-worker")['job_id'] == "orphan"
+    assert backend.claim("w2") is None
+
+    backend._connection().execute("UPDATE analysis_jobs SET heartbeat_at=0 WHERE job_id='orphan'")
+    assert backend.fail_stale(timeout=60) == ["orphan"]
+    assert backend.get_status("orphan") == 'failed'
+    assert backend.claim("w2")['job_id'] == "next"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
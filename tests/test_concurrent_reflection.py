@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+测试并发反思
+使用固定延迟的假LLM对比逐个反思与并发反思的总耗时，并验证情况向量只计算一次、记忆批量写入
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from langchain_core.messages import AIMessage
+
+from tradingagents.graph.reflection import REFLECTION_COMPONENTS, Reflector
+
+LATENCY = 0.2
+
+
+class FixedLatencyLLM:
+    """固定延迟的假LLM，记录最大并发数"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def invoke(self, messages):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(LATENCY)
+        with self.lock:
+            self.active -= 1
+        report = messages[1][1].split("Analysis/Decision: ")[1].split("\n")[0]
+        return AIMessage(content=f"反思：{report}")
+
+
+class RecordingMemory:
+    """记录向量计算次数和写入内容的假记忆"""
+
+    def __init__(self, embedding_calls):
+        self.llm_provider = "dashscope"
+        self.embedding = "text-embedding-v3"
+        self.embedding_calls = embedding_calls
+        self.added = []
+
+    def get_embedding(self, text):
+        self.embedding_calls.append(text)
+        time.sleep(LATENCY / 4)
+        return [0.1] * 8
+
+    def add_situations(self, situations_and_advice, embeddings=None):
+        if embeddings is None:
+            embeddings = [self.get_embedding(situation) for situation, _ in situations_and_advice]
+        self.added.append((situations_and_advice, embeddings))
+
+
+def _state():
+    return {
+        "market_report": "市场报告", "sentiment_report": "情绪报告",
+        "news_report": "新闻报告", "fundamentals_report": "基本面报告",
+        "investment_debate_state": {"bull_history": "看涨历史", "bear_history": "看跌历史",
+                                    "judge_decision": "研究经理决策"},
+        "trader_investment_plan": "交易员计划",
+        "risk_debate_state": {"judge_decision": "风险经理决策"},
+    }
+
+
+def _memories(embedding_calls):
+    return {name: RecordingMemory(embedding_calls) for name in REFLECTION_COMPONENTS}
+
+
+def test_concurrent_reflection_wall_time():
+    """并发反思的总耗时明显低于逐个反思，最大并发数受限"""
+    state = _state()
+
+    sequential_calls = []
+    memories = _memories(sequential_calls)
+    reflector = Reflector(FixedLatencyLLM())
+    start = time.perf_counter()
+    reflector.reflect_bull_researcher(state, 0.05, memories["bull"])
+    reflector.reflect_bear_researcher(state, 0.05, memories["bear"])
+    reflector.reflect_trader(state, 0.05, memories["trader"])
+    reflector.reflect_invest_judge(state, 0.05, memories["invest_judge"])
+    reflector.reflect_risk_manager(state, 0.05, memories["risk_manager"])
+    sequential_time = time.perf_counter() - start
+
+    concurrent_calls = []
+    memories = _memories(concurrent_calls)
+    llm = FixedLatencyLLM()
+    start = time.perf_counter()
+    Reflector(llm).reflect_all(state, 0.05, memories, max_workers=3)
+    concurrent_time = time.perf_counter() - start
+
+    print(f"\n逐个反思 {sequential_time:.2f}s ({len(sequential_calls)}次向量计算), "
+          f"并发反思 {concurrent_time:.2f}s ({len(concurrent_calls)}次向量计算)")
+
+    assert llm.peak == 3
+    # 5次调用在3个并发下需要2批，加一次向量计算
+    assert concurrent_time < sequential_time / 2
+    assert len(sequential_calls) == 5
+    assert len(concurrent_calls) == 1
+
+
+def test_reflections_written_to_matching_memories():
+    """每个组件的反思写入对应的记忆，使用共享的情况向量"""
+    memories = _memories([])
+    Reflector(FixedLatencyLLM()).reflect_all(_state(), -0.02, memories, max_workers=5)
+
+    expected = {"bull": "看涨历史", "bear": "看跌历史", "trader": "交易员计划",
+                "invest_judge": "研究经理决策", "risk_manager": "风险经理决策"}
+    for name, report in expected.items():
+        [(situations_and_advice, embeddings)] = memories[name].added
+        [(situation, advice)] = situations_and_advice
+        assert situation.startswith("市场报告")
+        assert advice == f"反思：{report}"
+        assert embeddings == [[0.1] * 8]
+
+
+def test_add_situations_uses_precomputed_embeddings():
+    """FinancialSituationMemory.add_situations 提供向量时不再重复计算"""
+    from tradingagents.agents.utils.memory import ChromaDBManager, FinancialSituationMemory
+
+    memory = FinancialSituationMemory.__new__(FinancialSituationMemory)
+    memory.situation_collection = ChromaDBManager().get_or_create_collection("test_precomputed_embeddings")
+
+    def fail(text):
+        raise AssertionError("不应重新计算向量")
+
+    memory.get_embedding = fail
+    memory.add_situations([("情况A", "建议A"), ("情况B", "建议B")], embeddings=[[0.1, 0.2], [0.3, 0.4]])
+    assert memory.situation_collection.count() == 2
+
+
+def test_empty_memories_is_noop():
+    """没有记忆实例时不调用LLM"""
+    llm = FixedLatencyLLM()
+    Reflector(llm).reflect_all(_state(), 0.0, {})
+    assert llm.peak == 0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
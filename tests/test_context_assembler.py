@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+测试上下文组装器
+用模拟的完整分析运行（四份长报告 + 多轮辩论）对比研究员/风险辩论者/经理提示词
+在组装前后的token数，并验证报告摘要只计算一次、最近发言保留原文
+"""
+
+import os
+import sys
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from langchain_core.messages import AIMessage
+
+from tradingagents.agents.managers.research_manager import create_research_manager
+from tradingagents.agents.managers.risk_manager import create_risk_manager
+from tradingagents.agents.researchers.bear_researcher import create_bear_researcher
+from tradingagents.agents.researchers.bull_researcher import create_bull_researcher
+from tradingagents.agents.risk_mgmt.aggresive_debator import create_risky_debator
+from tradingagents.agents.utils.context_assembler import (
+    ContextAssembler,
+    create_context_assembler,
+    estimate_tokens,
+    split_debate_turns,
+    window_debate_history,
+)
+from tradingagents.agents.utils.debate_log import format_turn, make_turn, render_history
+
+
+class PromptRecordingLLM:
+    """记录提示词的假LLM"""
+
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return AIMessage(content=f"第{len(self.prompts)}次发言：综合来看建议持有，目标价12.5元。")
+
+
+def _long_report(title: str, sections: int = 40) -> str:
+    lines = [f"# {title}"]
+    for i in range(sections):
+        lines.append(f"## 第{i + 1}部分")
+        lines.append("本部分对公司所处行业的竞争格局、上下游议价能力以及宏观环境进行了较为详尽的定性描述。" * 3)
+        lines.append(f"- 关键数据：营收同比增长{i + 5}%，市盈率{10 + i}倍，支撑位{8 + i * 0.1:.1f}元")
+    lines.append("## 总结：建议持有，目标价12.5元")
+    return "\n".join(lines)
+
+
+def _recorded_state(debate_rounds: int = 3) -> dict:
+    bull_bear = []
+    for i in range(debate_rounds):
+        bull_bear.append(make_turn("Bull", 2 * i, f"第{i + 1}轮看涨论点。" + "公司增长潜力巨大，估值仍有提升空间。" * 30, 2))
+        bull_bear.append(make_turn("Bear", 2 * i + 1, f"第{i + 1}轮看跌论点。" + "行业竞争加剧，利润率承压明显。" * 30, 2))
+    risk = []
+    for i in range(debate_rounds):
+        for j, speaker in enumerate(("Risky", "Safe", "Neutral")):
+            risk.append(make_turn(speaker, 3 * i + j, f"第{i + 1}轮风险观点。" + "仓位和止损需要结合波动率调整。" * 30, 3))
+    return {
+        "company_of_interest": "000001",
+        "market_report": _long_report("市场分析报告"),
+        "sentiment_report": _long_report("情绪分析报告"),
+        "news_report": _long_report("新闻分析报告"),
+        "fundamentals_report": _long_report("基本面分析报告"),
+        "investment_plan": "建议持有",
+        "trader_investment_plan": "最终交易建议: **持有**",
+        "investment_debate_state": {"current_response": format_turn(bull_bear[-1]), "count": len(bull_bear)},
+        "investment_debate_turns": bull_bear,
+        "risk_debate_state": {
+            "latest_speaker": "Neutral", "current_risky_response": "", "current_safe_response": "",
+            "current_neutral_response": "", "count": len(risk),
+        },
+        "risk_debate_turns": risk,
+    }
+
+
+def _run_downstream_agents(state: dict, assembler: ContextAssembler) -> dict:
+    """依次运行下游Agent（共用交易图传入的组装器），返回各节点的提示词token数"""
+    agents = {
+        "bull_researcher": create_bull_researcher,
+        "bear_researcher": create_bear_researcher,
+        "research_manager": create_research_manager,
+        "risk_manager": create_risk_manager,
+    }
+    prompt_tokens = {}
+    for name, factory in agents.items():
+        llm = PromptRecordingLLM()
+        factory(llm, None, assembler)(state)
+        prompt_tokens[name] = estimate_tokens(llm.prompts[-1])
+
+    llm = PromptRecordingLLM()
+    create_risky_debator(llm, assembler)(state)
+    prompt_tokens["risky_analyst"] = estimate_tokens(llm.prompts[-1])
+    return prompt_tokens
+
+
+def test_prompt_tokens_before_and_after():
+    """录制运行上对比组装前后各节点的提示词token数，均不超过预算"""
+    state = _recorded_state(debate_rounds=3)
+
+    before = _run_downstream_agents(state, ContextAssembler(budget_tokens=0))
+
+    assembler = ContextAssembler(budget_tokens=4000)
+    after = _run_downstream_agents(state, assembler)
+
+    print("\n节点               压缩前    压缩后")
+    for node in before:
+        print(f"{node:<18} {before[node]:>7} {after[node]:>8}")
+        assert after[node] < before[node]
+
+    for node, stats in assembler.get_stats().items():
+        assert stats["tokens_after"] <= 4000
+        assert stats["tokens_before"] > stats["tokens_after"]
+
+    # 四份报告各只压缩一次，被所有下游Agent复用
+    assert assembler.summary_computations == 4
+
+
+def test_condensed_report_keeps_key_lines():
+    """报告摘要优先保留标题和包含关键结论/数据的行"""
+    assembler = ContextAssembler(budget_tokens=1200)
+    report = _long_report("基本面分析报告")
+    context = assembler.assemble("bull_researcher", reports={"fundamentals": report})
+
+    condensed = context.reports["fundamentals"]
+    assert estimate_tokens(condensed) <= 1200
+    assert "# 基本面分析报告" in condensed
+    assert "## 总结：建议持有，目标价12.5元" in condensed
+    assert "营收同比增长" in condensed
+
+
+def test_history_window_keeps_recent_turns():
+    """辩论窗口：最近的发言保留原文，更早的发言被截断或省略"""
+    history = render_history(_recorded_state(debate_rounds=5)["investment_debate_turns"])
+    turns = split_debate_turns(history)
+    assert len(turns) == 10
+
+    windowed = window_debate_history(history, max_tokens=2000, recent_turns=2)
+    assert estimate_tokens(windowed) <= 2000
+    assert turns[-1] in windowed and turns[-2] in windowed
+    assert turns[0] not in windowed
+
+
+def test_small_context_is_unchanged():
+    """未超出预算时报告和历史原样返回"""
+    assembler = ContextAssembler(budget_tokens=4000)
+    context = assembler.assemble(
+        "bear_researcher",
+        reports={"market": "# 市场报告\n上涨趋势"},
+        history="Bull Analyst: 看涨",
+    )
+    assert context.reports == {"market": "# 市场报告\n上涨趋势"}
+    assert context.history == "Bull Analyst: 看涨"
+    assert context.tokens_before == context.tokens_after
+    assert assembler.summary_computations == 0
+
+
+def test_create_context_assembler_defaults_off(monkeypatch):
+    """默认不压缩；环境变量可设置全局预算和单个Agent的预算，每次创建独立的实例"""
+    for key in list(os.environ):
+        if key.startswith("CONTEXT_TOKEN_BUDGET"):
+            monkeypatch.delenv(key)
+    assert create_context_assembler().budget_tokens == 0
+
+    monkeypatch.setenv("CONTEXT_TOKEN_BUDGET", "12000")
+    monkeypatch.setenv("CONTEXT_TOKEN_BUDGET_RISK_MANAGER", "6000")
+    first = create_context_assembler()
+    assert first.budget_tokens == 12000
+    assert first.agent_budgets == {"risk_manager": 6000}
+    assert create_context_assembler(8000).budget_tokens == 8000
+    assert create_context_assembler() is not first
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
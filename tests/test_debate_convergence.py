@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+测试辩论收敛检测
+验证新颖度和立场分类，以及辩论在发言重复时提前结束、在持续产生新论点时跑满轮次，
+并统计节省的轮次和避免的token数
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from langchain_core.messages import AIMessage
+from langgraph.graph import END, START, StateGraph
+
+from tradingagents.agents.utils.agent_states import AgentState
+from tradingagents.agents.utils.debate_log import INVEST_DEBATE_SPEAKERS, RISK_DEBATE_SPEAKERS, make_turn
+from tradingagents.graph.conditional_logic import ConditionalLogic
+from tradingagents.graph.debate_convergence import (
+    ConvergenceDetector,
+    classify_stance,
+    convergence_report,
+    turn_novelty,
+)
+from tradingagents.graph.propagation import Propagator
+from tradingagents.graph.setup import GraphSetup
+
+BULL_ARGUMENT = "公司营收连续三个季度增长，估值低于行业平均，建议买入。"
+BEAR_ARGUMENT = "行业竞争加剧导致毛利率下滑，现金流承压，建议卖出。"
+
+
+class ScriptedLLM:
+    """假LLM：repetitive=True 时每位发言人反复重复同一论点，否则每次生成全新内容"""
+
+    def __init__(self, repetitive: bool):
+        self.repetitive = repetitive
+        self.calls = 0
+        self.rng = random.Random(42)
+
+    def invoke(self, prompt):
+        self.calls += 1
+        if self.repetitive:
+            argument = BEAR_ARGUMENT if "看跌分析师" in prompt else BULL_ARGUMENT
+        else:
+            fresh = "".join(chr(self.rng.randint(0x4E00, 0x9FA5)) for _ in range(60))
+            argument = f"{fresh}，建议持有。"
+        return AIMessage(content=argument)
+
+
+def _run_debate(repetitive: bool, max_rounds: int, detector=None):
+    llm = ScriptedLLM(repetitive)
+    logic = ConditionalLogic(max_debate_rounds=max_rounds, max_risk_discuss_rounds=max_rounds,
+                             convergence_detector=detector)
+    setup = GraphSetup(llm, llm, None, {}, None, None, None, None, None, logic, config={})
+    return _invoke_debates(setup), llm
+
+
+def _invoke_debates(setup: GraphSetup):
+    """用给定的 GraphSetup 串联投资辩论和风险辩论并运行到结束"""
+    workflow = StateGraph(AgentState)
+    workflow.add_node("Trader", lambda state: {"trader_investment_plan": "最终交易建议: **持有**"})
+    setup.add_investment_debate(workflow, START)
+    workflow.add_edge("Research Manager", "Trader")
+    setup.add_risk_debate(workflow, "Trader")
+    workflow.add_edge("Risk Judge", END)
+
+    state = Propagator().create_initial_state("000001", "2025-01-01")
+    for key in ("market_report", "sentiment_report", "news_report", "fundamentals_report"):
+        state[key] = f"{key}: 数据正常"
+    return workflow.compile().invoke(state)
+
+
+def test_novelty_and_stance():
+    """重复发言新颖度接近0，全新发言接近1；立场按关键词分类"""
+    assert turn_novelty(BULL_ARGUMENT, [BULL_ARGUMENT, BEAR_ARGUMENT]) == 0.0
+    assert turn_novelty(BULL_ARGUMENT, [BEAR_ARGUMENT]) > 0.8
+    assert turn_novelty("", [BULL_ARGUMENT]) == 0.0
+
+    assert classify_stance(BULL_ARGUMENT) == "buy"
+    assert classify_stance(BEAR_ARGUMENT) == "sell"
+    assert classify_stance("建议继续持有观望") == "hold"
+    assert classify_stance("数据正常") is None
+
+
+def test_detector_requires_complete_rounds():
+    """只在至少两轮完整发言后判断收敛"""
+    detector = ConvergenceDetector(novelty_threshold=0.2)
+    turns = [make_turn(s, i, BULL_ARGUMENT, 2) for i, s in enumerate(INVEST_DEBATE_SPEAKERS * 2)]
+    assert not detector.has_converged(turns[:2], INVEST_DEBATE_SPEAKERS)
+    assert not detector.has_converged(turns[:3], INVEST_DEBATE_SPEAKERS)
+    assert detector.has_converged(turns, INVEST_DEBATE_SPEAKERS)
+
+    # 立场变化时即使内容重复也不提前结束
+    flipped = turns[:3] + [make_turn("Bear", 3, BEAR_ARGUMENT, 2)]
+    assert not detector.has_converged(flipped, INVEST_DEBATE_SPEAKERS)
+
+
+def test_repetitive_debate_stops_early():
+    """发言重复时第二轮后提前结束，并统计节省的轮次和token数"""
+    baseline_state, baseline_llm = _run_debate(repetitive=True, max_rounds=4)
+    state, llm = _run_debate(repetitive=True, max_rounds=4, detector=ConvergenceDetector(0.2))
+
+    assert len(baseline_state["investment_debate_turns"]) == 8
+    assert len(baseline_state["risk_debate_turns"]) == 12
+    assert len(state["investment_debate_turns"]) == 4
+    assert len(state["risk_debate_turns"]) == 6
+    assert state["final_trade_decision"]
+
+    invest = convergence_report(state["investment_debate_turns"], len(INVEST_DEBATE_SPEAKERS), 4)
+    risk = convergence_report(state["risk_debate_turns"], len(RISK_DEBATE_SPEAKERS), 4)
+    print(f"\nLLM调用 {baseline_llm.calls} -> {llm.calls}; 投资辩论 {invest}; 风险辩论 {risk}")
+
+    assert invest["rounds_run"] == 2 and invest["rounds_saved"] == 2
+    assert risk["rounds_run"] == 2 and risk["rounds_saved"] == 2
+    assert invest["tokens_avoided"] == 4 * state["investment_debate_turns"][0]["tokens"]
+    assert baseline_llm.calls - llm.calls == 4 + 6
+
+
+def test_novel_debate_runs_all_rounds():
+    """每轮都有新论点时跑满设定轮次"""
+    state, _ = _run_debate(repetitive=False, max_rounds=3, detector=ConvergenceDetector(0.2))
+    assert len(state["investment_debate_turns"]) == 6
+    assert len(state["risk_debate_turns"]) == 9
+    assert convergence_report(state["investment_debate_turns"], 2, 3)["rounds_saved"] == 0
+
+
+def test_trading_graph_uses_configured_rounds(monkeypatch):
+    """TradingAgentsGraph 启用收敛检测时使用配置的轮数上限，重复辩论提前结束"""
+    from tradingagents.default_config import DEFAULT_CONFIG
+    from tradingagents.graph.trading_graph import TradingAgentsGraph
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    config = DEFAULT_CONFIG.copy()
+    config.update({
+        "llm_provider": "openai",
+        "memory_enabled": False,
+        "online_tools": False,
+        "max_debate_rounds": 4,
+        "max_risk_discuss_rounds": 4,
+    })
+
+    # 未启用收敛检测时保持原有的默认轮数
+    plain = TradingAgentsGraph(["market"], config={**config, "debate_convergence_enabled": False})
+    assert plain.conditional_logic.convergence_detector is None
+    assert plain.conditional_logic.max_debate_rounds == 1
+
+    graph = TradingAgentsGraph(["market"], config={**config, "debate_convergence_enabled": True})
+    assert graph.conditional_logic.max_debate_rounds == 4
+    assert graph.conditional_logic.max_risk_discuss_rounds == 4
+
+    llm = ScriptedLLM(repetitive=True)
+    graph.graph_setup.quick_thinking_llm = llm
+    graph.graph_setup.deep_thinking_llm = llm
+    state = _invoke_debates(graph.graph_setup)
+
+    report = graph._debate_convergence(state)
+    assert report["investment_debate"]["rounds_run"] == 2
+    assert report["investment_debate"]["rounds_saved"] == 2
+    assert report["risk_debate"]["rounds_saved"] == 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
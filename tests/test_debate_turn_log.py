@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+测试辩论发言记录
+在1/3/5轮辩论下对比结构化发言记录与原有字符串拼接方式的状态更新大小和耗时，
+并验证最终渲染的历史文本与原格式一致
+"""
+
+import json
+import os
+import sys
+import time
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from langchain_core.messages import AIMessage
+from langgraph.graph import END, START, StateGraph
+
+from tradingagents.agents.managers.research_manager import create_research_manager
+from tradingagents.agents.researchers.bear_researcher import create_bear_researcher
+from tradingagents.agents.researchers.bull_researcher import create_bull_researcher
+from tradingagents.agents.utils.agent_states import AgentState
+from tradingagents.agents.utils.debate_log import make_turn, render_history
+from tradingagents.graph.conditional_logic import ConditionalLogic
+from tradingagents.graph.propagation import Propagator
+
+ARGUMENT = "基于最新财报和行业数据，我的观点如下。" * 40
+
+
+class FixedLLM:
+    """固定输出的假LLM"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        return AIMessage(content=f"[{self.calls}] {ARGUMENT}")
+
+
+def _build_debate_graph(rounds: int):
+    llm = FixedLLM()
+    logic = ConditionalLogic(max_debate_rounds=rounds)
+    workflow = StateGraph(AgentState)
+    workflow.add_node("Bull Researcher", create_bull_researcher(llm, None))
+    workflow.add_node("Bear Researcher", create_bear_researcher(llm, None))
+    workflow.add_node("Research Manager", create_research_manager(llm, None))
+    workflow.add_edge(START, "Bull Researcher")
+    for node in ("Bull Researcher", "Bear Researcher"):
+        workflow.add_conditional_edges(
+            node,
+            logic.should_continue_debate,
+            {"Bear Researcher": "Bear Researcher", "Bull Researcher": "Bull Researcher",
+             "Research Manager": "Research Manager"},
+        )
+    workflow.add_edge("Research Manager", END)
+    return workflow.compile()
+
+
+def _initial_state() -> dict:
+    state = Propagator().create_initial_state("000001", "2025-01-01")
+    for key in ("market_report", "sentiment_report", "news_report", "fundamentals_report"):
+        state[key] = f"{key}: 数据正常"
+    return state
+
+
+def _run_structured(rounds: int):
+    """运行辩论图，返回每次辩论更新的序列化字节数、平均更新耗时和最终状态"""
+    graph = _build_debate_graph(rounds)
+    update_bytes = []
+    final_state = None
+    start = time.perf_counter()
+    for update in graph.stream(_initial_state(), stream_mode="updates"):
+        node, payload = next(iter(update.items()))
+        if node in ("Bull Researcher", "Bear Researcher"):
+            update_bytes.append(len(json.dumps(payload, ensure_ascii=False).encode()))
+    elapsed = time.perf_counter() - start
+    final_state = graph.invoke(_initial_state())
+    return update_bytes, elapsed / len(update_bytes), final_state
+
+
+def _run_legacy(rounds: int):
+    """按原有方式拼接历史字符串，返回每次更新的序列化字节数和平均更新耗时"""
+    debate = {"history": "", "bull_history": "", "bear_history": "", "current_response": "", "count": 0}
+    update_bytes = []
+    start = time.perf_counter()
+    for i in range(2 * rounds):
+        speaker = "Bull" if i % 2 == 0 else "Bear"
+        argument = f"{speaker} Analyst: [{i + 1}] {ARGUMENT}"
+        own_key = f"{speaker.lower()}_history"
+        debate = {
+            **debate,
+            "history": debate["history"] + "\n" + argument,
+            own_key: debate[own_key] + "\n" + argument,
+            "current_response": argument,
+            "count": debate["count"] + 1,
+        }
+        update_bytes.append(len(json.dumps({"investment_debate_state": debate}, ensure_ascii=False).encode()))
+    elapsed = time.perf_counter() - start
+    return update_bytes, elapsed / len(update_bytes)
+
+
+def test_update_size_at_1_3_5_rounds():
+    """结构化记录每次更新只携带新发言，更新大小不随轮数增长"""
+    print("\n轮数  原方式更新总字节  结构化更新总字节  原方式单次最大  结构化单次最大  结构化平均更新耗时")
+    for rounds in (1, 3, 5):
+        legacy_bytes, _ = _run_legacy(rounds)
+        structured_bytes, avg_update_time, _ = _run_structured(rounds)
+        print(f"{rounds:>3} {sum(legacy_bytes):>16} {sum(structured_bytes):>16} "
+              f"{max(legacy_bytes):>14} {max(structured_bytes):>14} {avg_update_time * 1000:>14.2f}ms")
+
+        assert len(structured_bytes) == 2 * rounds
+        # 每次更新大小基本恒定（只含一条新发言）
+        assert max(structured_bytes) <= min(structured_bytes) * 1.1
+        if rounds > 1:
+            # 原方式单次更新随历史线性增长，总量二次增长
+            assert max(legacy_bytes) > 2 * max(structured_bytes)
+            assert sum(structured_bytes) < sum(legacy_bytes) / 2
+
+
+def test_final_history_matches_legacy_format():
+    """研究经理渲染的历史文本与原字符串拼接结果一致"""
+    _, _, final_state = _run_structured(3)
+    debate_state = final_state["investment_debate_state"]
+    turns = final_state["investment_debate_turns"]
+
+    assert [t["speaker"] for t in turns] == ["Bull", "Bear"] * 3
+    assert [t["round"] for t in turns] == [1, 1, 2, 2, 3, 3]
+    assert all(t["tokens"] > 0 for t in turns)
+
+    legacy_history = "".join(f"\n{t['speaker']} Analyst: {t['content']}" for t in turns)
+    assert debate_state["history"] == legacy_history
+    assert debate_state["bull_history"].count("Bull Analyst:") == 3
+    assert "Bear Analyst:" not in debate_state["bull_history"]
+    assert debate_state["judge_decision"]
+
+
+def test_render_history_window():
+    """按发言人和最近条数渲染"""
+    turns = [make_turn(s, i, f"观点{i}", 3) for i, s in enumerate(["Risky", "Safe", "Neutral"] * 2)]
+    assert render_history(turns, last_n=2) == "\nSafe Analyst: 观点4\nNeutral Analyst: 观点5"
+    assert render_history(turns, speaker="Risky") == "\nRisky Analyst: 观点0\nRisky Analyst: 观点3"
+    assert [t["round"] for t in turns] == [1, 1, 1, 2, 2, 2]
+    assert render_history([]) == ""
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
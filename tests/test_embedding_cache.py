@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+测试嵌入向量缓存
+模拟一次分析中五个Agent检索相同市场情况，对比启用缓存前后每次分析的嵌入接口调用次数，
+并验证磁盘缓存跨运行复用、并发请求去重、零向量不缓存
+"""
+
+import os
+import sys
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from tradingagents.agents.utils import embedding_cache
+from tradingagents.agents.utils.embedding_cache import EmbeddingCache, FileEmbeddingCacheBackend
+from tradingagents.agents.utils.memory import FinancialSituationMemory
+
+AGENT_MEMORIES = ("bull_memory", "bear_memory", "trader_memory", "invest_judge_memory", "risk_manager_memory")
+
+
+class StubEmbeddingClient:
+    """假的OpenAI兼容嵌入客户端，记录调用次数"""
+
+    def __init__(self):
+        self.calls = 0
+        self.embeddings = SimpleNamespace(create=self._create)
+
+    def _create(self, model, input):
+        self.calls += 1
+        vector = [float(ord(ch) % 7) for ch in input[:8]] + [1.0]
+        return SimpleNamespace(data=[SimpleNamespace(embedding=vector)])
+
+
+def _memories(monkeypatch, client):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    config = {"llm_provider": "openai", "backend_url": "http://127.0.0.1:9/v1"}
+    memories = []
+    for name in AGENT_MEMORIES:
+        memory = FinancialSituationMemory(f"{name}_{uuid.uuid4().hex[:8]}", config)
+        memory.client = client
+        memories.append(memory)
+    return memories
+
+
+def _run_analysis(memories, situation: str):
+    """每个Agent按同一段情况文本检索记忆"""
+    for memory in memories:
+        memory.get_memories(situation, n_matches=2)
+
+
+SITUATION = "市场报告：放量上涨\n\n情绪报告：偏乐观\n\n新闻报告：业绩预增\n\n基本面报告：估值合理"
+
+
+def test_embedding_calls_per_analysis(monkeypatch, tmp_path):
+    """不启用缓存每次分析调用5次嵌入接口；启用后首次1次，之后的运行从磁盘缓存读取为0次"""
+    client = StubEmbeddingClient()
+
+    embedding_cache.configure_embedding_cache(enabled=False)
+    memories = _memories(monkeypatch, client)
+    _run_analysis(memories, SITUATION)
+    before = client.calls
+
+    client.calls = 0
+    embedding_cache.configure_embedding_cache(enabled=True, cache_dir=str(tmp_path))
+    _run_analysis(memories, SITUATION)
+    first_run = client.calls
+
+    # 新进程：进程内缓存为空，从磁盘缓存读取
+    client.calls = 0
+    cache = embedding_cache.configure_embedding_cache(enabled=True, cache_dir=str(tmp_path))
+    _run_analysis(memories, SITUATION)
+    second_run = client.calls
+
+    print(f"\n每次分析的嵌入接口调用: 无缓存 {before} 次, 启用缓存首次 {first_run} 次, "
+          f"再次运行 {second_run} 次; 统计 {cache.get_stats()}")
+    assert before == 5
+    assert first_run == 1
+    assert second_run == 0
+    assert cache.get_stats() == {"memory_hits": 4, "disk_hits": 1, "misses": 0}
+
+
+def test_cache_key_includes_model():
+    """不同嵌入模型的相同文本分别缓存"""
+    cache = EmbeddingCache()
+    assert cache.get_or_compute("model-a", "文本", lambda: [1.0]) == [1.0]
+    assert cache.get_or_compute("model-b", "文本", lambda: [2.0]) == [2.0]
+    assert cache.get_or_compute("model-a", "文本", lambda: [3.0]) == [1.0]
+
+
+def test_stats_since_baseline():
+    """共享缓存跨多次分析累计，传入起点后只统计本次运行"""
+    cache = EmbeddingCache()
+    cache.get_or_compute("m", "文本", lambda: [1.0])
+    baseline = cache.get_stats()
+    cache.get_or_compute("m", "文本", lambda: [2.0])
+    assert cache.get_stats(since=baseline) == {"memory_hits": 1, "disk_hits": 0, "misses": 0}
+    assert cache.get_stats() == {"memory_hits": 1, "disk_hits": 0, "misses": 1}
+
+
+def test_zero_vectors_not_cached(tmp_path):
+    """降级返回的零向量不缓存，下次仍请求嵌入接口"""
+    cache = EmbeddingCache(backend=FileEmbeddingCacheBackend(str(tmp_path)))
+    assert cache.get_or_compute("m", "文本", lambda: [0.0] * 4) == [0.0] * 4
+    assert cache.get_or_compute("m", "文本", lambda: [0.5] * 4) == [0.5] * 4
+    assert cache.get_stats()["misses"] == 2
+
+
+def test_concurrent_requests_deduplicated():
+    """并发请求相同文本时只计算一次"""
+    cache = EmbeddingCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return [0.1, 0.2]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("m", "同一情况", compute)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [[0.1, 0.2]] * 5
+
+
+def test_lru_eviction():
+    """进程内缓存超出容量时淘汰最久未使用的条目"""
+    cache = EmbeddingCache(max_entries=2)
+    cache.get_or_compute("m", "a", lambda: [1.0])
+    cache.get_or_compute("m", "b", lambda: [2.0])
+    cache.get_or_compute("m", "a", lambda: [9.0])
+    cache.get_or_compute("m", "c", lambda: [3.0])
+    assert cache.get_or_compute("m", "a", lambda: [9.0]) == [1.0]
+    assert cache.get_or_compute("m", "b", lambda: [9.0]) == [9.0]
+
+
+@pytest.fixture(autouse=True)
+def restore_global_cache():
+    yield
+    embedding_cache._embedding_cache = None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
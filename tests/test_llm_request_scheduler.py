@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+测试LLM请求调度器
+使用本地桩服务器模拟提供商配额（并发上限 + 429/Retry-After），
+验证并发上限、统一退避、优先级和token预算
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from tradingagents.llm_adapters import request_scheduler
+from tradingagents.llm_adapters.openai_compatible_base import ChatCustomOpenAI
+from tradingagents.llm_adapters.request_scheduler import (
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    LLMRequestScheduler,
+    RateLimits,
+    is_rate_limit_error,
+)
+
+
+class QuotaStubServer:
+    """OpenAI兼容的桩服务器，超过并发配额时返回 429 + Retry-After"""
+
+    def __init__(self, max_concurrency: int, latency: float = 0.05, retry_after: float = 0.1):
+        self.max_concurrency = max_concurrency
+        self.latency = latency
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.completed = 0
+        self.rejected = 0
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with stub.lock:
+                    if stub.active >= stub.max_concurrency:
+                        stub.rejected += 1
+                        reject = True
+                    else:
+                        stub.active += 1
+                        stub.peak = max(stub.peak, stub.active)
+                        reject = False
+                if reject:
+                    payload = json.dumps({"error": {"message": "Rate limit exceeded", "type": "rate_limit"}})
+                    self.send_response(429)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Retry-After", str(stub.retry_after))
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload.encode())
+                    return
+                try:
+                    time.sleep(stub.latency)
+                    payload = json.dumps({
+                        "id": "chatcmpl-stub",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model", "stub"),
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "ok"},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6},
+                    })
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload.encode())
+                finally:
+                    with stub.lock:
+                        stub.active -= 1
+                        stub.completed += 1
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _make_llm(base_url: str) -> ChatCustomOpenAI:
+    # 关闭客户端自带重试，由调度器统一处理限流
+    return ChatCustomOpenAI(model="stub-model", api_key="test", base_url=base_url, max_retries=0)
+
+
+@pytest.fixture
+def use_scheduler(monkeypatch):
+    def _install(scheduler):
+        monkeypatch.setattr(request_scheduler, "_scheduler", scheduler)
+        return scheduler
+    return _install
+
+
+def test_concurrency_cap_respects_provider_quota(use_scheduler):
+    """调度器并发上限与提供商配额一致时，不应触发任何429"""
+    scheduler = use_scheduler(LLMRequestScheduler(default_limits=RateLimits(max_concurrency=2)))
+
+    with QuotaStubServer(max_concurrency=2) as stub:
+        llm = _make_llm(stub.base_url)
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            results = list(pool.map(lambda i: llm.invoke(f"请求{i}").content, range(20)))
+
+    assert results == ["ok"] * 20
+    assert stub.peak <= 2
+    assert stub.rejected == 0
+    assert scheduler.get_stats()["rate_limited"] == 0
+
+
+def test_rate_limited_requests_back_off_and_succeed(use_scheduler):
+    """调度器上限高于配额时，429 触发统一退避，所有请求最终成功"""
+    scheduler = use_scheduler(LLMRequestScheduler(default_limits=RateLimits(max_concurrency=8), max_retries=20))
+
+    with QuotaStubServer(max_concurrency=2, retry_after=0.05) as stub:
+        llm = _make_llm(stub.base_url)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda i: llm.invoke(f"请求{i}").content, range(16)))
+
+    assert results == ["ok"] * 16
+    assert stub.completed == 16
+    assert stub.rejected > 0
+    assert scheduler.get_stats()["rate_limited"] == stub.rejected
+
+
+def test_interactive_requests_run_before_batch():
+    """同一提供商排队时，交互式请求优先于更早排队的批量请求"""
+    scheduler = LLMRequestScheduler(default_limits=RateLimits(max_concurrency=1))
+    order = []
+
+    held = scheduler.acquire("dashscope", "qwen-turbo")
+
+    def worker(name, priority):
+        permit = scheduler.acquire("dashscope", "qwen-turbo", priority=priority)
+        order.append(name)
+        scheduler.release(permit)
+
+    batch = threading.Thread(target=worker, args=("batch", PRIORITY_BATCH))
+    batch.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=worker, args=("interactive", PRIORITY_INTERACTIVE))
+    interactive.start()
+    time.sleep(0.05)
+
+    scheduler.release(held)
+    batch.join(2)
+    interactive.join(2)
+
+    assert order == ["interactive", "batch"]
+
+
+def test_tokens_per_minute_budget():
+    """超出token预算的请求需等待窗口释放"""
+    scheduler = LLMRequestScheduler(
+        default_limits=RateLimits(tokens_per_minute=100), window_seconds=0.3
+    )
+
+    first = scheduler.acquire("deepseek", "deepseek-chat", tokens=80)
+    scheduler.release(first)
+
+    start = time.time()
+    second = scheduler.acquire("deepseek", "deepseek-chat", tokens=80)
+    scheduler.release(second)
+
+    assert time.time() - start >= 0.25
+
+
+def test_rate_limit_error_detection():
+    """按状态码、限流异常类型或明确的限流信息识别429，信息中碰巧含有429的数字不算"""
+
+    class RateLimitError(Exception):
+        pass
+
+    class Response:
+        status_code = 429
+
+    class HTTPError(Exception):
+        response = Response()
+
+    coded = Exception("请求失败")
+    coded.status_code = 429
+
+    assert is_rate_limit_error(coded)
+    assert is_rate_limit_error(HTTPError("请求失败"))
+    assert is_rate_limit_error(RateLimitError("quota"))
+    assert is_rate_limit_error(Exception("Error code: 429 - {'error': 'quota exceeded'}"))
+    assert is_rate_limit_error(Exception("HTTP 429 Too Many Requests"))
+    assert is_rate_limit_error(Exception("{'status_code': 429}"))
+    assert is_rate_limit_error(Exception("Rate limit reached for requests"))
+
+    assert not is_rate_limit_error(Exception("context length 14290 exceeds the maximum 8192"))
+    assert not is_rate_limit_error(Exception("invalid request id 429ab1"))
+    assert not is_rate_limit_error(Exception("prompt has 429 tokens, status code 400"))
+
+
+def test_model_limits_from_env(monkeypatch):
+    """LLM_MODEL_LIMITS 配置单个模型的并发和token预算，无法解析的条目被忽略"""
+    monkeypatch.setenv("LLM_SCHEDULER_ENABLED", "true")
+    monkeypatch.setenv("LLM_MODEL_LIMITS", "dashscope/qwen-max=2:100000, deepseek/deepseek-chat=4, bad-entry")
+    monkeypatch.setattr(request_scheduler, "_scheduler", None)
+
+    scheduler = request_scheduler.get_llm_request_scheduler()
+    assert scheduler.model_limits == {
+        ("dashscope", "qwen-max"): RateLimits(max_concurrency=2, tokens_per_minute=100000),
+        ("deepseek", "deepseek-chat"): RateLimits(max_concurrency=4, tokens_per_minute=0),
+    }
+
+
+def test_dashscope_throttling_backs_off(use_scheduler, monkeypatch):
+    """DashScope 在响应对象中返回的429（如 Throttling.AllocationQuota）走调度器的统一退避并重试"""
+    from types import SimpleNamespace
+
+    from tradingagents.llm_adapters import dashscope_adapter
+    from tradingagents.llm_adapters.dashscope_adapter import ChatDashScope
+
+    scheduler = use_scheduler(LLMRequestScheduler(base_backoff=0.01, max_retries=3))
+    responses = [
+        SimpleNamespace(status_code=429, code="Throttling.AllocationQuota",
+                        message="Allocated quota exceeded, please increase your quota limit."),
+        SimpleNamespace(status_code=200, code="", message=""),
+    ]
+    monkeypatch.setattr(dashscope_adapter.Generation, "call", lambda **kwargs: responses.pop(0))
+
+    with pytest.raises(Exception) as excinfo:
+        ChatDashScope._call_generation_api({})
+    assert is_rate_limit_error(excinfo.value)
+    assert str(excinfo.value) == ("DashScope API error: 429 - Throttling.AllocationQuota - "
+                          "Allocated quota exceeded, please increase your quota limit.")
+
+    responses.insert(0, SimpleNamespace(status_code=429, code="Throttling",
+                                        message="Requests throttling triggered."))
+    response = request_scheduler.schedule_llm_call(
+        "dashscope", "qwen-turbo", lambda: ChatDashScope._call_generation_api({}))
+    assert response.status_code == 200
+    assert scheduler.get_stats()["rate_limited"] == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
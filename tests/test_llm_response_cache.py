@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+测试LLM响应缓存
+验证内容寻址缓存键、录制/回放模式和分Agent命中统计（不发起真实请求）
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_openai import ChatOpenAI
+
+from tradingagents.llm_adapters import response_cache
+from tradingagents.llm_adapters.openai_compatible_base import ChatDeepSeekOpenAI
+from tradingagents.llm_adapters.response_cache import (
+    FileResponseCacheBackend,
+    LLMCacheMissError,
+    LLMResponseCache,
+)
+
+
+class _FakeProvider:
+    """替代 ChatOpenAI._generate 的假提供商，记录调用次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, llm, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        message = AIMessage(content=f"回复: {messages[-1].content}")
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"token_usage": {"prompt_tokens": 10, "completion_tokens": 5}},
+        )
+
+
+@pytest.fixture
+def fake_provider(monkeypatch):
+    provider = _FakeProvider()
+
+    def fake_generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return provider(self, messages, stop, run_manager, **kwargs)
+
+    monkeypatch.setattr(ChatOpenAI, "_generate", fake_generate)
+    return provider
+
+
+@pytest.fixture
+def cache_dir():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield tmp_dir
+
+
+def _use_cache(monkeypatch, cache):
+    monkeypatch.setattr(response_cache, "_response_cache", cache)
+
+
+def test_cache_key_depends_on_prompt_and_params(cache_dir):
+    """缓存键应随消息和采样参数变化，对消息ID不敏感"""
+    cache = LLMResponseCache("read_write", FileResponseCacheBackend(cache_dir))
+    llm = ChatDeepSeekOpenAI(api_key="test", temperature=0.1)
+    llm_hot = ChatDeepSeekOpenAI(api_key="test", temperature=0.9)
+
+    messages = [SystemMessage(content="你是分析师"), HumanMessage(content="分析000001")]
+    same_messages = [SystemMessage(content="你是分析师"), HumanMessage(content="分析000001", id="random-id")]
+
+    key = cache.make_key(llm, messages)
+    assert key == cache.make_key(llm, same_messages)
+    assert key != cache.make_key(llm, [HumanMessage(content="分析000002")])
+    assert key != cache.make_key(llm_hot, messages)
+    assert key != cache.make_key(llm, messages, tools=[{"type": "function", "function": {"name": "t"}}])
+    # 会话ID等统计参数不影响缓存键
+    assert key == cache.make_key(llm, messages, session_id="abc")
+
+
+def test_read_write_mode_records_and_hits(monkeypatch, fake_provider, cache_dir):
+    """read_write模式：第二次相同请求直接命中缓存"""
+    cache = LLMResponseCache("read_write", FileResponseCacheBackend(cache_dir))
+    _use_cache(monkeypatch, cache)
+    llm = ChatDeepSeekOpenAI(api_key="test")
+
+    first = llm.invoke("分析000001")
+    second = llm.invoke("分析000001")
+
+    assert fake_provider.calls == 1
+    assert first.content == second.content == "回复: 分析000001"
+
+    stats = cache.get_stats()["unknown"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+    # 共享缓存实例跨多次分析：快照之后的统计只包含本次运行
+    baseline = cache.snapshot()
+    assert cache.get_stats(since=baseline) == {}
+    llm.invoke("分析000001")
+    run_stats = cache.get_stats(since=baseline)["unknown"]
+    assert run_stats["hits"] == 1
+    assert run_stats["misses"] == 0
+    assert run_stats["hit_rate"] == 1.0
+    assert cache.get_stats()["unknown"]["hits"] == 2
+
+
+def test_replay_mode_is_strict(monkeypatch, fake_provider, cache_dir):
+    """replay模式：已录制请求可回放，未录制请求直接报错且不调用提供商"""
+    _use_cache(monkeypatch, LLMResponseCache("read_write", FileResponseCacheBackend(cache_dir)))
+    llm = ChatDeepSeekOpenAI(api_key="test")
+    llm.invoke("分析000001")
+
+    _use_cache(monkeypatch, LLMResponseCache("replay", FileResponseCacheBackend(cache_dir)))
+    assert llm.invoke("分析000001").content == "回复: 分析000001"
+
+    with pytest.raises(LLMCacheMissError):
+        llm.invoke("分析600519")
+    assert fake_provider.calls == 1
+
+
+def test_tool_calls_survive_round_trip(cache_dir):
+    """缓存的工具调用消息应完整还原"""
+    cache = LLMResponseCache("read_write", FileResponseCacheBackend(cache_dir))
+    llm = ChatDeepSeekOpenAI(api_key="test")
+    messages = [HumanMessage(content="查询行情")]
+    tool_message = AIMessage(
+        content="",
+        tool_calls=[{"name": "get_stock_market_data_unified", "args": {"ticker": "000001"}, "id": "call_1"}],
+    )
+
+    def call():
+        return ChatResult(generations=[ChatGeneration(message=tool_message)])
+
+    cache.generate(llm, messages, call)
+    cached = cache.generate(llm, messages, lambda: pytest.fail("不应再次调用提供商"))
+
+    restored = cached.generations[0].message
+    assert restored.tool_calls[0]["name"] == "get_stock_market_data_unified"
+    assert restored.tool_calls[0]["args"] == {"ticker": "000001"}
+
+
+def test_off_mode_passes_through(fake_provider, cache_dir):
+    """off模式：不读写缓存"""
+    cache = LLMResponseCache("off")
+    llm = ChatDeepSeekOpenAI(api_key="test")
+
+    cache.generate(llm, [HumanMessage(content="hi")], lambda: fake_provider(llm, [HumanMessage(content="hi")]))
+    cache.generate(llm, [HumanMessage(content="hi")], lambda: fake_provider(llm, [HumanMessage(content="hi")]))
+
+    assert fake_provider.calls == 2
+    assert cache.get_stats() == {}
+
+
+def test_configure_reuses_instance_for_same_settings(monkeypatch, cache_dir):
+    """配置不变时复用同一缓存实例和统计，配置变化时才替换"""
+    monkeypatch.setattr(response_cache, "_response_cache", None)
+    monkeypatch.setattr(response_cache, "_response_cache_settings", None)
+
+    cache = response_cache.configure_llm_response_cache("read_write", "file", cache_dir)
+    cache._record("bull_researcher", hit=True)
+    assert response_cache.configure_llm_response_cache("read_write", "file", cache_dir) is cache
+    assert response_cache.get_llm_response_cache().get_stats()["bull_researcher"]["hits"] == 1
+
+    replaced = response_cache.configure_llm_response_cache("replay", "file", cache_dir)
+    assert replaced is not cache
+    assert response_cache.get_llm_response_cache() is replaced
+    assert response_cache.configure_llm_response_cache("off") is not replaced
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+测试LLM流式输出
+使用本地SSE桩服务器逐token返回内容，验证部分输出推送、节流、首token耗时统计，
+以及在LangGraph节点中按节点名归属
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TypedDict
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from langgraph.graph import END, START, StateGraph
+
+from tradingagents.llm_adapters import request_scheduler, streaming
+from tradingagents.llm_adapters.openai_compatible_base import ChatCustomOpenAI
+from tradingagents.llm_adapters.request_scheduler import LLMRequestScheduler
+from tradingagents.llm_adapters.streaming import (
+    StreamingStats,
+    ThrottledStreamListener,
+    stream_listener,
+)
+
+TOKENS = ["看", "涨", "：", "估值", "合理", "，", "建议", "买入"]
+
+
+class StreamStubServer:
+    """OpenAI兼容的桩服务器，stream=true 时按固定间隔逐token发送SSE"""
+
+    def __init__(self, first_token_delay: float = 0.1, token_interval: float = 0.02):
+        self.first_token_delay = first_token_delay
+        self.token_interval = token_interval
+        self.stream_requests = 0
+        self.plain_requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _chunk(self, delta, finish_reason=None, usage=None):
+                payload = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": "stub-model",
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if usage is None else [],
+                }
+                if usage is not None:
+                    payload["usage"] = usage
+                self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode())
+                self.wfile.flush()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not body.get("stream"):
+                    stub.plain_requests += 1
+                    payload = json.dumps({
+                        "id": "chatcmpl-stub",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": "stub-model",
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(TOKENS)},
+                                     "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": 5, "completion_tokens": 8, "total_tokens": 13},
+                    }, ensure_ascii=False).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+
+                stub.stream_requests += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                time.sleep(stub.first_token_delay)
+                self._chunk({"role": "assistant", "content": ""})
+                for token in TOKENS:
+                    self._chunk({"content": token})
+                    time.sleep(stub.token_interval)
+                self._chunk({}, finish_reason="stop")
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    self._chunk(None, usage={"prompt_tokens": 5, "completion_tokens": 8, "total_tokens": 13})
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(monkeypatch):
+    monkeypatch.setattr(request_scheduler, "_scheduler", LLMRequestScheduler())
+    monkeypatch.setattr(streaming, "_streaming_stats", StreamingStats())
+    monkeypatch.delenv("LLM_STREAMING_ENABLED", raising=False)
+
+
+def _make_llm(base_url: str) -> ChatCustomOpenAI:
+    return ChatCustomOpenAI(model="stub-model", api_key="test", base_url=base_url, max_retries=0)
+
+
+def test_partial_output_and_ttft():
+    """注册监听器后应收到逐步增长的部分输出，最终结果完整且记录首token耗时"""
+    updates = []
+
+    with StreamStubServer(first_token_delay=0.1) as stub:
+        llm = _make_llm(stub.base_url)
+        with stream_listener(lambda agent, text, done: updates.append((agent, text, done)),
+                             min_interval=0, min_chars=0):
+            result = llm.invoke("分析000001")
+
+    assert stub.stream_requests == 1
+    assert result.content == "".join(TOKENS)
+    assert result.usage_metadata["total_tokens"] == 13
+
+    partial = [text for _, text, done in updates if not done]
+    assert len(partial) == len(TOKENS)
+    assert all(len(a) < len(b) for a, b in zip(partial, partial[1:]))
+    assert updates[-1] == ("unknown", "".join(TOKENS), True)
+
+    stats = streaming.get_streaming_stats().get_stats()["unknown"]
+    assert stats["calls"] == 1
+    assert 0.1 <= stats["avg_ttft"] < stats["avg_total"]
+
+
+def test_caller_stream_usage_is_respected():
+    """调用方显式传入 stream_usage 时沿用其取值，不与默认值重复传参"""
+    with StreamStubServer(first_token_delay=0) as stub:
+        llm = _make_llm(stub.base_url)
+        with stream_listener(lambda *args: None, min_interval=0, min_chars=0):
+            result = llm.invoke("分析000001", stream_usage=False)
+
+    assert stub.stream_requests == 1
+    assert result.content == "".join(TOKENS)
+    assert not result.usage_metadata
+
+
+def test_stats_since_snapshot():
+    """全局统计跨多次分析累计，快照之后只报告本次运行的调用"""
+    stats = streaming.get_streaming_stats()
+    stats.record("Bull Researcher", 0.5, 2.0)
+    baseline = stats.snapshot()
+    assert stats.get_stats(since=baseline) == {}
+
+    stats.record("Bull Researcher", 0.1, 1.0)
+    stats.record("Risk Judge", None, 3.0)
+    run_stats = stats.get_stats(since=baseline)
+    assert run_stats["Bull Researcher"]["calls"] == 1
+    assert run_stats["Bull Researcher"]["max_ttft"] == pytest.approx(0.1)
+    assert run_stats["Risk Judge"] == {"calls": 1, "avg_ttft": 0.0, "max_ttft": 0.0, "avg_total": 3.0}
+    assert stats.get_stats()["Bull Researcher"]["calls"] == 2
+
+
+def test_no_listener_uses_plain_request(monkeypatch):
+    """未注册监听器或被环境变量关闭时不走流式接口"""
+    with StreamStubServer() as stub:
+        llm = _make_llm(stub.base_url)
+        assert llm.invoke("分析000001").content == "".join(TOKENS)
+
+        monkeypatch.setenv("LLM_STREAMING_ENABLED", "false")
+        with stream_listener(lambda *args: pytest.fail("流式输出已关闭")):
+            llm.invoke("分析000001")
+
+    assert stub.plain_requests == 2
+    assert stub.stream_requests == 0
+
+
+def test_throttling_limits_updates():
+    """节流：间隔和字符增量都未达到阈值时不推送，结束时总会推送完整文本"""
+    updates = []
+    listener = ThrottledStreamListener(lambda a, t, d: updates.append((t, d)), min_interval=60, min_chars=5)
+
+    text = ""
+    for token in TOKENS:
+        text += token
+        listener.on_partial("Bull Researcher", text)
+    listener.on_done("Bull Researcher", text)
+
+    # 第一次立即推送，之后每新增至少5个字符推送一次
+    assert [t for t, d in updates if not d] == ["看", "看涨：估值合理", "看涨：估值合理，建议买入"]
+    assert updates[-1] == (text, True)
+
+
+def test_ttft_attributed_to_graph_node():
+    """LangGraph并行节点中的流式调用应按节点名统计首token耗时"""
+
+    class State(TypedDict, total=False):
+        bull: str
+        bear: str
+
+    with StreamStubServer(first_token_delay=0.05, token_interval=0) as stub:
+        llm = _make_llm(stub.base_url)
+
+        def bull_node(state):
+            return {"bull": llm.invoke("看多观点").content}
+
+        def bear_node(state):
+            return {"bear": llm.invoke("看空观点").content}
+
+        workflow = StateGraph(State)
+        workflow.add_node("Bull Researcher", bull_node)
+        workflow.add_node("Bear Researcher", bear_node)
+        workflow.add_edge(START, "Bull Researcher")
+        workflow.add_edge(START, "Bear Researcher")
+        workflow.add_edge("Bull Researcher", END)
+        workflow.add_edge("Bear Researcher", END)
+        graph = workflow.compile()
+
+        agents = set()
+        with stream_listener(lambda agent, text, done: agents.add(agent)):
+            final_state = graph.invoke({})
+
+    assert final_state["bull"] == final_state["bear"] == "".join(TOKENS)
+    assert agents == {"Bull Researcher", "Bear Researcher"}
+    stats = streaming.get_streaming_stats().get_stats()
+    assert set(stats) == {"Bull Researcher", "Bear Researcher"}
+    assert all(s["avg_ttft"] >= 0.05 for s in stats.values())
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
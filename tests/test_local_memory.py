@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+测试本地记忆后端
+在10万条记忆上对比量化近似最近邻索引与精确float32检索的召回率，统计查询延迟p50/p99，
+并验证本地嵌入的记忆检索无需网络且结果有意义
+"""
+
+import os
+import sys
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from tradingagents.agents.utils.local_memory import (
+    HashedNgramEmbedder,
+    LocalMemoryCollection,
+    QuantizedANNIndex,
+)
+from tradingagents.agents.utils.memory import FinancialSituationMemory
+
+DIMENSION = 384
+
+
+def _clustered_vectors(count: int, clusters: int = 500, seed: int = 7) -> np.ndarray:
+    """模拟嵌入向量的分布：若干主题簇加噪声"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, DIMENSION)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=count)
+    vectors = centers[labels] + 0.6 * rng.normal(size=(count, DIMENSION)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("quantization", ["int8", "float16"])
+def test_recall_and_latency_at_100k(quantization):
+    """10万条记忆：对比精确float32检索的召回率@5和查询延迟，扫描更多倒排列表可提高召回率"""
+    data = _clustered_vectors(100_000)
+    rng = np.random.default_rng(11)
+    query_rows = rng.choice(len(data), 200, replace=False)
+    queries = data[query_rows] + 0.3 * rng.normal(size=(200, DIMENSION)).astype(np.float32)
+    exact = [set(np.argsort(-(data @ (q / np.linalg.norm(q))))[:5].tolist()) for q in queries]
+
+    index = QuantizedANNIndex(DIMENSION, quantization)
+    start = time.perf_counter()
+    index.set(np.arange(len(data)), data)
+    build_time = time.perf_counter() - start
+    memory_mb = index._vectors[:len(index)].nbytes / 1024 / 1024
+    print(f"\n{quantization}: 构建 {build_time:.1f}s, 向量占用 {memory_mb:.0f}MB "
+          f"(float32为 {len(data) * DIMENSION * 4 / 1024 / 1024:.0f}MB)")
+
+    results = {}
+    n_lists = len(index._centroids)
+    for n_probe in (None, n_lists // 4):
+        index.n_probe = n_probe
+        latencies, hits = [], 0
+        for query, expected in zip(queries, exact):
+            start = time.perf_counter()
+            rows, _ = index.search(query, 5)
+            latencies.append(time.perf_counter() - start)
+            hits += len(expected & set(rows.tolist()))
+        recall = hits / (5 * len(queries))
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        results[n_probe] = (recall, p99)
+        print(f"   扫描列表数 {n_probe or n_lists // 8}/{n_lists}: 召回率@5 {recall:.3f}, "
+              f"查询延迟 p50 {p50:.2f}ms / p99 {p99:.2f}ms")
+
+    default_recall, default_p99 = results[None]
+    assert default_recall >= 0.85
+    assert default_p99 < 50
+    assert results[n_lists // 4][0] >= 0.93
+
+
+def test_small_index_is_exact():
+    """数据量低于训练阈值时全量扫描，结果与精确检索一致"""
+    data = _clustered_vectors(1000, clusters=20)
+    index = QuantizedANNIndex(DIMENSION, "float16")
+    index.set(np.arange(len(data)), data)
+    rows, scores = index.search(data[42], 3)
+    assert rows[0] == 42
+    assert scores[0] == pytest.approx(1.0, abs=1e-2)
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_trained_index_appends_without_rebuild(monkeypatch):
+    """训练后的增量写入直接追加到倒排列表，覆盖已有行时从原列表移出，不触发全量重建"""
+    data = _clustered_vectors(3000, clusters=20)
+    index = QuantizedANNIndex(DIMENSION, "int8", train_threshold=2000)
+    index.set(np.arange(2000), data[:2000])
+    assert index._centroids is not None
+
+    def fail_rebuild():
+        raise AssertionError("增量写入不应全量重建倒排列表")
+
+    monkeypatch.setattr(index, "_rebuild_lists", fail_rebuild)
+    for row in range(2000, 3000, 50):
+        index.set(np.arange(row, row + 50), data[row:row + 50])
+    index.set([7], data[2500:2501])
+
+    listed = np.concatenate(index._lists)
+    assert sorted(listed.tolist()) == list(range(3000))
+    for c, members in enumerate(index._lists):
+        assert (index._assignments[members] == c).all()
+    index.n_probe = len(index._centroids)
+    rows, _ = index.search(data[2500], 2)
+    assert set(rows.tolist()) == {7, 2500}
+
+
+def test_upsert_replaces_existing_rows():
+    """相同ID再次写入时覆盖原记录"""
+    embedder = HashedNgramEmbedder()
+    collection = LocalMemoryCollection("upsert_test")
+    collection.upsert(["旧情况"], [{"recommendation": "旧建议"}], [embedder.embed("旧情况")], ["id-1"])
+    collection.upsert(["新情况"], [{"recommendation": "新建议"}], [embedder.embed("新情况")], ["id-1"])
+    assert collection.count() == 1
+    result = collection.query([embedder.embed("新情况")], n_results=1)
+    assert result["documents"] == [["新情况"]]
+    assert result["metadatas"] == [[{"recommendation": "新建议"}]]
+
+
+def test_memory_with_local_backend(monkeypatch):
+    """MEMORY_BACKEND=local 时记忆检索不需要网络，相似情况能检索到对应建议"""
+    monkeypatch.setenv("MEMORY_BACKEND", "local")
+    monkeypatch.delenv("DASHSCOPE_API_KEY", raising=False)
+    memory = FinancialSituationMemory(f"local_{uuid.uuid4().hex[:8]}", {"llm_provider": "dashscope"})
+    assert memory.client == "LOCAL"
+
+    memory.add_situations([
+        ("通胀高企，利率持续上升，消费支出下滑", "关注必需消费品和公用事业等防御性板块"),
+        ("科技板块波动加剧，机构投资者持续卖出", "降低高成长科技股仓位，关注现金流稳健的龙头"),
+        ("美元走强，新兴市场汇率波动加大", "对冲海外头寸的汇率风险"),
+        ("市场出现板块轮动，债券收益率上行", "再平衡组合，增配受益于高利率的板块"),
+    ])
+
+    start = time.perf_counter()
+    [best] = memory.get_memories("科技股波动加剧，机构投资者在减仓", n_matches=1)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"\n本地记忆检索 {elapsed_ms:.2f}ms: {best['recommendation']} (相似度 {best['similarity']:.2f})")
+
+    assert best["recommendation"] == "降低高成长科技股仓位，关注现金流稳健的龙头"
+    assert 0 < best["similarity"] <= 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+测试记忆批量写入和持久化
+使用本地假嵌入服务对比逐条写入与批量写入10k条情况的吞吐量，
+并验证内容ID幂等写入、批量大小限制、集合延迟加载和持久化客户端重启后可读
+"""
+
+import os
+import subprocess
+import sys
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from tradingagents.agents.utils import embedding_cache
+from tradingagents.agents.utils.memory import ChromaDBManager, FinancialSituationMemory
+
+DIMENSION = 32
+
+
+class StubEmbeddingClient:
+    """本地假嵌入服务：支持批量输入，记录请求次数和每次请求的文本数"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.batch_sizes = []
+        self.embeddings = SimpleNamespace(create=self._create)
+
+    def _create(self, model, input):
+        texts = [input] if isinstance(input, str) else list(input)
+        self.batch_sizes.append(len(texts))
+        time.sleep(self.latency)
+        data = []
+        for index, text in enumerate(texts):
+            seed = hash(text)
+            vector = [((seed >> (i % 48)) & 0xFF) / 255.0 + 0.01 for i in range(DIMENSION)]
+            data.append(SimpleNamespace(index=index, embedding=vector))
+        # 打乱返回顺序，验证按 index 还原
+        return SimpleNamespace(data=list(reversed(data)))
+
+
+@pytest.fixture(autouse=True)
+def memory_only_embedding_cache():
+    embedding_cache.configure_embedding_cache(enabled=True, cache_dir="")
+    yield
+    embedding_cache._embedding_cache = None
+
+
+def _memory(monkeypatch, client):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    config = {"llm_provider": "openai", "backend_url": "http://127.0.0.1:9/v1"}
+    memory = FinancialSituationMemory(f"batch_{uuid.uuid4().hex[:8]}", config)
+    memory.client = client
+    return memory
+
+
+def _situations(count: int, prefix: str = "情况"):
+    return [(f"{prefix}{i}：成交量放大{i % 97}%，市盈率{i % 53}倍", f"建议{i % 3}") for i in range(count)]
+
+
+def test_insert_throughput_10k(monkeypatch):
+    """批量写入10k条情况的吞吐量明显高于逐条写入"""
+    latency = 0.002  # 模拟每次嵌入请求的网络开销
+
+    legacy_client = StubEmbeddingClient(latency)
+    legacy_memory = _memory(monkeypatch, legacy_client)
+    legacy_items = _situations(500, prefix="逐条")
+    start = time.perf_counter()
+    for item in legacy_items:
+        legacy_memory.add_situations([item])
+    legacy_rate = len(legacy_items) / (time.perf_counter() - start)
+
+    client = StubEmbeddingClient(latency)
+    memory = _memory(monkeypatch, client)
+    items = _situations(10000)
+    start = time.perf_counter()
+    memory.add_situations(items)
+    elapsed = time.perf_counter() - start
+    batched_rate = len(items) / elapsed
+
+    print(f"\n逐条写入 {legacy_rate:,.0f} 条/秒 ({len(legacy_client.batch_sizes)}次嵌入请求/{len(legacy_items)}条); "
+          f"批量写入10k条 {elapsed:.2f}s, {batched_rate:,.0f} 条/秒 ({len(client.batch_sizes)}次嵌入请求)")
+
+    assert memory.situation_collection.count() == 10000
+    assert len(client.batch_sizes) == 100
+    assert max(client.batch_sizes) == memory.embedding_batch_size == 100
+    assert batched_rate > 3 * legacy_rate
+
+
+def test_upsert_is_idempotent(monkeypatch):
+    """内容ID相同的记录重复写入时覆盖，不产生重复记忆"""
+    memory = _memory(monkeypatch, StubEmbeddingClient())
+    items = _situations(20)
+    memory.add_situations(items)
+    memory.add_situations(items[:10] + items[:10])
+    assert memory.situation_collection.count() == 20
+
+    # 向量按原顺序对应：用同一段情况检索应命中自身
+    [best] = memory.get_memories(items[5][0], n_matches=1)
+    assert best["situation"] == items[5][0]
+    assert best["recommendation"] == items[5][1]
+
+
+def test_batch_size_limit(monkeypatch):
+    """按 EMBEDDING_BATCH_SIZE 分批请求，缓存命中的文本不再请求"""
+    monkeypatch.setenv("EMBEDDING_BATCH_SIZE", "7")
+    client = StubEmbeddingClient()
+    memory = _memory(monkeypatch, client)
+
+    texts = [situation for situation, _ in _situations(20)]
+    vectors = memory.get_embeddings(texts + ["", texts[0]])
+    assert client.batch_sizes == [7, 7, 6]
+    assert vectors[-2] == [0.0] * 1024
+    assert vectors[-1] == vectors[0]
+
+    memory.get_embeddings(texts[:5] + ["新的情况"])
+    assert client.batch_sizes[-1] == 1
+
+
+def test_collection_loaded_lazily(monkeypatch):
+    """创建记忆实例时不加载集合，首次读写时才加载"""
+    memory = _memory(monkeypatch, StubEmbeddingClient())
+    assert memory._situation_collection is None
+    memory.add_situations(_situations(1))
+    assert memory._situation_collection is not None
+
+
+def test_persistent_client_survives_restart(monkeypatch, tmp_path):
+    """设置 MEMORY_PERSIST_DIR 后记忆写入磁盘，新进程中仍可读取"""
+    monkeypatch.setenv("MEMORY_PERSIST_DIR", str(tmp_path))
+    monkeypatch.setattr(ChromaDBManager, "_instance", None)
+    monkeypatch.setattr(ChromaDBManager, "_collections", {})
+    memory = _memory(monkeypatch, StubEmbeddingClient())
+    memory.add_situations(_situations(50))
+
+    script = (
+        "import sys; sys.path.insert(0, %r)\n"
+        "from tradingagents.agents.utils.memory import ChromaDBManager\n"
+        "print(ChromaDBManager().get_or_create_collection(%r).count())\n"
+    ) % (project_root, memory.name)
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                            env={**os.environ, "MEMORY_PERSIST_DIR": str(tmp_path)}, timeout=120)
+    assert result.stdout.strip().splitlines()[-1] == "50", result.stderr[-2000:]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+测试MongoDB报告列表查询
+mongomock 未安装时使用本地替身集合：按列表排序 (timestamp, analysis_id) 倒序保存文档（相当于索引顺序），
+统计每次查询检查的文档数，返回的文档经过 BSON 编码/解码（相当于网络传输和驱动解码）并统计字节数。
+在10万个报告上对比旧版列表（返回完整文档、页面在内存中切片）、skip/limit 分页与范围游标分页
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+bson = pytest.importorskip("bson")
+
+from web.utils import mongodb_report_manager
+from web.utils.mongodb_report_manager import LIST_SORT, SUMMARY_PROJECTION, MongoDBReportManager
+
+REPORTS = 100_000
+PAGE_SIZE = 20
+DEEP_PAGE = 250
+BODY = "### 分析报告\n" + "技术面、基本面与市场情绪的综合判断，结合行业景气度给出投资建议。" * 100
+START = datetime(2025, 1, 1)
+
+
+# MongoDB 排序时的类型顺序：缺失/null < 数字 < 字符串 < 日期
+BSON_TYPES = {type(None): "null", int: "number", float: "number", str: "string", datetime: "date"}
+
+
+def _bson_type(value):
+    return BSON_TYPES[type(value)]
+
+
+def _bson_key(value):
+    return (mongodb_report_manager.CURSOR_TYPES.index(_bson_type(value)), 0 if value is None else value)
+
+
+def _sort_key(doc):
+    return (_bson_key(doc.get('timestamp')), doc['analysis_id'])
+
+
+class StandInCursor:
+    def __init__(self, collection, query, projection):
+        self.collection = collection
+        self.query = query or {}
+        self.projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, spec, direction=None):
+        self._sort = spec if isinstance(spec, list) else [(spec, direction or 1)]
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def __iter__(self):
+        return iter(self.collection._execute(self))
+
+
+class StandInCollection:
+    """
+    替身集合：文档按 LIST_SORT 顺序保存；查询条件包含 (timestamp, analysis_id) 范围时从范围边界开始扫描，
+    与MongoDB使用 (timestamp, analysis_id) 索引的扫描方式一致
+    """
+
+    def __init__(self):
+        self.docs = []
+        self._keys = []
+        self.indexes = []
+        self.examined = 0
+        self.bytes_transferred = 0
+        self.skips = []
+
+    def create_index(self, keys, **kwargs):
+        self.indexes.append([(keys, 1)] if isinstance(keys, str) else list(keys))
+
+    def insert_many(self, docs):
+        self.docs.extend(docs)
+        self.docs.sort(key=_sort_key, reverse=True)
+        self._keys = [_sort_key(doc) for doc in self.docs]
+
+    def find(self, query=None, projection=None):
+        return StandInCursor(self, query, projection)
+
+    @staticmethod
+    def _match(doc, query):
+        for key, cond in query.items():
+            if key == "$or":
+                if not any(StandInCollection._match(doc, sub) for sub in cond):
+                    return False
+            elif isinstance(cond, dict):
+                value = doc.get(key)
+                for op, operand in cond.items():
+                    if op == "$type":
+                        if _bson_type(value) not in operand:
+                            return False
+                    # 与MongoDB一致，比较运算只匹配同类型的值
+                    elif value is None or _bson_type(value) != _bson_type(operand) or \
+                            not {"$lt": value < operand, "$lte": value <= operand,
+                                 "$gt": value > operand, "$gte": value >= operand}[op]:
+                        return False
+            elif doc.get(key) != cond:
+                return False
+        return True
+
+    def _start(self, query):
+        """范围游标条件 -> 在索引顺序中的起始位置（倒序列表中第一个小于边界的位置）"""
+        bound = next((sub for sub in query.get("$or", []) if "analysis_id" in sub), None)
+        if bound is None:
+            return 0
+        key = (_bson_key(bound["timestamp"]), bound["analysis_id"]["$lt"])
+        # self._keys 为倒序，取反后二分
+        lo, hi = 0, len(self._keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._keys[mid] >= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _execute(self, cursor):
+        assert cursor._sort in (None, LIST_SORT)
+        if cursor._skip:
+            self.skips.append(cursor._skip)
+        results, skipped = [], 0
+        for doc in self.docs[self._start(cursor.query):]:
+            self.examined += 1
+            if not self._match(doc, cursor.query):
+                continue
+            if skipped < cursor._skip:
+                skipped += 1
+                continue
+            results.append(self._project(doc, cursor.projection))
+            if cursor._limit and len(results) >= cursor._limit:
+                break
+        decoded = []
+        for doc in results:
+            data = bson.encode(doc)
+            self.bytes_transferred += len(data)
+            decoded.append(bson.decode(data))
+        return decoded
+
+    @staticmethod
+    def _project(doc, projection):
+        if not projection:
+            return dict(doc)
+        included = {key for key, flag in projection.items() if flag and key != "_id"}
+        if included:
+            return {key: doc[key] for key in included if key in doc}
+        return {key: value for key, value in doc.items() if projection.get(key, 1)}
+
+
+def _make_manager(monkeypatch, collection) -> MongoDBReportManager:
+    monkeypatch.setattr(mongodb_report_manager, "MONGODB_AVAILABLE", False)
+    manager = MongoDBReportManager()
+    manager.collection = collection
+    manager.connected = True
+    manager._create_indexes()
+    return manager
+
+
+def _make_reports(count: int):
+    """按 save_analysis_report 的文档结构生成报告；每两个报告的时间戳相同"""
+    reports = {name: BODY for name in ("market_report", "fundamentals_report", "news_report",
+                                        "investment_plan", "final_trade_decision")}
+    docs = []
+    for i in range(count):
+        timestamp = START + timedelta(seconds=i // 2 * 30)
+        symbol = f"{600000 + i % 400}"
+        docs.append({
+            "analysis_id": f"{symbol}_{timestamp.strftime('%Y%m%d_%H%M%S')}_{i}",
+            "stock_symbol": symbol,
+            "analysis_date": timestamp.strftime('%Y-%m-%d'),
+            "timestamp": timestamp,
+            "status": "completed",
+            "source": "mongodb",
+            "summary": f"第{i}次分析：建议持有",
+            "analysts": ["market", "fundamentals"],
+            "research_depth": 2,
+            "reports": reports,
+            "created_at": timestamp,
+            "updated_at": timestamp,
+        })
+    return docs
+
+
+@pytest.fixture(scope="module")
+def report_docs():
+    return _make_reports(REPORTS)
+
+
+def _measure(collection, fetch):
+    collection.examined = collection.bytes_transferred = 0
+    started = time.perf_counter()
+    page = fetch()
+    return page, time.perf_counter() - started, collection.examined, collection.bytes_transferred
+
+
+def test_list_page_latency_and_bytes_at_100k(monkeypatch, report_docs):
+    """第1页和第251页：旧版完整文档+内存切片、skip/limit 摘要投影、范围游标的延迟、检查文档数和传输字节数"""
+    collection = StandInCollection()
+    collection.insert_many(report_docs)
+    manager = _make_manager(monkeypatch, collection)
+
+    def legacy(page):
+        # 旧版列表：返回完整文档（含全部报告正文），页面取前 (page+1)*PAGE_SIZE 条后在内存中切片
+        return manager.get_analysis_reports(limit=(page + 1) * PAGE_SIZE)[page * PAGE_SIZE:]
+
+    def skip_limit(page):
+        return [manager._to_web_result(doc) for doc in collection.find({}, SUMMARY_PROJECTION)
+                .sort(LIST_SORT).skip(page * PAGE_SIZE).limit(PAGE_SIZE)]
+
+    cursors = [None]
+    while len(cursors) <= DEEP_PAGE:
+        _, next_cursor = manager.list_analysis_reports(limit=PAGE_SIZE, cursor=cursors[-1])
+        cursors.append(next_cursor)
+
+    rows = {}
+    for page in (0, DEEP_PAGE):
+        rows[page] = {
+            '旧版(完整文档+内存切片)': _measure(collection, lambda: legacy(page)),
+            'skip/limit(摘要投影)': _measure(collection, lambda: skip_limit(page)),
+            '范围游标(摘要投影)': _measure(collection, lambda: manager.list_analysis_reports(
+                limit=PAGE_SIZE, cursor=cursors[page])[0]),
+        }
+    print(f"\n{REPORTS} 个报告，每页 {PAGE_SIZE} 条:")
+    for page, methods in rows.items():
+        for name, (_, seconds, examined, transferred) in methods.items():
+            print(f"  第{page + 1}页 {name}: {seconds * 1000:.1f}ms, 检查 {examined} 个文档, "
+                  f"传输 {transferred / 1024:.1f}KB")
+
+    expected = [doc['analysis_id'] for doc in collection.docs[DEEP_PAGE * PAGE_SIZE:(DEEP_PAGE + 1) * PAGE_SIZE]]
+    for name, (page_results, _, _, _) in rows[DEEP_PAGE].items():
+        assert [r['analysis_id'] for r in page_results] == expected, name
+    legacy_row, cursor_row = rows[DEEP_PAGE]['旧版(完整文档+内存切片)'], rows[DEEP_PAGE]['范围游标(摘要投影)']
+    assert 'reports' not in cursor_row[0][0]
+    assert cursor_row[2] == PAGE_SIZE + 1
+    assert cursor_row[3] * 1000 < legacy_row[3]
+    assert cursor_row[1] * 10 < legacy_row[1]
+    assert rows[0]['范围游标(摘要投影)'][3] * 50 < rows[0]['旧版(完整文档+内存切片)'][3]
+
+
+def test_cursor_pagination_covers_filtered_results(monkeypatch, report_docs):
+    """按股票/日期过滤时逐页翻完：不重复、不遗漏、顺序与排序一致（包括相同时间戳的报告）"""
+    collection = StandInCollection()
+    collection.insert_many(report_docs[:5000])
+    manager = _make_manager(monkeypatch, collection)
+
+    for filters in ({}, {'stock_symbol': "600007"}, {'start_date': "2025-01-01", 'end_date': "2025-01-01"}):
+        expected = [doc['analysis_id'] for doc in collection.docs
+                    if StandInCollection._match(doc, manager._build_query(**filters))]
+        listed, cursor = [], None
+        while True:
+            page, cursor = manager.list_analysis_reports(limit=7, cursor=cursor, **filters)
+            listed.extend(r['analysis_id'] for r in page)
+            if cursor is None:
+                break
+        assert listed == expected, filters
+    assert not collection.skips
+
+
+def test_cursor_pagination_with_legacy_timestamps(monkeypatch):
+    """早期报告的 timestamp 为数字或缺失时，逐页翻完仍不重复、不遗漏，顺序与MongoDB排序一致"""
+    docs = _make_reports(40)
+    for i, doc in enumerate(docs):
+        if i % 4 == 1:
+            doc['timestamp'] = doc['timestamp'].timestamp()
+        elif i % 4 == 2:
+            del doc['timestamp']
+        elif i % 8 == 3:
+            doc['timestamp'] = None
+    collection = StandInCollection()
+    collection.insert_many(docs)
+    manager = _make_manager(monkeypatch, collection)
+
+    listed, cursor = [], None
+    while True:
+        page, cursor = manager.list_analysis_reports(limit=3, cursor=cursor)
+        listed.extend(r['analysis_id'] for r in page)
+        if cursor is None:
+            break
+    assert listed == [doc['analysis_id'] for doc in collection.docs]
+
+
+def test_listing_errors_are_raised(monkeypatch):
+    """查询失败或游标无效时抛出异常，不返回看起来像"已经翻完"的空页"""
+    class FailingCollection(StandInCollection):
+        def find(self, query=None, projection=None):
+            raise RuntimeError("connection reset")
+
+    manager = _make_manager(monkeypatch, FailingCollection())
+    with pytest.raises(RuntimeError):
+        manager.list_analysis_reports(limit=5)
+    manager.collection = StandInCollection()
+    with pytest.raises(ValueError):
+        manager.list_analysis_reports(limit=5, cursor="2025-01-01T00:00:00|abc")
+
+
+def test_indexes_and_detail_lookup(monkeypatch):
+    """创建 (stock_symbol, timestamp) 和 (analysis_date) 索引；摘要列表不含正文，旧接口仍可返回正文"""
+    collection = StandInCollection()
+    collection.insert_many(_make_reports(10))
+    manager = _make_manager(monkeypatch, collection)
+
+    assert any(index[:2] == [("stock_symbol", 1), ("timestamp", -1)] for index in collection.indexes)
+    assert [("analysis_date", -1)] in collection.indexes
+    assert LIST_SORT in collection.indexes
+
+    summaries = manager.get_analysis_reports(limit=5, include_reports=False)
+    assert len(summaries) == 5 and all('reports' not in r for r in summaries)
+    full = manager.get_analysis_reports(limit=5)
+    assert full[0]['reports']['market_report'] == BODY
+    assert [r['analysis_id'] for r in summaries] == [r['analysis_id'] for r in full]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
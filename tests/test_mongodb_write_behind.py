@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+测试MongoDB使用记录后台批量写入
+使用本地替身MongoClient（模拟网络延迟、断连和部分写入失败），验证：
+多生产者并发写入不丢记录、按条数/时间间隔批量写入、关闭时写完、不可用时暂存到本地文件并在恢复后补写
+"""
+
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+pytest.importorskip("pymongo")
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError
+
+from tradingagents.config import mongodb_storage
+from tradingagents.config.config_manager import UsageRecord
+from tradingagents.config.mongodb_storage import MongoDBStorage
+
+
+class StandInCollection:
+    """本地替身集合：记录写入的文档和调用次数，可模拟延迟、断连和部分写入失败"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.documents = []
+        self.insert_one_calls = 0
+        self.insert_many_calls = 0
+        self.down = False
+        self.fail_after = None
+        self.fail_code = None
+        self.bulk_operations = []
+        self.lock = threading.Lock()
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    def insert_one(self, document):
+        time.sleep(self.latency)
+        with self.lock:
+            self.insert_one_calls += 1
+            document["_id"] = len(self.documents)
+            self.documents.append(dict(document))
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    def bulk_write(self, operations, ordered=True):
+        with self.lock:
+            self.bulk_operations.extend(operations)
+
+    def insert_many(self, documents, ordered=True):
+        time.sleep(self.latency)
+        with self.lock:
+            self.insert_many_calls += 1
+            if self.down:
+                raise ServerSelectionTimeoutError("stand-in unavailable")
+            for index, document in enumerate(documents):
+                document["_id"] = f"{self.insert_many_calls}-{index}"
+            if self.fail_after is not None:
+                inserted, self.fail_after = self.fail_after, None
+                self.documents.extend(dict(document) for document in documents[:inserted])
+                error = {"index": inserted, "errmsg": "stand-in write error"}
+                if self.fail_code is not None:
+                    error["code"] = self.fail_code
+                raise BulkWriteError({"nInserted": inserted, "writeErrors": [error]})
+            self.documents.extend(dict(document) for document in documents)
+
+
+class StandInClient:
+    collection = None
+    rollups = None
+
+    def __init__(self, *args, **kwargs):
+        self.admin = SimpleNamespace(command=lambda *a, **k: {"ok": 1})
+
+    def __getitem__(self, name):
+        return {"token_usage": StandInClient.collection, "token_usage_rollups": StandInClient.rollups}
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    StandInClient.collection = StandInCollection()
+    StandInClient.rollups = StandInCollection()
+    monkeypatch.setattr(mongodb_storage, "MongoClient", StandInClient)
+    return StandInClient.collection
+
+
+def _storage(tmp_path, write_behind=True):
+    return MongoDBStorage("mongodb://stand-in:27017/", write_behind=write_behind,
+                          spill_file=str(tmp_path / "usage_spill.jsonl"))
+
+
+def _record(session_id: str) -> UsageRecord:
+    return UsageRecord(timestamp="2025-01-01T10:00:00", provider="dashscope", model_name="qwen-turbo",
+                       input_tokens=1000, output_tokens=500, cost=0.005, session_id=session_id,
+                       analysis_type="stock_analysis")
+
+
+def test_concurrent_producers_lose_nothing(collection, tmp_path, monkeypatch):
+    """8个线程并发写入4000条记录，批量写入后全部落库且不重复；调用方不等待数据库"""
+    monkeypatch.setenv("USAGE_WRITE_BATCH_SIZE", "50")
+    monkeypatch.setenv("USAGE_WRITE_FLUSH_INTERVAL", "0.05")
+    collection.latency = 0.005
+
+    sync_storage = _storage(tmp_path, write_behind=False)
+    start = time.perf_counter()
+    for i in range(50):
+        sync_storage.save_usage_record(_record(f"sync-{i}"))
+    sync_latency = (time.perf_counter() - start) / 50
+    collection.documents.clear()
+
+    storage = _storage(tmp_path)
+    latencies = []
+
+    def produce(worker):
+        for i in range(500):
+            start = time.perf_counter()
+            assert storage.save_usage_record(_record(f"w{worker}-{i}"))
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=produce, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    storage.close()
+
+    latencies.sort()
+    print(f"\n单条保存延迟: 同步写入 {sync_latency * 1000:.2f}ms, "
+          f"后台批量写入 p50 {latencies[len(latencies) // 2] * 1e6:.0f}µs; "
+          f"insert_many {collection.insert_many_calls} 次写入 {len(collection.documents)} 条")
+
+    session_ids = [document["session_id"] for document in collection.documents]
+    assert len(session_ids) == 4000
+    assert len(set(session_ids)) == 4000
+    assert collection.insert_many_calls <= 4000 // 50 + 20
+    assert latencies[len(latencies) // 2] * 20 < sync_latency
+    assert not (tmp_path / "usage_spill.jsonl").exists()
+
+
+def test_flush_by_interval(collection, tmp_path, monkeypatch):
+    """未达到批量条数时，按时间间隔写入"""
+    monkeypatch.setenv("USAGE_WRITE_BATCH_SIZE", "1000")
+    monkeypatch.setenv("USAGE_WRITE_FLUSH_INTERVAL", "0.05")
+    storage = _storage(tmp_path)
+    storage.save_usage_record(_record("single"))
+    deadline = time.time() + 2
+    while not collection.documents and time.time() < deadline:
+        time.sleep(0.01)
+    assert [document["session_id"] for document in collection.documents] == ["single"]
+    storage.close()
+
+
+def test_spill_when_unavailable_and_replay(collection, tmp_path, monkeypatch):
+    """MongoDB不可用时记录暂存到本地文件，恢复后补写且不重复"""
+    monkeypatch.setenv("USAGE_WRITE_BATCH_SIZE", "1000")
+    monkeypatch.setenv("USAGE_WRITE_FLUSH_INTERVAL", "60")
+    storage = _storage(tmp_path)
+    collection.down = True
+    for i in range(300):
+        storage.save_usage_record(_record(f"down-{i}"))
+    assert storage.flush() == 0
+    spill_file = tmp_path / "usage_spill.jsonl"
+    assert len(spill_file.read_text(encoding='utf-8').splitlines()) == 300
+    assert storage.pending_count() == 0
+
+    collection.down = False
+    storage.save_usage_record(_record("after-recovery"))
+    assert storage.flush() == 301
+    assert not spill_file.exists()
+    session_ids = [document["session_id"] for document in collection.documents]
+    assert len(set(session_ids)) == len(session_ids) == 301
+    storage.close()
+
+
+def test_partial_bulk_failure_is_not_duplicated(collection, tmp_path, monkeypatch):
+    """批量写入部分失败时，只暂存未写入的记录"""
+    monkeypatch.setenv("USAGE_WRITE_BATCH_SIZE", "20")
+    monkeypatch.setenv("USAGE_WRITE_FLUSH_INTERVAL", "60")
+    storage = _storage(tmp_path)
+    collection.fail_after = 7
+    for i in range(20):
+        storage.save_usage_record(_record(f"partial-{i}"))
+    storage.close()
+
+    session_ids = [document["session_id"] for document in collection.documents]
+    assert sorted(session_ids) == sorted(f"partial-{i}" for i in range(20))
+
+
+@pytest.mark.parametrize("code, rejected", [(121, 1), (11000, 0)])
+def test_non_retryable_write_error_is_not_respilled(collection, tmp_path, monkeypatch, code, rejected):
+    """单条记录被拒绝且重试不会成功时：之后的记录继续写入，校验失败的记录转存到隔离文件，重复键的记录视为已写入"""
+    monkeypatch.setenv("USAGE_WRITE_BATCH_SIZE", "20")
+    monkeypatch.setenv("USAGE_WRITE_FLUSH_INTERVAL", "60")
+    storage = _storage(tmp_path)
+    collection.fail_after, collection.fail_code = 7, code
+    for i in range(20):
+        storage.save_usage_record(_record(f"rejected-{i}"))
+    assert storage.flush() == 20
+
+    assert sorted(document["session_id"] for document in collection.documents) == \
+        sorted(f"rejected-{i}" for i in range(20) if i != 7)
+    assert not (tmp_path / "usage_spill.jsonl").exists()
+    rejected_file = tmp_path / "usage_spill.jsonl.rejected"
+    assert (len(rejected_file.read_text(encoding='utf-8').splitlines()) if rejected_file.exists() else 0) == rejected
+    storage.close()
+
+
+def test_leftover_replay_files_are_merged(collection, tmp_path, monkeypatch):
+    """已退出进程遗留的重放文件一并补写；运行中进程的重放文件不动"""
+    monkeypatch.setenv("USAGE_WRITE_FLUSH_INTERVAL", "60")
+    storage = _storage(tmp_path, write_behind=False)
+    for i in range(3):
+        storage._spill([dict(_record(f"leftover-{i}").__dict__, _created_at=mongodb_storage.datetime.now())])
+    dead_pid = 2 ** 22 + 12345
+    os.replace(tmp_path / "usage_spill.jsonl", tmp_path / f"usage_spill.jsonl.{dead_pid}.abcd1234.replay")
+    live_file = tmp_path / f"usage_spill.jsonl.{os.getpid()}.live0000.replay"
+    live_file.write_text("", encoding='utf-8')
+    storage._spill([dict(_record("current").__dict__, _created_at=mongodb_storage.datetime.now())])
+
+    assert storage.flush() == 4
+    assert sorted(document["session_id"] for document in collection.documents) == \
+        ["current", "leftover-0", "leftover-1", "leftover-2"]
+    assert [path.name for path in tmp_path.glob("usage_spill.jsonl*")] == [live_file.name]
+    storage.close()
+
+
+def test_flush_loop_survives_errors(collection, tmp_path, monkeypatch):
+    """后台写入线程遇到异常后继续写入；进程退出时的写入只注册一次"""
+    monkeypatch.setenv("USAGE_WRITE_BATCH_SIZE", "1")
+    monkeypatch.setenv("USAGE_WRITE_FLUSH_INTERVAL", "0.02")
+    registered = []
+    monkeypatch.setattr(mongodb_storage.atexit, "register", registered.append)
+    storage = _storage(tmp_path)
+    original_replay = storage._replay_spill
+    failures = []
+
+    def flaky_replay():
+        if not failures:
+            failures.append(1)
+            raise OSError("disk unavailable")
+        return original_replay()
+
+    monkeypatch.setattr(storage, "_replay_spill", flaky_replay)
+    storage.save_usage_record(_record("after-error"))
+    deadline = time.time() + 2
+    while not collection.documents and time.time() < deadline:
+        time.sleep(0.01)
+    assert failures and [document["session_id"] for document in collection.documents] == ["after-error"]
+    assert storage._flusher.is_alive()
+
+    storage._flusher = None
+    storage._ensure_flusher()
+    assert len(registered) == 1
+    storage.close()
+
+
+def test_queue_overflow_spills_instead_of_blocking(collection, tmp_path, monkeypatch):
+    """队列已满时新记录直接暂存到本地文件，关闭时一并写入"""
+    monkeypatch.setenv("USAGE_WRITE_BATCH_SIZE", "1000")
+    monkeypatch.setenv("USAGE_WRITE_FLUSH_INTERVAL", "60")
+    monkeypatch.setenv("USAGE_WRITE_QUEUE_SIZE", "10")
+    storage = _storage(tmp_path)
+    for i in range(15):
+        assert storage.save_usage_record(_record(f"overflow-{i}"))
+    assert storage.pending_count() == 10
+    assert len((tmp_path / "usage_spill.jsonl").read_text(encoding='utf-8').splitlines()) == 5
+
+    storage.close()
+    assert sorted(document["session_id"] for document in collection.documents) == \
+        sorted(f"overflow-{i}" for i in range(15))
+
+
+def test_reads_see_buffered_records(collection, tmp_path, monkeypatch):
+    """读取前先写入缓冲中的记录"""
+    monkeypatch.setenv("USAGE_WRITE_FLUSH_INTERVAL", "60")
+    storage = _storage(tmp_path)
+    storage.save_usage_record(_record("buffered"))
+    assert collection.documents == []
+    storage.flush()
+    assert collection.documents[0]["session_id"] == "buffered"
+    assert collection.insert_one_calls == 0
+    storage.close()
+
+
+def test_rollups_updated_once_per_batch(collection, tmp_path, monkeypatch):
+    """每批写入成功后用一次 bulk_write 累加按小时/按天的汇总，失败的记录不计入"""
+    monkeypatch.setenv("USAGE_WRITE_BATCH_SIZE", "100")
+    monkeypatch.setenv("USAGE_WRITE_FLUSH_INTERVAL", "60")
+    storage = _storage(tmp_path)
+    collection.fail_after = 30
+    for i in range(40):
+        storage.save_usage_record(_record(f"session-{i % 2}"))
+    storage.close()
+
+    operations = StandInClient.rollups.bulk_operations
+    # 第一批只计入已写入的30条，重放的10条单独累加
+    assert len(operations) == 8
+    requests = {}
+    for operation in operations:
+        key = (operation._filter["granularity"], operation._filter["session_id"])
+        requests[key] = requests.get(key, 0) + operation._doc["$inc"]["requests"]
+    assert requests == {("hour", "session-0"): 20, ("hour", "session-1"): 20,
+                        ("day", "session-0"): 20, ("day", "session-1"): 20}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+测试辩论并行开场
+使用固定延迟的假LLM对比顺序执行和并行开场的总耗时，
+并验证并行开场按固定顺序合并、与完成先后无关
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from langchain_core.messages import AIMessage
+from langgraph.graph import END, START, StateGraph
+
+from tradingagents.agents.utils.agent_states import AgentState
+from tradingagents.graph.conditional_logic import ConditionalLogic
+from tradingagents.graph.propagation import Propagator
+from tradingagents.graph.setup import GraphSetup
+
+LATENCY = 0.2
+
+
+class FixedLatencyLLM:
+    """固定延迟的假LLM；看跌研究员和中性分析师返回更快，用于验证合并顺序与完成先后无关"""
+
+    def __init__(self, latency: float = LATENCY):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+
+    def invoke(self, prompt):
+        with self.lock:
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        fast = "看跌分析师" in prompt or "中性风险分析师" in prompt
+        time.sleep(self.latency / 2 if fast else self.latency)
+        with self.lock:
+            self.active -= 1
+        return AIMessage(content="综合各方观点后的结论：建议持有并控制仓位，目标价12.5元。")
+
+
+def _build_graph(llm, parallel: bool, rounds: int = 1):
+    logic = ConditionalLogic(max_debate_rounds=rounds, max_risk_discuss_rounds=rounds)
+    setup = GraphSetup(
+        llm, llm, None, {}, None, None, None, None, None, logic,
+        config={"parallel_debate_openings": parallel},
+    )
+    workflow = StateGraph(AgentState)
+    workflow.add_node("Trader", lambda state: {"trader_investment_plan": "最终交易建议: **持有**"})
+    setup.add_investment_debate(workflow, START)
+    workflow.add_edge("Research Manager", "Trader")
+    setup.add_risk_debate(workflow, "Trader")
+    workflow.add_edge("Risk Judge", END)
+    return workflow.compile()
+
+
+def _initial_state() -> dict:
+    state = Propagator().create_initial_state("000001", "2025-01-01")
+    for key in ("market_report", "sentiment_report", "news_report", "fundamentals_report"):
+        state[key] = f"{key}: 数据正常"
+    return state
+
+
+def _run(parallel: bool, rounds: int = 1):
+    llm = FixedLatencyLLM()
+    graph = _build_graph(llm, parallel, rounds)
+    start = time.perf_counter()
+    final_state = graph.invoke(_initial_state())
+    return time.perf_counter() - start, final_state, llm
+
+
+@pytest.mark.parametrize("rounds", [1, 2])
+def test_parallel_openings_save_wall_clock(rounds):
+    """并行开场缩短总耗时，且最终发言序列与顺序执行一致"""
+    sequential_time, sequential_state, sequential_llm = _run(parallel=False, rounds=rounds)
+    parallel_time, parallel_state, parallel_llm = _run(parallel=True, rounds=rounds)
+
+    print(f"\n{rounds}轮: 顺序执行 {sequential_time:.2f}s, 并行开场 {parallel_time:.2f}s, "
+          f"节省 {1 - parallel_time / sequential_time:.0%}")
+
+    assert sequential_llm.calls == parallel_llm.calls
+    assert sequential_llm.peak == 1
+    assert parallel_llm.peak == 3
+    # 第一轮研究员节省约1次调用，风险分析师节省约2次调用
+    assert parallel_time < sequential_time - 2 * LATENCY
+
+    for turns_key in ("investment_debate_turns", "risk_debate_turns"):
+        assert [(t["speaker"], t["round"]) for t in parallel_state[turns_key]] == \
+               [(t["speaker"], t["round"]) for t in sequential_state[turns_key]]
+    assert parallel_state["investment_debate_state"]["count"] == 2 * rounds
+    assert parallel_state["risk_debate_state"]["count"] == 3 * rounds
+    assert parallel_state["final_trade_decision"]
+
+
+def test_merged_state_matches_sequential_first_round():
+    """并行开场合并后的辩论状态与顺序执行第一轮后的状态形式一致"""
+    _, state, _ = _run(parallel=True, rounds=1)
+
+    risk_state = state["risk_debate_state"]
+    assert risk_state["current_risky_response"].startswith("Risky Analyst:")
+    assert risk_state["current_safe_response"].startswith("Safe Analyst:")
+    assert risk_state["current_neutral_response"].startswith("Neutral Analyst:")
+    assert state["investment_debate_state"]["bull_history"].startswith("\nBull Analyst:")
+    assert state["investment_debate_state"]["bear_history"].startswith("\nBear Analyst:")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
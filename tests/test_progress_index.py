@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+测试分析进度索引
+使用本地替身Redis（支持有序集合、SCAN，统计执行的命令），在10万个进度键下对比
+旧版 get_latest_analysis_id（KEYS + 逐个GET解析）与有序集合索引的耗时和命令数；
+并验证每用户索引、过期/删除的进度被跳过、旧数据重建索引以及文件模式的SQLite索引
+"""
+
+import bisect
+import fnmatch
+import json
+import os
+import sys
+import time
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+redis = pytest.importorskip("redis")
+
+from web.utils import progress_events, progress_index
+from web.utils.async_progress_tracker import AsyncProgressTracker, get_latest_analysis_id, get_recent_analysis_ids
+from web.utils.progress_index import INDEX_KEY, RedisProgressIndex, SQLiteProgressIndex
+
+KEYS = 100_000
+
+
+class StandInStore:
+    def __init__(self):
+        self.values = {}
+        # {键: ({成员: 分值}, [(分值, 成员)] 有序)}
+        self.zsets = {}
+        self.commands = []
+
+
+class StandInPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        calls, self.calls = self.calls, []
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in calls]
+
+
+class StandInRedis:
+    """替身Redis客户端：字符串键和有序集合（有序列表 + 二分查找）"""
+
+    store = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattribute__(self, name):
+        if not name.startswith('_') and name not in ('store', 'pipeline', 'scan_iter'):
+            StandInRedis.store.commands.append(name)
+        return object.__getattribute__(self, name)
+
+    def ping(self):
+        return True
+
+    def pipeline(self, transaction=True):
+        return StandInPipeline(self)
+
+    def get(self, key):
+        return self.store.values.get(key)
+
+    def setex(self, key, ttl, value):
+        self.store.values[key] = value
+
+    def hset(self, key, mapping):
+        self.store.values.setdefault(key, {}).update(mapping)
+
+    def hgetall(self, key):
+        value = self.store.values.get(key, {})
+        if not isinstance(value, dict):
+            raise TypeError("WRONGTYPE")
+        return dict(value)
+
+    def hmget(self, key, *fields):
+        value = self.hgetall(key)
+        return [value.get(field) for field in fields]
+
+    def delete(self, key):
+        self.store.values.pop(key, None)
+
+    def exists(self, key):
+        return int(key in self.store.values or key in self.store.zsets)
+
+    def expire(self, key, ttl):
+        return True
+
+    def keys(self, pattern):
+        return [key for key in self.store.values if fnmatch.fnmatchcase(key, pattern)]
+
+    def scan_iter(self, match=None, count=None):
+        StandInRedis.store.commands.append('scan')
+        return iter([key for key in self.store.values if fnmatch.fnmatchcase(key, match)])
+
+    def zadd(self, key, mapping):
+        scores, ordered = self.store.zsets.setdefault(key, ({}, []))
+        for member, score in mapping.items():
+            if member in scores:
+                ordered.pop(bisect.bisect_left(ordered, (scores[member], member)))
+            scores[member] = score
+            bisect.insort(ordered, (score, member))
+        return len(mapping)
+
+    def zrem(self, key, *members):
+        scores, ordered = self.store.zsets.get(key, ({}, []))
+        for member in members:
+            if member in scores:
+                ordered.pop(bisect.bisect_left(ordered, (scores.pop(member), member)))
+
+    def zrevrange(self, key, start, end):
+        _, ordered = self.store.zsets.get(key, ({}, []))
+        stop = len(ordered) - start
+        return [member for _, member in reversed(ordered[max(stop - (end - start + 1), 0):stop])]
+
+    def zremrangebyscore(self, key, low, high):
+        scores, ordered = self.store.zsets.get(key, ({}, []))
+        cut = bisect.bisect_right(ordered, (high, chr(0x10FFFF)))
+        for _, member in ordered[:cut]:
+            del scores[member]
+        del ordered[:cut]
+        return cut
+
+
+@pytest.fixture
+def stand_in_redis(monkeypatch, tmp_path):
+    StandInRedis.store = StandInStore()
+    monkeypatch.setattr(redis, "Redis", StandInRedis)
+    monkeypatch.setattr(redis, "ConnectionPool", lambda *args, **kwargs: None)
+    monkeypatch.setenv("REDIS_ENABLED", "true")
+    monkeypatch.setattr(progress_events, "_redis_pool", None)
+    monkeypatch.setattr(progress_events, "_event_bus", progress_events.LocalProgressEventBus())
+    monkeypatch.setattr(progress_index, "_redis_index", None)
+    monkeypatch.chdir(tmp_path)
+    return StandInRedis.store
+
+
+def legacy_get_latest_analysis_id(client):
+    """旧版实现：KEYS progress:* 后逐个GET并解析完整进度"""
+    latest_time, latest_id = 0, None
+    for key in client.keys("progress:*"):
+        data = client.get(key)
+        if data:
+            last_update = json.loads(data).get('last_update', 0)
+            if last_update > latest_time:
+                latest_time, latest_id = last_update, key.replace('progress:', '')
+    return latest_id
+
+
+def _populate(store, count: int, with_index: bool = True):
+    """写入 count 个历史进度键（最近一小时内），返回按更新时间最新的分析ID"""
+    client, index = StandInRedis(), RedisProgressIndex()
+    pipe = client.pipeline()
+    now = time.time()
+    for i in range(count):
+        analysis_id = f"analysis_{i:06d}"
+        last_update = now - 3000 + (i * 7919 % count) * 2500 / count
+        doc = {'analysis_id': analysis_id, 'status': 'completed', 'progress_percentage': 100.0,
+               'last_message': '✅ 分析完成', 'last_update': last_update, 'user': f"user{i % 50}"}
+        store.values[f"progress:{analysis_id}"] = json.dumps(doc, ensure_ascii=False)
+        if with_index:
+            index.record(pipe, analysis_id, last_update, doc['user'])
+    pipe.execute()
+    return max(store.values, key=lambda k: json.loads(store.values[k])['last_update'])[len("progress:"):]
+
+
+def test_latest_with_100k_progress_keys(stand_in_redis):
+    """10万个进度键：索引查询不使用KEYS、命令数固定，比旧版快几个数量级"""
+    store = stand_in_redis
+    expected = _populate(store, KEYS)
+
+    store.commands.clear()
+    start = time.perf_counter()
+    assert legacy_get_latest_analysis_id(StandInRedis()) == expected
+    legacy = time.perf_counter() - start
+    legacy_commands = len(store.commands)
+
+    store.commands.clear()
+    start = time.perf_counter()
+    assert get_latest_analysis_id() == expected
+    indexed = time.perf_counter() - start
+    indexed_commands = list(store.commands)
+
+    print(f"\n{KEYS}个进度键: 旧版 {legacy * 1000:.0f}ms / {legacy_commands} 条命令, "
+          f"索引 {indexed * 1000:.2f}ms / {len(indexed_commands)} 条命令")
+    assert 'keys' not in indexed_commands and 'scan' not in indexed_commands
+    assert len(indexed_commands) <= 5
+    assert legacy_commands > KEYS
+    assert indexed * 100 < legacy
+
+    # 新的分析写入后立即成为最新，最近N个按更新时间倒序
+    tracker = AsyncProgressTracker("fresh", ['market'], 1, 'dashscope', user="alice")
+    assert get_latest_analysis_id() == "fresh"
+    recent = get_recent_analysis_ids(3)
+    assert len(recent) == 3 and recent[:2] == ["fresh", expected]
+    assert get_latest_analysis_id(user="alice") == "fresh"
+    tracker.mark_completed("✅ 分析完成")
+    assert get_latest_analysis_id(user="alice") == "fresh"
+
+
+def test_per_user_index_and_stale_entries(stand_in_redis):
+    """每用户索引只返回该用户的分析；过期和已删除的进度从索引中移除"""
+    store = stand_in_redis
+    AsyncProgressTracker("bob_1", ['market'], 1, 'dashscope', user="bob")
+    time.sleep(0.01)
+    AsyncProgressTracker("carol_1", ['market'], 1, 'dashscope', user="carol")
+    time.sleep(0.01)
+    AsyncProgressTracker("bob_2", ['market'], 1, 'dashscope', user="bob")
+
+    assert get_recent_analysis_ids(10, user="bob") == ["bob_2", "bob_1"]
+    assert get_latest_analysis_id(user="carol") == "carol_1"
+    assert get_latest_analysis_id(user="nobody") is None
+
+    StandInRedis().delete("progress:bob_2")
+    assert get_latest_analysis_id() == "carol_1"
+    assert "bob_2" not in store.zsets[INDEX_KEY][0]
+
+    # 分值早于进度过期时间的成员被清理
+    RedisProgressIndex().record(StandInRedis(), "expired", time.time() - 7200)
+    store.values["progress:expired"] = "{}"
+    assert "expired" not in get_recent_analysis_ids(10)
+    assert "expired" not in store.zsets[INDEX_KEY][0]
+
+
+def test_rebuild_index_from_existing_keys(stand_in_redis):
+    """升级前写入的进度键没有索引：首次查询用SCAN重建一次"""
+    store = stand_in_redis
+    expected = _populate(store, 2000, with_index=False)
+    assert get_latest_analysis_id() == expected
+    assert store.commands.count('scan') == 1
+    assert len(store.zsets[INDEX_KEY][0]) == 2000
+    assert len(get_recent_analysis_ids(5, user="user7")) == 5
+    assert get_latest_analysis_id() == expected
+    assert store.commands.count('scan') == 1
+
+
+def test_file_mode_index(tmp_path, monkeypatch):
+    """文件模式：写入进度时更新SQLite索引，已有进度文件首次建库时按修改时间导入"""
+    monkeypatch.setenv("REDIS_ENABLED", "false")
+    monkeypatch.setattr(progress_events, "_event_bus", progress_events.LocalProgressEventBus())
+    monkeypatch.chdir(tmp_path)
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for i in range(500):
+        path = data_dir / f"progress_old_{i:03d}.json"
+        path.write_text(json.dumps({'analysis_id': f"old_{i:03d}"}), encoding='utf-8')
+        os.utime(path, (1_700_000_000 + i, 1_700_000_000 + i))
+
+    assert get_latest_analysis_id() == "old_499"
+    assert get_recent_analysis_ids(3) == ["old_499", "old_498", "old_497"]
+
+    AsyncProgressTracker("dave_1", ['market'], 1, 'dashscope', user="dave")
+    time.sleep(0.01)
+    AsyncProgressTracker("erin_1", ['market'], 1, 'dashscope', user="erin")
+    assert get_latest_analysis_id() == "erin_1"
+    assert get_latest_analysis_id(user="dave") == "dave_1"
+
+    os.remove(data_dir / "progress_erin_1.jsonl")
+    assert get_recent_analysis_ids(2) == ["dave_1", "old_499"]
+
+    # 其他进程打开同一个索引库看到相同的顺序
+    assert SQLiteProgressIndex(str(data_dir)).recent(2) == ["dave_1", "old_499"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+测试进度日志按分析上下文转发
+多个模拟分析在分析队列中并发执行，分析内部像 LangGraph 一样在线程池中执行节点（复制上下文），
+节点中的工具调用通过 tools 日志器记录模块开始/完成；验证每条进度只转发给所属分析的跟踪器，
+分析之外的日志不会转发给任何跟踪器
+"""
+
+import contextvars
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from tradingagents.utils.logging_manager import get_logger_manager
+from tradingagents.utils.tool_logging import tool_logger
+from web.utils.analysis_jobs import run_analysis_job
+from web.utils.analysis_queue import AnalysisJobQueue
+from web.utils.progress_log_handler import (ProgressLogHandler, analysis_context, get_current_analysis_id,
+                                            register_analysis_tracker, unregister_analysis_tracker)
+
+ANALYSES = 6
+MODULES = ['market_analyst', 'fundamentals_analyst', 'news_analyst']
+
+
+class RecordingTracker:
+    """替身跟踪器：记录收到的进度消息"""
+
+    def __init__(self, analysis_id: str):
+        self.analysis_id = analysis_id
+        self.progress_data = {'status': 'running'}
+        self.messages = []
+        self.lock = threading.Lock()
+
+    def update_progress(self, message: str, step=None):
+        with self.lock:
+            self.messages.append(message)
+
+    def update_stream(self, agent, text, done=False):
+        pass
+
+    def mark_completed(self, message, results=None):
+        self.progress_data['status'] = 'completed'
+        unregister_analysis_tracker(self.analysis_id)
+
+    def mark_failed(self, error):
+        self.progress_data['status'] = 'failed'
+        unregister_analysis_tracker(self.analysis_id)
+
+
+def stub_analysis(stock_symbol, progress_callback=None, **params):
+    """模拟分析：各分析师节点在线程池中并行执行（与 LangGraph 一样复制上下文），工具调用记录模块日志"""
+    manager = get_logger_manager()
+
+    def node(module):
+        for _ in range(3):
+            manager.log_module_start(tool_logger, module, stock_symbol, "s")
+            time.sleep(0.002)
+            manager.log_module_complete(tool_logger, module, stock_symbol, "s", 0.002)
+
+    with ThreadPoolExecutor(max_workers=len(MODULES)) as executor:
+        for future in [executor.submit(contextvars.copy_context().run, node, m) for m in MODULES]:
+            future.result()
+    return {'success': True}
+
+
+def test_concurrent_analyses_route_progress_to_owner():
+    """6个分析并发执行，每个跟踪器只收到自己股票的模块日志"""
+    queue = AnalysisJobQueue(max_workers=ANALYSES, max_per_user=ANALYSES, max_queued=100)
+    trackers = {}
+    try:
+        for i in range(ANALYSES):
+            analysis_id = f"route_{i}"
+            tracker = trackers[analysis_id] = RecordingTracker(analysis_id)
+            register_analysis_tracker(analysis_id, tracker)
+            params = {'stock_symbol': f"60000{i}", 'analysis_date': "2025-01-02", 'analysts': MODULES,
+                      'research_depth': 1, 'llm_provider': 'dashscope', 'llm_model': 'qwen-turbo'}
+            queue.submit(analysis_id, run_analysis_job, analysis_id, params, tracker,
+                         runner=stub_analysis, save_result=lambda **kwargs: True)
+        deadline = time.time() + 30
+        while time.time() < deadline and any(t.progress_data['status'] == 'running' for t in trackers.values()):
+            time.sleep(0.02)
+    finally:
+        queue.shutdown()
+
+    for i in range(ANALYSES):
+        messages = trackers[f"route_{i}"].messages
+        assert len(messages) == len(MODULES) * 3 * 2
+        assert all(f"股票: 60000{i}" in message for message in messages)
+    assert not set(trackers) & set(ProgressLogHandler._trackers)
+
+
+def test_logs_outside_analysis_are_ignored():
+    """没有绑定分析ID的日志、非模块事件的日志都不转发；上下文结束后恢复"""
+    tracker = RecordingTracker("outside")
+    register_analysis_tracker("outside", tracker)
+    manager = get_logger_manager()
+    try:
+        manager.log_module_start(tool_logger, "market_analyst", "AAPL", "s")
+        assert tracker.messages == []
+
+        with analysis_context("outside"):
+            assert get_current_analysis_id() == "outside"
+            tool_logger.info("📊 [模块开始] 普通文本，不是结构化事件")
+            manager.log_module_start(tool_logger, "market_analyst", "AAPL", "s")
+            with analysis_context("someone_else"):
+                manager.log_module_complete(tool_logger, "market_analyst", "AAPL", "s", 0.1)
+        assert get_current_analysis_id() is None
+        assert tracker.messages == ["📊 [模块开始] market_analyst - 股票: AAPL"]
+    finally:
+        unregister_analysis_tracker("outside")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+测试分析进度的增量持久化
+模拟一次完整分析（4个分析师、研究深度3，约1600次进度/流式更新，完成时保存报告结果），
+统计每次分析写入Redis/文件的字节数：旧版每次更新重写完整进度文档，
+新版只写入变化的字段并按合并间隔合并写入（文件追加写入）
+"""
+
+import json
+import os
+import sys
+import time
+import types
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from web.utils import async_progress_tracker, progress_events
+from web.utils.async_progress_tracker import (AsyncProgressTracker, get_progress_by_id,
+                                              progress_log_path, safe_serialize)
+
+ANALYSTS = ['market', 'fundamentals', 'news', 'social']
+MODULES = 60
+TOOL_CALLS = 5
+STREAM_CHUNKS = 20
+# 每次更新之间经过的（模拟）时间
+UPDATE_STEP = 0.25
+
+
+class FakeClock:
+    """替换跟踪器模块中的 time，使模拟分析不需要真实等待"""
+
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class CountingRedis:
+    """替身Redis：保存哈希字段，统计写入的字节数"""
+
+    def __init__(self, *args, **kwargs):
+        self.values = {}
+        self.bytes_written = 0
+
+    def ping(self):
+        return True
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        return []
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+    def hset(self, key, mapping):
+        self.bytes_written += sum(len(k.encode()) + len(v.encode()) for k, v in mapping.items())
+        self.values.setdefault(key, {}).update(mapping)
+
+    def hgetall(self, key):
+        return dict(self.values.get(key, {}))
+
+    def expire(self, key, ttl):
+        return True
+
+    def zadd(self, key, mapping):
+        return len(mapping)
+
+
+@pytest.fixture
+def clock(monkeypatch, tmp_path):
+    fake = FakeClock()
+    monkeypatch.setattr(async_progress_tracker, "time", types.SimpleNamespace(time=fake.time))
+    monkeypatch.setattr(progress_events, "_event_bus", progress_events.LocalProgressEventBus())
+    monkeypatch.chdir(tmp_path)
+    return fake
+
+
+def _results() -> dict:
+    report = "### 分析报告\n" + "技术面、基本面与市场情绪的综合判断。" * 200
+    return {'decision': {'action': '持有', 'confidence': 0.7},
+            'state': {f"{name}_report": report for name in ANALYSTS + ['investment_plan', 'final_trade_decision']}}
+
+
+def _run_analysis(tracker: AsyncProgressTracker, clock: FakeClock, legacy_bytes: list, indent):
+    """按真实分析的日志节奏更新进度，legacy_bytes 记录旧版每次保存完整文档的字节数"""
+    def save():
+        doc = json.dumps(safe_serialize(tracker.progress_data), ensure_ascii=False, indent=indent)
+        legacy_bytes.append(len(doc.encode()))
+
+    for module in range(MODULES):
+        clock.advance(UPDATE_STEP)
+        tracker.update_progress(f"📊 [模块开始] {ANALYSTS[module % 4]}_analyst")
+        save()
+        for call in range(TOOL_CALLS):
+            clock.advance(UPDATE_STEP)
+            tracker.update_progress(f"🔧 [工具调用] get_stock_market_data_unified 第{call}次")
+            save()
+        text = ""
+        for chunk in range(STREAM_CHUNKS):
+            clock.advance(UPDATE_STEP)
+            text += "模型正在输出分析内容，" * 15
+            tracker.update_stream(f"{ANALYSTS[module % 4]}_analyst", text, done=chunk == STREAM_CHUNKS - 1)
+            save()
+        clock.advance(UPDATE_STEP)
+        tracker.update_progress(f"📊 [模块完成] {ANALYSTS[module % 4]}_analyst")
+        save()
+    tracker.mark_completed("✅ 分析完成", results=_results())
+    save()
+
+
+def _expected(tracker: AsyncProgressTracker) -> dict:
+    return json.loads(json.dumps(safe_serialize(tracker.progress_data), ensure_ascii=False))
+
+
+def test_file_backend_bytes_per_analysis(clock, monkeypatch):
+    """文件模式：追加写入的增量远小于旧版每次重写的完整文档，读取结果与完整进度一致"""
+    monkeypatch.setenv("REDIS_ENABLED", "false")
+    results = {}
+    for interval in (0.0, 1.0):
+        monkeypatch.setenv("PROGRESS_FLUSH_INTERVAL", str(interval))
+        analysis_id = f"file_{interval}"
+        legacy = []
+        tracker = AsyncProgressTracker(analysis_id, ANALYSTS, 3, 'dashscope')
+        _run_analysis(tracker, clock, legacy, indent=2)
+        with open(progress_log_path(analysis_id), encoding='utf-8') as f:
+            writes = sum(1 for _ in f)
+        results[interval] = (os.path.getsize(progress_log_path(analysis_id)), writes)
+        assert get_progress_by_id(analysis_id) == _expected(tracker)
+
+    print(f"\n文件模式每次分析写入: 旧版 {sum(legacy) / 1024:.0f}KB ({len(legacy)} 次完整重写), "
+          f"仅增量 {results[0.0][0] / 1024:.0f}KB ({results[0.0][1]} 次追加), "
+          f"增量+1秒合并 {results[1.0][0] / 1024:.0f}KB ({results[1.0][1]} 次追加)")
+    # 仅增量时流式预览每次仍整段写入，合并写入后进一步减少
+    assert results[0.0][0] * 4 < sum(legacy)
+    assert results[1.0][0] * 10 < sum(legacy)
+    assert results[1.0][1] * 3 < len(legacy)
+
+
+def test_redis_backend_bytes_per_analysis(clock, monkeypatch):
+    """Redis模式：只写入变化的哈希字段"""
+    client = CountingRedis()
+    monkeypatch.setenv("REDIS_ENABLED", "true")
+    monkeypatch.setenv("PROGRESS_FLUSH_INTERVAL", "1.0")
+    monkeypatch.setattr(progress_events, "get_redis_client", lambda: client)
+    legacy = []
+    tracker = AsyncProgressTracker("redis_1", ANALYSTS, 3, 'dashscope')
+    _run_analysis(tracker, clock, legacy, indent=None)
+
+    print(f"\nRedis模式每次分析写入: 旧版 {sum(legacy) / 1024:.0f}KB ({len(legacy)} 次SETEX), "
+          f"增量+1秒合并 {client.bytes_written / 1024:.0f}KB")
+    assert client.bytes_written * 10 < sum(legacy)
+    assert get_progress_by_id("redis_1") == _expected(tracker)
+
+
+def test_pending_update_is_flushed_after_interval(tmp_path, monkeypatch):
+    """合并间隔内的更新在间隔结束后自动写入；状态变化立即写入"""
+    monkeypatch.setenv("REDIS_ENABLED", "false")
+    monkeypatch.setenv("PROGRESS_FLUSH_INTERVAL", "0.2")
+    monkeypatch.setattr(progress_events, "_event_bus", progress_events.LocalProgressEventBus())
+    monkeypatch.chdir(tmp_path)
+    tracker = AsyncProgressTracker("pending", ['market'], 1, 'dashscope')
+    tracker.update_progress("📊 [模块开始] market_analyst")
+    assert get_progress_by_id("pending")['last_message'] == '准备开始分析...'
+    time.sleep(0.5)
+    assert get_progress_by_id("pending")['last_message'] == "📊 [模块开始] market_analyst"
+
+    tracker.update_progress("步骤 1")
+    tracker.mark_failed("网络错误")
+    progress = get_progress_by_id("pending")
+    assert progress['status'] == 'failed' and progress['last_message'] == "分析失败: 网络错误"
+
+
+def test_partial_last_line_is_ignored(tmp_path, monkeypatch):
+    """读取时最后一行可能写了一半，忽略该行；旧版完整JSON文件仍可读取"""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    with open(progress_log_path("torn"), 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'status': 'running', 'progress_percentage': 10.0}) + "\n")
+        f.write(json.dumps({'progress_percentage': 20.0}) + "\n")
+        f.write('{"progress_percentage": 3')
+    assert get_progress_by_id("torn") == {'status': 'running', 'progress_percentage': 20.0}
+
+    with open("data/progress_legacy.json", 'w', encoding='utf-8') as f:
+        json.dump({'status': 'completed'}, f)
+    assert get_progress_by_id("legacy") == {'status': 'completed'}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
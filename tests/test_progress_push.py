@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+测试分析进度推送
+使用本地替身Redis（统计打开的连接数，支持Stream阻塞读取），50个并发查看者跟踪同一个分析：
+对比旧版（每次轮询新建Redis连接读取完整进度，sleep 3秒后刷新）和推送版（共享连接池，
+一个分发线程读取Stream，查看者等待增量事件）的连接数、CPU时间、刷新次数和完成通知延迟
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+redis = pytest.importorskip("redis")
+
+from web.utils import async_progress_tracker, progress_events
+from web.utils.async_progress_tracker import AsyncProgressTracker, get_progress_by_id
+from web.utils.progress_events import LocalProgressEventBus, ProgressViewer
+
+VIEWERS = 50
+UPDATES = 100
+UPDATE_INTERVAL = 0.04
+REFRESH_INTERVAL = 3.0
+
+
+class StandInStore:
+    """替身Redis服务器的数据：键值和Stream"""
+
+    def __init__(self):
+        self.values = {}
+        self.streams = {}
+        self.condition = threading.Condition()
+        self.connections_opened = 0
+        self.commands = 0
+
+
+class StandInPool:
+    """替身连接池：按需打开连接，用完放回"""
+
+    store = None
+
+    def __init__(self, *args, **kwargs):
+        self.idle = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.idle:
+                self.idle -= 1
+                return
+        with StandInPool.store.condition:
+            StandInPool.store.connections_opened += 1
+
+    def release(self):
+        with self.lock:
+            self.idle += 1
+
+
+class StandInPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        self.client.pool.acquire()
+        try:
+            return [getattr(self.client, "_" + name)(*args, **kwargs) for name, args, kwargs in self.calls]
+        finally:
+            self.client.pool.release()
+
+
+class StandInRedis:
+    """替身Redis客户端：不传连接池时和redis-py一样自建连接池"""
+
+    def __init__(self, *args, connection_pool=None, **kwargs):
+        self.pool = connection_pool or StandInPool()
+        self.store = StandInPool.store
+
+    def _command(self, fn, *args, **kwargs):
+        self.pool.acquire()
+        try:
+            with self.store.condition:
+                self.store.commands += 1
+            return fn(*args, **kwargs)
+        finally:
+            self.pool.release()
+
+    def ping(self):
+        return self._command(lambda: True)
+
+    def get(self, key):
+        return self._command(lambda: self.store.values.get(key))
+
+    def setex(self, key, ttl, value):
+        return self._command(self._set, key, value)
+
+    def _set(self, key, value):
+        with self.store.condition:
+            self.store.values[key] = value
+
+    def hgetall(self, key):
+        return self._command(lambda: dict(self.store.values.get(key) or {}))
+
+    def _hset(self, key, mapping):
+        with self.store.condition:
+            self.store.values.setdefault(key, {}).update(mapping)
+
+    def _delete(self, key):
+        with self.store.condition:
+            self.store.values.pop(key, None)
+
+    def _zadd(self, key, mapping):
+        return len(mapping)
+
+    def pipeline(self, transaction=True):
+        return StandInPipeline(self)
+
+    def _xadd(self, key, fields, maxlen=None, approximate=True):
+        with self.store.condition:
+            entries = self.store.streams.setdefault(key, [])
+            entry_id = f"{len(entries) + 1}-0"
+            entries.append((entry_id, dict(fields)))
+            self.store.condition.notify_all()
+            return entry_id
+
+    def _expire(self, key, ttl):
+        return True
+
+    def xread(self, streams, block=None, count=None):
+        def read():
+            deadline = time.monotonic() + (block or 0) / 1000
+            with self.store.condition:
+                while True:
+                    result = []
+                    for key, last_id in streams.items():
+                        last = int(str(last_id).split("-")[0])
+                        entries = [e for e in self.store.streams.get(key, []) if int(e[0].split("-")[0]) > last]
+                        if entries:
+                            result.append((key, entries[:count]))
+                    remaining = deadline - time.monotonic()
+                    if result or remaining <= 0:
+                        return result
+                    self.store.condition.wait(remaining)
+        return self._command(read)
+
+
+@pytest.fixture
+def stand_in_redis(monkeypatch, tmp_path):
+    StandInPool.store = StandInStore()
+    monkeypatch.setattr(redis, "Redis", StandInRedis)
+    monkeypatch.setattr(redis, "ConnectionPool", StandInPool)
+    monkeypatch.setenv("REDIS_ENABLED", "true")
+    monkeypatch.setattr(progress_events, "_redis_pool", None)
+    monkeypatch.setattr(progress_events, "_event_bus", None)
+    monkeypatch.setattr(progress_events, "DISPATCH_BLOCK_MS", 200)
+    monkeypatch.chdir(tmp_path)
+    return StandInPool.store
+
+
+def legacy_get_progress_by_id(analysis_id: str):
+    """旧版读取：每次调用新建Redis客户端（及其连接池），读取并解析完整进度文档"""
+    client = redis.Redis(host="localhost", port=6379, db=0, decode_responses=True)
+    data = client.hgetall(f"progress:{analysis_id}")
+    return {field: json.loads(value) for field, value in data.items()} if data else None
+
+
+def _run_analysis(analysis_id: str, ready: threading.Event, finished: dict):
+    tracker = AsyncProgressTracker(analysis_id, ['market', 'fundamentals', 'news'], 3, 'dashscope')
+    ready.set()
+    for i in range(UPDATES):
+        time.sleep(UPDATE_INTERVAL)
+        tracker.update_progress(f"📊 [模块开始] 分析步骤 {i}")
+    finished['at'] = time.monotonic()
+    tracker.mark_completed("✅ 分析完成", results={'decision': {'action': '持有'}})
+
+
+def _bench(analysis_id: str, viewer_loop) -> dict:
+    ready, finished = threading.Event(), {}
+    analysis = threading.Thread(target=_run_analysis, args=(analysis_id, ready, finished))
+    analysis.start()
+    assert ready.wait(10)
+    results = [None] * VIEWERS
+    cpu_start = time.process_time()
+    viewers = [threading.Thread(target=lambda n=n: results.__setitem__(n, viewer_loop())) for n in range(VIEWERS)]
+    for viewer in viewers:
+        viewer.start()
+    analysis.join()
+    for viewer in viewers:
+        viewer.join()
+    cpu = time.process_time() - cpu_start
+    latencies = [seen_at - finished['at'] for seen_at, _ in results]
+    return {'cpu': cpu, 'latency': sum(latencies) / len(latencies),
+            'reruns': sum(reruns for _, reruns in results)}
+
+
+def test_50_viewers_polling_vs_push(stand_in_redis):
+    """50个查看者：推送版连接数不随查看者增长，完成通知延迟更低，每次刷新的CPU开销更低"""
+    store = stand_in_redis
+
+    def legacy_viewer():
+        reruns = 0
+        while True:
+            reruns += 1
+            progress = legacy_get_progress_by_id("legacy")
+            if progress and progress['status'] == 'completed':
+                return time.monotonic(), reruns
+            time.sleep(REFRESH_INTERVAL)
+
+    legacy = _bench("legacy", legacy_viewer)
+    legacy_connections = store.connections_opened
+
+    # 推送版使用新的连接池，只统计它打开的连接
+    progress_events._redis_pool = None
+    store.connections_opened = 0
+
+    def push_viewer():
+        viewer = ProgressViewer("push", get_progress_by_id("push"))
+        reruns = 0
+        while True:
+            reruns += 1
+            viewer.poll()
+            if viewer.data.get('status') == 'completed':
+                return time.monotonic(), reruns
+            if not viewer.wait_for_update(REFRESH_INTERVAL):
+                viewer = ProgressViewer("push", get_progress_by_id("push"))
+
+    push = _bench("push", push_viewer)
+    push_connections = store.connections_opened
+    progress_events.get_progress_event_bus().close()
+
+    print(f"\n{VIEWERS}个查看者, 分析耗时约{UPDATES * UPDATE_INTERVAL:.0f}s:\n"
+          f"  旧版轮询: 新建连接 {legacy_connections}, CPU {legacy['cpu']:.2f}s, 刷新 {legacy['reruns']} 次, "
+          f"完成通知平均延迟 {legacy['latency']:.2f}s\n"
+          f"  推送版:   新建连接 {push_connections}, CPU {push['cpu']:.2f}s, 刷新 {push['reruns']} 次, "
+          f"完成通知平均延迟 {push['latency']:.2f}s")
+
+    assert legacy_connections >= legacy['reruns']
+    assert push_connections <= 5
+    assert push['latency'] * 3 < legacy['latency']
+    # 推送版刷新更及时（次数受 min_interval 限制），每次刷新的CPU开销不高于旧版
+    assert push['reruns'] <= VIEWERS * (UPDATES * UPDATE_INTERVAL / 0.5 + 3)
+    assert push['cpu'] / push['reruns'] < legacy['cpu'] / legacy['reruns']
+
+
+def test_viewer_merges_deltas_into_snapshot(tmp_path, monkeypatch):
+    """进程内总线：查看者用快照加增量事件得到与完整进度一致的数据，事件不含大字段"""
+    monkeypatch.setenv("REDIS_ENABLED", "false")
+    monkeypatch.chdir(tmp_path)
+    bus = LocalProgressEventBus()
+    monkeypatch.setattr(progress_events, "_event_bus", bus)
+
+    tracker = AsyncProgressTracker("local", ['market'], 1, 'dashscope')
+    viewer = ProgressViewer("local", get_progress_by_id("local"), bus=bus, min_interval=0)
+    for i in range(5):
+        tracker.update_progress(f"步骤 {i}")
+    tracker.update_stream("market_analyst", "部分输出" * 10)
+    tracker.mark_completed("✅ 分析完成", results={'decision': {'action': '买入'}})
+
+    assert viewer.poll()
+    full = get_progress_by_id("local")
+    for key in ('status', 'progress_percentage', 'last_message', 'current_step', 'streaming_text'):
+        assert viewer.data[key] == full[key]
+    assert viewer.data.get('has_raw_results') is True
+    events, _ = bus.wait("local", 0, 0)
+    assert all('steps' not in event and 'raw_results' not in event for event in events)
+
+
+def test_wait_returns_as_soon_as_event_arrives():
+    """等待中的查看者在事件发布后立即返回，不等满超时"""
+    bus = LocalProgressEventBus()
+    viewer = ProgressViewer("a1", {'status': 'running'}, bus=bus, min_interval=0)
+    threading.Timer(0.05, bus.publish, args=("a1", {'progress_percentage': 50.0})).start()
+    start = time.monotonic()
+    assert viewer.wait_for_update(5)
+    assert time.monotonic() - start < 1
+    assert viewer.data == {'status': 'running', 'progress_percentage': 50.0}
+    assert not viewer.wait_for_update(0.05)
+
+
+def test_idle_analyses_are_pruned(monkeypatch):
+    """已结束的分析空闲后丢弃缓冲事件，仍在运行的分析保留；序号不回退"""
+    monkeypatch.setattr(progress_events, "PRUNE_INTERVAL", 0)
+    monkeypatch.setattr(progress_events, "FINISHED_EVENT_TTL", 0.05)
+    bus = LocalProgressEventBus()
+
+    bus.publish("done", {'status': 'completed'})
+    bus.publish("running", {'progress_percentage': 30.0})
+    viewer = ProgressViewer("done", {}, bus=bus, min_interval=0)
+    assert viewer.poll() and viewer.data['status'] == 'completed'
+    time.sleep(0.1)
+
+    bus.publish("other", {'progress_percentage': 10.0})
+    assert set(bus._events) == set(bus._last_active) == {"running", "other"}
+    assert bus.wait("done", 0, 0) == ([], 0)
+    assert bus.wait("running", 0, 0)[0] == [{'progress_percentage': 30.0}]
+
+    # 已有的查看者在清理后仍能收到新事件
+    bus.publish("done", {'status': 'failed'})
+    assert viewer.poll() and viewer.data['status'] == 'failed'
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+测试分析报告全文检索
+在5万篇模拟报告（中文为主，夹杂英文术语）上建立倒排索引，统计索引大小和查询延迟（p50/p95），
+与旧方式（加载全部报告后在Python中逐篇子串匹配）对比；并验证中文分词、短语匹配、BM25排序、
+增量更新，以及历史记录页面和 tradingagents.api 的检索入口
+"""
+
+import os
+import random
+import sys
+import time
+import zlib
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from tradingagents.api.report_api import search_reports
+from tradingagents.utils import report_search
+from tradingagents.utils.report_search import ReportSearchIndex, build_match_query, tokenize
+
+REPORTS = 50_000
+WORDS_PER_REPORT = 120
+QUERIES = ["产能过剩", "guidance cut", "毛利率", "估值 修复", "北向资金", "现金流", "政策", "降息预期",
+           "库存周期", "市盈率 回落", "emerging", "供给侧", "风险提示", "净利润 增长", "渠道 库存"]
+
+FINANCE_TERMS = ["营业收入", "净利润", "增长", "毛利率", "现金流", "市盈率", "估值", "修复", "北向资金", "政策",
+                 "降息预期", "库存周期", "回落", "供给侧", "风险提示", "渠道", "库存", "技术面", "基本面",
+                 "市场情绪", "成交量", "均线", "支撑位", "压力位", "买入", "持有", "卖出", "行业景气度",
+                 "需求", "订单", "分红", "负债率", "研发投入", "海外市场", "汇率", "原材料", "价格", "竞争格局"]
+ENGLISH_TERMS = ["revenue", "margin", "guidance", "outlook", "demand", "capex", "buyback", "emerging", "markets"]
+COMMON_CHARS = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清己美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片始却专状育厂京识适属圆包火住调满县局照参红细引听该铁价严"
+
+
+def _make_reports(count: int, seed: int = 7):
+    """生成模拟报告：常用词服从长尾分布，少量报告包含特定主题（产能过剩 / guidance cut）"""
+    rng = random.Random(seed)
+    filler = ["".join(rng.choice(COMMON_CHARS) for _ in range(rng.randint(2, 4))) for _ in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(filler))]
+    reports = []
+    for i in range(count):
+        words = rng.choices(filler, weights=weights, k=WORDS_PER_REPORT)
+        words += rng.sample(FINANCE_TERMS, 12) + rng.sample(ENGLISH_TERMS, 2)
+        if i % 97 == 0:
+            words += ["行业", "产能过剩", "价格", "承压"]
+        if i % 211 == 0:
+            words += ["management", "guidance", "cut", "for", "next", "quarter"]
+        rng.shuffle(words)
+        reports.append((f"report_{i:05d}", "，".join(words) + "。", f"{600000 + i % 500}", 1_700_000_000 + i))
+    return reports
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def test_tokenize_and_query():
+    """中文切分为二字组并在末尾追加单字，英文小写单词；查询词作为短语，单个汉字精确匹配单字"""
+    assert tokenize("产能过剩，Guidance Cut！") == ['产能', '能过', '过剩', 'guidance', 'cut', '产', '能', '过', '剩']
+    assert tokenize("涨 ＡＢＣ123") == ['涨', 'abc123']
+    assert tokenize("减产，涨") == ['减产', '涨', '减', '产']
+    assert build_match_query("产能过剩 guidance") == '"产能 能过 过剩" AND "guidance"'
+    assert build_match_query("涨") == '"涨"'
+    assert build_match_query(" ，。 ") is None
+
+
+def test_single_character_matches_any_position(tmp_path):
+    """单个汉字能命中词中间和词尾的字；旧版本（只有二字组）的索引打开时自动补上单字"""
+    db_path = tmp_path / "search.db"
+    index = ReportSearchIndex(str(db_path))
+    index.add("a", "公司宣布减产。", "000001", 1)
+    index.add("b", "产能利用率提升", "000002", 2)
+    index.add("c", "Revenue guidance cut", "AAPL", 3)
+
+    assert [hit['analysis_id'] for hit in index.search('产', limit=10)] in (["a", "b"], ["b", "a"])
+    assert [hit['analysis_id'] for hit in index.search('布')] == ["a"]
+    assert [hit['analysis_id'] for hit in index.search('减产')] == ["a"]
+
+    # 模拟旧版本索引：只保存二字组词元
+    conn = index._connection()
+    for doc_id, analysis_id in conn.execute("SELECT doc_id, analysis_id FROM report_docs").fetchall():
+        text = {"a": "公司宣布减产。", "b": "产能利用率提升", "c": "Revenue guidance cut"}[analysis_id]
+        old_tokens = ' '.join(report_search._phrase_tokens(text))
+        conn.execute("INSERT INTO report_fts (report_fts, rowid, body) VALUES ('delete', ?, ?)",
+                     (doc_id, ' '.join(tokenize(text))))
+        conn.execute("INSERT INTO report_fts (rowid, body) VALUES (?, ?)", (doc_id, old_tokens))
+        conn.execute("UPDATE report_docs SET tokens=? WHERE doc_id=?",
+                     (zlib.compress(old_tokens.encode('utf-8')), doc_id))
+    conn.execute("PRAGMA user_version=0")
+    assert index.search('布') == []
+
+    upgraded = ReportSearchIndex(str(db_path))
+    assert [hit['analysis_id'] for hit in upgraded.search('布')] == ["a"]
+    assert {hit['analysis_id'] for hit in upgraded.search('产')} == {"a", "b"}
+    assert [hit['analysis_id'] for hit in upgraded.search('guidance cut')] == ["c"]
+    upgraded.remove("a")
+    assert upgraded.search('布') == []
+
+
+def test_phrase_matching_and_ranking(tmp_path):
+    """连续子串才匹配，出现次数多、文档短的排在前面；重新保存替换旧索引，删除后不再命中"""
+    index = ReportSearchIndex(str(tmp_path / "search.db"))
+    index.add("a", "行业产能过剩，产能过剩压力持续，价格承压", "000001", 1)
+    index.add("b", "行业产能过剩。" + "其他内容" * 200, "000002", 2)
+    index.add("c", "产能利用率提升，库存过剩问题缓解", "000003", 3)
+    index.add("d", "Management announced a guidance cut for FY2025", "AAPL", 4)
+
+    assert [hit['analysis_id'] for hit in index.search("产能过剩")] == ["a", "b"]
+    assert {hit['analysis_id'] for hit in index.search("产能 过剩")} == {"a", "b", "c"}
+    assert [hit['analysis_id'] for hit in index.search("guidance cut")] == ["d"]
+    assert [hit['analysis_id'] for hit in index.search("GUIDANCE")] == ["d"]
+    assert [hit['analysis_id'] for hit in index.search("产能过剩", stock_symbol="000002")] == ["b"]
+
+    index.add("a", "公司公告回购计划", "000001", 5)
+    assert [hit['analysis_id'] for hit in index.search("产能过剩")] == ["b"]
+    assert [hit['analysis_id'] for hit in index.search("回购")] == ["a"]
+    assert index.remove("b") and not index.remove("b")
+    assert index.search("产能过剩") == []
+    assert index.count() == 3
+
+
+def test_index_size_and_latency_at_50k_reports(tmp_path):
+    """5万篇报告：索引大小、查询 p50/p95 延迟，与逐篇子串匹配对比"""
+    reports = _make_reports(REPORTS)
+    index = ReportSearchIndex(str(tmp_path / "search.db"))
+    started = time.perf_counter()
+    for start in range(0, REPORTS, 1000):
+        index.add_many(reports[start:start + 1000])
+    index.optimize()
+    build_seconds = time.perf_counter() - started
+    index._connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    index_bytes = os.path.getsize(tmp_path / "search.db")
+    text_bytes = sum(len(text.encode('utf-8')) for _, text, _, _ in reports)
+
+    latencies = []
+    for _ in range(10):
+        for query in QUERIES:
+            started = time.perf_counter()
+            hits = index.search(query, limit=20)
+            latencies.append(time.perf_counter() - started)
+            assert hits, query
+
+    scan = []
+    for query in QUERIES[:5]:
+        words = query.split()
+        started = time.perf_counter()
+        matched = [analysis_id for analysis_id, text, _, _ in reports if all(w in text.lower() for w in words)]
+        scan.append(time.perf_counter() - started)
+
+    p50, p95 = _percentile(latencies, 0.5), _percentile(latencies, 0.95)
+    print(f"\n{REPORTS} 篇报告 (正文 {text_bytes / 1024 ** 2:.1f}MB): 索引 {index_bytes / 1024 ** 2:.1f}MB, "
+          f"建立 {build_seconds:.1f}s ({REPORTS / build_seconds:.0f} 篇/秒); "
+          f"查询 p50 {p50 * 1000:.1f}ms, p95 {p95 * 1000:.1f}ms; "
+          f"逐篇子串匹配（正文已在内存中）平均 {sum(scan) / len(scan) * 1000:.0f}ms")
+
+    assert len(index.search("产能过剩", limit=1000)) == len(range(0, REPORTS, 97))
+    assert len(index.search("guidance cut", limit=1000)) == len(range(0, REPORTS, 211))
+    assert p95 < 0.2
+    assert p95 * 5 < sum(scan) / len(scan)
+
+
+def test_history_page_and_api_search(tmp_path, monkeypatch):
+    """保存分析结果时建立索引，历史记录页面按相关度列出，api 检索返回同样的结果；升级前的结果补建索引"""
+    pytest.importorskip("streamlit")
+    from web.components import analysis_results
+    from web.utils import mongodb_report_manager, results_catalog
+
+    web_dir = tmp_path / "analysis_results"
+    web_dir.mkdir()
+    monkeypatch.setattr(analysis_results, "get_analysis_results_dir", lambda: web_dir)
+    monkeypatch.setattr(analysis_results, "MONGODB_AVAILABLE", False)
+    monkeypatch.setattr(results_catalog, "get_detailed_results_dir", lambda: tmp_path / "detailed")
+    monkeypatch.setattr(results_catalog, "_catalog", None)
+    monkeypatch.setattr(results_catalog, "_backfilled", False)
+    monkeypatch.setattr(mongodb_report_manager.mongodb_report_manager, "connected", False)
+    monkeypatch.setenv("RESULTS_CATALOG_DB", str(tmp_path / "catalog.db"))
+    monkeypatch.setenv("REPORT_SEARCH_DB", str(tmp_path / "search.db"))
+    monkeypatch.setattr(report_search, "_index", None)
+
+    # 升级前保存的结果：目录中已有，但还没有全文索引
+    analysis_results.save_analysis_result("old_1", "000001", ['market'], 1,
+                                          {'summary': "持有", 'state': {'market_report': "钢铁行业产能过剩"}})
+    report_search.get_report_search_index().remove("old_1")
+
+    analysis_results.save_analysis_result("new_1", "000002", ['market'], 1,
+                                          {'summary': "卖出", 'state': {
+                                              'fundamentals_report': "水泥产能过剩，产能过剩导致价格战"}})
+    analysis_results.save_analysis_result("new_2", "000003", ['news'], 1,
+                                          {'summary': "买入", 'state': {'news_report': "需求回暖"}})
+
+    listed = analysis_results.load_analysis_results(search_text="产能过剩", full_text=True, sort_by='relevance')
+    assert [r['analysis_id'] for r in listed] == ["new_1", "old_1"]
+    assert 'full_data' not in listed[0]
+    assert analysis_results.summarize_analysis_results(search_text="产能过剩", full_text=True)['total'] == 2
+    # 不勾选全文检索时仍只匹配股票代码、摘要和分析师
+    assert analysis_results.load_analysis_results(search_text="产能过剩") == []
+
+    assert [hit['analysis_id'] for hit in search_reports("产能过剩")] == ["new_1", "old_1"]
+    assert [hit['analysis_id'] for hit in search_reports("产能过剩", stock_symbol="000001")] == ["old_1"]
+    assert search_reports("") == []
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
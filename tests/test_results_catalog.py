@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+测试分析历史记录目录
+在临时目录中生成1万个已保存的分析结果（Web结果文件）和分模块报告目录，对比
+旧版历史记录页面加载（读取全部结果文件后在内存中过滤、排序）与目录查询（统计 + 一页列表 + 图表用的200条）的耗时；
+并验证过滤、排序、分页、正文按需读取以及保存时登记目录
+"""
+
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+pytest.importorskip("streamlit")
+
+from web.components import analysis_results
+from tradingagents.utils import report_search
+from web.utils import mongodb_report_manager, results_catalog
+
+ANALYSES = 10_000
+DETAILED = 50
+STOCKS = [f"{600000 + i}" for i in range(300)] + ["AAPL", "TSLA", "0700.HK"]
+ANALYSTS = ['market', 'fundamentals', 'news', 'social']
+REPORT = "### 分析报告\n" + "技术面、基本面与市场情绪的综合判断。" * 150
+NOW = datetime.now().timestamp()
+
+
+@pytest.fixture
+def results_dirs(tmp_path, monkeypatch):
+    """把Web结果目录、分模块报告目录和目录数据库都指向临时目录"""
+    web_dir = tmp_path / "analysis_results"
+    detailed_dir = tmp_path / "detailed"
+    web_dir.mkdir()
+    monkeypatch.setattr(analysis_results, "get_analysis_results_dir", lambda: web_dir)
+    monkeypatch.setattr(analysis_results, "MONGODB_AVAILABLE", False)
+    monkeypatch.setattr(results_catalog, "get_detailed_results_dir", lambda: detailed_dir)
+    monkeypatch.setattr(results_catalog, "_catalog", None)
+    monkeypatch.setattr(mongodb_report_manager.mongodb_report_manager, "connected", False)
+    monkeypatch.setenv("RESULTS_CATALOG_DB", str(tmp_path / "catalog.db"))
+    monkeypatch.setenv("REPORT_SEARCH_DB", str(tmp_path / "report_search.db"))
+    monkeypatch.setattr(report_search, "_index", None)
+    monkeypatch.setattr(results_catalog, "_backfilled", False)
+    return web_dir, detailed_dir
+
+
+def _populate(web_dir: Path, detailed_dir: Path, count: int):
+    """按 save_analysis_result 的格式写入结果文件（每个分析约30KB正文），另写入若干分模块报告目录"""
+    for i in range(count):
+        analysis_id = f"analysis_{i:05d}"
+        entry = {
+            'analysis_id': analysis_id,
+            'timestamp': NOW - i * 600,
+            'stock_symbol': STOCKS[i % len(STOCKS)],
+            'analysts': ANALYSTS[:1 + i % 4],
+            'research_depth': 1 + i % 3,
+            'status': 'completed' if i % 10 else 'failed',
+            'summary': f"第{i}次分析：建议{'买入' if i % 3 else '持有'}",
+            'performance': {'duration': 60.0 + i % 7},
+            'full_data': {'market_report': REPORT, 'fundamentals_report': REPORT, 'final_trade_decision': REPORT},
+        }
+        with open(web_dir / f"analysis_{analysis_id}.json", 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False, indent=2)
+    (web_dir / "favorites.json").write_text(json.dumps(["analysis_00003", "analysis_00030"]), encoding='utf-8')
+    (web_dir / "tags.json").write_text(json.dumps({"analysis_00005": ["重点"]}, ensure_ascii=False),
+                                       encoding='utf-8')
+
+    for i in range(DETAILED):
+        day = (datetime.now() - timedelta(days=i % 5)).strftime('%Y-%m-%d')
+        reports_dir = detailed_dir / f"DET{i:03d}" / day / "reports"
+        reports_dir.mkdir(parents=True)
+        for name in ('market_report', 'fundamentals_report', 'final_trade_decision'):
+            (reports_dir / f"{name}.md").write_text(f"# {name}\n\n{REPORT}", encoding='utf-8')
+
+
+def _legacy_page_load(web_dir: Path, start_date, end_date, limit=200):
+    """旧版 load_analysis_results 的文件系统路径：读取全部结果文件，在内存中过滤和排序"""
+    all_results = []
+    for result_file in web_dir.glob("*.json"):
+        if result_file.name in ['favorites.json', 'tags.json']:
+            continue
+        with open(result_file, 'r', encoding='utf-8') as f:
+            all_results.append(json.load(f))
+    filtered = [r for r in all_results
+                if start_date <= datetime.fromtimestamp(r['timestamp']).date() <= end_date]
+    filtered.sort(key=lambda r: r['timestamp'], reverse=True)
+    return filtered[:limit]
+
+
+def _catalog_page_load(filter_kwargs):
+    """新版历史记录页面加载的查询：统计、收藏数、第一页列表、图表/详细分析用的200条"""
+    stats = analysis_results.summarize_analysis_results(**filter_kwargs)
+    analysis_results.summarize_analysis_results(**dict(filter_kwargs, favorites_only=True))
+    page = analysis_results.load_analysis_results(limit=10, offset=0, **filter_kwargs)
+    recent = analysis_results.load_analysis_results(limit=200, **filter_kwargs)
+    return stats, page, recent
+
+
+def test_page_load_at_10k_analyses(results_dirs):
+    """1万个分析时页面加载只查询目录，不读取结果文件"""
+    web_dir, detailed_dir = results_dirs
+    _populate(web_dir, detailed_dir, ANALYSES)
+    start_date, end_date = (datetime.now() - timedelta(days=30)).date(), datetime.now().date()
+
+    started = time.perf_counter()
+    catalog = results_catalog.get_results_catalog()
+    rebuild_seconds = time.perf_counter() - started
+    assert isinstance(catalog, results_catalog.SQLiteResultsCatalog)
+
+    started = time.perf_counter()
+    legacy = _legacy_page_load(web_dir, start_date, end_date)
+    legacy_seconds = time.perf_counter() - started
+
+    filter_kwargs = {'start_date': start_date, 'end_date': end_date}
+    _catalog_page_load(filter_kwargs)
+    started = time.perf_counter()
+    stats, page, recent = _catalog_page_load(filter_kwargs)
+    catalog_seconds = time.perf_counter() - started
+
+    print(f"\n{ANALYSES} 个分析: 旧版页面加载 {legacy_seconds * 1000:.0f}ms (读取 {ANALYSES} 个结果文件), "
+          f"目录查询 {catalog_seconds * 1000:.1f}ms; 首次导入目录 {rebuild_seconds:.1f}s")
+
+    # 30天内每10分钟一个分析（4320个）+ 分模块报告目录
+    assert stats['total'] == sum(1 for i in range(ANALYSES) if NOW - i * 600 >= datetime.combine(
+        start_date, datetime.min.time()).timestamp()) + DETAILED
+    assert stats['unique_stocks'] == len(STOCKS) + DETAILED
+    assert [r['analysis_id'] for r in recent if r['source'] == 'file_system' and r['analysis_id'].startswith(
+        'analysis_')][:10] == [r['analysis_id'] for r in legacy][:10]
+    assert len(page) == 10 and all('full_data' not in r and 'reports' not in r for r in recent)
+    assert catalog_seconds * 10 < legacy_seconds
+
+
+def test_filters_sorting_and_paging(results_dirs):
+    """过滤、排序、分页与旧版内存过滤的语义一致"""
+    web_dir, detailed_dir = results_dirs
+    _populate(web_dir, detailed_dir, 500)
+
+    by_stock = analysis_results.load_analysis_results(stock_symbol="aapl", limit=1000)
+    assert by_stock and all(r['stock_symbol'] == "AAPL" for r in by_stock)
+    by_analyst = analysis_results.load_analysis_results(analyst_type="social", limit=1000)
+    assert len(by_analyst) == 125 and all('social' in r['analysts'] for r in by_analyst)
+    searched = analysis_results.load_analysis_results(search_text="第42次", limit=1000)
+    assert [r['analysis_id'] for r in searched] == ["analysis_00042"]
+    favorites = analysis_results.load_analysis_results(favorites_only=True)
+    assert {r['analysis_id'] for r in favorites} == {"analysis_00003", "analysis_00030"}
+    assert all(r['is_favorite'] for r in favorites)
+    tagged = analysis_results.load_analysis_results(tags_filter=["重点"])
+    assert [(r['analysis_id'], r['tags']) for r in tagged] == [("analysis_00005", ["重点"])]
+    assert analysis_results.load_analysis_results(tags_filter=["重点"], favorites_only=True) == []
+
+    today = date.today()
+    dated = analysis_results.load_analysis_results(start_date=today, end_date=today, limit=1000)
+    assert dated and all(datetime.fromtimestamp(r['timestamp']).date() == today for r in dated)
+
+    pages = [analysis_results.load_analysis_results(limit=50, offset=offset, sort_by='time_asc')
+             for offset in range(0, 600, 50)]
+    ids = [r['analysis_id'] for page in pages for r in page]
+    assert len(ids) == len(set(ids)) == 500 + DETAILED
+    timestamps = [r['timestamp'] for page in pages for r in page]
+    assert timestamps == sorted(timestamps)
+
+    # 键集分页（从上一页最后一条记录继续）与偏移量分页结果一致，包括相同时间戳、按股票排序
+    for sort_by in results_catalog.KEYSET_SORTS:
+        expected = [r['analysis_id'] for r in analysis_results.load_analysis_results(limit=1000, sort_by=sort_by)]
+        listed, after = [], None
+        while True:
+            page = analysis_results.load_analysis_results(limit=37, sort_by=sort_by, after=after)
+            if not page:
+                break
+            listed.extend(r['analysis_id'] for r in page)
+            after = results_catalog.page_cursor(page[-1], sort_by)
+        assert listed == expected, sort_by
+
+    by_status = analysis_results.load_analysis_results(limit=1000, sort_by='status')
+    statuses = [r['status'] for r in by_status]
+    assert statuses.index('failed') == statuses.count('completed')
+
+
+def test_body_is_loaded_on_demand(results_dirs):
+    """列表结果不含正文，打开详情时从结果文件/分模块报告目录读取"""
+    web_dir, detailed_dir = results_dirs
+    _populate(web_dir, detailed_dir, 20)
+
+    result = analysis_results.load_analysis_results(search_text="第7次")[0]
+    assert 'full_data' not in result
+    analysis_results.ensure_result_body(result)
+    assert result['full_data']['market_report'] == REPORT
+
+    detailed = analysis_results.load_analysis_results(stock_symbol="DET001")[0]
+    assert detailed['summary'].startswith("final_trade_decision") and 'reports' not in detailed
+    analysis_results.ensure_result_body(detailed)
+    assert set(detailed['reports']) == {'market_report', 'fundamentals_report', 'final_trade_decision'}
+
+
+def test_saved_result_is_listed_immediately(results_dirs):
+    """save_analysis_result 保存后立即出现在历史记录中；分模块报告保存到 detailed 目录时也登记"""
+    web_dir, detailed_dir = results_dirs
+    assert analysis_results.load_analysis_results() == []
+
+    assert analysis_results.save_analysis_result("new_1", "000001", ['market'], 2,
+                                                 {'summary': "建议买入", 'market_report': REPORT})
+    listed = analysis_results.load_analysis_results()
+    assert [(r['analysis_id'], r['summary']) for r in listed] == [("new_1", "建议买入")]
+    assert analysis_results.ensure_result_body(listed[0])['full_data']['market_report'] == REPORT
+
+    date_dir = detailed_dir / "000002" / date.today().strftime('%Y-%m-%d')
+    (date_dir / "reports").mkdir(parents=True)
+    (date_dir / "reports" / "final_trade_decision.md").write_text("# 最终决策\n\n持有", encoding='utf-8')
+    results_catalog.record_detailed_result(date_dir)
+    results_catalog.record_detailed_result(web_dir)
+    assert [r['stock_symbol'] for r in analysis_results.load_analysis_results()] == ["000001", "000002"]
+
+
+def test_failed_mongodb_import_is_not_committed(results_dirs, tmp_path):
+    """导入时MongoDB翻页失败：抛出异常，目录中不写入已读取的部分报告"""
+    class FlakyManager:
+        def list_analysis_reports(self, limit=50, cursor=None):
+            if cursor is not None:
+                raise RuntimeError("connection reset")
+            return [{'analysis_id': f"m{i}", 'timestamp': NOW, 'stock_symbol': "000001"} for i in range(3)], "next"
+
+    web_dir, detailed_dir = results_dirs
+    catalog = results_catalog.SQLiteResultsCatalog(str(tmp_path / "import.db"))
+    with pytest.raises(RuntimeError):
+        results_catalog.rebuild_results_catalog(catalog, FlakyManager(), web_dir, detailed_dir)
+    assert catalog.is_empty()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
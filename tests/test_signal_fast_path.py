@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+测试SignalProcessor确定性快速解析
+在录制的决策文本语料上统计跳过LLM调用的比例，并验证存在歧义时仍调用LLM
+"""
+
+import os
+import sys
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from langchain_core.messages import AIMessage
+
+from tradingagents.graph.signal_processing import SignalProcessor
+
+# 录制的最终决策文本，(文本, 股票代码, 期望的快速解析结果或 None 表示应交给LLM)
+CORPUS = [
+    ("""### 风险管理委员会决策
+综合三位分析师的观点，建议持有平安银行。
+技术面分析显示当前价格为12.50元，目标价位为15.00元。
+置信度：75%
+风险评分：40%
+最终交易建议: **持有**""", "000001", {"action": "持有", "target_price": 15.0, "confidence": 0.75, "risk_score": 0.4}),
+    ("""Based on comprehensive analysis of Apple Inc. (AAPL), we recommend BUY.
+Technical analysis shows current price at $150.00, target price $180.00.
+Confidence: 80%
+Risk Score: 30%
+Final Trading Recommendation: **BUY**""", "AAPL", {"action": "买入", "target_price": 180.0, "confidence": 0.8, "risk_score": 0.3}),
+    ("""## 最终决策
+**决策理由**：估值处于历史低位，盈利改善确定性高。
+**目标价位**: ¥28.60
+**置信度**: 0.82
+**风险评分**: 0.35
+最终交易建议: **买入**""", "600519", {"action": "买入", "target_price": 28.6, "confidence": 0.82, "risk_score": 0.35}),
+    ("""经过讨论，我们认为当前风险收益比不佳。
+目标价：9.8元
+最终交易建议：**卖出**""", "000002", {"action": "卖出", "target_price": 9.8, "confidence": 0.7, "risk_score": 0.5}),
+    ("""```json
+{"action": "买入", "target_price": 45.5, "confidence": 0.78, "risk_score": 0.42, "reasoning": "业绩超预期"}
+```""", "000858", {"action": "买入", "target_price": 45.5, "confidence": 0.78, "risk_score": 0.42}),
+    ("""腾讯控股估值合理，维持持有。
+目标价格: 380港元
+FINAL TRANSACTION PROPOSAL: **HOLD**""", "0700.HK", {"action": "持有", "target_price": 380.0, "confidence": 0.7, "risk_score": 0.5}),
+    ("""**默认建议：持有**
+由于技术原因无法生成详细分析，目标价位：20.00元。""", "000001", {"action": "持有", "target_price": 20.0, "confidence": 0.7, "risk_score": 0.5}),
+    ("""Risk committee view: the downside is limited.
+Target price of $95.
+Final Recommendation: SELL""", "TSLA", {"action": "卖出", "target_price": 95.0, "confidence": 0.7, "risk_score": 0.5}),
+    # 以下存在歧义，需要LLM提取
+    ("""激进分析师主张买入，保守分析师主张卖出，我们综合后倾向于持有，
+但具体仓位视市场情况而定。""", "000001", None),
+    ("""短期目标价位：15元，长期目标价位：18元。
+最终交易建议: **买入**""", "000001", None),
+    ("""目标价位：14-16元
+最终交易建议: **持有**""", "000001", None),
+    ("""最终交易建议: **买入**
+（修订）最终决策：卖出，目标价12元""", "000001", None),
+    ("""建议投资者逢低布局，公司长期前景向好。
+最终交易建议: **买入**""", "000001", None),
+    ("""目标价位: 30元
+置信度：80%，复核后置信度：60%
+最终交易建议: **买入**""", "000001", None),
+    ("""目标价位: 30元
+风险评分：3
+最终交易建议: **买入**""", "000001", None),
+    ("""目标价位: 30元
+置信度：8
+最终交易建议: **持有**""", "000001", None),
+    ("""目标价位: 30元
+置信度：75
+最终交易建议: **卖出**""", "000001", None),
+]
+
+
+class CountingLLM:
+    """记录调用次数的假LLM，返回固定的JSON决策"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return AIMessage(content='{"action": "持有", "target_price": 10.0, "confidence": 0.6, '
+                                 '"risk_score": 0.5, "reasoning": "LLM提取"}')
+
+
+def test_corpus_skip_share():
+    """统计录制语料上跳过LLM调用的比例，明确的决策全部走快速解析"""
+    llm = CountingLLM()
+    processor = SignalProcessor(llm)
+
+    for text, symbol, expected in CORPUS:
+        result = processor.process_signal(text, symbol)
+        if expected is not None:
+            for key, value in expected.items():
+                assert result[key] == pytest.approx(value) if isinstance(value, float) else result[key] == value, \
+                    f"{key} 解析错误: {text[:30]}"
+
+    stats = processor.get_fast_path_stats()
+    clear = sum(1 for _, _, expected in CORPUS if expected is not None)
+    print(f"\n语料 {stats['total']} 条, 跳过LLM {stats['fast_path_hits']} 条 "
+          f"({stats['skip_ratio']:.0%}), 调用LLM {stats['llm_calls']} 条")
+
+    assert stats['fast_path_hits'] == clear
+    assert stats['llm_calls'] == llm.calls == len(CORPUS) - clear
+
+
+def test_ambiguous_signals_use_llm():
+    """存在歧义的文本快速解析返回 None"""
+    processor = SignalProcessor(CountingLLM())
+    for text, _, expected in CORPUS:
+        if expected is None:
+            assert processor._parse_signal_fast(text) is None, text[:30]
+
+
+def test_thousands_separator_and_ratio_forms():
+    """千分位目标价、8/10 形式的评分；评分标记后没有数字时交给LLM"""
+    processor = SignalProcessor(CountingLLM())
+
+    result = processor._parse_signal_fast("目标价位：1,250.50元\n最终交易建议: **买入**")
+    assert result['target_price'] == pytest.approx(1250.5)
+    result = processor._parse_signal_fast("Target price: $2,400\nFinal Recommendation: HOLD")
+    assert result['target_price'] == pytest.approx(2400.0)
+    assert processor._parse_signal_fast("目标价位：15,16元\n最终交易建议: **买入**") is None
+
+    result = processor._parse_signal_fast("目标价位：30元\n置信度：8/10\n风险评分: 3 / 10\n最终交易建议: **买入**")
+    assert result['confidence'] == pytest.approx(0.8)
+    assert result['risk_score'] == pytest.approx(0.3)
+
+    assert processor._parse_signal_fast("目标价位：30元\n风险评分：中等\n最终交易建议: **买入**") is None
+    assert processor._parse_signal_fast("目标价位：30元\n置信度：较高\n最终交易建议: **买入**") is None
+
+
+def test_fast_path_can_be_disabled():
+    """关闭快速解析时每次都调用LLM"""
+    llm = CountingLLM()
+    processor = SignalProcessor(llm, fast_path=False)
+    result = processor.process_signal(CORPUS[0][0], "000001")
+    assert llm.calls == 1
+    assert result['reasoning'] == "LLM提取"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+测试使用量运行聚合和定价缓存
+在大量历史记录下对比每次跟踪调用的开销（旧版全量扫描 vs 运行聚合），
+并验证聚合结果与逐条统计一致、定价文件修改后失效、成本警告使用今日聚合
+"""
+
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from tradingagents.config.config_manager import ConfigManager, TokenTracker, UsageRecord
+from tradingagents.config.usage_aggregates import UsageAggregates
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setenv("USE_MONGODB_STORAGE", "false")
+    return ConfigManager(str(tmp_path))
+
+
+def _record(i: int, timestamp: str) -> dict:
+    providers = [("dashscope", "qwen-turbo"), ("dashscope", "qwen-plus-latest"), ("deepseek", "deepseek-chat")]
+    provider, model_name = providers[i % 3]
+    return {
+        "timestamp": timestamp, "provider": provider, "model_name": model_name,
+        "input_tokens": 1000 + i % 700, "output_tokens": 200 + i % 300,
+        "cost": round(0.001 * (i % 11), 6), "session_id": f"session_{i // 40}",
+        "analysis_type": "stock_analysis",
+    }
+
+
+def _legacy_track_overhead(manager: ConfigManager, provider: str, model_name: str) -> float:
+    """旧版每次跟踪调用的统计开销：重读定价文件线性查找，并在Python中扫描今日全部记录"""
+    start = time.perf_counter()
+    for pricing in manager.load_pricing():
+        if pricing.provider == provider and pricing.model_name == model_name:
+            break
+    records = [UsageRecord(**item) for item in manager.usage_ledger.load(days=1)]
+    cutoff = datetime.now() - timedelta(days=1)
+    recent = [record for record in records if datetime.fromisoformat(record.timestamp) >= cutoff]
+    sum(record.cost for record in recent)
+    return time.perf_counter() - start
+
+
+@pytest.mark.parametrize("history", [10_000, 200_000])
+def test_tracking_overhead_at_large_history(manager, history):
+    """历史记录很多时，每次跟踪调用的开销保持常数级"""
+    now = datetime.now().isoformat()
+    manager.usage_ledger.max_records = None
+    manager.usage_ledger.append_many(_record(i, now) for i in range(history))
+    tracker = TokenTracker(manager)
+
+    legacy = sorted(_legacy_track_overhead(manager, "dashscope", "qwen-turbo") for _ in range(5))[2]
+
+    tracker.track_usage("dashscope", "qwen-turbo", 100, 50, "warmup")  # 首次调用汇总历史
+    latencies = []
+    for i in range(200):
+        start = time.perf_counter()
+        tracker.track_usage("dashscope", "qwen-turbo", 1000, 500, f"session_{i}")
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    tracked = latencies[len(latencies) // 2]
+
+    print(f"\n历史 {history:,} 条: 旧版统计开销 {legacy * 1000:.1f}ms/次, "
+          f"新版完整跟踪调用 {tracked * 1000:.3f}ms/次")
+
+    assert tracked < 5e-3
+    assert tracked * 10 < legacy
+    assert manager.get_usage_statistics(1)["total_requests"] == history + 201
+
+
+def test_aggregates_match_full_scan(manager):
+    """聚合统计与逐条扫描结果一致，只统计查询天数内的记录"""
+    today = datetime.now()
+    records = []
+    for i in range(3000):
+        timestamp = (today - timedelta(days=i % 10, minutes=i % 50)).isoformat()
+        records.append(_record(i, timestamp))
+    manager.usage_ledger.append_many(records)
+
+    for days in (1, 3, 7, 30):
+        stats = manager.get_usage_statistics(days)
+        first_day = (today - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        expected = [r for r in records if r["timestamp"][:10] >= first_day]
+        assert stats["total_requests"] == len(expected)
+        assert stats["total_cost"] == pytest.approx(round(sum(r["cost"] for r in expected), 4))
+        assert stats["total_input_tokens"] == sum(r["input_tokens"] for r in expected)
+        deepseek = [r for r in expected if r["provider"] == "deepseek"]
+        assert stats["provider_stats"]["deepseek"]["requests"] == len(deepseek)
+        assert stats["model_stats"]["deepseek/deepseek-chat"]["output_tokens"] == \
+            sum(r["output_tokens"] for r in deepseek)
+
+
+def test_external_writes_are_folded_in(manager):
+    """其他进程直接写入账本的记录，在下一次统计时合并进聚合"""
+    manager.add_usage_record("dashscope", "qwen-turbo", 1000, 500, "own")
+    assert manager.get_usage_statistics(1)["total_requests"] == 1
+
+    now = datetime.now().isoformat()
+    manager.usage_ledger.append_many(_record(i, now) for i in range(5))
+    assert manager.get_usage_statistics(1)["total_requests"] == 6
+
+    manager.save_usage_records([])
+    assert manager.get_usage_statistics(1)["total_requests"] == 0
+
+
+def test_pricing_cached_until_file_changes(manager, monkeypatch):
+    """定价文件未修改时不重新读取，修改后使用新价格"""
+    assert manager.calculate_cost("dashscope", "qwen-turbo", 1000, 1000) == pytest.approx(0.008)
+
+    reads = []
+    original = manager.load_pricing
+    monkeypatch.setattr(manager, "load_pricing", lambda: reads.append(1) or original())
+    for _ in range(100):
+        manager.calculate_cost("dashscope", "qwen-turbo", 1000, 1000)
+    assert reads == []
+
+    # 外部编辑定价文件
+    data = json.loads(manager.pricing_file.read_text(encoding='utf-8'))
+    for item in data:
+        if item["model_name"] == "qwen-turbo":
+            item["input_price_per_1k"] = 0.01
+    manager.pricing_file.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+    assert manager.calculate_cost("dashscope", "qwen-turbo", 1000, 1000) == pytest.approx(0.016)
+    assert reads == [1]
+
+
+def test_cost_alert_uses_today_aggregate(manager, monkeypatch):
+    """今日成本超过阈值时发出警告，昨天的记录不计入"""
+    # tradingagents.config 包导出了同名的 config_manager 实例，这里取模块本身
+    config_manager_module = sys.modules[ConfigManager.__module__]
+
+    settings = manager.load_settings()
+    settings["cost_alert_threshold"] = 0.05
+    manager.save_settings(settings)
+    yesterday = (datetime.now() - timedelta(days=1)).isoformat()
+    manager.usage_ledger.append_many([{**_record(0, yesterday), "cost": 10.0}])
+
+    alerts = []
+    monkeypatch.setattr(config_manager_module.logger, "warning",
+                        lambda message, **kwargs: alerts.append(message))
+    tracker = TokenTracker(manager)
+    tracker.track_usage("dashscope", "qwen-max", 1000, 100, "s1")  # 今日 0.026
+    assert alerts == []
+    tracker.track_usage("dashscope", "qwen-max", 1000, 100, "s1")  # 今日 0.052
+    assert len(alerts) == 1 and "0.0520" in alerts[0]
+
+
+def test_usage_aggregates_add_is_per_day():
+    """聚合按日期分桶，day_cost 只返回当天成本"""
+    aggregates = UsageAggregates()
+    aggregates.add("2025-01-01T10:00:00", "p", "m", 1.0, 10, 5)
+    aggregates.add("2025-01-01T23:59:59", "p", "m", 2.0, 10, 5)
+    aggregates.add("2025-01-02T00:00:00", "p", "m2", 4.0, 10, 5, requests=3)
+    assert aggregates.day_cost("2025-01-01") == 3.0
+    assert aggregates.day_cost("2025-01-02") == 4.0
+    assert aggregates.day_cost("2025-01-03") == 0.0
+
+
+class _SharedRollupStorage:
+    """MongoDB存储替身：按天汇总集合由多个进程共享，记录读取次数"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.saved = []
+        self.rollup_reads = 0
+
+    def is_connected(self):
+        return True
+
+    def save_usage_record(self, record):
+        self.saved.append(record)
+        return True
+
+    def get_usage_rollups(self, granularity="day", group_by=("provider",), **kwargs):
+        assert granularity == "day" and tuple(group_by) == ("provider", "model_name")
+        self.rollup_reads += 1
+        return [dict(row) for row in self.rows]
+
+    def get_daily_aggregates(self, days=None):
+        return []
+
+
+def test_mongodb_aggregates_read_shared_rollups(manager, monkeypatch):
+    """MongoDB模式：聚合来自共享的按天汇总（含其他进程的记录），按间隔重新读取，其间累加本进程记录"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    storage = _SharedRollupStorage([
+        {"bucket": today, "provider": "dashscope", "model_name": "qwen-turbo",
+         "cost": 1.5, "input_tokens": 3000, "output_tokens": 600, "requests": 3},
+    ])
+    manager.mongodb_storage = storage
+    monkeypatch.setenv("USAGE_AGGREGATES_REFRESH_SECONDS", "3600")
+
+    assert manager.get_usage_aggregates().day_cost() == pytest.approx(1.5)
+    record = manager.add_usage_record("dashscope", "qwen-turbo", 1000, 500, "own")
+    assert storage.saved == [record]
+    assert manager.get_usage_aggregates().day_cost() == pytest.approx(1.5 + record.cost)
+    assert storage.rollup_reads == 1
+
+    # 另一个工作进程写入的记录在下一次读取汇总时计入
+    storage.rows[0]["cost"] = 4.0 + record.cost
+    monkeypatch.setenv("USAGE_AGGREGATES_REFRESH_SECONDS", "0")
+    assert manager.get_usage_aggregates().day_cost() == pytest.approx(4.0 + record.cost)
+    assert storage.rollup_reads == 2
+
+
+def test_mongodb_add_record_holds_aggregates_lock(manager, monkeypatch):
+    """MongoDB模式：本进程记录在聚合锁内累加，不与定期重新读取交错"""
+    storage = _SharedRollupStorage([])
+    manager.mongodb_storage = storage
+    monkeypatch.setenv("USAGE_AGGREGATES_REFRESH_SECONDS", "3600")
+
+    class _LockCheckingAggregates(UsageAggregates):
+        def add_record(self, record):
+            assert manager._aggregates_lock.locked()
+            super().add_record(record)
+
+    monkeypatch.setattr(manager, "_load_mongodb_aggregates", lambda mongodb: _LockCheckingAggregates())
+    manager.get_usage_aggregates()
+    record = manager.add_usage_record("dashscope", "qwen-turbo", 1000, 500, "own")
+    assert manager.get_usage_aggregates().day_cost() == pytest.approx(record.cost)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
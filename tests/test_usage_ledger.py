@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+测试本地使用记录账本
+对比旧版整文件重写与只追加账本在已有10k/1M条记录时的单条写入延迟，
+并验证多线程/多进程并发写入不丢记录、压缩和保留策略、旧版 usage.json 迁移
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import asdict
+from datetime import datetime, timedelta
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from tradingagents.config.config_manager import ConfigManager, UsageRecord
+from tradingagents.config.usage_ledger import UsageLedger
+
+
+def _record(i: int, timestamp: str = None) -> dict:
+    return {
+        "timestamp": timestamp or datetime.now().isoformat(),
+        "provider": "dashscope", "model_name": "qwen-turbo",
+        "input_tokens": 1000 + i % 500, "output_tokens": 300 + i % 200,
+        "cost": 0.0038, "session_id": f"session_{i // 50}", "analysis_type": "stock_analysis",
+    }
+
+
+def _prefill(ledger: UsageLedger, count: int, chunk: int = 100_000):
+    for start in range(0, count, chunk):
+        ledger.append_many(_record(i) for i in range(start, min(count, start + chunk)))
+
+
+def _median_append_ms(ledger: UsageLedger, samples: int = 300) -> float:
+    latencies = []
+    for i in range(samples):
+        start = time.perf_counter()
+        ledger.append(_record(i))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1000
+
+
+def _legacy_append_ms(path, samples: int = 20) -> float:
+    """旧版实现：读取整个 usage.json，追加一条后整体重写"""
+    latencies = []
+    for i in range(samples):
+        start = time.perf_counter()
+        with open(path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        records.append(_record(i))
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1000
+
+
+def test_append_latency_independent_of_history(tmp_path):
+    """账本单条写入延迟不随已有记录数增长，明显低于旧版整文件重写"""
+    legacy_path = tmp_path / "usage.json"
+    with open(legacy_path, 'w', encoding='utf-8') as f:
+        json.dump([_record(i) for i in range(10_000)], f, ensure_ascii=False, indent=2)
+    legacy_10k = _legacy_append_ms(legacy_path)
+
+    ledger = UsageLedger(str(tmp_path / "usage_10k.db"), max_records=None)
+    _prefill(ledger, 10_000)
+    ledger_10k = _median_append_ms(ledger)
+
+    ledger = UsageLedger(str(tmp_path / "usage_1m.db"), max_records=None)
+    _prefill(ledger, 1_000_000)
+    ledger_1m = _median_append_ms(ledger)
+
+    print(f"\n单条写入延迟中位数: 旧版JSON@10k {legacy_10k:.1f}ms, "
+          f"账本@10k {ledger_10k:.3f}ms, 账本@1M {ledger_1m:.3f}ms")
+
+    assert ledger.count() == 1_000_300
+    assert ledger_10k * 20 < legacy_10k
+    assert ledger_1m < 5
+    assert ledger_1m < max(5 * ledger_10k, 1.0)
+
+
+def test_concurrent_writers_lose_nothing(tmp_path):
+    """多线程和多进程同时写入同一账本，记录不丢失"""
+    db_path = str(tmp_path / "usage.db")
+    ledger = UsageLedger(db_path, max_records=None)
+
+    script = (
+        "import sys; sys.path.insert(0, %r)\n"
+        "from tradingagents.config.usage_ledger import UsageLedger\n"
+        "ledger = UsageLedger(%r, max_records=None)\n"
+        "for i in range(200):\n"
+        "    ledger.append({'timestamp': '2025-01-01T00:00:00', 'provider': 'p', 'model_name': 'm',\n"
+        "                   'input_tokens': 1, 'output_tokens': 1, 'cost': 0.1,\n"
+        "                   'session_id': 'proc', 'analysis_type': 'stock_analysis'})\n"
+    ) % (project_root, db_path)
+    processes = [subprocess.Popen([sys.executable, "-c", script]) for _ in range(2)]
+
+    def write(worker):
+        for i in range(200):
+            ledger.append(_record(worker * 1000 + i))
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for process in processes:
+        assert process.wait(timeout=120) == 0
+
+    assert ledger.count() == 8 * 200 + 2 * 200
+
+
+def test_compaction_and_retention(tmp_path):
+    """压缩时只保留最近 max_records 条，并删除超过保留天数的记录"""
+    ledger = UsageLedger(str(tmp_path / "usage.db"), max_records=100, retention_days=30,
+                         compact_interval=50)
+    old = (datetime.now() - timedelta(days=60)).isoformat()
+    ledger.append_many(_record(i, timestamp=old) for i in range(20))
+    for i in range(149):
+        ledger.append(_record(i))
+    # 第100次写入时压缩：删除过期记录并截断到100条，之后继续追加
+    assert ledger.count() == 149
+    # 第150次写入触发下一次压缩
+    ledger.append(_record(149))
+    assert ledger.count() == 100
+
+    records = ledger.load()
+    assert all(record["timestamp"] > old for record in records)
+    assert records[-1]["input_tokens"] == _record(149)["input_tokens"]
+    assert len(ledger.load(limit=10)) == 10
+    assert ledger.load(limit=1) == records[-1:]
+
+
+def test_config_manager_uses_ledger(tmp_path, monkeypatch):
+    """ConfigManager 写入只追加到账本，旧版 usage.json 首次访问时迁移"""
+    monkeypatch.setenv("USE_MONGODB_STORAGE", "false")
+    legacy = [asdict(UsageRecord(**_record(i))) for i in range(5)]
+    (tmp_path / "usage.json").write_text(json.dumps(legacy), encoding='utf-8')
+
+    manager = ConfigManager(str(tmp_path))
+    manager.add_usage_record("dashscope", "qwen-turbo", 1000, 500, "session_x")
+
+    records = manager.load_usage_records()
+    assert len(records) == 6
+    assert records[-1].session_id == "session_x"
+    assert records[-1].cost == pytest.approx(0.005)
+    assert not (tmp_path / "usage.json").exists()
+    assert (tmp_path / "usage.json.migrated").exists()
+
+    stats = manager.get_usage_statistics(1)
+    assert stats["total_requests"] == 6
+    assert stats["provider_stats"]["dashscope"]["requests"] == 6
+
+    settings = manager.load_settings()
+    settings["max_usage_records"] = 3
+    manager.save_settings(settings)
+    manager.usage_ledger.compact()
+    assert len(manager.load_usage_records()) == 3
+
+    manager.save_usage_records([])
+    assert manager.load_usage_records() == []
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+测试使用量小时/天汇总和Token统计页面
+验证汇总与原始记录一致、压缩后汇总仍保留、分页查询，
+并在100万条使用记录下测量Token统计页面的渲染时间（对比旧版加载全部原始记录的耗时）
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from tradingagents.config.config_manager import ConfigManager
+from tradingagents.config.usage_ledger import UsageLedger
+
+PAGE_SCRIPT = """
+import os, sys
+sys.path.insert(0, os.environ["TEST_PROJECT_ROOT"])
+sys.path.insert(0, os.path.join(os.environ["TEST_PROJECT_ROOT"], "web"))
+from tradingagents.config.config_manager import ConfigManager
+from web.modules import token_statistics
+token_statistics.config_manager = ConfigManager(os.environ["TEST_USAGE_CONFIG_DIR"])
+token_statistics.render_token_statistics()
+"""
+
+
+def _records(count: int, days: int = 30, sessions_every: int = 50):
+    now = datetime.now()
+    providers = [("dashscope", "qwen-turbo"), ("dashscope", "qwen-plus-latest"), ("deepseek", "deepseek-chat")]
+    for i in range(count):
+        provider, model_name = providers[i % 3]
+        timestamp = now - timedelta(seconds=(i * days * 86400) // count)
+        yield {
+            "timestamp": timestamp.isoformat(), "provider": provider, "model_name": model_name,
+            "input_tokens": 1000 + i % 700, "output_tokens": 200 + i % 300,
+            "cost": round(0.0005 * (i % 13), 6), "session_id": f"session_{i // sessions_every}",
+            "analysis_type": "stock_analysis",
+        }
+
+
+def _fill(ledger: UsageLedger, count: int, chunk: int = 100_000):
+    batch = []
+    for record in _records(count):
+        batch.append(record)
+        if len(batch) == chunk:
+            ledger.append_many(batch)
+            batch = []
+    if batch:
+        ledger.append_many(batch)
+
+
+def test_rollups_match_raw_records(tmp_path):
+    """按小时/按天的汇总与原始记录逐条统计一致"""
+    ledger = UsageLedger(str(tmp_path / "usage.db"), max_records=None)
+    records = list(_records(5000, days=3, sessions_every=7))
+    for record in records[:100]:
+        ledger.append(record)
+    ledger.append_many(records[100:])
+
+    for granularity, length in (("hour", 13), ("day", 10)):
+        rows = ledger.rollups(granularity, group_by=("provider",))
+        expected = {}
+        for record in records:
+            key = (record["timestamp"][:length], record["provider"])
+            expected[key] = expected.get(key, 0) + record["cost"]
+        assert {(row["bucket"], row["provider"]): row["cost"] for row in rows} == pytest.approx(expected)
+
+    sessions = ledger.rollups("day", group_by=("session_id",), by_bucket=False)
+    assert len(sessions) == len({record["session_id"] for record in records})
+    assert sum(row["requests"] for row in sessions) == 5000
+
+    top = ledger.rollups("day", group_by=("session_id",), by_bucket=False, limit=5)
+    assert [row["cost"] for row in top] == sorted((row["cost"] for row in sessions), reverse=True)[:5]
+
+    day = records[0]["timestamp"][:10]
+    [total] = ledger.rollups("day", start=day, end=day, group_by=())
+    assert total["requests"] == sum(1 for record in records if record["timestamp"][:10] == day)
+
+
+def test_rollups_survive_compaction_and_upgrade(tmp_path):
+    """压缩只删除原始记录，汇总保留；旧版账本打开时从原始记录重建汇总"""
+    db_path = tmp_path / "usage.db"
+    ledger = UsageLedger(str(db_path), max_records=10)
+    ledger.append_many(_records(100))
+    ledger.compact()
+    assert ledger.count() == 10
+    assert sum(row["requests"] for row in ledger.rollups("day", group_by=())) == 100
+
+    # 模拟038版本的账本：没有汇总表
+    conn = ledger._connection()
+    conn.execute("DROP TABLE usage_rollups")
+    conn.execute("PRAGMA user_version=0")
+    reopened = UsageLedger(str(db_path), max_records=10)
+    assert sum(row["requests"] for row in reopened.rollups("day", group_by=())) == 10
+
+
+def test_hourly_rollups_pruned_after_retention(tmp_path):
+    """压缩时删除超过保留天数的按小时汇总，按天汇总全部保留"""
+    ledger = UsageLedger(str(tmp_path / "usage.db"), rollup_hour_retention_days=7)
+    ledger.append_many(_records(300, days=30))
+    cutoff = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%dT%H")
+    assert any(row["bucket"] < cutoff for row in ledger.rollups("hour", group_by=()))
+
+    ledger.compact()
+    hourly = ledger.rollups("hour", group_by=())
+    assert hourly and all(row["bucket"] >= cutoff for row in hourly)
+    assert sum(row["requests"] for row in ledger.rollups("day", group_by=())) == 300
+    assert ledger.count() == 300
+
+
+def test_records_page(tmp_path, monkeypatch):
+    """分页查询按时间倒序返回当前页和总数"""
+    monkeypatch.setenv("USE_MONGODB_STORAGE", "false")
+    manager = ConfigManager(str(tmp_path))
+    manager.usage_ledger.append_many(_records(95, days=2))
+
+    first, total = manager.load_usage_records_page(days=7, page=1, page_size=20)
+    last, _ = manager.load_usage_records_page(days=7, page=5, page_size=20)
+    assert total == 95
+    assert len(first) == 20 and len(last) == 15
+    assert first[0].timestamp > first[-1].timestamp > last[0].timestamp
+
+    rollups = manager.get_usage_rollups(7, "day", group_by=())
+    assert sum(row["requests"] for row in rollups) == 95
+
+
+def test_token_statistics_page_render_at_1m(tmp_path, monkeypatch):
+    """100万条使用记录下Token统计页面渲染时间"""
+    from streamlit.testing.v1 import AppTest
+
+    monkeypatch.setenv("USE_MONGODB_STORAGE", "false")
+    manager = ConfigManager(str(tmp_path))
+    manager.usage_ledger.max_records = None
+    start = time.perf_counter()
+    _fill(manager.usage_ledger, 1_000_000)
+    fill_time = time.perf_counter() - start
+
+    # 旧版页面在绘图前加载全部原始记录并逐条过滤
+    start = time.perf_counter()
+    records = manager.load_usage_records()
+    cutoff = datetime.now() - timedelta(days=30)
+    recent = [record for record in records if datetime.fromisoformat(record.timestamp) >= cutoff]
+    legacy_load = time.perf_counter() - start
+    del records, recent
+
+    monkeypatch.setenv("TEST_PROJECT_ROOT", project_root)
+    monkeypatch.setenv("TEST_USAGE_CONFIG_DIR", str(tmp_path))
+    app = AppTest.from_string(PAGE_SCRIPT, default_timeout=120)
+    start = time.perf_counter()
+    app.run()
+    first_render = time.perf_counter() - start
+    start = time.perf_counter()
+    app.run()
+    rerun = time.perf_counter() - start
+
+    print(f"\n写入100万条 {fill_time:.1f}s; 旧版加载并过滤原始记录 {legacy_load:.2f}s; "
+          f"新版页面首次渲染 {first_render:.2f}s, 重新运行 {rerun:.2f}s")
+
+    assert not app.exception
+    assert len(app.dataframe) >= 2
+    # 详细记录表只包含一页
+    assert len(app.dataframe[-1].value) == 20
+    assert rerun * 5 < legacy_load
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
@@ -1,14 +1,20 @@
 import time
 import json
 
+from tradingagents.agents.utils.context_assembler import ContextAssembler
+from tradingagents.agents.utils.debate_log import render_history
+
 # 导入统一日志系统
 from tradingagents.utils.logging_init import get_logger
 logger = get_logger("default")
 
 
-def create_research_manager(llm, memory):
+def create_research_manager(llm, memory, context_assembler=None):
+    context_assembler = context_assembler or ContextAssembler(budget_tokens=0)
+
     def research_manager_node(state) -> dict:
-        history = state["investment_debate_state"].get("history", "")
+        debate_turns = state.get("investment_debate_turns", [])
+        history = render_history(debate_turns)
         market_research_report = state["market_report"]
         sentiment_report = state["sentiment_report"]
         news_report = state["news_report"]
@@ -29,6 +35,18 @@ def create_research_manager(llm, memory):
         for i, rec in enumerate(past_memories, 1):
             past_memory_str += rec["recommendation"] + "\n\n"
 
+        # 按token预算组装上下文（超长报告使用摘要，早期辩论发言只保留开头）
+        context = context_assembler.assemble(
+            "research_manager",
+            reports={
+                "market": market_research_report,
+                "sentiment": sentiment_report,
+                "news": news_report,
+                "fundamentals": fundamentals_report,
+            },
+            history=history,
+        )
+
         prompt = f"""作为投资组合经理和辩论主持人，您的职责是批判性地评估这轮辩论并做出明确决策：支持看跌分析师、看涨分析师，或者仅在基于所提出论点有强有力理由时选择持有。
 
 简洁地总结双方的关键观点，重点关注最有说服力的证据或推理。您的建议——买入、卖出或持有——必须明确且可操作。避免仅仅因为双方都有有效观点就默认选择持有；要基于辩论中最强有力的论点做出承诺。
@@ -53,26 +71,27 @@ def create_research_manager(llm, memory):
 \"{past_memory_str}\"
 
 以下是综合分析报告：
-市场研究：{market_research_report}
+市场研究：{context.reports['market']}
 
-情绪分析：{sentiment_report}
+情绪分析：{context.reports['sentiment']}
 
-新闻分析：{news_report}
+新闻分析：{context.reports['news']}
 
-基本面分析：{fundamentals_report}
+基本面分析：{context.reports['fundamentals']}
 
 以下是辩论：
 辩论历史：
-{history}
+{context.history}
 
 请用中文撰写所有分析内容和建议。"""
         response = llm.invoke(prompt)
 
+        # 辩论结束，渲染一次完整历史供报告展示和反思使用
         new_investment_debate_state = {
             "judge_decision": response.content,
-            "history": investment_debate_state.get("history", ""),
-            "bear_history": investment_debate_state.get("bear_history", ""),
-            "bull_history": investment_debate_state.get("bull_history", ""),
+            "history": history,
+            "bear_history": render_history(debate_turns, speaker="Bear"),
+            "bull_history": render_history(debate_turns, speaker="Bull"),
             "current_response": response.content,
             "count": investment_debate_state["count"],
         }
@@ -1,17 +1,23 @@
 import time
 import json
 
+from tradingagents.agents.utils.context_assembler import ContextAssembler
+from tradingagents.agents.utils.debate_log import render_history
+
 # 导入统一日志系统
 from tradingagents.utils.logging_init import get_logger
 logger = get_logger("default")
 
 
-def create_risk_manager(llm, memory):
+def create_risk_manager(llm, memory, context_assembler=None):
+    context_assembler = context_assembler or ContextAssembler(budget_tokens=0)
+
     def risk_manager_node(state) -> dict:
 
         company_name = state["company_of_interest"]
 
-        history = state["risk_debate_state"]["history"]
+        debate_turns = state.get("risk_debate_turns", [])
+        history = render_history(debate_turns)
         risk_debate_state = state["risk_debate_state"]
         market_research_report = state["market_report"]
         news_report = state["news_report"]
@@ -32,6 +38,9 @@ def create_risk_manager(llm, memory):
         for i, rec in enumerate(past_memories, 1):
             past_memory_str += rec["recommendation"] + "\n\n"
 
+        # 按token预算组装上下文（早期辩论发言只保留开头）
+        context = context_assembler.assemble("risk_manager", history=history)
+
         prompt = f"""作为风险管理委员会主席和辩论主持人，您的目标是评估三位风险分析师——激进、中性和安全/保守——之间的辩论，并确定交易员的最佳行动方案。您的决策必须产生明确的建议：买入、卖出或持有。只有在有具体论据强烈支持时才选择持有，而不是在所有方面都似乎有效时作为后备选择。力求清晰和果断。
 
 决策指导原则：
@@ -47,7 +56,7 @@ def create_risk_manager(llm, memory):
 ---
 
 **分析师辩论历史：**
-{history}
+{context.history}
 
 ---
 
@@ -103,12 +112,13 @@ def create_risk_manager(llm, memory):
 
 注意：此为系统默认建议，建议结合人工分析做出最终决策。"""
 
+        # 辩论结束，渲染一次完整历史供报告展示和反思使用
         new_risk_debate_state = {
             "judge_decision": response_content,
-            "history": risk_debate_state["history"],
-            "risky_history": risk_debate_state["risky_history"],
-            "safe_history": risk_debate_state["safe_history"],
-            "neutral_history": risk_debate_state["neutral_history"],
+            "history": history,
+            "risky_history": render_history(debate_turns, speaker="Risky"),
+            "safe_history": render_history(debate_turns, speaker="Safe"),
+            "neutral_history": render_history(debate_turns, speaker="Neutral"),
             "latest_speaker": "Judge",
             "current_risky_response": risk_debate_state["current_risky_response"],
             "current_safe_response": risk_debate_state["current_safe_response"],
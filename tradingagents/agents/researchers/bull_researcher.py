@@ -2,18 +2,24 @@ from langchain_core.messages import AIMessage
 import time
 import json
 
+from tradingagents.agents.utils.context_assembler import ContextAssembler
+from tradingagents.agents.utils.debate_log import INVEST_DEBATE_SPEAKERS, make_turn, render_history
+
 # 导入统一日志系统
 from tradingagents.utils.logging_init import get_logger
 logger = get_logger("default")
 
 
-def create_bull_researcher(llm, memory):
+def create_bull_researcher(llm, memory, context_assembler=None):
+    context_assembler = context_assembler or ContextAssembler(budget_tokens=0)
+
     def bull_node(state) -> dict:
         logger.debug(f"🐂 [DEBUG] ===== 看涨研究员节点开始 =====")
 
         investment_debate_state = state["investment_debate_state"]
-        history = investment_debate_state.get("history", "")
-        bull_history = investment_debate_state.get("bull_history", "")
+        # 发言记录按需渲染为提示词中的辩论历史
+        debate_turns = state.get("investment_debate_turns", [])
+        history = render_history(debate_turns)
 
         current_response = investment_debate_state.get("current_response", "")
         market_research_report = state["market_report"]
@@ -54,6 +60,18 @@ def create_bull_researcher(llm, memory):
         for i, rec in enumerate(past_memories, 1):
             past_memory_str += rec["recommendation"] + "\n\n"
 
+        # 按token预算组装上下文（超长报告使用摘要，早期辩论发言只保留开头）
+        context = context_assembler.assemble(
+            "bull_researcher",
+            reports={
+                "market": market_research_report,
+                "sentiment": sentiment_report,
+                "news": news_report,
+                "fundamentals": fundamentals_report,
+            },
+            history=history,
+        )
+
         prompt = f"""你是一位看涨分析师，负责为股票 {company_name} 的投资建立强有力的论证。
 
 ⚠️ 重要提醒：当前分析的是 {'中国A股' if is_china else '海外股票'}，所有价格和估值请使用 {currency}（{currency_symbol}）作为单位。
@@ -68,11 +86,11 @@ def create_bull_researcher(llm, memory):
 - 参与讨论：以对话风格呈现你的论点，直接回应看跌分析师的观点并进行有效辩论，而不仅仅是列举数据
 
 可用资源：
-市场研究报告：{market_research_report}
-社交媒体情绪报告：{sentiment_report}
-最新世界事务新闻：{news_report}
-公司基本面报告：{fundamentals_report}
-辩论对话历史：{history}
+市场研究报告：{context.reports['market']}
+社交媒体情绪报告：{context.reports['sentiment']}
+最新世界事务新闻：{context.reports['news']}
+公司基本面报告：{context.reports['fundamentals']}
+辩论对话历史：{context.history}
 最后的看跌论点：{current_response}
 类似情况的反思和经验教训：{past_memory_str}
 
@@ -85,14 +103,16 @@ def create_bull_researcher(llm, memory):
 
         argument = f"Bull Analyst: {response.content}"
 
+        turn = make_turn("Bull", investment_debate_state["count"], response.content, len(INVEST_DEBATE_SPEAKERS))
+
         new_investment_debate_state = {
-            "history": history + "\n" + argument,
-            "bull_history": bull_history + "\n" + argument,
-            "bear_history": investment_debate_state.get("bear_history", ""),
             "current_response": argument,
             "count": investment_debate_state["count"] + 1,
         }
 
-        return {"investment_debate_state": new_investment_debate_state}
+        return {
+            "investment_debate_state": new_investment_debate_state,
+            "investment_debate_turns": [turn],
+        }
 
     return bull_node
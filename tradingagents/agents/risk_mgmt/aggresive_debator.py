@@ -1,16 +1,22 @@
 import time
 import json
 
+from tradingagents.agents.utils.context_assembler import ContextAssembler
+from tradingagents.agents.utils.debate_log import RISK_DEBATE_SPEAKERS, make_turn, render_history
+
 # 导入统一日志系统
 from tradingagents.utils.logging_init import get_logger
 logger = get_logger("default")
 
 
-def create_risky_debator(llm):
+def create_risky_debator(llm, context_assembler=None):
+    context_assembler = context_assembler or ContextAssembler(budget_tokens=0)
+
     def risky_node(state) -> dict:
         risk_debate_state = state["risk_debate_state"]
-        history = risk_debate_state.get("history", "")
-        risky_history = risk_debate_state.get("risky_history", "")
+        # 发言记录按需渲染为提示词中的辩论历史
+        debate_turns = state.get("risk_debate_turns", [])
+        history = render_history(debate_turns)
 
         current_safe_response = risk_debate_state.get("current_safe_response", "")
         current_neutral_response = risk_debate_state.get("current_neutral_response", "")
@@ -22,17 +28,29 @@ def create_risky_debator(llm):
 
         trader_decision = state["trader_investment_plan"]
 
+        # 按token预算组装上下文（超长报告使用摘要，早期辩论发言只保留开头）
+        context = context_assembler.assemble(
+            "risky_analyst",
+            reports={
+                "market": market_research_report,
+                "sentiment": sentiment_report,
+                "news": news_report,
+                "fundamentals": fundamentals_report,
+            },
+            history=history,
+        )
+
         prompt = f"""作为激进风险分析师，您的职责是积极倡导高回报、高风险的投资机会，强调大胆策略和竞争优势。在评估交易员的决策或计划时，请重点关注潜在的上涨空间、增长潜力和创新收益——即使这些伴随着较高的风险。使用提供的市场数据和情绪分析来加强您的论点，并挑战对立观点。具体来说，请直接回应保守和中性分析师提出的每个观点，用数据驱动的反驳和有说服力的推理进行反击。突出他们的谨慎态度可能错过的关键机会，或者他们的假设可能过于保守的地方。以下是交易员的决策：
 
 {trader_decision}
 
 您的任务是通过质疑和批评保守和中性立场来为交易员的决策创建一个令人信服的案例，证明为什么您的高回报视角提供了最佳的前进道路。将以下来源的见解纳入您的论点：
 
-市场研究报告：{market_research_report}
-社交媒体情绪报告：{sentiment_report}
-最新世界事务报告：{news_report}
-公司基本面报告：{fundamentals_report}
-以下是当前对话历史：{history} 以下是保守分析师的最后论点：{current_safe_response} 以下是中性分析师的最后论点：{current_neutral_response}。如果其他观点没有回应，请不要虚构，只需提出您的观点。
+市场研究报告：{context.reports['market']}
+社交媒体情绪报告：{context.reports['sentiment']}
+最新世界事务报告：{context.reports['news']}
+公司基本面报告：{context.reports['fundamentals']}
+以下是当前对话历史：{context.history} 以下是保守分析师的最后论点：{current_safe_response} 以下是中性分析师的最后论点：{current_neutral_response}。如果其他观点没有回应，请不要虚构，只需提出您的观点。
 
 积极参与，解决提出的任何具体担忧，反驳他们逻辑中的弱点，并断言承担风险的好处以超越市场常规。专注于辩论和说服，而不仅仅是呈现数据。挑战每个反驳点，强调为什么高风险方法是最优的。请用中文以对话方式输出，就像您在说话一样，不使用任何特殊格式。"""
 
@@ -40,20 +58,19 @@ def create_risky_debator(llm):
 
         argument = f"Risky Analyst: {response.content}"
 
+        turn = make_turn("Risky", risk_debate_state["count"], response.content, len(RISK_DEBATE_SPEAKERS))
+
         new_risk_debate_state = {
-            "history": history + "\n" + argument,
-            "risky_history": risky_history + "\n" + argument,
-            "safe_history": risk_debate_state.get("safe_history", ""),
-            "neutral_history": risk_debate_state.get("neutral_history", ""),
             "latest_speaker": "Risky",
             "current_risky_response": argument,
             "current_safe_response": risk_debate_state.get("current_safe_response", ""),
-            "current_neutral_response": risk_debate_state.get(
-                "current_neutral_response", ""
-            ),
+            "current_neutral_response": risk_debate_state.get("current_neutral_response", ""),
             "count": risk_debate_state["count"] + 1,
         }
 
-        return {"risk_debate_state": new_risk_debate_state}
+        return {
+            "risk_debate_state": new_risk_debate_state,
+            "risk_debate_turns": [turn],
+        }
 
     return risky_node
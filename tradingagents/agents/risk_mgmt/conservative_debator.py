@@ -2,16 +2,22 @@ from langchain_core.messages import AIMessage
 import time
 import json
 
+from tradingagents.agents.utils.context_assembler import ContextAssembler
+from tradingagents.agents.utils.debate_log import RISK_DEBATE_SPEAKERS, make_turn, render_history
+
 # 导入统一日志系统
 from tradingagents.utils.logging_init import get_logger
 logger = get_logger("default")
 
 
-def create_safe_debator(llm):
+def create_safe_debator(llm, context_assembler=None):
+    context_assembler = context_assembler or ContextAssembler(budget_tokens=0)
+
     def safe_node(state) -> dict:
         risk_debate_state = state["risk_debate_state"]
-        history = risk_debate_state.get("history", "")
-        safe_history = risk_debate_state.get("safe_history", "")
+        # 发言记录按需渲染为提示词中的辩论历史
+        debate_turns = state.get("risk_debate_turns", [])
+        history = render_history(debate_turns)
 
         current_risky_response = risk_debate_state.get("current_risky_response", "")
         current_neutral_response = risk_debate_state.get("current_neutral_response", "")
@@ -23,17 +29,29 @@ def create_safe_debator(llm):
 
         trader_decision = state["trader_investment_plan"]
 
+        # 按token预算组装上下文（超长报告使用摘要，早期辩论发言只保留开头）
+        context = context_assembler.assemble(
+            "safe_analyst",
+            reports={
+                "market": market_research_report,
+                "sentiment": sentiment_report,
+                "news": news_report,
+                "fundamentals": fundamentals_report,
+            },
+            history=history,
+        )
+
         prompt = f"""作为安全/保守风险分析师，您的主要目标是保护资产、最小化波动性，并确保稳定、可靠的增长。您优先考虑稳定性、安全性和风险缓解，仔细评估潜在损失、经济衰退和市场波动。在评估交易员的决策或计划时，请批判性地审查高风险要素，指出决策可能使公司面临不当风险的地方，以及更谨慎的替代方案如何能够确保长期收益。以下是交易员的决策：
 
 {trader_decision}
 
 您的任务是积极反驳激进和中性分析师的论点，突出他们的观点可能忽视的潜在威胁或未能优先考虑可持续性的地方。直接回应他们的观点，利用以下数据来源为交易员决策的低风险方法调整建立令人信服的案例：
 
-市场研究报告：{market_research_report}
-社交媒体情绪报告：{sentiment_report}
-最新世界事务报告：{news_report}
-公司基本面报告：{fundamentals_report}
-以下是当前对话历史：{history} 以下是激进分析师的最后回应：{current_risky_response} 以下是中性分析师的最后回应：{current_neutral_response}。如果其他观点没有回应，请不要虚构，只需提出您的观点。
+市场研究报告：{context.reports['market']}
+社交媒体情绪报告：{context.reports['sentiment']}
+最新世界事务报告：{context.reports['news']}
+公司基本面报告：{context.reports['fundamentals']}
+以下是当前对话历史：{context.history} 以下是激进分析师的最后回应：{current_risky_response} 以下是中性分析师的最后回应：{current_neutral_response}。如果其他观点没有回应，请不要虚构，只需提出您的观点。
 
 通过质疑他们的乐观态度并强调他们可能忽视的潜在下行风险来参与讨论。解决他们的每个反驳点，展示为什么保守立场最终是公司资产最安全的道路。专注于辩论和批评他们的论点，证明低风险策略相对于他们方法的优势。请用中文以对话方式输出，就像您在说话一样，不使用任何特殊格式。"""
 
@@ -41,22 +59,19 @@ def create_safe_debator(llm):
 
         argument = f"Safe Analyst: {response.content}"
 
+        turn = make_turn("Safe", risk_debate_state["count"], response.content, len(RISK_DEBATE_SPEAKERS))
+
         new_risk_debate_state = {
-            "history": history + "\n" + argument,
-            "risky_history": risk_debate_state.get("risky_history", ""),
-            "safe_history": safe_history + "\n" + argument,
-            "neutral_history": risk_debate_state.get("neutral_history", ""),
             "latest_speaker": "Safe",
-            "current_risky_response": risk_debate_state.get(
-                "current_risky_response", ""
-            ),
+            "current_risky_response": risk_debate_state.get("current_risky_response", ""),
             "current_safe_response": argument,
-            "current_neutral_response": risk_debate_state.get(
-                "current_neutral_response", ""
-            ),
+            "current_neutral_response": risk_debate_state.get("current_neutral_response", ""),
             "count": risk_debate_state["count"] + 1,
         }
 
-        return {"risk_debate_state": new_risk_debate_state}
+        return {
+            "risk_debate_state": new_risk_debate_state,
+            "risk_debate_turns": [turn],
+        }
 
     return safe_node
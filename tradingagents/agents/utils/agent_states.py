@@ -1,10 +1,12 @@
-from typing import Annotated, Sequence
+import operator
+from typing import Annotated, List, Sequence
 from datetime import date, timedelta, datetime
 from typing_extensions import TypedDict, Optional
 from langchain_openai import ChatOpenAI
 from tradingagents.agents import *
 from langgraph.prebuilt import ToolNode
 from langgraph.graph import END, StateGraph, START, MessagesState
+from tradingagents.agents.utils.debate_log import DebateTurn
 
 # 导入统一日志系统
 from tradingagents.utils.logging_init import get_logger
@@ -12,6 +14,8 @@ logger = get_logger("default")
 
 
 # Researcher team state
+# 辩论发言记录在 AgentState.investment_debate_turns 中，
+# 以下历史字符串仅在研究经理做出决策时渲染一次，供报告/反思使用
 class InvestDebateState(TypedDict):
     bull_history: Annotated[
         str, "Bullish Conversation history"
@@ -26,6 +30,7 @@ class InvestDebateState(TypedDict):
 
 
 # Risk management team state
+# 辩论发言记录在 AgentState.risk_debate_turns 中，历史字符串由风险经理最终渲染
 class RiskDebateState(TypedDict):
     risky_history: Annotated[
         str, "Risky Agent's Conversation history"
@@ -70,6 +75,10 @@ class AgentState(MessagesState):
         InvestDebateState, "Current state of the debate on if to invest or not"
     ]
     investment_plan: Annotated[str, "Plan generated by the Analyst"]
+    # 只追加的发言记录，节点只返回新发言，由reducer追加
+    investment_debate_turns: Annotated[List[DebateTurn], operator.add]
+    # 并行开场模式下各发言人第一轮发言的暂存区，由合并节点按固定顺序写入发言记录
+    investment_debate_openings: Annotated[List[DebateTurn], operator.add]
 
     trader_investment_plan: Annotated[str, "Plan generated by the Trader"]
 
@@ -77,4 +86,6 @@ class AgentState(MessagesState):
     risk_debate_state: Annotated[
         RiskDebateState, "Current state of the debate on evaluating risk"
     ]
+    risk_debate_turns: Annotated[List[DebateTurn], operator.add]
+    risk_debate_openings: Annotated[List[DebateTurn], operator.add]
     final_trade_decision: Annotated[str, "Final decision made by the Risk Analysts"]
@@ -0,0 +1,289 @@
+"""
+上下文组装器
+为研究员、风险辩论者和经理的提示词按Agent控制token预算：
+- 超出预算的分析报告压缩为摘要（按内容哈希缓存，同一次分析中所有下游Agent复用）
+- 辩论历史保留最近几轮原文，更早的发言只保留开头部分
+并按Agent统计压缩前后的上下文token数
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from tradingagents.config.env_utils import parse_int_env
+
+# 导入日志模块
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('agents')
+
+
+# 默认每个Agent的上下文token预算（0 表示不限制，默认不压缩）
+DEFAULT_CONTEXT_TOKEN_BUDGET = 0
+# 辩论历史最多占用的预算比例，其余分配给分析报告
+DEFAULT_HISTORY_SHARE = 0.4
+# 保留原文的最近发言数
+DEFAULT_RECENT_TURNS = 3
+# 早期发言压缩后保留的token数
+OLDER_TURN_TOKENS = 80
+
+_CJK_RE = re.compile(r"[　-〿㐀-䶿一-鿿＀-￯]")
+_SPEAKER_RE = re.compile(
+    r"\n(?=(?:Bull Analyst|Bear Analyst|Risky Analyst|Safe Analyst|Neutral Analyst):)"
+)
+# 摘要优先保留的关键信息
+_KEY_TERMS = (
+    "建议", "结论", "总结", "目标价", "风险", "买入", "卖出", "持有", "估值",
+    "支撑", "阻力", "市盈率", "营收", "利润", "增长", "趋势",
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """本地估算文本token数：中日韩字符按1个token计，其余按4字符1个token计"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """截取文本开头，使其不超过指定token数"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low].rstrip() + "……"
+
+
+def condense_report(report: str, max_tokens: int) -> str:
+    """
+    抽取式压缩报告：保留标题和含数据/关键结论的行，按原顺序输出，直到达到token上限
+    """
+    if estimate_tokens(report) <= max_tokens:
+        return report
+
+    lines = [line for line in report.splitlines() if line.strip()]
+    scored = []
+    for index, line in enumerate(lines):
+        stripped = line.strip()
+        score = 0
+        if stripped.startswith("#"):
+            score += 3
+        if any(term in stripped for term in _KEY_TERMS):
+            score += 2
+        if re.search(r"\d", stripped):
+            score += 1
+        scored.append((score, index))
+
+    # 高分优先，同分按原顺序
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    selected = set()
+    used = 0
+    for score, index in scored:
+        cost = estimate_tokens(lines[index]) + 1
+        if used + cost > max_tokens:
+            continue
+        selected.add(index)
+        used += cost
+
+    if not selected:
+        return _truncate_to_tokens(report, max_tokens)
+    return "\n".join(lines[index] for index in sorted(selected))
+
+
+def split_debate_turns(history: str) -> List[str]:
+    """把拼接的辩论历史按发言人拆分为单轮发言"""
+    if not history:
+        return []
+    return [turn.strip() for turn in _SPEAKER_RE.split(history) if turn.strip()]
+
+
+def window_debate_history(history: str, max_tokens: int, recent_turns: int = DEFAULT_RECENT_TURNS) -> str:
+    """
+    辩论历史窗口：最近几轮保留原文，更早的发言只保留开头；仍超预算时从最早的发言开始省略
+    """
+    if max_tokens <= 0 or estimate_tokens(history) <= max_tokens:
+        return history
+
+    turns = split_debate_turns(history)
+    older, recent = turns[:-recent_turns], turns[-recent_turns:]
+    older = [_truncate_to_tokens(turn, OLDER_TURN_TOKENS) for turn in older]
+
+    kept = older + recent
+    omitted = 0
+    while len(kept) > 1 and estimate_tokens("\n".join(kept)) > max_tokens:
+        kept.pop(0)
+        omitted += 1
+
+    if estimate_tokens("\n".join(kept)) > max_tokens:
+        # 只剩一轮仍超预算时保留其开头
+        kept = [_truncate_to_tokens(kept[0], max_tokens)]
+
+    if omitted:
+        kept.insert(0, f"（省略了更早的 {omitted} 轮发言）")
+    return "\n".join(kept)
+
+
+@dataclass
+class AssembledContext:
+    """组装后的上下文"""
+    reports: Dict[str, str] = field(default_factory=dict)
+    history: str = ""
+    tokens_before: int = 0
+    tokens_after: int = 0
+
+
+class ContextAssembler:
+    """按Agent的token预算组装报告和辩论历史"""
+
+    def __init__(self, budget_tokens: int = DEFAULT_CONTEXT_TOKEN_BUDGET,
+                 agent_budgets: Optional[Dict[str, int]] = None,
+                 history_share: float = DEFAULT_HISTORY_SHARE,
+                 recent_turns: int = DEFAULT_RECENT_TURNS,
+                 max_cached_summaries: int = 64):
+        self.budget_tokens = budget_tokens
+        self.agent_budgets = agent_budgets or {}
+        self.history_share = history_share
+        self.recent_turns = recent_turns
+        self.max_cached_summaries = max_cached_summaries
+        self._summaries: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self.summary_computations = 0
+
+    def get_budget(self, agent: str) -> int:
+        return self.agent_budgets.get(agent, self.budget_tokens)
+
+    def assemble(self, agent: str, reports: Optional[Dict[str, str]] = None,
+                 history: Optional[str] = None) -> AssembledContext:
+        """
+        组装上下文
+
+        Args:
+            agent: Agent名称，用于查找预算和统计
+            reports: 报告名称 -> 报告全文
+            history: 辩论历史，为 None 时全部预算分配给报告
+        """
+        reports = {name: text or "" for name, text in (reports or {}).items()}
+        has_history = history is not None
+        history = history or ""
+        report_tokens = {name: estimate_tokens(text) for name, text in reports.items()}
+        history_tokens = estimate_tokens(history)
+        tokens_before = sum(report_tokens.values()) + history_tokens
+
+        budget = self.get_budget(agent)
+        if budget <= 0 or tokens_before <= budget:
+            context = AssembledContext(dict(reports), history, tokens_before, tokens_before)
+            self._record(agent, context)
+            return context
+
+        # 报告和辩论历史按固定比例分配预算：报告预算不随辩论进度变化，
+        # 同一份报告在所有下游Agent中得到相同的摘要，只需计算一次
+        if not reports:
+            history_budget = budget
+        elif has_history:
+            history_budget = int(budget * self.history_share)
+        else:
+            history_budget = 0
+        windowed_history = window_debate_history(history, history_budget, self.recent_turns)
+        report_budget = budget - history_budget
+
+        allocation = self._allocate(report_tokens, report_budget)
+        condensed = {
+            name: self._get_summary(text, allocation[name]) if report_tokens[name] > allocation[name] else text
+            for name, text in reports.items()
+        }
+
+        tokens_after = sum(estimate_tokens(text) for text in condensed.values()) + estimate_tokens(windowed_history)
+        context = AssembledContext(condensed, windowed_history, tokens_before, tokens_after)
+        self._record(agent, context)
+        logger.debug(f"📐 [上下文组装] {agent}: {tokens_before} -> {tokens_after} tokens (预算 {budget})")
+        return context
+
+    @staticmethod
+    def _allocate(report_tokens: Dict[str, int], budget: int) -> Dict[str, int]:
+        """注水式分配：短报告保留原文，剩余预算平均分给较长的报告"""
+        allocation = {}
+        remaining = dict(report_tokens)
+        while remaining:
+            share = budget // len(remaining)
+            fitting = {name: tokens for name, tokens in remaining.items() if tokens <= share}
+            if not fitting:
+                for name in remaining:
+                    allocation[name] = share
+                break
+            for name, tokens in fitting.items():
+                allocation[name] = tokens
+                budget -= tokens
+                del remaining[name]
+        return allocation
+
+    def _get_summary(self, report: str, max_tokens: int) -> str:
+        key = (hashlib.sha256(report.encode("utf-8")).hexdigest(), max_tokens)
+        with self._lock:
+            if key in self._summaries:
+                self._summaries.move_to_end(key)
+                return self._summaries[key]
+
+        summary = condense_report(report, max_tokens)
+
+        with self._lock:
+            self.summary_computations += 1
+            self._summaries[key] = summary
+            while len(self._summaries) > self.max_cached_summaries:
+                self._summaries.popitem(last=False)
+        return summary
+
+    def _record(self, agent: str, context: AssembledContext):
+        with self._lock:
+            stats = self._stats.setdefault(agent, {"calls": 0, "tokens_before": 0, "tokens_after": 0})
+            stats["calls"] += 1
+            stats["tokens_before"] += context.tokens_before
+            stats["tokens_after"] += context.tokens_after
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """获取分Agent的调用次数和压缩前后的上下文token数"""
+        with self._lock:
+            return {agent: dict(stats) for agent, stats in self._stats.items()}
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+    def log_stats(self):
+        """输出分Agent的上下文token报告"""
+        for agent, s in sorted(self.get_stats().items()):
+            saved = s["tokens_before"] - s["tokens_after"]
+            ratio = saved / s["tokens_before"] if s["tokens_before"] else 0.0
+            logger.info(
+                f"📐 [上下文组装] {agent}: {s['calls']}次调用, 上下文tokens {s['tokens_before']} -> "
+                f"{s['tokens_after']} (节省 {ratio:.0%})"
+            )
+
+
+def create_context_assembler(budget_tokens: Optional[int] = None) -> ContextAssembler:
+    """
+    创建上下文组装器（每个交易图实例一个，传给研究员、风险辩论者和经理节点），未指定的参数从环境变量读取
+
+    Args:
+        budget_tokens: 默认上下文token预算 (CONTEXT_TOKEN_BUDGET，0 表示不压缩)，
+            可用 CONTEXT_TOKEN_BUDGET_<AGENT> 为单个Agent单独设置，如 CONTEXT_TOKEN_BUDGET_RISK_MANAGER
+    """
+    if budget_tokens is None:
+        budget_tokens = parse_int_env("CONTEXT_TOKEN_BUDGET", DEFAULT_CONTEXT_TOKEN_BUDGET)
+
+    agent_budgets = {}
+    prefix = "CONTEXT_TOKEN_BUDGET_"
+    for key in os.environ:
+        if key.startswith(prefix):
+            agent_budgets[key[len(prefix):].lower()] = parse_int_env(key, budget_tokens)
+
+    return ContextAssembler(budget_tokens, agent_budgets)
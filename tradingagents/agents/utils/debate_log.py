@@ -0,0 +1,113 @@
+"""
+辩论发言记录
+辩论发言以结构化记录（发言人、轮次、内容、token数）追加到状态中，
+需要提示词文本时再按需渲染，避免每轮重新拼接并复制整段历史字符串。
+并行开场模式下，第一轮各发言人并行发言，再由合并节点按固定顺序写入发言记录。
+"""
+
+from typing import Iterable, List, Optional, Tuple
+
+from typing_extensions import TypedDict
+
+from tradingagents.agents.utils.context_assembler import estimate_tokens
+
+
+class DebateTurn(TypedDict):
+    speaker: str  # Bull / Bear / Risky / Safe / Neutral
+    round: int  # 从1开始的辩论轮次
+    content: str  # 发言内容（不含发言人前缀）
+    tokens: int  # 本地估算的token数
+
+
+# 每轮辩论的发言人数，用于从发言计数推算轮次
+INVEST_DEBATE_SPEAKERS = ("Bull", "Bear")
+RISK_DEBATE_SPEAKERS = ("Risky", "Safe", "Neutral")
+
+
+def make_turn(speaker: str, count: int, content: str, speakers_per_round: int) -> DebateTurn:
+    """根据当前发言计数创建一条发言记录"""
+    return DebateTurn(
+        speaker=speaker,
+        round=count // speakers_per_round + 1,
+        content=content,
+        tokens=estimate_tokens(content),
+    )
+
+
+def format_turn(turn: DebateTurn) -> str:
+    """渲染单条发言，格式与原有历史字符串一致，如 "Bull Analyst: ..." """
+    return f"{turn['speaker']} Analyst: {turn['content']}"
+
+
+def render_history(turns: Iterable[DebateTurn], speaker: Optional[str] = None,
+                   last_n: Optional[int] = None) -> str:
+    """
+    渲染辩论历史文本
+
+    Args:
+        turns: 发言记录
+        speaker: 只渲染指定发言人的发言
+        last_n: 只渲染最近 n 条发言
+    """
+    selected: List[DebateTurn] = [t for t in turns if speaker is None or t["speaker"] == speaker]
+    if last_n is not None:
+        selected = selected[-last_n:] if last_n > 0 else []
+    return "".join("\n" + format_turn(turn) for turn in selected)
+
+
+def history_tokens(turns: Iterable[DebateTurn]) -> int:
+    """辩论历史的token总数（使用记录中缓存的token数，无需重新估算）"""
+    return sum(turn["tokens"] for turn in turns)
+
+
+def create_opening_node(debate_node, turns_key: str, openings_key: str):
+    """
+    包装辩论节点用于并行开场：只把发言写入暂存通道，不修改辩论状态，
+    避免多个并行节点同时写同一个状态字段
+    """
+    def opening_node(state) -> dict:
+        update = debate_node(state)
+        return {openings_key: update[turns_key]}
+
+    return opening_node
+
+
+def _ordered_openings(openings: List[DebateTurn], speakers: Tuple[str, ...]) -> List[DebateTurn]:
+    """按固定发言顺序排列并行开场的发言，结果与完成先后无关"""
+    return sorted(openings, key=lambda turn: speakers.index(turn["speaker"]))
+
+
+def create_invest_opening_merge():
+    """合并看涨/看跌并行开场，得到与顺序执行第一轮相同形式的辩论状态"""
+    def invest_opening_merge(state) -> dict:
+        openings = _ordered_openings(state.get("investment_debate_openings", []), INVEST_DEBATE_SPEAKERS)
+        debate_state = state["investment_debate_state"]
+        return {
+            "investment_debate_turns": openings,
+            "investment_debate_state": {
+                "current_response": format_turn(openings[-1]),
+                "count": debate_state["count"] + len(openings),
+            },
+        }
+
+    return invest_opening_merge
+
+
+def create_risk_opening_merge():
+    """合并激进/保守/中性并行开场，得到与顺序执行第一轮相同形式的辩论状态"""
+    def risk_opening_merge(state) -> dict:
+        openings = _ordered_openings(state.get("risk_debate_openings", []), RISK_DEBATE_SPEAKERS)
+        debate_state = state["risk_debate_state"]
+        responses = {turn["speaker"]: format_turn(turn) for turn in openings}
+        return {
+            "risk_debate_turns": openings,
+            "risk_debate_state": {
+                "latest_speaker": openings[-1]["speaker"],
+                "current_risky_response": responses.get("Risky", ""),
+                "current_safe_response": responses.get("Safe", ""),
+                "current_neutral_response": responses.get("Neutral", ""),
+                "count": debate_state["count"] + len(openings),
+            },
+        }
+
+    return risk_opening_merge
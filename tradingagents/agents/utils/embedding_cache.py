@@ -0,0 +1,267 @@
+"""
+嵌入向量缓存
+按 (嵌入模型, 文本哈希) 缓存嵌入向量，分两级：
+- 进程内LRU：同一次分析中多个Agent对相同的市场情况文本只请求一次嵌入接口
+- 磁盘持久层：跨进程/跨运行复用，重复分析相同情况时不再请求嵌入接口
+相同文本的并发请求只计算一次，其余请求等待结果。零向量（记忆功能降级结果）不缓存。
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from tradingagents.config.env_utils import parse_bool_env, parse_int_env
+
+# 导入日志模块
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('agents')
+
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_EMBEDDING_CACHE_DIR = "./data/embeddings"
+
+
+class FileEmbeddingCacheBackend:
+    """磁盘缓存后端，每个向量一个JSON文件，按哈希前两位分目录"""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[List[float]]:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️ [嵌入缓存] 读取缓存文件失败 {path}: {e}")
+            return None
+
+    def set(self, key: str, vector: List[float]):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再替换，避免并发读到半个文件
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(vector, f)
+        os.replace(tmp_path, path)
+
+
+class EmbeddingCache:
+    """两级嵌入向量缓存，带命中统计"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, backend=None):
+        self.max_entries = max_entries
+        self.backend = backend
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._in_flight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\n{text}".encode('utf-8')).hexdigest()
+
+    def get_or_compute(self, model: str, text: str, compute: Callable[[], List[float]]) -> List[float]:
+        """
+        获取缓存的向量，未命中时调用 compute 计算并写入缓存
+
+        Args:
+            model: 嵌入模型名称
+            text: 被嵌入的文本
+            compute: 实际请求嵌入接口的函数
+        """
+        key = self.make_key(model, text)
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return self._entries[key]
+                event = self._in_flight.get(key)
+                if event is None:
+                    # 由当前线程负责计算，其他线程等待
+                    event = self._in_flight[key] = threading.Event()
+                    break
+            event.wait()
+            with self._lock:
+                if key in self._entries:
+                    continue
+            # 计算方失败或结果不可缓存时，由当前线程自行计算
+            return compute()
+
+        try:
+            vector = self._load(key)
+            if vector is not None:
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+            else:
+                vector = compute()
+                with self._lock:
+                    self._stats["misses"] += 1
+                if not vector or not any(vector):
+                    return vector
+                self._save(key, vector)
+            self._remember(key, vector)
+            return vector
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            event.set()
+
+    def get_or_compute_many(self, model: str, texts: List[str],
+                            compute_many: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """
+        批量获取向量：已缓存的直接返回，未命中的去重后一次交给 compute_many 批量计算
+
+        Args:
+            model: 嵌入模型名称
+            texts: 被嵌入的文本列表
+            compute_many: 批量请求嵌入接口的函数，返回与输入一一对应的向量
+        """
+        keys = [self.make_key(model, text) for text in texts]
+        vectors: Dict[str, List[float]] = {}
+        missing: "OrderedDict[str, str]" = OrderedDict()
+
+        with self._lock:
+            for key, text in zip(keys, texts):
+                if key in vectors or key in missing:
+                    continue
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    vectors[key] = self._entries[key]
+                else:
+                    missing[key] = text
+
+        for key in list(missing):
+            vector = self._load(key)
+            if vector is not None:
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                self._remember(key, vector)
+                vectors[key] = vector
+                del missing[key]
+
+        if missing:
+            computed = compute_many(list(missing.values()))
+            with self._lock:
+                self._stats["misses"] += len(missing)
+            for key, vector in zip(missing, computed):
+                vectors[key] = vector
+                if vector and any(vector):
+                    self._save(key, vector)
+                    self._remember(key, vector)
+
+        return [vectors[key] for key in keys]
+
+    def _load(self, key: str) -> Optional[List[float]]:
+        if self.backend is None:
+            return None
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"⚠️ [嵌入缓存] 读取缓存失败: {e}")
+            return None
+
+    def _save(self, key: str, vector: List[float]):
+        if self.backend is None:
+            return
+        try:
+            self.backend.set(key, list(vector))
+        except Exception as e:
+            logger.warning(f"⚠️ [嵌入缓存] 写入缓存失败: {e}")
+
+    def _remember(self, key: str, vector: List[float]):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_stats(self, since: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+        """
+        获取命中统计（内存命中、磁盘命中、未命中即嵌入接口调用次数）
+
+        Args:
+            since: 之前 get_stats() 的返回值，指定时只统计之后的调用（单次分析的报告）
+        """
+        with self._lock:
+            return {key: value - (since or {}).get(key, 0) for key, value in self._stats.items()}
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def log_stats(self, since: Optional[Dict[str, int]] = None):
+        """输出嵌入缓存命中报告，since 为之前 get_stats() 的返回值时只报告之后的调用"""
+        stats = self.get_stats(since)
+        total = sum(stats.values())
+        if not total:
+            return
+        logger.info(
+            f"📊 [嵌入缓存] 请求 {total} 次, 内存命中 {stats['memory_hits']}, "
+            f"磁盘命中 {stats['disk_hits']}, 嵌入接口调用 {stats['misses']}"
+        )
+
+
+class _DisabledEmbeddingCache(EmbeddingCache):
+    """关闭缓存时直接调用嵌入接口，只做统计"""
+
+    def get_or_compute(self, model: str, text: str, compute: Callable[[], List[float]]) -> List[float]:
+        with self._lock:
+            self._stats["misses"] += 1
+        return compute()
+
+    def get_or_compute_many(self, model: str, texts: List[str],
+                            compute_many: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        with self._lock:
+            self._stats["misses"] += len(texts)
+        return compute_many(texts) if texts else []
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def configure_embedding_cache(enabled: Optional[bool] = None, cache_dir: Optional[str] = None,
+                              max_entries: Optional[int] = None) -> EmbeddingCache:
+    """
+    配置全局嵌入缓存，未指定的参数从环境变量读取
+
+    Args:
+        enabled: 是否启用缓存 (EMBEDDING_CACHE_ENABLED，默认启用)
+        cache_dir: 磁盘缓存目录 (EMBEDDING_CACHE_DIR)，设为空字符串时只使用进程内缓存
+        max_entries: 进程内LRU最大条数 (EMBEDDING_CACHE_SIZE)
+    """
+    global _embedding_cache
+    if enabled is None:
+        enabled = parse_bool_env("EMBEDDING_CACHE_ENABLED", True)
+    if cache_dir is None:
+        cache_dir = os.getenv("EMBEDDING_CACHE_DIR", DEFAULT_EMBEDDING_CACHE_DIR)
+    if max_entries is None:
+        max_entries = parse_int_env("EMBEDDING_CACHE_SIZE", DEFAULT_MAX_ENTRIES)
+
+    with _embedding_cache_lock:
+        if not enabled:
+            _embedding_cache = _DisabledEmbeddingCache()
+        else:
+            backend = FileEmbeddingCacheBackend(cache_dir) if cache_dir else None
+            _embedding_cache = EmbeddingCache(max_entries, backend)
+    return _embedding_cache
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """获取全局嵌入缓存实例（首次调用时按环境变量初始化）"""
+    if _embedding_cache is None:
+        return configure_embedding_cache()
+    return _embedding_cache
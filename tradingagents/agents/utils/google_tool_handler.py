@@ -12,6 +12,8 @@ import logging
 from typing import Any, Dict, List, Optional, Tuple
 from langchain_core.messages import HumanMessage, ToolMessage, AIMessage
 
+from tradingagents.llm_adapters.request_scheduler import is_rate_limit_error
+
 logger = logging.getLogger(__name__)
 
 class GoogleToolCallHandler:
@@ -643,8 +645,10 @@ class GoogleToolCallHandler:
                 logger.error(f"[{analyst_name}] ❌ 完整异常信息:\n{traceback.format_exc()}")
                 
                 if attempt < max_retries - 1:
-                    logger.info(f"[{analyst_name}] 🔄 等待{retry_delay}秒后重试...")
-                    time.sleep(retry_delay)
+                    # 限流由全局LLM调度器统一退避，这里不再额外等待
+                    if not is_rate_limit_error(e):
+                        logger.info(f"[{analyst_name}] 🔄 等待{retry_delay}秒后重试...")
+                        time.sleep(retry_delay)
                     continue
                 else:
                     # 使用降级报告
@@ -0,0 +1,265 @@
+"""
+本地记忆后端
+不依赖远程嵌入接口的记忆检索：
+- HashedNgramEmbedder：字符n-gram哈希嵌入，纯CPU计算，对中文无需分词
+- QuantizedANNIndex：进程内近似最近邻索引（倒排聚类 + int8/float16向量量化）
+- LocalMemoryCollection：提供与ChromaDB集合相同的 count/upsert/query 接口，可直接替换
+
+通过 MEMORY_BACKEND=local 启用，记忆只保存在进程内。
+"""
+
+import re
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# 导入日志模块
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('agents')
+
+
+DEFAULT_DIMENSION = 384
+QUANTIZATIONS = ("int8", "float16")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class HashedNgramEmbedder:
+    """字符n-gram哈希嵌入：n-gram经crc32哈希到固定维度（带符号），按对数词频加权后L2归一化"""
+
+    def __init__(self, dimension: int = DEFAULT_DIMENSION, ngram_range=(1, 3)):
+        self.dimension = dimension
+        self.ngram_range = ngram_range
+        self.model_name = f"local-hashed-ngram-{dimension}"
+
+    def embed(self, text: str) -> List[float]:
+        return self._embed(text).tolist()
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        return [self._embed(text).tolist() for text in texts]
+
+    def _embed(self, text: str) -> np.ndarray:
+        normalized = _WHITESPACE_RE.sub(" ", (text or "").lower()).strip()
+        counts: Dict[int, float] = {}
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            for i in range(len(normalized) - n + 1):
+                h = zlib.crc32(normalized[i:i + n].encode("utf-8"))
+                # 最高位决定符号，减少哈希冲突带来的偏差
+                bucket = (h & 0x7FFFFFFF) % self.dimension
+                counts[bucket] = counts.get(bucket, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for bucket, value in counts.items():
+            vector[bucket] = np.sign(value) * np.log1p(abs(value))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+
+class QuantizedANNIndex:
+    """
+    量化向量的近似最近邻索引（余弦相似度）
+
+    向量归一化后按 int8（每条向量按最大分量缩放到 ±127 取整）或 float16 存储。数据量达到 train_threshold 后
+    用k-means把向量划分到约 sqrt(N) 个倒排列表，查询时只扫描与查询最接近的 n_probe 个列表；
+    数据量翻倍后重新训练。数据量较小时直接全量扫描。
+    """
+
+    def __init__(self, dimension: int, quantization: str = "int8", train_threshold: int = 4096,
+                 n_probe: Optional[int] = None, kmeans_iterations: int = 8, seed: int = 0):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"不支持的向量量化方式: {quantization}，可选值: {', '.join(QUANTIZATIONS)}")
+        self.dimension = dimension
+        self.quantization = quantization
+        self.train_threshold = train_threshold
+        self.n_probe = n_probe
+        self.kmeans_iterations = kmeans_iterations
+        self._rng = np.random.default_rng(seed)
+
+        dtype = np.int8 if quantization == "int8" else np.float16
+        self._vectors = np.zeros((0, dimension), dtype=dtype)
+        # int8量化时每条向量的反缩放系数
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._size = 0
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._lists: List[np.ndarray] = []
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _quantize(self, vectors: np.ndarray):
+        """返回 (量化后的向量, 反缩放系数)"""
+        if self.quantization == "int8":
+            peaks = np.abs(vectors).max(axis=1)
+            peaks[peaks == 0] = 1.0
+            quantized = np.clip(np.rint(vectors * (127.0 / peaks)[:, None]), -127, 127).astype(np.int8)
+            return quantized, (peaks / 127.0).astype(np.float32)
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+
+    def _dequantize(self, rows) -> np.ndarray:
+        vectors = self._vectors[rows].astype(np.float32)
+        if self.quantization == "int8":
+            vectors *= self._scales[rows][:, None]
+        return vectors
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def set(self, rows: Sequence[int], vectors: Sequence[Sequence[float]]):
+        """写入指定行的向量（行号等于当前大小时追加）"""
+        normalized = self._normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension))
+        rows = np.asarray(rows, dtype=np.int64)
+        new_size = max(self._size, int(rows.max()) + 1) if len(rows) else self._size
+        if new_size > len(self._vectors):
+            capacity = max(new_size, 2 * len(self._vectors), 1024)
+            grown = np.zeros((capacity, self.dimension), dtype=self._vectors.dtype)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+            grown_scales = np.zeros(capacity, dtype=np.float32)
+            grown_scales[:self._size] = self._scales[:self._size]
+            self._scales = grown_scales
+        self._vectors[rows], self._scales[rows] = self._quantize(normalized)
+        self._size = new_size
+
+        if self._centroids is None:
+            if self._size >= self.train_threshold:
+                self._train()
+        elif self._size >= 2 * self._trained_size:
+            self._train()
+        else:
+            self._assign(rows, normalized)
+
+    def _train(self):
+        """k-means训练倒排列表的聚类中心，并重新分配所有向量"""
+        data = self._dequantize(slice(0, self._size))
+        n_lists = max(1, int(np.sqrt(self._size)))
+        sample_size = min(self._size, max(50 * n_lists, 10000))
+        sample = data[self._rng.choice(self._size, sample_size, replace=False)]
+        centroids = sample[self._rng.choice(sample_size, n_lists, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = self._normalize(centroids)
+
+        self._centroids = centroids
+        self._assignments = np.argmax(data @ centroids.T, axis=1).astype(np.int32)
+        self._rebuild_lists()
+        self._trained_size = self._size
+        logger.debug(f"🧭 [本地记忆] 训练倒排索引: {self._size}条向量, {n_lists}个列表")
+
+    def _assign(self, rows: np.ndarray, normalized: np.ndarray):
+        """把写入的向量追加到最近的倒排列表，已有行换列表时从原列表移出（全量重建只在训练时进行）"""
+        labels = np.argmax(normalized @ self._centroids.T, axis=1).astype(np.int32)
+        if len(self._assignments) < self._size:
+            grown = np.full(self._size, -1, dtype=np.int32)
+            grown[:len(self._assignments)] = self._assignments
+            self._assignments = grown
+        for row, label in zip(rows.tolist(), labels.tolist()):
+            previous = int(self._assignments[row])
+            if previous == label:
+                continue
+            if previous >= 0:
+                members = self._lists[previous]
+                self._lists[previous] = members[members != row]
+            self._lists[label] = np.append(self._lists[label], row)
+            self._assignments[row] = label
+
+    def _rebuild_lists(self):
+        order = np.argsort(self._assignments[:self._size], kind="stable")
+        bounds = np.searchsorted(self._assignments[order], np.arange(len(self._centroids) + 1))
+        self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self._centroids))]
+
+    def search(self, query: Sequence[float], k: int = 1):
+        """返回 (行号数组, 余弦相似度数组)，按相似度降序"""
+        if self._size == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        q = self._normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+
+        if self._centroids is None:
+            candidates = np.arange(self._size)
+        else:
+            n_probe = self.n_probe or max(1, len(self._centroids) // 8)
+            nearest = np.argsort(-(self._centroids @ q))[:n_probe]
+            candidates = np.concatenate([self._lists[c] for c in nearest])
+
+        if len(candidates) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = self._dequantize(candidates) @ q
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return candidates[top], scores[top]
+
+
+class LocalMemoryCollection:
+    """与ChromaDB集合接口兼容的本地记忆集合（count / upsert / query）"""
+
+    def __init__(self, name: str, dimension: int = DEFAULT_DIMENSION, quantization: str = "int8"):
+        self.name = name
+        self.index = QuantizedANNIndex(dimension, quantization)
+        self._rows: Dict[str, int] = {}
+        self._documents: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def count(self) -> int:
+        return len(self._documents)
+
+    def upsert(self, documents: List[str], metadatas: List[Dict[str, Any]],
+               embeddings: List[List[float]], ids: List[str]):
+        with self._lock:
+            rows = []
+            for record_id, document, metadata in zip(ids, documents, metadatas):
+                row = self._rows.get(record_id)
+                if row is None:
+                    row = self._rows[record_id] = len(self._documents)
+                    self._documents.append(document)
+                    self._metadatas.append(metadata)
+                else:
+                    self._documents[row] = document
+                    self._metadatas[row] = metadata
+                rows.append(row)
+            self.index.set(rows, [self._fit(vector) for vector in embeddings])
+
+    add = upsert
+
+    def _fit(self, vector: Sequence[float]) -> Sequence[float]:
+        """维度不符的向量（如嵌入失败时的零向量）按零向量处理"""
+        if len(vector) != self.index.dimension:
+            return [0.0] * self.index.dimension
+        return vector
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 1) -> Dict[str, List[List[Any]]]:
+        result = {"documents": [], "metadatas": [], "distances": []}
+        for query in query_embeddings:
+            rows, scores = self.index.search(self._fit(query), n_results)
+            result["documents"].append([self._documents[row] for row in rows])
+            result["metadatas"].append([self._metadatas[row] for row in rows])
+            # 与ChromaDB一致返回距离，调用方按 1 - 距离 换算相似度
+            result["distances"].append([float(1.0 - score) for score in scores])
+        return result
+
+
+_local_collections: Dict[str, LocalMemoryCollection] = {}
+_local_collections_lock = threading.Lock()
+
+
+def get_local_memory_collection(name: str, dimension: int = DEFAULT_DIMENSION,
+                                quantization: str = "int8") -> LocalMemoryCollection:
+    """获取或创建进程内的本地记忆集合"""
+    with _local_collections_lock:
+        if name not in _local_collections:
+            _local_collections[name] = LocalMemoryCollection(name, dimension, quantization)
+            logger.info(f"📚 [本地记忆] 创建集合: {name} (量化: {quantization})")
+        return _local_collections[name]
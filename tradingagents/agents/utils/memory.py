@@ -8,6 +8,9 @@ import threading
 import hashlib
 from typing import Dict, Optional
 
+from tradingagents.agents.utils.embedding_cache import get_embedding_cache
+from tradingagents.agents.utils.local_memory import HashedNgramEmbedder, get_local_memory_collection
+
 # 导入统一日志系统
 from tradingagents.utils.logging_init import get_logger
 logger = get_logger("agents.utils.memory")
@@ -35,8 +38,16 @@ class ChromaDBManager:
                 # 自动检测操作系统版本并使用最优配置
                 import platform
                 system = platform.system()
-                
-                if system == "Windows":
+                persist_dir = os.getenv('MEMORY_PERSIST_DIR')
+
+                if persist_dir:
+                    # 持久化配置：记忆写入磁盘，重启后无需重新学习
+                    self._client = chromadb.PersistentClient(
+                        path=persist_dir,
+                        settings=Settings(allow_reset=True, anonymized_telemetry=False)
+                    )
+                    logger.info(f"📚 [ChromaDB] 持久化配置初始化完成: {persist_dir}")
+                elif system == "Windows":
                     # 使用改进的Windows 11检测
                     from .chromadb_win11_config import is_windows_11
                     if is_windows_11():
@@ -107,8 +118,17 @@ class ChromaDBManager:
             return collection
 
 
+# 各嵌入服务单次请求的最大文本数
+DASHSCOPE_EMBEDDING_BATCH_SIZE = 10
+OPENAI_EMBEDDING_BATCH_SIZE = 100
+LOCAL_EMBEDDING_BATCH_SIZE = 1000
+# 单次写入ChromaDB的最大条数（不超过ChromaDB的批量上限）
+CHROMA_WRITE_BATCH_SIZE = 1000
+
+
 class FinancialSituationMemory:
     def __init__(self, name, config):
+        self.name = name
         self.config = config
         self.llm_provider = config.get("llm_provider", "openai").lower()
 
@@ -116,11 +136,20 @@ class FinancialSituationMemory:
         self.max_embedding_length = int(os.getenv('MAX_EMBEDDING_CONTENT_LENGTH', '50000'))  # 默认50K字符
         self.enable_embedding_length_check = os.getenv('ENABLE_EMBEDDING_LENGTH_CHECK', 'true').lower() == 'true'  # 向量缓存默认启用
         
+        # 记忆后端: chromadb（远程嵌入接口 + ChromaDB，默认）/ local（本地嵌入 + 进程内近似最近邻索引）
+        self.memory_backend = (config.get("memory_backend") or os.getenv('MEMORY_BACKEND', 'chromadb')).lower()
+
         # 根据LLM提供商选择嵌入模型和客户端
         # 初始化降级选项标志
         self.fallback_available = False
         
-        if self.llm_provider == "dashscope" or self.llm_provider == "alibaba":
+        if self.memory_backend == "local":
+            # 本地嵌入不依赖网络，任何LLM提供商都可用
+            self.local_embedder = HashedNgramEmbedder()
+            self.embedding = self.local_embedder.model_name
+            self.client = "LOCAL"
+            logger.info(f"💡 记忆使用本地嵌入: {self.embedding}")
+        elif self.llm_provider == "dashscope" or self.llm_provider == "alibaba":
             self.embedding = "text-embedding-v3"
             self.client = None  # DashScope不需要OpenAI客户端
 
@@ -317,9 +346,45 @@ class FinancialSituationMemory:
                 self.client = "DISABLED"
                 logger.warning(f"⚠️ 未找到OPENAI_API_KEY，记忆功能已禁用")
 
-        # 使用单例ChromaDB管理器
+        # 批量嵌入的单次请求文本数（可用 EMBEDDING_BATCH_SIZE 覆盖）
+        if self.client == "LOCAL":
+            default_batch_size = LOCAL_EMBEDDING_BATCH_SIZE
+        elif self._uses_dashscope():
+            default_batch_size = DASHSCOPE_EMBEDDING_BATCH_SIZE
+        else:
+            default_batch_size = OPENAI_EMBEDDING_BATCH_SIZE
+        self.embedding_batch_size = max(1, int(os.getenv('EMBEDDING_BATCH_SIZE', str(default_batch_size))))
+
+        # 使用单例ChromaDB管理器，集合在首次读写时才加载
         self.chroma_manager = ChromaDBManager()
-        self.situation_collection = self.chroma_manager.get_or_create_collection(name)
+        self._situation_collection = None
+
+    @property
+    def situation_collection(self):
+        """记忆集合（延迟加载）"""
+        if self._situation_collection is None:
+            if self.memory_backend == "local":
+                self._situation_collection = get_local_memory_collection(
+                    self.name, self.local_embedder.dimension, os.getenv('MEMORY_ANN_QUANTIZATION', 'int8')
+                )
+            else:
+                self._situation_collection = self.chroma_manager.get_or_create_collection(self.name)
+        return self._situation_collection
+
+    @situation_collection.setter
+    def situation_collection(self, collection):
+        self._situation_collection = collection
+
+    def _uses_dashscope(self):
+        """是否使用阿里百炼嵌入服务"""
+        if self.client == "LOCAL":
+            return False
+        return (self.llm_provider == "dashscope" or
+                self.llm_provider == "alibaba" or
+                self.llm_provider == "qianfan" or
+                (self.llm_provider == "google" and self.client is None) or
+                (self.llm_provider == "deepseek" and self.client is None) or
+                (self.llm_provider == "openrouter" and self.client is None))
 
     def _smart_text_truncation(self, text, max_length=8192):
         """智能文本截断，保持语义完整性和缓存兼容性"""
@@ -407,12 +472,18 @@ class FinancialSituationMemory:
             'strategy': 'no_truncation_with_fallback'  # 标记策略
         }
 
-        if (self.llm_provider == "dashscope" or
-            self.llm_provider == "alibaba" or
-            self.llm_provider == "qianfan" or
-            (self.llm_provider == "google" and self.client is None) or
-            (self.llm_provider == "deepseek" and self.client is None) or
-            (self.llm_provider == "openrouter" and self.client is None)):
+        # 本地嵌入的计算比读缓存更快，直接计算
+        if self.client == "LOCAL":
+            return self.local_embedder.embed(text)
+
+        # 相同情况文本的向量按 (模型, 文本哈希) 缓存，同一次分析中各Agent和跨运行复用
+        return get_embedding_cache().get_or_compute(
+            self.embedding, text, lambda: self._request_embedding(text)
+        )
+
+    def _request_embedding(self, text):
+        """请求嵌入接口，失败时返回零向量"""
+        if self._uses_dashscope():
             # 使用阿里百炼的嵌入模型
             try:
                 # 导入DashScope模块
@@ -553,6 +624,64 @@ class FinancialSituationMemory:
                 logger.warning(f"⚠️ 记忆功能降级，返回空向量")
                 return [0.0] * 1024
 
+    def get_embeddings(self, texts):
+        """
+        批量获取多段文本的向量
+
+        已缓存的文本直接复用，其余按服务商的单次请求上限分批请求；
+        无效文本或超长文本与 get_embedding 一样返回零向量
+        """
+        if self.client == "DISABLED":
+            return [[0.0] * 1024 for _ in texts]
+
+        results = [None] * len(texts)
+        valid_indexes = []
+        for i, text in enumerate(texts):
+            if (not text or not isinstance(text, str) or
+                    (self.enable_embedding_length_check and len(text) > self.max_embedding_length)):
+                results[i] = [0.0] * 1024
+            else:
+                valid_indexes.append(i)
+
+        valid_texts = [texts[i] for i in valid_indexes]
+        if self.client == "LOCAL":
+            vectors = self.local_embedder.embed_many(valid_texts)
+        else:
+            vectors = get_embedding_cache().get_or_compute_many(
+                self.embedding, valid_texts, self._request_embeddings
+            )
+        for i, vector in zip(valid_indexes, vectors):
+            results[i] = vector
+        return results
+
+    def _request_embeddings(self, texts):
+        """按批量上限分批请求嵌入接口，批量请求失败时逐条请求（沿用单条请求的降级处理）"""
+        vectors = []
+        for start in range(0, len(texts), self.embedding_batch_size):
+            chunk = texts[start:start + self.embedding_batch_size]
+            try:
+                vectors.extend(self._request_embedding_batch(chunk))
+            except Exception as e:
+                logger.warning(f"⚠️ 批量嵌入请求失败，改为逐条请求: {str(e)}")
+                vectors.extend(self._request_embedding(text) for text in chunk)
+        return vectors
+
+    def _request_embedding_batch(self, texts):
+        """单次批量请求嵌入接口，返回与输入顺序一致的向量"""
+        if self._uses_dashscope():
+            if not hasattr(dashscope, 'api_key') or not dashscope.api_key:
+                return [[0.0] * 1024 for _ in texts]
+            response = TextEmbedding.call(model=self.embedding, input=texts)
+            if response.status_code != 200:
+                raise RuntimeError(f"{response.code} - {response.message}")
+            items = sorted(response.output['embeddings'], key=lambda item: item['text_index'])
+            return [item['embedding'] for item in items]
+
+        if self.client is None:
+            return [[0.0] * 1024 for _ in texts]
+        response = self.client.embeddings.create(model=self.embedding, input=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
     def get_embedding_config_status(self):
         """获取向量缓存配置状态"""
         return {
@@ -567,28 +696,41 @@ class FinancialSituationMemory:
         """获取最后处理的文本信息"""
         return getattr(self, '_last_text_info', None)
 
-    def add_situations(self, situations_and_advice):
-        """Add financial situations and their corresponding advice. Parameter is a list of tuples (situation, rec)"""
+    def add_situations(self, situations_and_advice, embeddings=None):
+        """Add financial situations and their corresponding advice. Parameter is a list of tuples (situation, rec)
 
-        situations = []
-        advice = []
-        ids = []
-        embeddings = []
-
-        offset = self.situation_collection.count()
+        embeddings: 可选的预先计算好的情况向量，与 situations_and_advice 一一对应，提供时不再重复计算
 
+        记录ID由情况和建议的内容哈希生成，重复写入相同内容时覆盖而不是新增
+        """
+        # 按内容ID去重，同一批次中重复的记录只保留一条
+        records = {}
         for i, (situation, recommendation) in enumerate(situations_and_advice):
-            situations.append(situation)
-            advice.append(recommendation)
-            ids.append(str(offset + i))
-            embeddings.append(self.get_embedding(situation))
-
-        self.situation_collection.add(
-            documents=situations,
-            metadatas=[{"recommendation": rec} for rec in advice],
-            embeddings=embeddings,
-            ids=ids,
-        )
+            records[self._situation_id(situation, recommendation)] = (i, situation, recommendation)
+        if not records:
+            return
+
+        ids = list(records)
+        situations = [situation for _, situation, _ in records.values()]
+        advice = [recommendation for _, _, recommendation in records.values()]
+        if embeddings is not None:
+            embeddings = [embeddings[i] for i, _, _ in records.values()]
+        else:
+            embeddings = self.get_embeddings(situations)
+
+        for start in range(0, len(ids), CHROMA_WRITE_BATCH_SIZE):
+            end = start + CHROMA_WRITE_BATCH_SIZE
+            self.situation_collection.upsert(
+                documents=situations[start:end],
+                metadatas=[{"recommendation": rec} for rec in advice[start:end]],
+                embeddings=embeddings[start:end],
+                ids=ids[start:end],
+            )
+
+    @staticmethod
+    def _situation_id(situation, recommendation):
+        """由情况和建议内容生成稳定的记录ID"""
+        return hashlib.sha256(f"{situation}\n{recommendation}".encode('utf-8')).hexdigest()
 
     def get_memories(self, current_situation, n_matches=1):
         """Find matching recommendations using embeddings with smart truncation handling"""
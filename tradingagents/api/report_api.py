@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析报告API接口
+提供历史分析报告的全文检索接口
+"""
+
+from typing import Any, Dict, List, Optional
+
+from tradingagents.utils.logging_manager import get_logger
+from tradingagents.utils.report_search import get_report_search_index
+
+logger = get_logger('agents')
+
+
+def search_reports(query: str, limit: int = 20, stock_symbol: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    全文检索已保存的分析报告，按 BM25 相关度排序
+
+    Args:
+        query: 检索词，多个词用空格分隔（同时包含），中文按连续子串匹配（如 '产能过剩'）
+        limit: 最多返回的结果数
+        stock_symbol: 只检索指定股票的报告（可选）
+
+    Returns:
+        List[Dict]: 匹配的分析，包含 analysis_id, stock_symbol, timestamp, score
+
+    Example:
+        >>> for hit in search_reports('产能过剩'):
+        ...     print(hit['analysis_id'], hit['score'])
+    """
+    index = get_report_search_index()
+    if index is None:
+        return []
+    try:
+        return index.search(query, limit=limit, stock_symbol=stock_symbol)
+    except Exception as e:
+        logger.error(f"❌ 报告检索失败: {e}")
+        return []
@@ -7,8 +7,10 @@
 import json
 import os
 import re
-from datetime import datetime
-from typing import Dict, List, Optional, Any
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Sequence, Tuple
 from dataclasses import dataclass, asdict
 from pathlib import Path
 from dotenv import load_dotenv
@@ -20,6 +22,10 @@ from tradingagents.utils.logging_init import get_logger
 from tradingagents.utils.logging_manager import get_logger
 logger = get_logger('agents')
 
+from .env_utils import parse_int_env
+from .usage_aggregates import UsageAggregates
+from .usage_ledger import DEFAULT_COMPACT_INTERVAL, DEFAULT_ROLLUP_HOUR_RETENTION_DAYS, UsageLedger
+
 try:
     from .mongodb_storage import MongoDBStorage
     MONGODB_AVAILABLE = True
@@ -73,7 +79,18 @@ class ConfigManager:
         self.models_file = self.config_dir / "models.json"
         self.pricing_file = self.config_dir / "pricing.json"
         self.usage_file = self.config_dir / "usage.json"
+        self.usage_ledger_file = self.config_dir / "usage.db"
         self.settings_file = self.config_dir / "settings.json"
+        self._usage_ledger: Optional[UsageLedger] = None
+        # 内存中的定价索引，按定价文件的修改时间失效
+        self._pricing_index: Optional[Dict[tuple, PricingConfig]] = None
+        self._pricing_signature = None
+        # 使用量运行聚合及已聚合到的账本记录ID；MongoDB模式下记录上次读取共享汇总的时间
+        self._usage_aggregates: Optional[UsageAggregates] = None
+        self._aggregated_id = 0
+        self._aggregates_from_mongodb = False
+        self._aggregates_loaded_at = 0.0
+        self._aggregates_lock = threading.Lock()
 
         # 加载.env文件（保持向后兼容）
         self._load_env_file()
@@ -163,14 +180,15 @@ class ConfigManager:
             
             self.mongodb_storage = MongoDBStorage(
                 connection_string=connection_string,
-                database_name=database_name
+                database_name=database_name,
+                spill_file=os.getenv("USAGE_SPILL_FILE", str(self.config_dir / "usage_spill.jsonl"))
             )
             
             if self.mongodb_storage.is_connected():
                 logger.info("✅ MongoDB存储已启用")
             else:
                 self.mongodb_storage = None
-                logger.warning("⚠️ MongoDB连接失败，将使用JSON文件存储")
+                logger.warning("⚠️ MongoDB连接失败，将使用本地账本存储")
 
         except Exception as e:
             logger.error(f"❌ MongoDB初始化失败: {e}", exc_info=True)
@@ -344,27 +362,99 @@ class ConfigManager:
                 json.dump(data, f, ensure_ascii=False, indent=2)
         except Exception as e:
             logger.error(f"保存定价配置失败: {e}")
+        self._pricing_index = None
+
+    def _get_pricing_index(self) -> Dict[tuple, PricingConfig]:
+        """按 (供应商, 模型) 索引的定价配置，定价文件修改后重新加载"""
+        try:
+            stat = self.pricing_file.stat()
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        if self._pricing_index is None or signature != self._pricing_signature:
+            self._pricing_index = {
+                (pricing.provider, pricing.model_name): pricing for pricing in self.load_pricing()
+            }
+            self._pricing_signature = signature
+        return self._pricing_index
     
-    def load_usage_records(self) -> List[UsageRecord]:
-        """加载使用记录"""
+    @property
+    def usage_ledger(self) -> UsageLedger:
+        """本地使用记录账本（首次访问时创建，并导入旧版 usage.json）"""
+        if self._usage_ledger is None:
+            settings = self.load_settings()
+            ledger = UsageLedger(
+                str(self.usage_ledger_file),
+                max_records=settings.get("max_usage_records", 10000),
+                retention_days=parse_int_env("USAGE_RETENTION_DAYS", 0),
+                compact_interval=parse_int_env("USAGE_LEDGER_COMPACT_INTERVAL", DEFAULT_COMPACT_INTERVAL),
+                rollup_hour_retention_days=parse_int_env("USAGE_ROLLUP_HOUR_RETENTION_DAYS",
+                                                         DEFAULT_ROLLUP_HOUR_RETENTION_DAYS),
+            )
+            ledger.import_json(str(self.usage_file))
+            self._usage_ledger = ledger
+        return self._usage_ledger
+
+    def load_usage_records(self, days: Optional[int] = None) -> List[UsageRecord]:
+        """加载使用记录（可只加载最近N天）"""
         try:
-            if not self.usage_file.exists():
-                return []
-            with open(self.usage_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return [UsageRecord(**item) for item in data]
+            return [UsageRecord(**item) for item in self.usage_ledger.load(days=days)]
         except Exception as e:
             logger.error(f"加载使用记录失败: {e}")
             return []
+
+    def load_usage_records_page(self, days: Optional[int] = None, page: int = 1,
+                                page_size: int = 20) -> Tuple[List[UsageRecord], int]:
+        """
+        按时间倒序分页加载使用记录
+
+        Returns:
+            (当前页的记录, 记录总数)
+        """
+        offset = (max(page, 1) - 1) * page_size
+        if self.mongodb_storage and self.mongodb_storage.is_connected():
+            return (self.mongodb_storage.load_usage_records_page(days, offset, page_size),
+                    self.mongodb_storage.count_usage_records(days))
+        try:
+            records = [UsageRecord(**item) for item in self.usage_ledger.load_page(days, offset, page_size)]
+            return records, self.usage_ledger.count(days)
+        except Exception as e:
+            logger.error(f"分页加载使用记录失败: {e}")
+            return [], 0
+
+    def get_usage_rollups(self, days: int = 30, granularity: str = "day",
+                          group_by: Sequence[str] = ("provider",), by_bucket: bool = True,
+                          limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        查询最近N个自然日（含今天）按小时/按天的使用量汇总，不读取原始记录
+
+        Args:
+            days: 天数
+            granularity: 汇总粒度 hour / day
+            group_by: 分组字段，可选 provider / model_name / session_id
+            by_bucket: 是否按时间桶分组
+            limit: 只返回成本最高的N组
+        """
+        start = (datetime.now() - timedelta(days=max(days, 1) - 1)).strftime("%Y-%m-%d")
+        if granularity == "hour":
+            start += "T00"
+        if self.mongodb_storage and self.mongodb_storage.is_connected():
+            return self.mongodb_storage.get_usage_rollups(granularity, start, None, group_by, by_bucket, limit)
+        try:
+            return self.usage_ledger.rollups(granularity, start, None, group_by, by_bucket, limit)
+        except Exception as e:
+            logger.error(f"查询使用量汇总失败: {e}")
+            return []
     
     def save_usage_records(self, records: List[UsageRecord]):
-        """保存使用记录"""
+        """保存使用记录（替换全部记录）"""
         try:
-            data = [asdict(record) for record in records]
-            with open(self.usage_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.usage_ledger.replace_all(asdict(record) for record in records)
         except Exception as e:
             logger.error(f"保存使用记录失败: {e}")
+        # 记录被整体替换后重新汇总
+        with self._aggregates_lock:
+            self._usage_aggregates = None
     
     def add_usage_record(self, provider: str, model_name: str, input_tokens: int,
                         output_tokens: int, session_id: str, analysis_type: str = "stock_analysis"):
@@ -387,38 +477,36 @@ class ConfigManager:
         if self.mongodb_storage and self.mongodb_storage.is_connected():
             success = self.mongodb_storage.save_usage_record(record)
             if success:
+                # 与 get_usage_aggregates 的定期重新读取互斥，避免累加到即将被替换的聚合上
+                with self._aggregates_lock:
+                    if self._usage_aggregates is not None:
+                        self._usage_aggregates.add_record(record)
                 return record
             else:
-                logger.error(f"⚠️ MongoDB保存失败，回退到JSON文件存储")
-        
-        # 回退到JSON文件存储
-        records = self.load_usage_records()
-        records.append(record)
+                logger.error(f"⚠️ MongoDB保存失败，回退到本地账本存储")
         
-        # 限制记录数量
-        settings = self.load_settings()
-        max_records = settings.get("max_usage_records", 10000)
-        if len(records) > max_records:
-            records = records[-max_records:]
-        
-        self.save_usage_records(records)
+        # 回退到本地账本：只追加一条，记录数量限制由账本定期压缩处理
+        try:
+            self.usage_ledger.append(asdict(record))
+        except Exception as e:
+            logger.error(f"保存使用记录失败: {e}")
         return record
     
     def calculate_cost(self, provider: str, model_name: str, input_tokens: int, output_tokens: int) -> float:
         """计算使用成本"""
-        pricing_configs = self.load_pricing()
+        pricing_index = self._get_pricing_index()
 
-        for pricing in pricing_configs:
-            if pricing.provider == provider and pricing.model_name == model_name:
-                input_cost = (input_tokens / 1000) * pricing.input_price_per_1k
-                output_cost = (output_tokens / 1000) * pricing.output_price_per_1k
-                total_cost = input_cost + output_cost
-                return round(total_cost, 6)
+        pricing = pricing_index.get((provider, model_name))
+        if pricing is not None:
+            input_cost = (input_tokens / 1000) * pricing.input_price_per_1k
+            output_cost = (output_tokens / 1000) * pricing.output_price_per_1k
+            total_cost = input_cost + output_cost
+            return round(total_cost, 6)
 
         # 只在找不到配置时输出调试信息
         logger.warning(f"⚠️ [calculate_cost] 未找到匹配的定价配置: {provider}/{model_name}")
         logger.debug(f"⚠️ [calculate_cost] 可用的配置:")
-        for pricing in pricing_configs:
+        for pricing in pricing_index.values():
             logger.debug(f"⚠️ [calculate_cost]   - {pricing.provider}/{pricing.model_name}")
 
         return 0.0
@@ -503,6 +591,8 @@ class ConfigManager:
                 json.dump(settings, f, ensure_ascii=False, indent=2)
         except Exception as e:
             logger.error(f"保存设置失败: {e}")
+        if self._usage_ledger is not None:
+            self._usage_ledger.max_records = settings.get("max_usage_records", self._usage_ledger.max_records)
     
     def get_enabled_models(self) -> List[ModelConfig]:
         """获取启用的模型"""
@@ -532,54 +622,66 @@ class ConfigManager:
                     stats["records_count"] = stats.get("total_requests", 0)
                     return stats
             except Exception as e:
-                logger.error(f"⚠️ MongoDB统计获取失败，回退到JSON文件: {e}")
-        
-        # 回退到JSON文件统计
-        records = self.load_usage_records()
+                logger.error(f"⚠️ MongoDB统计获取失败，回退到本地账本: {e}")
         
-        # 过滤最近N天的记录
-        from datetime import datetime, timedelta
+        # 回退到本地账本的运行聚合（最近N个自然日，含今天）
+        return self.get_usage_aggregates().statistics(days)
 
-        cutoff_date = datetime.now() - timedelta(days=days)
-        
-        recent_records = []
-        for record in records:
-            try:
-                record_date = datetime.fromisoformat(record.timestamp)
-                if record_date >= cutoff_date:
-                    recent_records.append(record)
-            except:
-                continue
-        
-        # 统计数据
-        total_cost = sum(record.cost for record in recent_records)
-        total_input_tokens = sum(record.input_tokens for record in recent_records)
-        total_output_tokens = sum(record.output_tokens for record in recent_records)
-        
-        # 按供应商统计
-        provider_stats = {}
-        for record in recent_records:
-            if record.provider not in provider_stats:
-                provider_stats[record.provider] = {
-                    "cost": 0,
-                    "input_tokens": 0,
-                    "output_tokens": 0,
-                    "requests": 0
-                }
-            provider_stats[record.provider]["cost"] += record.cost
-            provider_stats[record.provider]["input_tokens"] += record.input_tokens
-            provider_stats[record.provider]["output_tokens"] += record.output_tokens
-            provider_stats[record.provider]["requests"] += 1
-        
-        return {
-            "period_days": days,
-            "total_cost": round(total_cost, 4),
-            "total_input_tokens": total_input_tokens,
-            "total_output_tokens": total_output_tokens,
-            "total_requests": len(recent_records),
-            "provider_stats": provider_stats,
-            "records_count": len(recent_records)
-        }
+    def get_usage_aggregates(self) -> UsageAggregates:
+        """
+        获取按天/供应商/模型的使用量运行聚合
+
+        本地账本模式：首次调用时从账本汇总一次历史记录，之后每次调用只合并新增的记录（包括其他进程写入的）。
+        MongoDB模式：从共享的按天汇总集合读取（包括其他进程/主机写入的），最多每
+        USAGE_AGGREGATES_REFRESH_SECONDS 秒重新读取一次，两次读取之间由 add_usage_record 累加本进程的记录。
+        """
+        with self._aggregates_lock:
+            mongodb = self.mongodb_storage if self.mongodb_storage and self.mongodb_storage.is_connected() else None
+            if self._usage_aggregates is not None and self._aggregates_from_mongodb != (mongodb is not None):
+                # 存储切换（MongoDB断开或恢复）后重新汇总
+                self._usage_aggregates = None
+            if mongodb is not None:
+                refresh_seconds = parse_int_env("USAGE_AGGREGATES_REFRESH_SECONDS", 30)
+                if self._usage_aggregates is None or time.monotonic() - self._aggregates_loaded_at >= refresh_seconds:
+                    self._usage_aggregates = self._load_mongodb_aggregates(mongodb)
+                    self._aggregates_from_mongodb = True
+                    self._aggregates_loaded_at = time.monotonic()
+            elif self._usage_aggregates is None:
+                aggregates = UsageAggregates()
+                try:
+                    self._aggregated_id, rows = self.usage_ledger.aggregate_by_day()
+                    for day, provider, model_name, cost, input_tokens, output_tokens, requests in rows:
+                        aggregates.add(day, provider, model_name, cost, input_tokens, output_tokens, requests)
+                except Exception as e:
+                    logger.error(f"汇总使用记录失败: {e}")
+                self._usage_aggregates = aggregates
+                self._aggregates_from_mongodb = False
+            else:
+                try:
+                    for record_id, item in self.usage_ledger.load_since(self._aggregated_id):
+                        self._usage_aggregates.add_record(UsageRecord(**item))
+                        self._aggregated_id = record_id
+                except Exception as e:
+                    logger.error(f"更新使用量聚合失败: {e}")
+            return self._usage_aggregates
+
+    @staticmethod
+    def _load_mongodb_aggregates(mongodb) -> UsageAggregates:
+        """从MongoDB按天汇总集合读取聚合；汇总集合为空（升级前的记录）时按原始记录汇总"""
+        aggregates = UsageAggregates()
+        try:
+            rows = mongodb.get_usage_rollups("day", group_by=("provider", "model_name"))
+            if rows:
+                for row in rows:
+                    aggregates.add(row["bucket"], row["provider"], row["model_name"], row["cost"],
+                                   row["input_tokens"], row["output_tokens"], row["requests"])
+            else:
+                for day, provider, model_name, cost, input_tokens, output_tokens, requests in \
+                        mongodb.get_daily_aggregates():
+                    aggregates.add(day, provider, model_name, cost, input_tokens, output_tokens, requests)
+        except Exception as e:
+            logger.error(f"汇总MongoDB使用记录失败: {e}")
+        return aggregates
     
     def get_data_dir(self) -> str:
         """获取数据目录路径"""
@@ -690,9 +792,8 @@ class TokenTracker:
         settings = self.config_manager.load_settings()
         threshold = settings.get("cost_alert_threshold", 100.0)
 
-        # 获取今日总成本
-        today_stats = self.config_manager.get_usage_statistics(1)
-        total_today = today_stats["total_cost"]
+        # 获取今日总成本（来自运行聚合，不扫描使用记录）
+        total_today = self.config_manager.get_usage_aggregates().day_cost()
 
         if total_today >= threshold:
             logger.warning(f"⚠️ 成本警告: 今日成本已达到 ¥{total_today:.4f}，超过阈值 ¥{threshold}",
@@ -4,29 +4,59 @@ MongoDB存储适配器
 用于将token使用记录存储到MongoDB数据库
 """
 
+import atexit
+import json
 import os
+import threading
+import time
+import uuid
+from collections import deque
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Sequence
 from dataclasses import asdict
+
+import psutil
+
 from .config_manager import UsageRecord
+from .env_utils import parse_bool_env, parse_float_env, parse_int_env
+from .usage_ledger import ROLLUP_GRANULARITIES, ROLLUP_GROUP_FIELDS, rollup_rows
 
 # 导入日志模块
 from tradingagents.utils.logging_manager import get_logger
 logger = get_logger('agents')
 
 try:
-    from pymongo import MongoClient
-    from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+    from pymongo import MongoClient, UpdateOne
+    from pymongo.errors import BulkWriteError, ConnectionFailure, ServerSelectionTimeoutError
     MONGODB_AVAILABLE = True
 except ImportError:
     MONGODB_AVAILABLE = False
     MongoClient = None
+    BulkWriteError = None
+
+
+DEFAULT_WRITE_BATCH_SIZE = 100
+DEFAULT_WRITE_FLUSH_INTERVAL = 2.0
+DEFAULT_WRITE_QUEUE_SIZE = 10000
+# 批量写入时单条记录的错误中可以重试的错误码（主节点切换、关闭、网络超时等），
+# 其他错误码（校验失败、文档过大等）重试也不会成功，记录转存到隔离文件；重复键说明记录已写入
+RETRYABLE_WRITE_ERROR_CODES = {6, 7, 89, 91, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+DUPLICATE_KEY_ERROR_CODE = 11000
 
 
 class MongoDBStorage:
     """MongoDB存储适配器"""
     
-    def __init__(self, connection_string: str = None, database_name: str = "tradingagents"):
+    def __init__(self, connection_string: str = None, database_name: str = "tradingagents",
+                 write_behind: Optional[bool] = None, spill_file: Optional[str] = None):
+        """
+        Args:
+            connection_string: MongoDB连接字符串
+            database_name: 数据库名称
+            write_behind: 是否后台批量写入使用记录 (USAGE_WRITE_BEHIND，默认启用)
+            spill_file: MongoDB不可用时暂存使用记录的本地文件 (JSONL)
+        """
         if not MONGODB_AVAILABLE:
             raise ImportError("pymongo is not installed. Please install it with: pip install pymongo")
         
@@ -42,12 +72,30 @@ class MongoDBStorage:
         
         self.database_name = database_name
         self.collection_name = "token_usage"
+        # 按小时/按天的使用量汇总集合，写入记录时以 $inc 更新
+        self.rollup_collection_name = "token_usage_rollups"
         
         self.client = None
         self.db = None
         self.collection = None
+        self.rollup_collection = None
         self._connected = False
         
+        # 后台批量写入：记录先进入有界内存队列，按数量或时间间隔用 insert_many 写入
+        self.write_behind = parse_bool_env("USAGE_WRITE_BEHIND", True) if write_behind is None else write_behind
+        self.write_batch_size = parse_int_env("USAGE_WRITE_BATCH_SIZE", DEFAULT_WRITE_BATCH_SIZE)
+        self.write_flush_interval = parse_float_env("USAGE_WRITE_FLUSH_INTERVAL", DEFAULT_WRITE_FLUSH_INTERVAL)
+        self.write_queue_size = parse_int_env("USAGE_WRITE_QUEUE_SIZE", DEFAULT_WRITE_QUEUE_SIZE)
+        self.spill_file = Path(spill_file or os.getenv(
+            "USAGE_SPILL_FILE", str(Path(__file__).parent.parent.parent / "config" / "usage_spill.jsonl")))
+        self._pending = deque()
+        self._pending_condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._atexit_registered = False
+        self._closing = False
+        
         # 尝试连接
         self._connect()
     
@@ -63,6 +111,7 @@ class MongoDBStorage:
             
             self.db = self.client[self.database_name]
             self.collection = self.db[self.collection_name]
+            self.rollup_collection = self.db[self.rollup_collection_name]
             
             # 创建索引以提高查询性能
             self._create_indexes()
@@ -94,6 +143,9 @@ class MongoDBStorage:
             # 创建分析类型索引
             self.collection.create_index("analysis_type")
             
+            # 汇总集合按 粒度 + 时间桶 做范围查询
+            self.rollup_collection.create_index([("granularity", 1), ("bucket", 1)])
+            
         except Exception as e:
             logger.error(f"创建MongoDB索引失败: {e}")
     
@@ -102,10 +154,13 @@ class MongoDBStorage:
         return self._connected
     
     def save_usage_record(self, record: UsageRecord) -> bool:
-        """保存单个使用记录到MongoDB"""
+        """保存单个使用记录到MongoDB（启用后台批量写入时只入队，不等待数据库）"""
         if not self._connected:
             return False
         
+        if self.write_behind and not self._closing:
+            return self._enqueue_usage_record(record)
+        
         try:
             # 转换为字典格式
             record_dict = asdict(record)
@@ -117,6 +172,7 @@ class MongoDBStorage:
             result = self.collection.insert_one(record_dict)
             
             if result.inserted_id:
+                self._update_rollups([record_dict])
                 return True
             else:
                 logger.error(f"MongoDB插入失败：未返回插入ID")
@@ -126,11 +182,217 @@ class MongoDBStorage:
             logger.error(f"保存记录到MongoDB失败: {e}")
             return False
     
+    def _enqueue_usage_record(self, record: UsageRecord) -> bool:
+        """记录入队；队列已满时直接写入暂存文件，不阻塞调用方"""
+        record_dict = asdict(record)
+        record_dict['_created_at'] = datetime.now()
+        
+        with self._pending_condition:
+            if len(self._pending) >= self.write_queue_size:
+                overflow = True
+            else:
+                overflow = False
+                self._pending.append(record_dict)
+                if len(self._pending) >= self.write_batch_size:
+                    self._pending_condition.notify()
+        
+        if overflow:
+            logger.warning(f"⚠️ 使用记录写入队列已满 ({self.write_queue_size})，暂存到本地文件")
+            self._spill([record_dict])
+        
+        self._ensure_flusher()
+        return True
+    
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._pending_condition:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="mongodb-usage-writer", daemon=True)
+            self._flusher.start()
+            if not self._atexit_registered:
+                # 进程退出前写入缓冲中的记录（写入线程退出后重新启动时不重复注册）
+                atexit.register(self.flush)
+                self._atexit_registered = True
+    
+    def _flush_loop(self):
+        while not self._closing:
+            with self._pending_condition:
+                if not self._closing and len(self._pending) < self.write_batch_size:
+                    self._pending_condition.wait(self.write_flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                # 写入线程不能因异常退出，否则之后的记录只入队不写入
+                logger.error(f"❌ 后台写入使用记录失败: {e}")
+                time.sleep(self.write_flush_interval)
+    
+    def flush(self) -> int:
+        """
+        立即写入缓冲中的全部记录（先重放暂存文件），写入失败的记录转存到暂存文件
+        
+        Returns:
+            int: 已处理的记录数（写入MongoDB，或被MongoDB拒绝后转存到隔离文件）
+        """
+        with self._flush_lock:
+            written = self._replay_spill()
+            while True:
+                with self._pending_condition:
+                    batch = [self._pending.popleft()
+                             for _ in range(min(self.write_batch_size, len(self._pending)))]
+                if not batch:
+                    break
+                handled = self._insert_batch(batch)
+                written += handled
+                if handled < len(batch):
+                    self._spill(batch[handled:])
+            return written
+    
+    def _insert_batch(self, documents: List[Dict[str, Any]]) -> int:
+        """
+        按顺序批量插入，返回已处理的条数（之后的记录未写入，由调用方暂存后重试）
+
+        单条记录被拒绝且重试也不会成功时跳过该记录继续写入：重复键说明记录已写入，
+        其他错误的记录转存到隔离文件；连接失败等错误时停止
+        """
+        handled = 0
+        while handled < len(documents):
+            remaining = documents[handled:]
+            try:
+                self.collection.insert_many(remaining, ordered=True)
+                self._update_rollups(remaining)
+                return len(documents)
+            except Exception as e:
+                inserted = 0
+                write_error = None
+                if BulkWriteError is not None and isinstance(e, BulkWriteError):
+                    inserted = e.details.get('nInserted', 0)
+                    write_errors = e.details.get('writeErrors') or []
+                    write_error = write_errors[0] if write_errors else None
+                if inserted:
+                    self._update_rollups(remaining[:inserted])
+                handled += inserted
+                code = write_error.get('code') if write_error else None
+                if code is None or code in RETRYABLE_WRITE_ERROR_CODES:
+                    logger.error(f"批量保存使用记录到MongoDB失败 ({handled}/{len(documents)} 已写入): {e}")
+                    return handled
+                if code != DUPLICATE_KEY_ERROR_CODE:
+                    logger.error(f"❌ 使用记录被MongoDB拒绝 (错误码 {code})，转存到隔离文件: "
+                                 f"{write_error.get('errmsg', e)}")
+                    self._spill([dict(documents[handled], _error=write_error.get('errmsg', str(e)))],
+                                self.rejected_file)
+                handled += 1
+        return handled
+    
+    def _update_rollups(self, documents: List[Dict[str, Any]]):
+        """把已写入的记录累加到按小时/按天的汇总集合（一批记录合并为一次 bulk_write）"""
+        operations = [
+            UpdateOne(
+                {'granularity': granularity, 'bucket': bucket, 'provider': provider,
+                 'model_name': model_name, 'session_id': session_id},
+                {'$inc': {'cost': cost, 'input_tokens': input_tokens,
+                          'output_tokens': output_tokens, 'requests': requests}},
+                upsert=True
+            )
+            for granularity, bucket, provider, model_name, session_id, cost, input_tokens, output_tokens, requests
+            in rollup_rows(documents)
+        ]
+        try:
+            self.rollup_collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"更新MongoDB使用量汇总失败: {e}")
+    
+    @property
+    def rejected_file(self) -> Path:
+        """MongoDB拒绝写入（重试也不会成功）的记录的隔离文件"""
+        return self.spill_file.with_name(f"{self.spill_file.name}.rejected")
+    
+    def _spill(self, documents: List[Dict[str, Any]], target: Optional[Path] = None):
+        """把未能写入MongoDB的记录追加到本地暂存文件"""
+        target = target or self.spill_file
+        try:
+            with self._spill_lock:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                with open(target, 'a', encoding='utf-8') as f:
+                    for document in documents:
+                        document = {key: value for key, value in document.items() if key != '_id'}
+                        document['_created_at'] = document['_created_at'].isoformat()
+                        f.write(json.dumps(document, ensure_ascii=False) + "\n")
+        except Exception as e:
+            logger.error(f"❌ 暂存使用记录失败，{len(documents)} 条记录丢失: {e}")
+    
+    def _claim_replay_files(self) -> List[Path]:
+        """
+        认领要重放的暂存文件：改名为本进程唯一的重放文件，多个进程共用暂存文件时只有一个进程认领成功。
+        重放过程中进程退出会留下重放文件，已退出进程遗留的重放文件一并认领
+        """
+        prefix = f"{self.spill_file.name}."
+        candidates = []
+        for leftover in self.spill_file.parent.glob(f"{prefix}*.replay"):
+            pid = leftover.name[len(prefix):].split('.')[0]
+            if pid.isdigit() and not psutil.pid_exists(int(pid)):
+                candidates.append(leftover)
+        candidates.append(self.spill_file)
+        
+        claimed = []
+        with self._spill_lock:
+            for candidate in candidates:
+                replay_file = self.spill_file.with_name(f"{prefix}{os.getpid()}.{uuid.uuid4().hex[:8]}.replay")
+                try:
+                    os.replace(candidate, replay_file)
+                except FileNotFoundError:
+                    continue
+                claimed.append(replay_file)
+        return claimed
+    
+    def _replay_spill(self) -> int:
+        """把暂存文件中的记录重新写入MongoDB"""
+        replay_files = self._claim_replay_files()
+        if not replay_files:
+            return 0
+        
+        documents = []
+        for replay_file in replay_files:
+            with open(replay_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        document = json.loads(line)
+                        document['_created_at'] = datetime.fromisoformat(document['_created_at'])
+                    except (ValueError, KeyError, TypeError) as e:
+                        logger.error(f"❌ 暂存文件中的记录无法解析，已跳过: {e}")
+                        continue
+                    documents.append(document)
+        
+        written = 0
+        for start in range(0, len(documents), self.write_batch_size):
+            batch = documents[start:start + self.write_batch_size]
+            handled = self._insert_batch(batch)
+            written += handled
+            if handled < len(batch):
+                self._spill(batch[handled:] + documents[start + len(batch):])
+                break
+        for replay_file in replay_files:
+            os.remove(replay_file)
+        if written:
+            logger.info(f"📤 已将 {written} 条暂存的使用记录写入MongoDB")
+        return written
+    
+    def pending_count(self) -> int:
+        """缓冲队列中尚未写入的记录数"""
+        with self._pending_condition:
+            return len(self._pending)
+    
     def load_usage_records(self, limit: int = 10000, days: int = None) -> List[UsageRecord]:
         """从MongoDB加载使用记录"""
         if not self._connected:
             return []
         
+        # 先写入缓冲中的记录，保证能读到刚跟踪的使用量
+        self.flush()
+        
         try:
             # 构建查询条件
             query = {}
@@ -162,11 +424,100 @@ class MongoDBStorage:
             logger.error(f"从MongoDB加载记录失败: {e}")
             return []
     
+    def load_usage_records_page(self, days: int = None, offset: int = 0, limit: int = 20) -> List[UsageRecord]:
+        """按时间倒序分页加载使用记录"""
+        if not self._connected:
+            return []
+        
+        self.flush()
+        
+        try:
+            query = {}
+            if days:
+                from datetime import timedelta
+                cutoff_date = datetime.now() - timedelta(days=days)
+                query['timestamp'] = {'$gte': cutoff_date.isoformat()}
+            
+            cursor = self.collection.find(query, {'_id': 0, '_created_at': 0}) \
+                .sort('timestamp', -1).skip(offset).limit(limit)
+            return [UsageRecord(**doc) for doc in cursor]
+            
+        except Exception as e:
+            logger.error(f"从MongoDB分页加载记录失败: {e}")
+            return []
+    
+    def count_usage_records(self, days: int = None) -> int:
+        """统计使用记录条数"""
+        if not self._connected:
+            return 0
+        
+        try:
+            query = {}
+            if days:
+                from datetime import timedelta
+                cutoff_date = datetime.now() - timedelta(days=days)
+                query['timestamp'] = {'$gte': cutoff_date.isoformat()}
+            return self.collection.count_documents(query)
+        except Exception as e:
+            logger.error(f"统计MongoDB记录条数失败: {e}")
+            return 0
+    
+    def get_usage_rollups(self, granularity: str = "day", start: str = None, end: str = None,
+                          group_by: Sequence[str] = ("provider",), by_bucket: bool = True,
+                          limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按时间范围查询汇总集合，参数与 UsageLedger.rollups 一致"""
+        if not self._connected:
+            return []
+        if granularity not in ROLLUP_GRANULARITIES:
+            raise ValueError(f"不支持的汇总粒度: {granularity}")
+        invalid = set(group_by) - set(ROLLUP_GROUP_FIELDS)
+        if invalid:
+            raise ValueError(f"不支持的分组字段: {', '.join(sorted(invalid))}")
+        
+        self.flush()
+        
+        try:
+            match = {'granularity': granularity}
+            if start or end:
+                match['bucket'] = {}
+                if start:
+                    match['bucket']['$gte'] = start
+                if end:
+                    match['bucket']['$lte'] = end
+            keys = (["bucket"] if by_bucket else []) + list(group_by)
+            pipeline = [
+                {'$match': match},
+                {'$group': {
+                    '_id': {key: f'${key}' for key in keys},
+                    'cost': {'$sum': '$cost'},
+                    'input_tokens': {'$sum': '$input_tokens'},
+                    'output_tokens': {'$sum': '$output_tokens'},
+                    'requests': {'$sum': '$requests'}
+                }},
+            ]
+            if limit:
+                pipeline += [{'$sort': {'cost': -1}}, {'$limit': limit}]
+            else:
+                pipeline.append({'$sort': {f'_id.{key}': 1 for key in keys} or {'_id': 1}})
+            
+            rows = []
+            for result in self.rollup_collection.aggregate(pipeline):
+                row = dict(result['_id'] or {})
+                row.update({field: result[field] for field in ('cost', 'input_tokens', 'output_tokens', 'requests')})
+                rows.append(row)
+            return rows
+            
+        except Exception as e:
+            logger.error(f"获取MongoDB使用量汇总失败: {e}")
+            return []
+    
     def get_usage_statistics(self, days: int = 30) -> Dict[str, Any]:
         """从MongoDB获取使用统计"""
         if not self._connected:
             return {}
         
+        self.flush()
+        
         try:
             from datetime import timedelta
             cutoff_date = datetime.now() - timedelta(days=days)
@@ -218,6 +569,8 @@ class MongoDBStorage:
         if not self._connected:
             return {}
         
+        self.flush()
+        
         try:
             from datetime import timedelta
             cutoff_date = datetime.now() - timedelta(days=days)
@@ -258,6 +611,44 @@ class MongoDBStorage:
             logger.error(f"获取供应商统计失败: {e}")
             return {}
     
+    def get_daily_aggregates(self, days: int = None) -> List[tuple]:
+        """按 (日期, 供应商, 模型) 聚合使用记录，返回 [(日期, 供应商, 模型, 成本, 输入token, 输出token, 请求数), ...]"""
+        if not self._connected:
+            return []
+        
+        self.flush()
+        
+        try:
+            pipeline = []
+            if days:
+                from datetime import timedelta
+                cutoff_date = datetime.now() - timedelta(days=days)
+                pipeline.append({'$match': {'timestamp': {'$gte': cutoff_date.isoformat()}}})
+            pipeline.append({
+                '$group': {
+                    '_id': {
+                        'day': {'$substr': ['$timestamp', 0, 10]},
+                        'provider': '$provider',
+                        'model_name': '$model_name'
+                    },
+                    'cost': {'$sum': '$cost'},
+                    'input_tokens': {'$sum': '$input_tokens'},
+                    'output_tokens': {'$sum': '$output_tokens'},
+                    'requests': {'$sum': 1}
+                }
+            })
+            
+            return [
+                (result['_id']['day'], result['_id']['provider'], result['_id']['model_name'],
+                 result.get('cost', 0), result.get('input_tokens', 0),
+                 result.get('output_tokens', 0), result.get('requests', 0))
+                for result in self.collection.aggregate(pipeline)
+            ]
+            
+        except Exception as e:
+            logger.error(f"获取MongoDB每日聚合失败: {e}")
+            return []
+    
     def cleanup_old_records(self, days: int = 90) -> int:
         """清理旧记录"""
         if not self._connected:
@@ -283,7 +674,14 @@ class MongoDBStorage:
             return 0
     
     def close(self):
-        """关闭MongoDB连接"""
+        """写入缓冲中的记录后关闭MongoDB连接"""
+        self._closing = True
+        with self._pending_condition:
+            self._pending_condition.notify_all()
+        if self._flusher is not None:
+            self._flusher.join(timeout=self.write_flush_interval + 5)
+        if self._connected:
+            self.flush()
         if self.client:
             self.client.close()
             self._connected = False
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Token使用运行聚合
+按 天 → 供应商 → 模型 维护成本、token数和请求数，每条记录O(1)更新；
+统计查询只遍历所查天数内的聚合桶，不再扫描全部使用记录。
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+_COUNTERS = ("cost", "input_tokens", "output_tokens", "requests")
+
+
+def _empty() -> Dict[str, float]:
+    return {"cost": 0.0, "input_tokens": 0, "output_tokens": 0, "requests": 0}
+
+
+def _accumulate(target: Dict[str, float], cost: float, input_tokens: int, output_tokens: int, requests: int):
+    target["cost"] += cost
+    target["input_tokens"] += input_tokens
+    target["output_tokens"] += output_tokens
+    target["requests"] += requests
+
+
+class UsageAggregates:
+    """按天、供应商、模型的使用量运行聚合（线程安全）"""
+
+    def __init__(self):
+        # {日期: {"total": 计数, "providers": {供应商: 计数}, "models": {(供应商, 模型): 计数}}}
+        self._days: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, timestamp: str, provider: str, model_name: str, cost: float,
+            input_tokens: int, output_tokens: int, requests: int = 1):
+        """累加一条记录（或一组已聚合的记录），timestamp 取前10位作为日期"""
+        day = timestamp[:10]
+        with self._lock:
+            bucket = self._days.get(day)
+            if bucket is None:
+                bucket = self._days[day] = {"total": _empty(), "providers": {}, "models": {}}
+            _accumulate(bucket["total"], cost, input_tokens, output_tokens, requests)
+            provider_counters = bucket["providers"].get(provider)
+            if provider_counters is None:
+                provider_counters = bucket["providers"][provider] = _empty()
+            _accumulate(provider_counters, cost, input_tokens, output_tokens, requests)
+            model_counters = bucket["models"].get((provider, model_name))
+            if model_counters is None:
+                model_counters = bucket["models"][(provider, model_name)] = _empty()
+            _accumulate(model_counters, cost, input_tokens, output_tokens, requests)
+
+    def add_record(self, record):
+        """累加一条 UsageRecord"""
+        self.add(record.timestamp, record.provider, record.model_name, record.cost,
+                 record.input_tokens, record.output_tokens)
+
+    @staticmethod
+    def _day_range(days: int, today: Optional[datetime] = None):
+        today = today or datetime.now()
+        return [(today - timedelta(days=offset)).strftime("%Y-%m-%d") for offset in range(max(days, 1))]
+
+    def day_cost(self, day: Optional[str] = None) -> float:
+        """某天（默认今天）的总成本"""
+        day = day or datetime.now().strftime("%Y-%m-%d")
+        with self._lock:
+            bucket = self._days.get(day)
+            return bucket["total"]["cost"] if bucket else 0.0
+
+    def statistics(self, days: int = 30) -> Dict[str, Any]:
+        """
+        最近N个自然日（含今天）的使用统计，格式与 ConfigManager.get_usage_statistics 一致，
+        另外提供按模型的统计 model_stats
+        """
+        total = _empty()
+        provider_stats: Dict[str, Dict[str, float]] = {}
+        model_stats: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for day in self._day_range(days):
+                bucket = self._days.get(day)
+                if bucket is None:
+                    continue
+                _accumulate(total, *(bucket["total"][key] for key in _COUNTERS))
+                for provider, counters in bucket["providers"].items():
+                    _accumulate(provider_stats.setdefault(provider, _empty()),
+                                *(counters[key] for key in _COUNTERS))
+                for (provider, model_name), counters in bucket["models"].items():
+                    _accumulate(model_stats.setdefault(f"{provider}/{model_name}", _empty()),
+                                *(counters[key] for key in _COUNTERS))
+
+        return {
+            "period_days": days,
+            "total_cost": round(total["cost"], 4),
+            "total_input_tokens": total["input_tokens"],
+            "total_output_tokens": total["output_tokens"],
+            "total_requests": total["requests"],
+            "provider_stats": provider_stats,
+            "model_stats": model_stats,
+            "records_count": total["requests"],
+        }
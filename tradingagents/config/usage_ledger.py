@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Token使用记录账本
+未启用MongoDB时使用的本地存储：SQLite（WAL模式）只追加写入，每条记录一次插入，
+与已有记录数量无关；多线程、多进程可同时写入。
+按写入次数定期压缩：只保留最近 max_records 条、删除超过保留天数的记录并回收磁盘空间。
+
+写入记录时在同一事务中更新按小时/按天的汇总表（供应商 × 模型 × 会话），
+统计页面按时间范围查询汇总表，不再读取原始记录；按天汇总不随压缩删除，
+按小时汇总只保留最近 rollup_hour_retention_days 天（统计页面只在查看最近一天时使用）。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# 导入日志模块
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('agents')
+
+
+DEFAULT_COMPACT_INTERVAL = 1000
+DEFAULT_ROLLUP_HOUR_RETENTION_DAYS = 7
+USAGE_FIELDS = ("timestamp", "provider", "model_name", "input_tokens", "output_tokens",
+                "cost", "session_id", "analysis_type")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    session_id TEXT,
+    analysis_type TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_usage_timestamp ON usage_records(timestamp);
+CREATE INDEX IF NOT EXISTS idx_usage_session ON usage_records(session_id);
+CREATE TABLE IF NOT EXISTS usage_rollups (
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    cost REAL NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    requests INTEGER NOT NULL,
+    PRIMARY KEY (granularity, bucket, provider, model_name, session_id)
+) WITHOUT ROWID;
+"""
+
+# 汇总表结构版本（PRAGMA user_version），旧账本升级时从原始记录重建汇总
+_SCHEMA_VERSION = 1
+
+_INSERT_SQL = (f"INSERT INTO usage_records ({', '.join(USAGE_FIELDS)}) "
+               f"VALUES ({', '.join('?' for _ in USAGE_FIELDS)})")
+
+_UPSERT_ROLLUP_SQL = (
+    "INSERT INTO usage_rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(granularity, bucket, provider, model_name, session_id) DO UPDATE SET "
+    "cost = cost + excluded.cost, input_tokens = input_tokens + excluded.input_tokens, "
+    "output_tokens = output_tokens + excluded.output_tokens, requests = requests + excluded.requests"
+)
+
+# 汇总粒度 → 时间戳前缀长度（按小时 YYYY-MM-DDTHH，按天 YYYY-MM-DD）
+ROLLUP_GRANULARITIES = {"hour": 13, "day": 10}
+ROLLUP_GROUP_FIELDS = ("provider", "model_name", "session_id")
+
+
+def rollup_rows(records: Iterable[Dict[str, Any]]) -> List[tuple]:
+    """把一批记录合并为按小时/按天的汇总行 (粒度, 时间桶, 供应商, 模型, 会话, 成本, 输入, 输出, 请求数)"""
+    merged: Dict[tuple, List[float]] = {}
+    for record in records:
+        for granularity, length in ROLLUP_GRANULARITIES.items():
+            key = (granularity, record["timestamp"][:length], record["provider"],
+                   record["model_name"], record.get("session_id") or "")
+            counters = merged.get(key)
+            if counters is None:
+                counters = merged[key] = [0.0, 0, 0, 0]
+            counters[0] += record["cost"]
+            counters[1] += record["input_tokens"]
+            counters[2] += record["output_tokens"]
+            counters[3] += 1
+    return [key + tuple(counters) for key, counters in merged.items()]
+
+
+class UsageLedger:
+    """基于SQLite WAL的只追加使用记录账本"""
+
+    def __init__(self, db_path: str, max_records: Optional[int] = None,
+                 retention_days: Optional[int] = None,
+                 compact_interval: int = DEFAULT_COMPACT_INTERVAL,
+                 rollup_hour_retention_days: Optional[int] = DEFAULT_ROLLUP_HOUR_RETENTION_DAYS):
+        """
+        Args:
+            db_path: 账本数据库文件路径
+            max_records: 最多保留的记录数，None或0表示不限制
+            retention_days: 记录保留天数，None或0表示不限制
+            compact_interval: 每写入多少条记录压缩一次
+            rollup_hour_retention_days: 按小时汇总的保留天数，None或0表示不限制（按天汇总始终保留）
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_records = max_records
+        self.retention_days = retention_days
+        self.compact_interval = compact_interval
+        self.rollup_hour_retention_days = rollup_hour_retention_days
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._appends_since_compact = 0
+
+        conn = self._connection()
+        # auto_vacuum 必须在建表前设置，之后压缩时可增量回收空间
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.executescript(_SCHEMA)
+        if conn.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+            self._rebuild_rollups()
+            conn.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程使用独立连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(record: Dict[str, Any]) -> tuple:
+        return tuple(record.get(field) for field in USAGE_FIELDS)
+
+    def append(self, record: Dict[str, Any]):
+        """追加一条记录并更新汇总，每 compact_interval 次写入后压缩一次"""
+        self._write([record])
+
+        with self._lock:
+            self._appends_since_compact += 1
+            should_compact = self._appends_since_compact >= self.compact_interval
+            if should_compact:
+                self._appends_since_compact = 0
+        if should_compact:
+            self.compact()
+
+    def append_many(self, records: Iterable[Dict[str, Any]]):
+        """在一个事务中追加多条记录"""
+        self._write(list(records))
+
+    def _write(self, records: List[Dict[str, Any]], replace: bool = False):
+        """在一个事务中写入原始记录和对应的汇总行"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if replace:
+                conn.execute("DELETE FROM usage_records")
+                conn.execute("DELETE FROM usage_rollups")
+            conn.executemany(_INSERT_SQL, (self._row(record) for record in records))
+            conn.executemany(_UPSERT_ROLLUP_SQL, rollup_rows(records))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _rebuild_rollups(self):
+        """从原始记录重建汇总表"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM usage_rollups")
+            for granularity, length in ROLLUP_GRANULARITIES.items():
+                conn.execute(
+                    "INSERT INTO usage_rollups SELECT ?, substr(timestamp, 1, ?), provider, model_name, "
+                    "COALESCE(session_id, ''), SUM(cost), SUM(input_tokens), SUM(output_tokens), COUNT(*) "
+                    "FROM usage_records GROUP BY 2, 3, 4, 5", (granularity, length)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def compact(self) -> int:
+        """
+        压缩账本：删除超出 max_records 的最旧记录、超过保留天数的记录和过期的按小时汇总，回收空闲页
+
+        Returns:
+            int: 删除的记录数（不含汇总行）
+        """
+        conn = self._connection()
+        deleted = 0
+        pruned_rollups = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.max_records:
+                deleted += conn.execute(
+                    "DELETE FROM usage_records WHERE id <= "
+                    "(SELECT MAX(id) FROM usage_records) - ?", (self.max_records,)
+                ).rowcount
+            if self.retention_days:
+                cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+                deleted += conn.execute(
+                    "DELETE FROM usage_records WHERE timestamp < ?", (cutoff,)
+                ).rowcount
+            if self.rollup_hour_retention_days:
+                cutoff_bucket = (datetime.now() - timedelta(days=self.rollup_hour_retention_days)).isoformat()
+                pruned_rollups = conn.execute(
+                    "DELETE FROM usage_rollups WHERE granularity = 'hour' AND bucket < ?",
+                    (cutoff_bucket[:ROLLUP_GRANULARITIES["hour"]],)
+                ).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if deleted or pruned_rollups:
+            conn.execute("PRAGMA incremental_vacuum")
+            # 被动检查点，不阻塞其他读写
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            logger.debug(f"🗜️ [使用记录账本] 压缩完成，删除 {deleted} 条记录、{pruned_rollups} 条按小时汇总")
+        return deleted
+
+    def load(self, days: Optional[int] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        按写入顺序读取记录
+
+        Args:
+            days: 只读取最近N天的记录
+            limit: 只读取最新的N条记录
+        """
+        where, params = "", []
+        if days:
+            where = "WHERE timestamp >= ?"
+            params.append((datetime.now() - timedelta(days=days)).isoformat())
+        sql = f"SELECT {', '.join(USAGE_FIELDS)} FROM usage_records {where} ORDER BY id"
+        if limit:
+            sql = (f"SELECT {', '.join(USAGE_FIELDS)} FROM (SELECT id, {', '.join(USAGE_FIELDS)} "
+                   f"FROM usage_records {where} ORDER BY id DESC LIMIT ?) ORDER BY id")
+            params.append(limit)
+        rows = self._connection().execute(sql, params).fetchall()
+        return [dict(zip(USAGE_FIELDS, row)) for row in rows]
+
+    def load_since(self, last_id: int) -> List[tuple]:
+        """读取ID大于 last_id 的新记录，返回 [(id, 记录), ...]，用于增量更新聚合"""
+        rows = self._connection().execute(
+            f"SELECT id, {', '.join(USAGE_FIELDS)} FROM usage_records WHERE id > ? ORDER BY id", (last_id,)
+        ).fetchall()
+        return [(row[0], dict(zip(USAGE_FIELDS, row[1:]))) for row in rows]
+
+    def aggregate_by_day(self):
+        """
+        按 (日期, 供应商, 模型) 汇总全部记录（读取按天汇总表，包括已被压缩删除的记录）
+
+        Returns:
+            (最大记录ID, [(日期, 供应商, 模型, 成本, 输入token, 输出token, 请求数), ...])
+        """
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM usage_records").fetchone()[0]
+            rows = conn.execute(
+                "SELECT bucket, provider, model_name, SUM(cost), SUM(input_tokens), "
+                "SUM(output_tokens), SUM(requests) FROM usage_rollups "
+                "WHERE granularity = 'day' GROUP BY 1, 2, 3"
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        return max_id, rows
+
+    def rollups(self, granularity: str = "day", start: Optional[str] = None, end: Optional[str] = None,
+                group_by: Sequence[str] = ("provider",), by_bucket: bool = True,
+                limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        按时间范围查询汇总
+
+        Args:
+            granularity: 汇总粒度 hour / day
+            start: 起始时间桶（含），如 "2025-01-01" 或 "2025-01-01T08"
+            end: 结束时间桶（含）
+            group_by: 分组字段，可选 provider / model_name / session_id
+            by_bucket: 是否按时间桶分组（False 时返回整个时间范围的汇总）
+            limit: 只返回成本最高的N组（默认按分组字段排序返回全部）
+        """
+        if granularity not in ROLLUP_GRANULARITIES:
+            raise ValueError(f"不支持的汇总粒度: {granularity}")
+        invalid = set(group_by) - set(ROLLUP_GROUP_FIELDS)
+        if invalid:
+            raise ValueError(f"不支持的分组字段: {', '.join(sorted(invalid))}")
+
+        keys = (["bucket"] if by_bucket else []) + list(group_by)
+        where, params = "WHERE granularity = ?", [granularity]
+        if start:
+            where += " AND bucket >= ?"
+            params.append(start)
+        if end:
+            where += " AND bucket <= ?"
+            params.append(end)
+        columns = ", ".join(keys + ["SUM(cost)", "SUM(input_tokens)", "SUM(output_tokens)", "SUM(requests)"])
+        sql = f"SELECT {columns} FROM usage_rollups {where}"
+        if keys:
+            sql += f" GROUP BY {', '.join(keys)}"
+            sql += " ORDER BY SUM(cost) DESC LIMIT ?" if limit else f" ORDER BY {', '.join(keys)}"
+        if limit and keys:
+            params.append(limit)
+        rows = self._connection().execute(sql, params).fetchall()
+        fields = keys + ["cost", "input_tokens", "output_tokens", "requests"]
+        return [dict(zip(fields, row)) for row in rows if row[-1]]
+
+    def load_page(self, days: Optional[int] = None, offset: int = 0, limit: int = 20) -> List[Dict[str, Any]]:
+        """按时间倒序分页读取原始记录"""
+        where, params = "", []
+        if days:
+            where = "WHERE timestamp >= ?"
+            params.append((datetime.now() - timedelta(days=days)).isoformat())
+        rows = self._connection().execute(
+            f"SELECT {', '.join(USAGE_FIELDS)} FROM usage_records {where} "
+            f"ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?", params + [limit, offset]
+        ).fetchall()
+        return [dict(zip(USAGE_FIELDS, row)) for row in rows]
+
+    def count(self, days: Optional[int] = None) -> int:
+        if days:
+            cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+            return self._connection().execute(
+                "SELECT COUNT(*) FROM usage_records WHERE timestamp >= ?", (cutoff,)).fetchone()[0]
+        return self._connection().execute("SELECT COUNT(*) FROM usage_records").fetchone()[0]
+
+    def replace_all(self, records: Iterable[Dict[str, Any]]):
+        """用给定记录替换账本全部内容和汇总（如清空使用记录）"""
+        self._write(list(records), replace=True)
+        self._connection().execute("PRAGMA incremental_vacuum")
+
+    def import_json(self, json_path: str) -> int:
+        """
+        从旧版 usage.json 导入记录（仅在账本为空时），导入后将原文件重命名为 .migrated
+
+        Returns:
+            int: 导入的记录数
+        """
+        json_path = Path(json_path)
+        if not json_path.exists():
+            return 0
+        if self.count() > 0:
+            logger.warning(f"⚠️ [使用记录账本] 账本已有记录，跳过导入 {json_path}")
+            return 0
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+            self.append_many(records)
+            os.replace(json_path, json_path.with_suffix(json_path.suffix + ".migrated"))
+            logger.info(f"📦 [使用记录账本] 已从 {json_path} 导入 {len(records)} 条使用记录")
+            return len(records)
+        except Exception as e:
+            logger.error(f"❌ [使用记录账本] 导入 {json_path} 失败: {e}")
+            return 0
@@ -17,10 +17,27 @@ DEFAULT_CONFIG = {
     "max_debate_rounds": 1,
     "max_risk_discuss_rounds": 1,
     "max_recur_limit": 100,
+    # Run first-round debate openings (bull/bear, risky/safe/neutral) concurrently
+    "parallel_debate_openings": os.getenv("DEBATE_PARALLEL_OPENINGS", "false").lower() == "true",
+    # End a debate early once a round adds little new content and stances are stable
+    "debate_convergence_enabled": os.getenv("DEBATE_CONVERGENCE_ENABLED", "false").lower() == "true",
+    "debate_novelty_threshold": float(os.getenv("DEBATE_NOVELTY_THRESHOLD", "0.2")),
+    # Max concurrent reflection LLM calls in reflect_and_remember
+    "reflection_max_workers": int(os.getenv("REFLECTION_MAX_WORKERS", "3")),
+    # Agent memory backend - chromadb (remote embedding API) / local (hashed n-gram embedder + in-process ANN)
+    "memory_backend": os.getenv("MEMORY_BACKEND", "chromadb"),
     # Tool settings - 从环境变量读取，提供默认值
     "online_tools": os.getenv("ONLINE_TOOLS_ENABLED", "false").lower() == "true",
     "online_news": os.getenv("ONLINE_NEWS_ENABLED", "true").lower() == "true", 
     "realtime_data": os.getenv("REALTIME_DATA_ENABLED", "false").lower() == "true",
+    # LLM response cache settings - off / read_write / replay
+    "llm_cache_mode": os.getenv("LLM_RESPONSE_CACHE_MODE", "off"),
+    "llm_cache_backend": os.getenv("LLM_RESPONSE_CACHE_BACKEND", "file"),
+    "llm_cache_dir": os.getenv("LLM_RESPONSE_CACHE_DIR", ""),
+    # LLM request priority for the shared scheduler - interactive / batch
+    "llm_request_priority": os.getenv("LLM_REQUEST_PRIORITY", "interactive"),
+    # Per-agent context token budget for researcher/risk/manager prompts - 0 disables condensing
+    "context_token_budget": int(os.getenv("CONTEXT_TOKEN_BUDGET", "0")),
 
     # Note: Database and cache configuration is now managed by .env file and config.database_manager
     # No database/cache settings in default config to avoid configuration conflicts
@@ -1,6 +1,7 @@
 # TradingAgents/graph/conditional_logic.py
 
 from tradingagents.agents.utils.agent_states import AgentState
+from tradingagents.agents.utils.debate_log import INVEST_DEBATE_SPEAKERS, RISK_DEBATE_SPEAKERS
 
 # 导入统一日志系统
 from tradingagents.utils.logging_init import get_logger
@@ -10,10 +11,19 @@ logger = get_logger("default")
 class ConditionalLogic:
     """Handles conditional logic for determining graph flow."""
 
-    def __init__(self, max_debate_rounds=1, max_risk_discuss_rounds=1):
-        """Initialize with configuration parameters."""
+    def __init__(self, max_debate_rounds=1, max_risk_discuss_rounds=1, convergence_detector=None):
+        """Initialize with configuration parameters.
+
+        convergence_detector: 可选的辩论收敛检测器，辩论不再产生新论点时提前结束
+        """
         self.max_debate_rounds = max_debate_rounds
         self.max_risk_discuss_rounds = max_risk_discuss_rounds
+        self.convergence_detector = convergence_detector
+
+    def _converged(self, state: AgentState, turns_key: str, speakers) -> bool:
+        if self.convergence_detector is None:
+            return False
+        return self.convergence_detector.has_converged(state.get(turns_key, []), speakers)
 
     def should_continue_market(self, state: AgentState):
         """Determine if market analysis should continue."""
@@ -62,6 +72,8 @@ class ConditionalLogic:
             state["investment_debate_state"]["count"] >= 2 * self.max_debate_rounds
         ):  # 3 rounds of back-and-forth between 2 agents
             return "Research Manager"
+        if self._converged(state, "investment_debate_turns", INVEST_DEBATE_SPEAKERS):
+            return "Research Manager"
         if state["investment_debate_state"]["current_response"].startswith("Bull"):
             return "Bear Researcher"
         return "Bull Researcher"
@@ -72,6 +84,8 @@ class ConditionalLogic:
             state["risk_debate_state"]["count"] >= 3 * self.max_risk_discuss_rounds
         ):  # 3 rounds of back-and-forth between 3 agents
             return "Risk Judge"
+        if self._converged(state, "risk_debate_turns", RISK_DEBATE_SPEAKERS):
+            return "Risk Judge"
         if state["risk_debate_state"]["latest_speaker"].startswith("Risky"):
             return "Safe Analyst"
         if state["risk_debate_state"]["latest_speaker"].startswith("Safe"):
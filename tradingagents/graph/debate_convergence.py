@@ -0,0 +1,121 @@
+# TradingAgents/graph/debate_convergence.py
+
+"""
+辩论收敛检测
+基于本地低成本信号判断辩论是否已不再产生新论点：
+- 新颖度：最新一轮发言中未在此前发言出现过的字符n-gram比例
+- 立场稳定：各发言人本轮的立场分类（买入/持有/卖出）与上一轮相同
+两者同时满足时提前结束辩论，并统计节省的轮次和估算避免的token数
+"""
+
+import re
+from typing import Dict, List, Optional, Sequence
+
+from tradingagents.agents.utils.debate_log import DebateTurn
+
+# 导入统一日志系统
+from tradingagents.utils.logging_init import get_logger
+logger = get_logger("default")
+
+
+DEFAULT_NOVELTY_THRESHOLD = 0.2
+DEFAULT_NGRAM_SIZE = 3
+
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+_STANCE_TERMS = {
+    "buy": ("买入", "增持", "看涨", "做多", "buy", "bullish"),
+    "sell": ("卖出", "减持", "看跌", "做空", "sell", "bearish"),
+    "hold": ("持有", "观望", "中性", "hold", "neutral"),
+}
+
+
+def _ngrams(text: str, n: int = DEFAULT_NGRAM_SIZE) -> set:
+    """字符n-gram集合（去除空白和标点，对中文无需分词）"""
+    normalized = _NON_WORD_RE.sub("", text.lower())
+    if len(normalized) < n:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + n] for i in range(len(normalized) - n + 1)}
+
+
+def turn_novelty(content: str, prior_contents: Sequence[str], n: int = DEFAULT_NGRAM_SIZE) -> float:
+    """最新发言的新颖度：未在此前发言中出现过的n-gram比例（0~1）"""
+    grams = _ngrams(content, n)
+    if not grams:
+        return 0.0
+    seen = set()
+    for prior in prior_contents:
+        seen |= _ngrams(prior, n)
+    return len(grams - seen) / len(grams)
+
+
+def classify_stance(content: str) -> Optional[str]:
+    """按关键词出现次数把发言分类为 buy / sell / hold，无明显倾向时返回 None"""
+    text = content.lower()
+    counts = {stance: sum(text.count(term) for term in terms) for stance, terms in _STANCE_TERMS.items()}
+    stance, hits = max(counts.items(), key=lambda item: item[1])
+    if hits == 0 or list(counts.values()).count(hits) > 1:
+        return None
+    return stance
+
+
+class ConvergenceDetector:
+    """辩论收敛检测器：在每轮结束时判断最新一轮是否还带来足够的新内容"""
+
+    def __init__(self, novelty_threshold: float = DEFAULT_NOVELTY_THRESHOLD,
+                 ngram_size: int = DEFAULT_NGRAM_SIZE):
+        self.novelty_threshold = novelty_threshold
+        self.ngram_size = ngram_size
+
+    def round_novelty(self, turns: List[DebateTurn], speakers_per_round: int) -> float:
+        """最新一轮各发言相对此前所有发言的平均新颖度"""
+        start = len(turns) - speakers_per_round
+        novelties = [
+            turn_novelty(turns[i]["content"], [t["content"] for t in turns[:i]], self.ngram_size)
+            for i in range(start, len(turns))
+        ]
+        return sum(novelties) / len(novelties)
+
+    @staticmethod
+    def stances_stable(turns: List[DebateTurn], speakers_per_round: int) -> bool:
+        """各发言人最新一轮的立场与上一轮相同"""
+        latest = turns[-speakers_per_round:]
+        previous = turns[-2 * speakers_per_round:-speakers_per_round]
+        return all(
+            classify_stance(new["content"]) == classify_stance(old["content"])
+            for old, new in zip(previous, latest)
+        )
+
+    def has_converged(self, turns: List[DebateTurn], speakers: Sequence[str]) -> bool:
+        """
+        判断辩论是否收敛；只在完整一轮结束且至少进行了两轮时判断
+
+        Args:
+            turns: 发言记录
+            speakers: 每轮的发言人顺序
+        """
+        per_round = len(speakers)
+        if len(turns) < 2 * per_round or len(turns) % per_round:
+            return False
+        novelty = self.round_novelty(turns, per_round)
+        converged = novelty < self.novelty_threshold and self.stances_stable(turns, per_round)
+        if converged:
+            logger.info(
+                f"🧭 [辩论收敛] 第{turns[-1]['round']}轮新颖度 {novelty:.2f} "
+                f"< {self.novelty_threshold:.2f}，立场稳定，提前结束辩论"
+            )
+        return converged
+
+
+def convergence_report(turns: List[DebateTurn], speakers_per_round: int, max_rounds: int) -> Dict[str, int]:
+    """
+    统计一场辩论提前结束节省的轮次，以及按平均每条发言token数估算避免的token数
+    """
+    rounds_run = -(-len(turns) // speakers_per_round) if turns else 0
+    rounds_saved = max(max_rounds - rounds_run, 0)
+    avg_tokens = sum(t["tokens"] for t in turns) // len(turns) if turns else 0
+    return {
+        "max_rounds": max_rounds,
+        "rounds_run": rounds_run,
+        "rounds_saved": rounds_saved,
+        "tokens_avoided": rounds_saved * speakers_per_round * avg_tokens,
+    }
@@ -28,17 +28,20 @@ class Propagator:
             "company_of_interest": company_name,
             "trade_date": str(trade_date),
             "investment_debate_state": InvestDebateState(
-                {"history": "", "current_response": "", "count": 0}
+                {"current_response": "", "count": 0}
             ),
+            "investment_debate_turns": [],
+            "investment_debate_openings": [],
             "risk_debate_state": RiskDebateState(
                 {
-                    "history": "",
                     "current_risky_response": "",
                     "current_safe_response": "",
                     "current_neutral_response": "",
                     "count": 0,
                 }
             ),
+            "risk_debate_turns": [],
+            "risk_debate_openings": [],
             "market_report": "",
             "fundamentals_report": "",
             "sentiment_report": "",
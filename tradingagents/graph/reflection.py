@@ -1,6 +1,8 @@
 # TradingAgents/graph/reflection.py
 
-from typing import Dict, Any
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Tuple
 from langchain_openai import ChatOpenAI
 
 # 导入统一日志系统
@@ -8,6 +10,17 @@ from tradingagents.utils.logging_init import get_logger
 logger = get_logger("default")
 
 
+# 反思组件：名称 -> (提示词中的组件类型, 从状态中取出被反思内容的函数)
+REFLECTION_COMPONENTS: Dict[str, Tuple[str, Callable[[Dict[str, Any]], str]]] = {
+    "bull": ("BULL", lambda state: state["investment_debate_state"]["bull_history"]),
+    "bear": ("BEAR", lambda state: state["investment_debate_state"]["bear_history"]),
+    "trader": ("TRADER", lambda state: state["trader_investment_plan"]),
+    "invest_judge": ("INVEST JUDGE", lambda state: state["investment_debate_state"]["judge_decision"]),
+    "risk_manager": ("RISK JUDGE", lambda state: state["risk_debate_state"]["judge_decision"]),
+}
+DEFAULT_REFLECTION_WORKERS = 3
+
+
 class Reflector:
     """Handles reflection on decisions and updating memory."""
 
@@ -123,3 +136,42 @@ Adhere strictly to these instructions, and ensure your output is detailed, accur
             "RISK JUDGE", judge_decision, situation, returns_losses
         )
         risk_manager_memory.add_situations([(situation, result)])
+
+    def reflect_all(self, current_state, returns_losses, memories: Dict[str, Any],
+                    max_workers: int = DEFAULT_REFLECTION_WORKERS):
+        """
+        并发执行多个组件的反思，并批量写入记忆
+
+        各组件的反思是相互独立的LLM调用，使用有界线程池并发执行；
+        所有组件共享同一段市场情况文本，其向量只计算一次，再分别写入各组件的记忆集合
+
+        Args:
+            current_state: 本次分析的最终状态
+            returns_losses: 收益/亏损
+            memories: 组件名称（见 REFLECTION_COMPONENTS）-> 记忆实例
+            max_workers: 最大并发反思数
+        """
+        if not memories:
+            return
+        situation = self._extract_current_situation(current_state)
+
+        def reflect(name: str) -> str:
+            component_type, extract = REFLECTION_COMPONENTS[name]
+            return self._reflect_on_component(component_type, extract(current_state), situation, returns_losses)
+
+        names = list(memories)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(names)))) as executor:
+            # 复制上下文，使请求优先级等上下文变量在工作线程中生效
+            futures = [executor.submit(contextvars.copy_context().run, reflect, name) for name in names]
+            results = [future.result() for future in futures]
+
+        # 同一嵌入模型的记忆共享情况文本的向量
+        embeddings: Dict[Tuple[str, str], List[float]] = {}
+        for name, result in zip(names, results):
+            memory = memories[name]
+            model_key = (getattr(memory, "llm_provider", ""), getattr(memory, "embedding", ""))
+            if model_key not in embeddings:
+                embeddings[model_key] = memory.get_embedding(situation)
+            memory.add_situations([(situation, result)], embeddings=[embeddings[model_key]])
+
+        logger.info(f"🪞 [反思] 完成{len(names)}个组件的反思，计算情况向量{len(embeddings)}次")
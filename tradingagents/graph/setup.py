@@ -8,6 +8,11 @@ from langgraph.prebuilt import ToolNode
 from tradingagents.agents import *
 from tradingagents.agents.utils.agent_states import AgentState
 from tradingagents.agents.utils.agent_utils import Toolkit
+from tradingagents.agents.utils.debate_log import (
+    create_invest_opening_merge,
+    create_opening_node,
+    create_risk_opening_merge,
+)
 
 from .conditional_logic import ConditionalLogic
 
@@ -33,6 +38,7 @@ class GraphSetup:
         conditional_logic: ConditionalLogic,
         config: Dict[str, Any] = None,
         react_llm = None,
+        context_assembler = None,
     ):
         """Initialize with required components."""
         self.quick_thinking_llm = quick_thinking_llm
@@ -47,6 +53,8 @@ class GraphSetup:
         self.conditional_logic = conditional_logic
         self.config = config or {}
         self.react_llm = react_llm
+        self.context_assembler = context_assembler
+        self.parallel_debate_openings = self.config.get("parallel_debate_openings", False)
 
     def setup_graph(
         self, selected_analysts=["market", "social", "news", "fundamentals"]
@@ -136,26 +144,8 @@ class GraphSetup:
             delete_nodes["fundamentals"] = create_msg_delete()
             tool_nodes["fundamentals"] = self.tool_nodes["fundamentals"]
 
-        # Create researcher and manager nodes
-        bull_researcher_node = create_bull_researcher(
-            self.quick_thinking_llm, self.bull_memory
-        )
-        bear_researcher_node = create_bear_researcher(
-            self.quick_thinking_llm, self.bear_memory
-        )
-        research_manager_node = create_research_manager(
-            self.deep_thinking_llm, self.invest_judge_memory
-        )
         trader_node = create_trader(self.quick_thinking_llm, self.trader_memory)
 
-        # Create risk analysis nodes
-        risky_analyst = create_risky_debator(self.quick_thinking_llm)
-        neutral_analyst = create_neutral_debator(self.quick_thinking_llm)
-        safe_analyst = create_safe_debator(self.quick_thinking_llm)
-        risk_manager_node = create_risk_manager(
-            self.deep_thinking_llm, self.risk_manager_memory
-        )
-
         # Create workflow
         workflow = StateGraph(AgentState)
 
@@ -168,14 +158,7 @@ class GraphSetup:
             workflow.add_node(f"tools_{analyst_type}", tool_nodes[analyst_type])
 
         # Add other nodes
-        workflow.add_node("Bull Researcher", bull_researcher_node)
-        workflow.add_node("Bear Researcher", bear_researcher_node)
-        workflow.add_node("Research Manager", research_manager_node)
         workflow.add_node("Trader", trader_node)
-        workflow.add_node("Risky Analyst", risky_analyst)
-        workflow.add_node("Neutral Analyst", neutral_analyst)
-        workflow.add_node("Safe Analyst", safe_analyst)
-        workflow.add_node("Risk Judge", risk_manager_node)
 
         # Define edges
         # Start with the first analyst
@@ -196,14 +179,60 @@ class GraphSetup:
             )
             workflow.add_edge(current_tools, current_analyst)
 
-            # Connect to next analyst or to Bull Researcher if this is the last analyst
+            # Connect to next analyst or to the research debate if this is the last analyst
             if i < len(selected_analysts) - 1:
                 next_analyst = f"{selected_analysts[i+1].capitalize()} Analyst"
                 workflow.add_edge(current_clear, next_analyst)
             else:
-                workflow.add_edge(current_clear, "Bull Researcher")
+                self.add_investment_debate(workflow, current_clear)
 
         # Add remaining edges
+        workflow.add_edge("Research Manager", "Trader")
+        self.add_risk_debate(workflow, "Trader")
+
+        workflow.add_edge("Risk Judge", END)
+
+        # Compile and return
+        return workflow.compile()
+
+    def add_investment_debate(self, workflow: StateGraph, source: str):
+        """添加看涨/看跌研究员辩论，从 source 进入，以 Research Manager 结束"""
+        bull_researcher_node = create_bull_researcher(
+            self.quick_thinking_llm, self.bull_memory, self.context_assembler
+        )
+        bear_researcher_node = create_bear_researcher(
+            self.quick_thinking_llm, self.bear_memory, self.context_assembler
+        )
+        research_manager_node = create_research_manager(
+            self.deep_thinking_llm, self.invest_judge_memory, self.context_assembler
+        )
+
+        workflow.add_node("Bull Researcher", bull_researcher_node)
+        workflow.add_node("Bear Researcher", bear_researcher_node)
+        workflow.add_node("Research Manager", research_manager_node)
+
+        if self.parallel_debate_openings:
+            # 第一轮看涨/看跌开场互不依赖，并行执行后按固定顺序合并
+            self._add_parallel_openings(
+                workflow,
+                source,
+                {"Bull Researcher": bull_researcher_node, "Bear Researcher": bear_researcher_node},
+                "investment_debate_turns",
+                "investment_debate_openings",
+                "Investment Opening Merge",
+                create_invest_opening_merge(),
+            )
+            workflow.add_conditional_edges(
+                "Investment Opening Merge",
+                self.conditional_logic.should_continue_debate,
+                {
+                    "Bull Researcher": "Bull Researcher",
+                    "Research Manager": "Research Manager",
+                },
+            )
+        else:
+            workflow.add_edge(source, "Bull Researcher")
+
         workflow.add_conditional_edges(
             "Bull Researcher",
             self.conditional_logic.should_continue_debate,
@@ -220,8 +249,43 @@ class GraphSetup:
                 "Research Manager": "Research Manager",
             },
         )
-        workflow.add_edge("Research Manager", "Trader")
-        workflow.add_edge("Trader", "Risky Analyst")
+
+    def add_risk_debate(self, workflow: StateGraph, source: str):
+        """添加激进/保守/中性风险分析师辩论，从 source 进入，以 Risk Judge 结束"""
+        risky_analyst = create_risky_debator(self.quick_thinking_llm, self.context_assembler)
+        neutral_analyst = create_neutral_debator(self.quick_thinking_llm, self.context_assembler)
+        safe_analyst = create_safe_debator(self.quick_thinking_llm, self.context_assembler)
+        risk_manager_node = create_risk_manager(
+            self.deep_thinking_llm, self.risk_manager_memory, self.context_assembler
+        )
+
+        workflow.add_node("Risky Analyst", risky_analyst)
+        workflow.add_node("Neutral Analyst", neutral_analyst)
+        workflow.add_node("Safe Analyst", safe_analyst)
+        workflow.add_node("Risk Judge", risk_manager_node)
+
+        if self.parallel_debate_openings:
+            # 第一轮三位风险分析师只针对交易员计划发言，并行执行后按固定顺序合并
+            self._add_parallel_openings(
+                workflow,
+                source,
+                {"Risky Analyst": risky_analyst, "Safe Analyst": safe_analyst, "Neutral Analyst": neutral_analyst},
+                "risk_debate_turns",
+                "risk_debate_openings",
+                "Risk Opening Merge",
+                create_risk_opening_merge(),
+            )
+            workflow.add_conditional_edges(
+                "Risk Opening Merge",
+                self.conditional_logic.should_continue_risk_analysis,
+                {
+                    "Risky Analyst": "Risky Analyst",
+                    "Risk Judge": "Risk Judge",
+                },
+            )
+        else:
+            workflow.add_edge(source, "Risky Analyst")
+
         workflow.add_conditional_edges(
             "Risky Analyst",
             self.conditional_logic.should_continue_risk_analysis,
@@ -247,7 +311,15 @@ class GraphSetup:
             },
         )
 
-        workflow.add_edge("Risk Judge", END)
-
-        # Compile and return
-        return workflow.compile()
+    @staticmethod
+    def _add_parallel_openings(workflow: StateGraph, source: str, speaker_nodes: Dict[str, Any],
+                               turns_key: str, openings_key: str, merge_name: str, merge_node):
+        """source 同时触发各发言人的开场节点，全部完成后进入合并节点"""
+        opening_names = []
+        for speaker, node in speaker_nodes.items():
+            opening_name = f"{speaker} Opening"
+            workflow.add_node(opening_name, create_opening_node(node, turns_key, openings_key))
+            workflow.add_edge(source, opening_name)
+            opening_names.append(opening_name)
+        workflow.add_node(merge_name, merge_node)
+        workflow.add_edge(opening_names, merge_name)
@@ -1,5 +1,9 @@
 # TradingAgents/graph/signal_processing.py
 
+import json
+import re
+from typing import Optional
+
 from langchain_openai import ChatOpenAI
 
 # 导入统一日志系统和图处理模块日志装饰器
@@ -8,12 +12,44 @@ from tradingagents.utils.tool_logging import log_graph_module
 logger = get_logger("graph.signal_processing")
 
 
+# 确定性快速解析使用的模式：只匹配明确的结论标记，避免误读正文中的讨论
+_ACTION_MAP = {
+    '买入': '买入', '持有': '持有', '卖出': '卖出',
+    'buy': '买入', 'hold': '持有', 'sell': '卖出',
+}
+_ACTION_MARKER_PATTERNS = [
+    re.compile(r'(?:最终交易建议|最终建议|最终决策|交易建议|投资建议|操作建议|默认建议)\**\s*[：:]\s*\**\s*(买入|持有|卖出)'),
+    re.compile(r'(?:final\s+(?:trading\s+)?(?:recommendation|decision)|final\s+transaction\s+proposal)\**\s*[：:]\s*\**\s*(buy|hold|sell)\b',
+               re.IGNORECASE),
+]
+# 价格数字：支持千分位（1,250.50），其后不能紧跟数字、",数字"或".数字"（避免 15,16 被截断为 15）
+_PRICE_NUMBER = r'(\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)(?![\d,.]\d|\d)'
+_TARGET_PRICE_PATTERNS = [
+    re.compile(r'目标价[位格]?\**\s*[：:为是]?\s*\**\s*[¥￥\$]?\s*' + _PRICE_NUMBER +
+               r'(\s*(?:元|美元|港元|港币)?\s*[-~～至到]\s*[¥￥\$]?\d)?'),
+    re.compile(r'target\s+price\**\s*(?:[：:]|of|is)?\s*\**\s*\$?\s*' + _PRICE_NUMBER + r'(\s*[-~]\s*\$?\d)?',
+               re.IGNORECASE),
+]
+# 比例值：数字可缺失（标记后没有数字时交给LLM），后缀为百分号或分母（8/10）
+_RATIO_VALUE = r'\**\s*[：:]?\s*\**\s*(\d+(?:\.\d+)?)?\s*(%|/\s*\d+(?:\.\d+)?)?'
+_CONFIDENCE_PATTERN = re.compile(r'(?:置信度|信心程度|confidence)' + _RATIO_VALUE, re.IGNORECASE)
+_RISK_SCORE_PATTERN = re.compile(r'(?:风险评分|风险分数|risk\s+score)' + _RATIO_VALUE, re.IGNORECASE)
+_JSON_BLOCK_PATTERN = re.compile(r'```(?:json)?\s*(\{.*?\})\s*```', re.DOTALL)
+_REASONING_PATTERN = re.compile(r'(?:决策理由|主要理由|理由)\**\s*[：:]\s*\**\s*([^\n]+)')
+
+
 class SignalProcessor:
     """Processes trading signals to extract actionable decisions."""
 
-    def __init__(self, quick_thinking_llm: ChatOpenAI):
-        """Initialize with an LLM for processing."""
+    def __init__(self, quick_thinking_llm: ChatOpenAI, fast_path: bool = True):
+        """Initialize with an LLM for processing.
+
+        fast_path: 先用确定性解析提取决策，只有存在歧义时才调用LLM
+        """
         self.quick_thinking_llm = quick_thinking_llm
+        self.fast_path = fast_path
+        self.fast_path_hits = 0
+        self.llm_calls = 0
 
     @log_graph_module("signal_processing")
     def process_signal(self, full_signal: str, stock_symbol: str = None) -> dict:
@@ -51,6 +87,17 @@ class SignalProcessor:
                 'reasoning': '信号内容为空，默认持有建议'
             }
 
+        # 确定性快速解析：各字段都能无歧义地提取时直接返回，跳过LLM调用
+        if self.fast_path:
+            fast_result = self._parse_signal_fast(full_signal)
+            if fast_result is not None:
+                self.fast_path_hits += 1
+                logger.info(f"⚡ [SignalProcessor] 确定性解析成功，跳过LLM调用: {fast_result}",
+                            extra={'action': fast_result['action'], 'target_price': fast_result['target_price'],
+                                   'stock_symbol': stock_symbol})
+                return fast_result
+        self.llm_calls += 1
+
         # 检测股票类型和货币
         from tradingagents.utils.stock_utils import StockUtils
 
@@ -112,9 +159,6 @@ class SignalProcessor:
             logger.debug(f"🔍 [SignalProcessor] LLM响应: {response[:200]}...")
 
             # 尝试解析JSON响应
-            import json
-            import re
-
             # 提取JSON部分
             json_match = re.search(r'\{.*\}', response, re.DOTALL)
             if json_match:
@@ -213,6 +257,114 @@ class SignalProcessor:
             # 回退到简单提取
             return self._extract_simple_decision(full_signal)
 
+    def get_fast_path_stats(self) -> dict:
+        """确定性解析命中统计：命中次数、LLM调用次数和跳过LLM的比例"""
+        total = self.fast_path_hits + self.llm_calls
+        return {
+            'total': total,
+            'fast_path_hits': self.fast_path_hits,
+            'llm_calls': self.llm_calls,
+            'skip_ratio': self.fast_path_hits / total if total else 0.0,
+        }
+
+    def _parse_signal_fast(self, text: str) -> Optional[dict]:
+        """
+        确定性解析决策文本
+
+        依次尝试结构化JSON块和明确的结论标记（如"最终交易建议: **买入**"、"目标价位: 15.00元"）。
+        投资建议和目标价必须唯一确定；置信度和风险评分出现时必须唯一，未出现时使用与LLM提示词相同的默认值。
+        任一字段缺失或存在冲突时返回 None，交由LLM提取。
+        """
+        structured = self._parse_json_block(text)
+        if structured is not None:
+            return structured
+
+        actions = {
+            _ACTION_MAP[match.lower()]
+            for pattern in _ACTION_MARKER_PATTERNS
+            for match in pattern.findall(text)
+        }
+        if len(actions) != 1:
+            return None
+
+        prices = set()
+        for pattern in _TARGET_PRICE_PATTERNS:
+            for value, range_tail in pattern.findall(text):
+                if range_tail:
+                    # 目标价区间需要LLM判断取值
+                    return None
+                prices.add(float(value.replace(',', '')))
+        if len(prices) != 1:
+            return None
+
+        confidence = self._unique_ratio(_CONFIDENCE_PATTERN, text, 0.7)
+        risk_score = self._unique_ratio(_RISK_SCORE_PATTERN, text, 0.5)
+        if confidence is None or risk_score is None:
+            return None
+
+        reasoning_match = _REASONING_PATTERN.search(text)
+        reasoning = reasoning_match.group(1).strip(' *') if reasoning_match else '基于综合分析的投资建议'
+
+        return {
+            'action': actions.pop(),
+            'target_price': prices.pop(),
+            'confidence': confidence,
+            'risk_score': risk_score,
+            'reasoning': reasoning[:200],
+        }
+
+    @staticmethod
+    def _unique_ratio(pattern, text: str, default: float) -> Optional[float]:
+        """
+        提取0-1之间的比例值（支持百分数、0.8 和 8/10 形式），标记未出现时返回默认值；
+        标记后没有数字、裸整数（如"风险评分：3"，可能是百分数也可能是10分制）、
+        取值超出范围或多个不同取值时返回 None
+        """
+        values = set()
+        for value, suffix in pattern.findall(text):
+            if not value:
+                return None
+            number = float(value)
+            if suffix.startswith('/'):
+                denominator = float(suffix[1:].strip())
+                if denominator <= 0:
+                    return None
+                number /= denominator
+            elif suffix:
+                number /= 100
+            elif '.' not in value or number > 1:
+                return None
+            if not 0 <= number <= 1:
+                return None
+            values.add(round(number, 4))
+        if not values:
+            return default
+        return values.pop() if len(values) == 1 else None
+
+    @staticmethod
+    def _parse_json_block(text: str) -> Optional[dict]:
+        """解析文本中唯一的JSON决策块，字段齐全且合法时返回标准化结果"""
+        blocks = _JSON_BLOCK_PATTERN.findall(text)
+        if len(blocks) != 1:
+            return None
+        try:
+            data = json.loads(blocks[0])
+            action = _ACTION_MAP.get(str(data.get('action', '')).strip().lower())
+            target_price = float(data['target_price'])
+            confidence = float(data.get('confidence', 0.7))
+            risk_score = float(data.get('risk_score', 0.5))
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return None
+        if action is None or not (0 <= confidence <= 1 and 0 <= risk_score <= 1):
+            return None
+        return {
+            'action': action,
+            'target_price': target_price,
+            'confidence': confidence,
+            'risk_score': risk_score,
+            'reasoning': data.get('reasoning') or '基于综合分析的投资建议',
+        }
+
     def _smart_price_estimation(self, text: str, action: str, is_china: bool) -> float:
         """智能价格推算方法"""
         import re
@@ -10,12 +10,18 @@ from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_google_genai import ChatGoogleGenerativeAI
 from tradingagents.llm_adapters import ChatDashScope, ChatDashScopeOpenAI, ChatGoogleOpenAI
+from tradingagents.llm_adapters.request_scheduler import PRIORITY_INTERACTIVE, request_priority
+from tradingagents.llm_adapters.response_cache import configure_llm_response_cache, get_llm_response_cache
+from tradingagents.llm_adapters.streaming import get_streaming_stats
 
 from langgraph.prebuilt import ToolNode
 
 from tradingagents.agents import *
+from tradingagents.agents.utils.context_assembler import create_context_assembler
+from tradingagents.agents.utils.debate_log import INVEST_DEBATE_SPEAKERS, RISK_DEBATE_SPEAKERS
 from tradingagents.default_config import DEFAULT_CONFIG
 from tradingagents.agents.utils.memory import FinancialSituationMemory
+from tradingagents.agents.utils.embedding_cache import get_embedding_cache
 
 # 导入统一日志系统
 from tradingagents.utils.logging_init import get_logger
@@ -31,6 +37,7 @@ from tradingagents.agents.utils.agent_states import (
 from tradingagents.dataflows.interface import set_config
 
 from .conditional_logic import ConditionalLogic
+from .debate_convergence import ConvergenceDetector, convergence_report
 from .setup import GraphSetup
 from .propagation import Propagator
 from .reflection import Reflector
@@ -65,6 +72,17 @@ class TradingAgentsGraph:
             exist_ok=True,
         )
 
+        # Configure the LLM response cache (record/replay); an unchanged configuration reuses the shared instance
+        if "llm_cache_mode" in self.config:
+            configure_llm_response_cache(
+                mode=self.config["llm_cache_mode"],
+                backend=self.config.get("llm_cache_backend"),
+                cache_dir=self.config.get("llm_cache_dir") or None,
+            )
+
+        # Per-agent context token budget for this graph's debate and manager nodes (0 disables condensing)
+        self.context_assembler = create_context_assembler(self.config.get("context_token_budget"))
+
         # Initialize LLMs
         if self.config["llm_provider"].lower() == "openai":
             self.deep_thinking_llm = ChatOpenAI(model=self.config["deep_think_llm"], base_url=self.config["backend_url"])
@@ -256,7 +274,15 @@ class TradingAgentsGraph:
         self.tool_nodes = self._create_tool_nodes()
 
         # Initialize components
-        self.conditional_logic = ConditionalLogic()
+        if self.config.get("debate_convergence_enabled", False):
+            # 启用收敛检测时使用配置的辩论轮数上限，收敛检测在上限之内提前结束
+            self.conditional_logic = ConditionalLogic(
+                max_debate_rounds=self.config.get("max_debate_rounds", 1),
+                max_risk_discuss_rounds=self.config.get("max_risk_discuss_rounds", 1),
+                convergence_detector=ConvergenceDetector(self.config.get("debate_novelty_threshold", 0.2)),
+            )
+        else:
+            self.conditional_logic = ConditionalLogic()
         self.graph_setup = GraphSetup(
             self.quick_thinking_llm,
             self.deep_thinking_llm,
@@ -270,6 +296,7 @@ class TradingAgentsGraph:
             self.conditional_logic,
             self.config,
             getattr(self, 'react_llm', None),
+            self.context_assembler,
         )
 
         self.propagator = Propagator()
@@ -351,20 +378,35 @@ class TradingAgentsGraph:
         logger.debug(f"🔍 [GRAPH DEBUG] 初始状态中的trade_date: '{init_agent_state.get('trade_date', 'NOT_FOUND')}'")
         args = self.propagator.get_graph_args()
 
-        if self.debug:
-            # Debug mode with tracing
-            trace = []
-            for chunk in self.graph.stream(init_agent_state, **args):
-                if len(chunk["messages"]) == 0:
-                    pass
-                else:
-                    chunk["messages"][-1].pretty_print()
-                    trace.append(chunk)
-
-            final_state = trace[-1]
-        else:
-            # Standard mode without tracing
-            final_state = self.graph.invoke(init_agent_state, **args)
+        # 上下文压缩报告只统计本次运行
+        self.context_assembler.reset_stats()
+        # LLM缓存、流式统计和嵌入缓存为进程内共享实例，记录实例及起点，结束时只报告本次运行在同一实例上的增量
+        response_cache = get_llm_response_cache()
+        response_cache_baseline = response_cache.snapshot()
+        streaming_stats = get_streaming_stats()
+        streaming_baseline = streaming_stats.snapshot()
+        embedding_cache = get_embedding_cache()
+        embedding_cache_baseline = embedding_cache.get_stats()
+
+        # 本次运行的LLM请求优先级（交互式请求优先于批量回测）
+        with request_priority(self.config.get("llm_request_priority", PRIORITY_INTERACTIVE)):
+            if self.debug:
+                # Debug mode with tracing
+                trace = []
+                for chunk in self.graph.stream(init_agent_state, **args):
+                    if len(chunk["messages"]) == 0:
+                        pass
+                    else:
+                        chunk["messages"][-1].pretty_print()
+                        trace.append(chunk)
+
+                final_state = trace[-1]
+            else:
+                # Standard mode without tracing
+                final_state = self.graph.invoke(init_agent_state, **args)
+
+        # 记录辩论提前收敛节省的轮次和token数
+        final_state["debate_convergence"] = self._debate_convergence(final_state)
 
         # Store current state for reflection
         self.curr_state = final_state
@@ -372,9 +414,44 @@ class TradingAgentsGraph:
         # Log state
         self._log_state(trade_date, final_state)
 
+        # 输出LLM响应缓存命中报告（仅在启用缓存时）
+        response_cache.log_stats(since=response_cache_baseline)
+
+        # 输出分Agent首token耗时（仅在流式输出时有数据）
+        streaming_stats.log_stats(since=streaming_baseline)
+
+        # 输出分Agent上下文token压缩报告
+        self.context_assembler.log_stats()
+
+        # 输出嵌入缓存命中报告（记忆检索的嵌入接口调用次数）
+        embedding_cache.log_stats(since=embedding_cache_baseline)
+
         # Return decision and processed signal
         return final_state, self.process_signal(final_state["final_trade_decision"], company_name)
 
+    def _debate_convergence(self, final_state) -> Dict[str, Dict[str, int]]:
+        """统计投资辩论和风险辩论提前结束节省的轮次和估算避免的token数"""
+        report = {
+            "investment_debate": convergence_report(
+                final_state.get("investment_debate_turns", []),
+                len(INVEST_DEBATE_SPEAKERS),
+                self.conditional_logic.max_debate_rounds,
+            ),
+            "risk_debate": convergence_report(
+                final_state.get("risk_debate_turns", []),
+                len(RISK_DEBATE_SPEAKERS),
+                self.conditional_logic.max_risk_discuss_rounds,
+            ),
+        }
+        if self.conditional_logic.convergence_detector is not None:
+            for name, stats in report.items():
+                if stats["rounds_saved"]:
+                    logger.info(
+                        f"🧭 [辩论收敛] {name}: 进行{stats['rounds_run']}/{stats['max_rounds']}轮, "
+                        f"节省{stats['rounds_saved']}轮, 约避免{stats['tokens_avoided']} tokens"
+                    )
+        return report
+
     def _log_state(self, trade_date, final_state):
         """Log the final state to a JSON file."""
         self.log_states_dict[str(trade_date)] = {
@@ -405,6 +482,7 @@ class TradingAgentsGraph:
             },
             "investment_plan": final_state["investment_plan"],
             "final_trade_decision": final_state["final_trade_decision"],
+            "debate_convergence": final_state.get("debate_convergence", {}),
         }
 
         # Save to file
@@ -419,20 +497,20 @@ class TradingAgentsGraph:
 
     def reflect_and_remember(self, returns_losses):
         """Reflect on decisions and update memory based on returns."""
-        self.reflector.reflect_bull_researcher(
-            self.curr_state, returns_losses, self.bull_memory
-        )
-        self.reflector.reflect_bear_researcher(
-            self.curr_state, returns_losses, self.bear_memory
-        )
-        self.reflector.reflect_trader(
-            self.curr_state, returns_losses, self.trader_memory
-        )
-        self.reflector.reflect_invest_judge(
-            self.curr_state, returns_losses, self.invest_judge_memory
-        )
-        self.reflector.reflect_risk_manager(
-            self.curr_state, returns_losses, self.risk_manager_memory
+        memories = {
+            "bull": self.bull_memory,
+            "bear": self.bear_memory,
+            "trader": self.trader_memory,
+            "invest_judge": self.invest_judge_memory,
+            "risk_manager": self.risk_manager_memory,
+        }
+        # 记忆功能关闭时记忆实例为 None，跳过对应组件
+        memories = {name: memory for name, memory in memories.items() if memory is not None}
+        self.reflector.reflect_all(
+            self.curr_state,
+            returns_losses,
+            memories,
+            max_workers=self.config.get("reflection_max_workers", 3),
         )
 
     def process_signal(self, full_signal, stock_symbol=None):
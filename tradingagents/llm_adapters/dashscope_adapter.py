@@ -16,6 +16,8 @@ from pydantic import Field, SecretStr
 import dashscope
 from dashscope import Generation
 from ..config.config_manager import token_tracker
+from .request_scheduler import ProviderRateLimitError, schedule_llm_call
+from .response_cache import get_llm_response_cache
 
 # 导入日志模块
 from tradingagents.utils.logging_manager import get_logger
@@ -100,7 +102,20 @@ class ChatDashScope(BaseChatModel):
         run_manager: Optional[CallbackManagerForLLMRun] = None,
         **kwargs: Any,
     ) -> ChatResult:
-        """生成聊天回复"""
+        """生成聊天回复（命中响应缓存时不调用 DashScope API）"""
+        return get_llm_response_cache().generate(
+            self, messages,
+            lambda: self._call_dashscope(messages, stop, **kwargs),
+            stop=stop, run_manager=run_manager, **kwargs
+        )
+
+    def _call_dashscope(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        """调用 DashScope API 生成聊天回复"""
         
         # 转换消息格式
         dashscope_messages = self._convert_messages_to_dashscope_format(messages)
@@ -123,8 +138,10 @@ class ChatDashScope(BaseChatModel):
         request_params.update(kwargs)
         
         try:
-            # 调用 DashScope API
-            response = Generation.call(**request_params)
+            # 调用 DashScope API（由全局调度器控制并发、token预算和限流退避）
+            response = schedule_llm_call(
+                "dashscope", self.model, lambda: self._call_generation_api(request_params), messages=messages
+            )
             
             if response.status_code == 200:
                 # 解析响应
@@ -184,6 +201,14 @@ class ChatDashScope(BaseChatModel):
         except Exception as e:
             raise Exception(f"Error calling DashScope API: {str(e)}")
     
+    @staticmethod
+    def _call_generation_api(request_params: Dict[str, Any]):
+        """调用 DashScope Generation 接口，限流响应转为异常交给调度器退避"""
+        response = Generation.call(**request_params)
+        if response.status_code == 429:
+            raise ProviderRateLimitError(f"DashScope API error: 429 - {response.code} - {response.message}")
+        return response
+
     async def _agenerate(
         self,
         messages: List[BaseMessage],
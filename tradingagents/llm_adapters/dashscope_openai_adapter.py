@@ -10,6 +10,8 @@ from langchain_openai import ChatOpenAI
 from langchain_core.tools import BaseTool
 from pydantic import Field, SecretStr
 from ..config.config_manager import token_tracker
+from .request_scheduler import schedule_llm_call
+from .response_cache import get_llm_response_cache
 
 # 导入日志模块
 from tradingagents.utils.logging_manager import get_logger
@@ -50,11 +52,22 @@ class ChatDashScopeOpenAI(ChatOpenAI):
         api_base = getattr(self, 'base_url', None) or getattr(self, 'openai_api_base', None) or kwargs.get('base_url', 'unknown')
         logger.info(f"   API Base: {api_base}")
     
-    def _generate(self, *args, **kwargs):
-        """重写生成方法，添加 token 使用量追踪"""
-        
-        # 调用父类的生成方法
-        result = super()._generate(*args, **kwargs)
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        """重写生成方法，添加响应缓存和 token 使用量追踪"""
+        parent_generate = super()._generate
+        return get_llm_response_cache().generate(
+            self, messages,
+            lambda: self._generate_and_track(parent_generate, messages, stop, run_manager, **kwargs),
+            stop=stop, run_manager=run_manager, **kwargs
+        )
+
+    def _generate_and_track(self, parent_generate, *args, **kwargs):
+        """调用父类的生成方法并追踪 token 使用量"""
+
+        # 调用父类的生成方法（由全局调度器控制并发、token预算和限流退避）
+        result = schedule_llm_call(
+            "dashscope", self.model_name, lambda: parent_generate(*args, **kwargs), messages=args[0]
+        )
         
         # 追踪 token 使用量
         try:
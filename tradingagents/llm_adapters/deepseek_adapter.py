@@ -27,6 +27,9 @@ except ImportError:
     TOKEN_TRACKING_ENABLED = False
     logger.warning("⚠️ Token跟踪功能未启用")
 
+from .request_scheduler import schedule_llm_call
+from .response_cache import get_llm_response_cache
+
 
 class ChatDeepSeek(ChatOpenAI):
     """
@@ -93,71 +96,97 @@ class ChatDeepSeek(ChatOpenAI):
         analysis_type = kwargs.pop('analysis_type', None)
 
         try:
-            # 调用父类方法生成响应
-            result = super()._generate(messages, stop, run_manager, **kwargs)
-            
-            # 提取token使用量
-            input_tokens = 0
-            output_tokens = 0
-            
-            # 尝试从响应中提取token使用量
-            if hasattr(result, 'llm_output') and result.llm_output:
-                token_usage = result.llm_output.get('token_usage', {})
-                if token_usage:
-                    input_tokens = token_usage.get('prompt_tokens', 0)
-                    output_tokens = token_usage.get('completion_tokens', 0)
-            
-            # 如果没有获取到token使用量，进行估算
-            if input_tokens == 0 and output_tokens == 0:
-                input_tokens = self._estimate_input_tokens(messages)
-                output_tokens = self._estimate_output_tokens(result)
-                logger.debug(f"🔍 [DeepSeek] 使用估算token: 输入={input_tokens}, 输出={output_tokens}")
-            else:
-                logger.info(f"📊 [DeepSeek] 实际token使用: 输入={input_tokens}, 输出={output_tokens}")
-            
-            # 记录token使用量
-            if TOKEN_TRACKING_ENABLED and (input_tokens > 0 or output_tokens > 0):
-                try:
-                    # 使用提取的参数或生成默认值
-                    if session_id is None:
-                        session_id = f"deepseek_{hash(str(messages))%10000}"
-                    if analysis_type is None:
-                        analysis_type = 'stock_analysis'
+            # 调用父类方法生成响应（命中响应缓存时不会请求提供商，也不会重复计费）
+            parent_generate = super()._generate
+            return get_llm_response_cache().generate(
+                self, messages,
+                lambda: self._generate_and_track(
+                    parent_generate, messages, stop, run_manager, session_id, analysis_type, **kwargs
+                ),
+                stop=stop, run_manager=run_manager, **kwargs
+            )
 
-                    # 记录使用量
-                    usage_record = token_tracker.track_usage(
-                        provider="deepseek",
-                        model_name=self.model_name,
-                        input_tokens=input_tokens,
-                        output_tokens=output_tokens,
-                        session_id=session_id,
-                        analysis_type=analysis_type
-                    )
+        except Exception as e:
+            logger.error(f"❌ [DeepSeek] 调用失败: {e}", exc_info=True)
+            raise
+
+    def _generate_and_track(
+        self,
+        parent_generate,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]],
+        run_manager: Optional[CallbackManagerForLLMRun],
+        session_id: Optional[str],
+        analysis_type: Optional[str],
+        **kwargs: Any,
+    ) -> ChatResult:
+        """
+        调用父类生成响应并记录token使用量
+        """
+        result = schedule_llm_call(
+            "deepseek", self.model_name,
+            lambda: parent_generate(messages, stop, run_manager, **kwargs),
+            messages=messages,
+        )
+        
+        # 提取token使用量
+        input_tokens = 0
+        output_tokens = 0
+        
+        # 尝试从响应中提取token使用量
+        if hasattr(result, 'llm_output') and result.llm_output:
+            token_usage = result.llm_output.get('token_usage', {})
+            if token_usage:
+                input_tokens = token_usage.get('prompt_tokens', 0)
+                output_tokens = token_usage.get('completion_tokens', 0)
+        
+        # 如果没有获取到token使用量，进行估算
+        if input_tokens == 0 and output_tokens == 0:
+            input_tokens = self._estimate_input_tokens(messages)
+            output_tokens = self._estimate_output_tokens(result)
+            logger.debug(f"🔍 [DeepSeek] 使用估算token: 输入={input_tokens}, 输出={output_tokens}")
+        else:
+            logger.info(f"📊 [DeepSeek] 实际token使用: 输入={input_tokens}, 输出={output_tokens}")
+        
+        # 记录token使用量
+        if TOKEN_TRACKING_ENABLED and (input_tokens > 0 or output_tokens > 0):
+            try:
+                # 使用提取的参数或生成默认值
+                if session_id is None:
+                    session_id = f"deepseek_{hash(str(messages))%10000}"
+                if analysis_type is None:
+                    analysis_type = 'stock_analysis'
 
-                    if usage_record:
-                        if usage_record.cost == 0.0:
-                            logger.warning(f"⚠️ [DeepSeek] 成本计算为0，可能配置有问题")
-                        else:
-                            logger.info(f"💰 [DeepSeek] 本次调用成本: ¥{usage_record.cost:.6f}")
+                # 记录使用量
+                usage_record = token_tracker.track_usage(
+                    provider="deepseek",
+                    model_name=self.model_name,
+                    input_tokens=input_tokens,
+                    output_tokens=output_tokens,
+                    session_id=session_id,
+                    analysis_type=analysis_type
+                )
 
-                        # 使用统一日志管理器的Token记录方法
-                        logger_manager = get_logger_manager()
-                        logger_manager.log_token_usage(
-                            logger, "deepseek", self.model_name,
-                            input_tokens, output_tokens, usage_record.cost,
-                            session_id
-                        )
+                if usage_record:
+                    if usage_record.cost == 0.0:
+                        logger.warning(f"⚠️ [DeepSeek] 成本计算为0，可能配置有问题")
                     else:
-                        logger.warning(f"⚠️ [DeepSeek] 未创建使用记录")
+                        logger.info(f"💰 [DeepSeek] 本次调用成本: ¥{usage_record.cost:.6f}")
 
-                except Exception as track_error:
-                    logger.error(f"⚠️ [DeepSeek] Token统计失败: {track_error}", exc_info=True)
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"❌ [DeepSeek] 调用失败: {e}", exc_info=True)
-            raise
+                    # 使用统一日志管理器的Token记录方法
+                    logger_manager = get_logger_manager()
+                    logger_manager.log_token_usage(
+                        logger, "deepseek", self.model_name,
+                        input_tokens, output_tokens, usage_record.cost,
+                        session_id
+                    )
+                else:
+                    logger.warning(f"⚠️ [DeepSeek] 未创建使用记录")
+
+            except Exception as track_error:
+                logger.error(f"⚠️ [DeepSeek] Token统计失败: {track_error}", exc_info=True)
+        
+        return result
     
     def _estimate_input_tokens(self, messages: List[BaseMessage]) -> int:
         """
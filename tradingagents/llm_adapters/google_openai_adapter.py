@@ -12,6 +12,8 @@ from langchain_core.messages import BaseMessage, AIMessage, HumanMessage, System
 from langchain_core.outputs import LLMResult
 from pydantic import Field, SecretStr
 from ..config.config_manager import token_tracker
+from .request_scheduler import schedule_llm_call
+from .response_cache import LLMCacheMissError, get_llm_response_cache
 
 # 导入日志模块
 from tradingagents.utils.logging_manager import get_logger
@@ -54,21 +56,17 @@ class ChatGoogleOpenAI(ChatGoogleGenerativeAI):
         """重写生成方法，优化工具调用处理和内容格式"""
         
         try:
-            # 调用父类的生成方法
-            result = super()._generate(messages, stop, **kwargs)
-            
-            # 优化返回内容格式
-            if result and result.generations:
-                for generation in result.generations:
-                    if hasattr(generation, 'message') and generation.message:
-                        # 优化消息内容格式
-                        self._optimize_message_content(generation.message)
-            
-            # 追踪 token 使用量
-            self._track_token_usage(result, kwargs)
-            
-            return result
-            
+            # 命中响应缓存时不调用 Google API；失败的调用不会写入缓存
+            parent_generate = super()._generate
+            return get_llm_response_cache().generate(
+                self, messages,
+                lambda: self._generate_and_optimize(parent_generate, messages, stop, **kwargs),
+                stop=stop, **kwargs
+            )
+
+        except LLMCacheMissError:
+            # 严格回放模式的未命中必须直接暴露给调用方
+            raise
         except Exception as e:
             logger.error(f"❌ Google AI 生成失败: {e}")
             # 返回一个包含错误信息的结果，而不是抛出异常
@@ -77,6 +75,26 @@ class ChatGoogleOpenAI(ChatGoogleGenerativeAI):
             error_generation = ChatGeneration(message=error_message)
             return LLMResult(generations=[[error_generation]])
     
+    def _generate_and_optimize(self, parent_generate, messages: List[BaseMessage],
+                               stop: Optional[List[str]] = None, **kwargs) -> LLMResult:
+        """调用父类的生成方法，优化内容格式并追踪 token 使用量"""
+
+        result = schedule_llm_call(
+            "google", self.model, lambda: parent_generate(messages, stop, **kwargs), messages=messages
+        )
+
+        # 优化返回内容格式
+        if result and result.generations:
+            for generation in result.generations:
+                if hasattr(generation, 'message') and generation.message:
+                    # 优化消息内容格式
+                    self._optimize_message_content(generation.message)
+
+        # 追踪 token 使用量
+        self._track_token_usage(result, kwargs)
+
+        return result
+
     def _optimize_message_content(self, message: BaseMessage):
         """优化消息内容格式，确保包含新闻特征关键词"""
         
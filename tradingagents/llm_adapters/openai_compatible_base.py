@@ -28,6 +28,10 @@ except ImportError:
     TOKEN_TRACKING_ENABLED = False
     logger.warning("⚠️ Token跟踪功能未启用")
 
+from .request_scheduler import schedule_llm_call
+from .response_cache import get_llm_response_cache
+from .streaming import collect_stream, get_stream_listener
+
 
 class OpenAICompatibleBase(ChatOpenAI):
     """
@@ -127,14 +131,34 @@ class OpenAICompatibleBase(ChatOpenAI):
         
         # 记录开始时间
         start_time = time.time()
-        
-        # 调用父类生成方法
-        result = super()._generate(messages, stop, run_manager, **kwargs)
-        
-        # 记录token使用
-        self._track_token_usage(result, kwargs, start_time)
-        
-        return result
+        parent_generate = super()._generate
+        parent_stream = super()._stream
+        listener = get_stream_listener()
+
+        def _request() -> ChatResult:
+            if listener is None:
+                return parent_generate(messages, stop, run_manager, **kwargs)
+            # 有界面监听时改用流式接口，逐步推送部分输出（请求usage以保持token统计）
+            stream_kwargs = {**kwargs, 'stream_usage': kwargs.get('stream_usage', True)}
+            chunks = parent_stream(messages, stop, run_manager, **stream_kwargs)
+            return collect_stream(chunks, listener, run_manager)
+
+        def _call_provider() -> ChatResult:
+            # 调用父类生成方法（由全局调度器控制并发、token预算和限流退避）
+            result = schedule_llm_call(
+                self.provider_name or "openai", self.model_name,
+                _request,
+                messages=messages,
+            )
+
+            # 记录token使用
+            self._track_token_usage(result, kwargs, start_time)
+            return result
+
+        # 命中响应缓存时不会请求提供商
+        return get_llm_response_cache().generate(
+            self, messages, _call_provider, stop=stop, run_manager=run_manager, **kwargs
+        )
 
     def _track_token_usage(self, result: ChatResult, kwargs: Dict, start_time: float):
         """记录token使用量并输出日志"""
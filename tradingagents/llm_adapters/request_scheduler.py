@@ -0,0 +1,416 @@
+"""
+LLM请求调度器
+在所有并发分析之间共享，按提供商/模型限制并发数和每分钟token预算，
+交互式请求优先于批量请求，并根据 429 / Retry-After 统一退避
+"""
+
+import contextvars
+import itertools
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from tradingagents.config.env_utils import parse_bool_env, parse_int_env, parse_list_env
+
+# 导入日志模块
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('agents')
+
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+_PRIORITY_ORDER = {PRIORITY_INTERACTIVE: 0, PRIORITY_BATCH: 1}
+
+_current_priority: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "llm_request_priority", default=PRIORITY_INTERACTIVE
+)
+
+
+@contextmanager
+def request_priority(priority: str):
+    """
+    在上下文中设置LLM请求优先级
+
+    Example:
+        with request_priority(PRIORITY_BATCH):
+            graph.propagate("000001", "2025-01-01")
+    """
+    if priority not in _PRIORITY_ORDER:
+        raise ValueError(f"不支持的请求优先级: {priority}")
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+@dataclass
+class RateLimits:
+    """并发和token预算限制，0 表示不限制"""
+    max_concurrency: int = 0
+    tokens_per_minute: int = 0
+
+
+class RateLimitExceededError(RuntimeError):
+    """重试多次后仍被提供商限流"""
+
+
+class ProviderRateLimitError(RuntimeError):
+    """
+    提供商返回限流响应（HTTP 429）
+
+    非HTTP异常形式的SDK（如 DashScope 在响应对象中返回状态码）用它把限流交给调度器统一退避
+    """
+
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# 各SDK的限流异常类型名（openai.RateLimitError、google ResourceExhausted 等）
+RATE_LIMIT_ERROR_TYPES = {"RateLimitError", "ResourceExhausted", "TooManyRequests"}
+
+# 异常信息中的429需紧跟状态码/HTTP/错误码字样，避免误判信息中恰好含有429的数字（如token数14290）
+_RATE_LIMIT_MESSAGE = re.compile(
+    r"\b(?:status(?:[ _]code)?|http(?:/\d(?:\.\d)?)?|error[ _]code|code)['\"]?\s*[:=]?\s*['\"]?429\b"
+    r"|\b429\s+too many requests\b|\btoo many requests\b|\brate[ _-]?limit(?:ed|ing)?\b",
+    re.IGNORECASE,
+)
+
+
+def _is_429(value: Any) -> bool:
+    return str(value).strip() == "429" if value is not None else False
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """判断异常是否为提供商限流（HTTP 429 状态码、SDK的限流异常类型或明确的限流信息）"""
+    if _is_429(getattr(error, "status_code", None)) or _is_429(getattr(error, "code", None)):
+        return True
+    response = getattr(error, "response", None)
+    if _is_429(getattr(response, "status_code", None)):
+        return True
+    if isinstance(error, ProviderRateLimitError) or \
+            any(cls.__name__ in RATE_LIMIT_ERROR_TYPES for cls in type(error).__mro__):
+        return True
+    return bool(_RATE_LIMIT_MESSAGE.search(str(error)))
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """从限流异常（或其响应头）中提取 Retry-After 秒数"""
+    retry_after = getattr(error, "retry_after", None)
+    if isinstance(retry_after, (int, float)):
+        return float(retry_after)
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def estimate_tokens(messages: List[Any]) -> int:
+    """粗略估算请求token数：保守估算2字符/token"""
+    total_chars = 0
+    for message in messages:
+        content = getattr(message, "content", message)
+        total_chars += len(str(content))
+    return max(1, total_chars // 2)
+
+
+class _Bucket:
+    """单个提供商或模型的并发和token窗口状态"""
+
+    def __init__(self, limits: RateLimits, window_seconds: float = 60.0):
+        self.limits = limits
+        self.window_seconds = window_seconds
+        self.in_flight = 0
+        self.token_window: deque = deque()  # (timestamp, tokens)
+
+    def tokens_used(self, now: float) -> int:
+        while self.token_window and now - self.token_window[0][0] >= self.window_seconds:
+            self.token_window.popleft()
+        return sum(tokens for _, tokens in self.token_window)
+
+    def next_token_release(self, now: float) -> float:
+        if not self.token_window:
+            return 0.0
+        return max(0.0, self.window_seconds - (now - self.token_window[0][0]))
+
+    def has_capacity(self, tokens: int, now: float) -> bool:
+        if self.limits.max_concurrency and self.in_flight >= self.limits.max_concurrency:
+            return False
+        if self.limits.tokens_per_minute:
+            used = self.tokens_used(now)
+            # 单个超大请求在窗口为空时放行，避免永久阻塞
+            if used and used + tokens > self.limits.tokens_per_minute:
+                return False
+        return True
+
+
+class LLMRequestScheduler:
+    """跨分析共享的LLM请求调度器"""
+
+    def __init__(
+        self,
+        provider_limits: Optional[Dict[str, RateLimits]] = None,
+        model_limits: Optional[Dict[Tuple[str, str], RateLimits]] = None,
+        default_limits: Optional[RateLimits] = None,
+        max_retries: int = 5,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        window_seconds: float = 60.0,
+    ):
+        self.provider_limits = provider_limits or {}
+        self.model_limits = model_limits or {}
+        self.default_limits = default_limits or RateLimits()
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.window_seconds = window_seconds
+
+        self._condition = threading.Condition()
+        self._buckets: Dict[Any, _Bucket] = {}
+        self._waiting: List[Tuple[int, int, str, str]] = []  # (priority, seq, provider, model)
+        self._seq = itertools.count()
+        self._blocked_until: Dict[str, float] = {}
+        self._consecutive_429: Dict[str, int] = {}
+        self._stats = {"requests": 0, "rate_limited": 0, "wait_time": 0.0}
+
+    def _bucket(self, key, limits: RateLimits) -> _Bucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = _Bucket(limits, self.window_seconds)
+            self._buckets[key] = bucket
+        return bucket
+
+    def _buckets_for(self, provider: str, model: str) -> Tuple[_Bucket, _Bucket]:
+        provider_bucket = self._bucket(provider, self.provider_limits.get(provider, self.default_limits))
+        model_bucket = self._bucket((provider, model), self.model_limits.get((provider, model), RateLimits()))
+        return provider_bucket, model_bucket
+
+    def _is_next_in_line(self, ticket: Tuple[int, int, str, str]) -> bool:
+        """同一提供商内，更高优先级或更早排队的请求先执行"""
+        priority, seq, provider, model = ticket
+        for other in self._waiting:
+            if other is ticket or other[2] != provider:
+                continue
+            if other[0] < priority:
+                return False
+            if other[0] == priority and other[3] == model and other[1] < seq:
+                return False
+        return True
+
+    def acquire(self, provider: str, model: str, tokens: int = 0, priority: Optional[str] = None):
+        """阻塞直到获得执行许可，返回许可对象，执行完成后需调用 release"""
+        priority = priority or _current_priority.get()
+        ticket = (_PRIORITY_ORDER[priority], next(self._seq), provider, model)
+        start_wait = time.time()
+
+        with self._condition:
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    now = time.time()
+                    buckets = self._buckets_for(provider, model)
+                    blocked_until = self._blocked_until.get(provider, 0.0)
+                    if (now >= blocked_until and self._is_next_in_line(ticket)
+                            and all(b.has_capacity(tokens, now) for b in buckets)):
+                        break
+
+                    # 计算下一次可能放行的时间，避免空转
+                    timeout = 1.0
+                    if blocked_until > now:
+                        timeout = blocked_until - now
+                    elif any(b.limits.tokens_per_minute for b in buckets):
+                        release_in = [b.next_token_release(now) for b in buckets if b.limits.tokens_per_minute]
+                        timeout = min(timeout, max(0.01, min(release_in)))
+                    self._condition.wait(timeout)
+            finally:
+                self._waiting.remove(ticket)
+                # 队首变化后唤醒其他等待者
+                self._condition.notify_all()
+
+            now = time.time()
+            for bucket in buckets:
+                bucket.in_flight += 1
+                if tokens:
+                    bucket.token_window.append((now, tokens))
+            self._stats["requests"] += 1
+            self._stats["wait_time"] += now - start_wait
+
+        return (provider, model)
+
+    def release(self, permit: Tuple[str, str]):
+        provider, model = permit
+        with self._condition:
+            for bucket in self._buckets_for(provider, model):
+                bucket.in_flight -= 1
+            self._condition.notify_all()
+
+    def report_rate_limited(self, provider: str, retry_after: Optional[float] = None) -> float:
+        """记录一次限流，所有使用该提供商的请求统一退避，返回退避秒数"""
+        with self._condition:
+            attempts = self._consecutive_429.get(provider, 0) + 1
+            self._consecutive_429[provider] = attempts
+            if retry_after is None:
+                delay = min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+                delay *= random.uniform(0.8, 1.2)
+            else:
+                delay = retry_after
+            self._blocked_until[provider] = max(self._blocked_until.get(provider, 0.0), time.time() + delay)
+            self._stats["rate_limited"] += 1
+            self._condition.notify_all()
+        logger.warning(f"⚠️ [LLM调度] {provider} 触发限流，所有请求退避 {delay:.2f}s")
+        return delay
+
+    def report_success(self, provider: str):
+        if self._consecutive_429.get(provider):
+            with self._condition:
+                self._consecutive_429[provider] = 0
+
+    def run(self, provider: str, model: str, call: Callable[[], Any], messages: Optional[List[Any]] = None,
+            priority: Optional[str] = None) -> Any:
+        """
+        在调度器控制下执行一次LLM调用，遇到限流时统一退避并重试
+
+        Args:
+            provider: 提供商名称
+            model: 模型名称
+            call: 实际发起请求的函数
+            messages: 请求消息，用于估算token预算
+            priority: interactive / batch，默认取当前上下文的优先级
+        """
+        tokens = estimate_tokens(messages) if messages else 0
+        attempt = 0
+        while True:
+            permit = self.acquire(provider, model, tokens, priority)
+            try:
+                result = call()
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                attempt += 1
+                self.report_rate_limited(provider, get_retry_after(e))
+                if attempt > self.max_retries:
+                    raise RateLimitExceededError(
+                        f"{provider}/{model} 重试{self.max_retries}次后仍被限流: {e}"
+                    ) from e
+                continue
+            finally:
+                self.release(permit)
+            self.report_success(provider)
+            return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                **self._stats,
+                "in_flight": {str(k): b.in_flight for k, b in self._buckets.items() if b.in_flight},
+                "waiting": len(self._waiting),
+            }
+
+
+def _limits_from_env(prefix: str) -> RateLimits:
+    return RateLimits(
+        max_concurrency=parse_int_env(f"LLM_MAX_CONCURRENCY{prefix}", 0),
+        tokens_per_minute=parse_int_env(f"LLM_TOKENS_PER_MINUTE{prefix}", 0),
+    )
+
+
+KNOWN_PROVIDERS = ("dashscope", "deepseek", "google", "openai", "qianfan", "custom_openai")
+
+
+def _model_limits_from_env() -> Dict[Tuple[str, str], RateLimits]:
+    """
+    解析 LLM_MODEL_LIMITS，格式为逗号分隔的 提供商/模型=最大并发[:每分钟token]，
+    如 dashscope/qwen-max=2:100000,deepseek/deepseek-chat=4
+    """
+    model_limits = {}
+    for item in parse_list_env("LLM_MODEL_LIMITS"):
+        try:
+            target, values = item.split("=", 1)
+            provider, model = target.strip().split("/", 1)
+            concurrency, _, tokens = values.partition(":")
+            limits = RateLimits(
+                max_concurrency=int(concurrency or 0),
+                tokens_per_minute=int(tokens or 0),
+            )
+        except ValueError:
+            logger.warning(f"⚠️ [LLM调度] 无法解析模型限制 '{item}'，已忽略")
+            continue
+        model_limits[(provider.strip().lower(), model.strip())] = limits
+    return model_limits
+
+
+_scheduler: Optional[LLMRequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_request_scheduler() -> Optional[LLMRequestScheduler]:
+    """
+    获取全局LLM请求调度器（LLM_SCHEDULER_ENABLED=false 时返回 None）
+
+    限制从环境变量读取：
+    - LLM_MAX_CONCURRENCY / LLM_TOKENS_PER_MINUTE: 每个提供商的默认限制
+    - LLM_MAX_CONCURRENCY_<PROVIDER> / LLM_TOKENS_PER_MINUTE_<PROVIDER>: 指定提供商的限制
+    - LLM_MODEL_LIMITS: 指定模型的限制，如 dashscope/qwen-max=2:100000
+    """
+    global _scheduler
+    if not parse_bool_env("LLM_SCHEDULER_ENABLED", True):
+        return None
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                default_limits = RateLimits(
+                    max_concurrency=parse_int_env("LLM_MAX_CONCURRENCY", 8),
+                    tokens_per_minute=parse_int_env("LLM_TOKENS_PER_MINUTE", 0),
+                )
+                provider_limits = {}
+                for provider in KNOWN_PROVIDERS:
+                    limits = _limits_from_env(f"_{provider.upper()}")
+                    if limits.max_concurrency or limits.tokens_per_minute:
+                        provider_limits[provider] = RateLimits(
+                            max_concurrency=limits.max_concurrency or default_limits.max_concurrency,
+                            tokens_per_minute=limits.tokens_per_minute or default_limits.tokens_per_minute,
+                        )
+                _scheduler = LLMRequestScheduler(
+                    provider_limits=provider_limits,
+                    model_limits=_model_limits_from_env(),
+                    default_limits=default_limits,
+                    max_retries=parse_int_env("LLM_RATE_LIMIT_MAX_RETRIES", 5),
+                )
+    return _scheduler
+
+
+def set_llm_request_scheduler(scheduler: Optional[LLMRequestScheduler]):
+    """替换全局调度器（用于测试或自定义限额）"""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
+
+
+def schedule_llm_call(provider: str, model: str, call: Callable[[], Any],
+                      messages: Optional[List[Any]] = None) -> Any:
+    """通过全局调度器执行LLM调用；调度器关闭时直接调用"""
+    scheduler = get_llm_request_scheduler()
+    if scheduler is None:
+        return call()
+    return scheduler.run(provider, model, call, messages=messages)
@@ -0,0 +1,344 @@
+"""
+LLM响应缓存
+按 (模型, 消息, 工具, 采样参数) 的内容哈希缓存LLM响应，支持磁盘和Redis后端
+
+缓存模式:
+- off: 关闭缓存（默认），所有请求直接发送给提供商
+- read_write: 命中时直接返回缓存，未命中时调用提供商并写入缓存（录制）
+- replay: 严格回放，只从缓存读取，未命中时抛出 LLMCacheMissError，
+  用于离线重跑回测/回归测试，保证结果确定且不产生费用
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# 导入日志模块
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('agents')
+
+
+CACHE_MODES = ("off", "read_write", "replay")
+
+# 不参与缓存键计算的调用参数（仅用于统计，不影响模型输出）
+_NON_SEMANTIC_KWARGS = {"session_id", "analysis_type"}
+
+DEFAULT_LLM_RESPONSE_CACHE_DIR = "./data/llm_responses"
+
+
+class LLMCacheMissError(RuntimeError):
+    """严格回放模式下缓存未命中"""
+
+
+class FileResponseCacheBackend:
+    """磁盘缓存后端，每个响应一个JSON文件，按哈希前两位分目录"""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️ [LLM缓存] 读取缓存文件失败 {path}: {e}")
+            return None
+
+    def set(self, key: str, entry: Dict[str, Any]):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再替换，避免并发读到半个文件
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+
+
+class RedisResponseCacheBackend:
+    """Redis缓存后端"""
+
+    def __init__(self, redis_client, prefix: str = "llm_cache:", ttl_seconds: Optional[int] = None):
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        data = self.redis_client.get(self.prefix + key)
+        if data is None:
+            return None
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+    def set(self, key: str, entry: Dict[str, Any]):
+        payload = json.dumps(entry, ensure_ascii=False, default=str)
+        if self.ttl_seconds:
+            self.redis_client.setex(self.prefix + key, self.ttl_seconds, payload)
+        else:
+            self.redis_client.set(self.prefix + key, payload)
+
+
+def _json_safe(value: Any) -> Any:
+    """只保留可稳定序列化的参数值，忽略客户端对象等"""
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _json_safe(v) for k, v in value.items()}
+    if hasattr(value, "model_dump"):
+        return _json_safe(value.model_dump())
+    return None
+
+
+def _normalize_message(message: BaseMessage) -> Dict[str, Any]:
+    """提取消息中影响模型输出的部分（忽略随机生成的消息ID和工具调用ID）"""
+    data = {"type": message.type, "content": message.content}
+    if getattr(message, "name", None):
+        data["name"] = message.name
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        data["tool_calls"] = [{"name": tc.get("name"), "args": tc.get("args")} for tc in tool_calls]
+    return data
+
+
+def _current_agent_name(run_manager=None) -> str:
+    """从LangGraph运行上下文中获取当前节点名称，用于分Agent统计"""
+    metadata = getattr(run_manager, "metadata", None) or {}
+    node = metadata.get("langgraph_node")
+    if node:
+        return node
+    try:
+        from langchain_core.runnables.config import ensure_config
+        node = ensure_config().get("metadata", {}).get("langgraph_node")
+    except Exception:
+        node = None
+    return node or "unknown"
+
+
+class LLMResponseCache:
+    """内容寻址的LLM响应缓存，带录制/回放模式和分Agent命中统计"""
+
+    def __init__(self, mode: str = "off", backend=None):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"不支持的LLM缓存模式: {mode}，可选值: {', '.join(CACHE_MODES)}")
+        if mode != "off" and backend is None:
+            raise ValueError("启用LLM缓存时必须提供缓存后端")
+        self.mode = mode
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def make_key(self, llm: Any, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                 **kwargs: Any) -> str:
+        """根据模型、消息、工具和采样参数计算缓存键"""
+        try:
+            identifying_params = dict(llm._identifying_params)
+        except Exception:
+            identifying_params = {"model": getattr(llm, "model_name", None) or getattr(llm, "model", None)}
+
+        call_params = {k: v for k, v in kwargs.items() if k not in _NON_SEMANTIC_KWARGS}
+        payload = {
+            "llm_type": getattr(llm, "_llm_type", type(llm).__name__),
+            "params": _json_safe(identifying_params),
+            "messages": [_normalize_message(m) for m in messages],
+            "stop": stop,
+            "call_params": _json_safe(call_params),
+        }
+        serialized = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    def generate(self, llm: Any, messages: List[BaseMessage], call: Callable[[], ChatResult],
+                 stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        """
+        带缓存的生成调用
+
+        Args:
+            llm: 发起调用的LLM实例
+            messages: 输入消息
+            call: 实际调用提供商的函数，仅在未命中时执行
+            stop: 停止词
+            run_manager: LangChain回调管理器，用于识别当前Agent
+            **kwargs: 其他调用参数（工具、tool_choice等）
+        """
+        if not self.enabled:
+            return call()
+
+        agent = _current_agent_name(run_manager)
+        key = self.make_key(llm, messages, stop, **kwargs)
+
+        entry = None
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"⚠️ [LLM缓存] 读取缓存失败: {e}")
+
+        if entry is not None:
+            self._record(agent, hit=True, latency_saved=entry.get("elapsed", 0.0))
+            logger.debug(f"🎯 [LLM缓存] 命中: agent={agent}, key={key[:12]}")
+            return self._deserialize(entry)
+
+        self._record(agent, hit=False)
+        if self.mode == "replay":
+            raise LLMCacheMissError(
+                f"LLM缓存回放模式未命中: agent={agent}, key={key}。"
+                f"请先使用 read_write 模式录制该请求。"
+            )
+
+        start_time = time.time()
+        result = call()
+        elapsed = time.time() - start_time
+
+        try:
+            self.backend.set(key, self._serialize(result, elapsed))
+        except Exception as e:
+            logger.warning(f"⚠️ [LLM缓存] 写入缓存失败: {e}")
+        return result
+
+    def _serialize(self, result: ChatResult, elapsed: float) -> Dict[str, Any]:
+        return {
+            "generations": [
+                {
+                    "message": message_to_dict(generation.message),
+                    "generation_info": generation.generation_info,
+                }
+                for generation in result.generations
+            ],
+            "llm_output": result.llm_output,
+            "elapsed": elapsed,
+            "created_at": datetime.now().isoformat(),
+        }
+
+    def _deserialize(self, entry: Dict[str, Any]) -> ChatResult:
+        generations = []
+        for item in entry["generations"]:
+            message = messages_from_dict([item["message"]])[0]
+            generations.append(ChatGeneration(message=message, generation_info=item.get("generation_info")))
+        return ChatResult(generations=generations, llm_output=entry.get("llm_output"))
+
+    def _record(self, agent: str, hit: bool, latency_saved: float = 0.0):
+        with self._lock:
+            stats = self._stats.setdefault(agent, {"hits": 0, "misses": 0, "latency_saved": 0.0})
+            if hit:
+                stats["hits"] += 1
+                stats["latency_saved"] += latency_saved
+            else:
+                stats["misses"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """当前累计计数的副本，作为 get_stats/log_stats 的 since 参数可只统计之后的调用"""
+        with self._lock:
+            return {agent: dict(stats) for agent, stats in self._stats.items()}
+
+    def get_stats(self, since: Optional[Dict[str, Dict[str, float]]] = None) -> Dict[str, Dict[str, float]]:
+        """
+        获取分Agent的命中统计（命中数、未命中数、命中率、节省的时间）
+
+        Args:
+            since: snapshot() 的返回值，指定时只统计快照之后的调用（单次分析的报告）
+        """
+        with self._lock:
+            result = {}
+            for agent, stats in self._stats.items():
+                base = (since or {}).get(agent, {})
+                delta = {key: value - base.get(key, 0) for key, value in stats.items()}
+                total = delta["hits"] + delta["misses"]
+                if since is not None and not total:
+                    continue
+                result[agent] = {
+                    **delta,
+                    "hit_rate": delta["hits"] / total if total else 0.0,
+                }
+            return result
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+    def log_stats(self, since: Optional[Dict[str, Dict[str, float]]] = None):
+        """输出分Agent的缓存命中报告，since 为 snapshot() 的返回值时只报告之后的调用"""
+        stats = self.get_stats(since)
+        if not self.enabled or not stats:
+            return
+        total_hits = sum(s["hits"] for s in stats.values())
+        total_misses = sum(s["misses"] for s in stats.values())
+        total_saved = sum(s["latency_saved"] for s in stats.values())
+        logger.info(
+            f"📊 [LLM缓存] 模式: {self.mode}, 命中: {total_hits}, 未命中: {total_misses}, "
+            f"节省时间: {total_saved:.2f}s"
+        )
+        for agent, s in sorted(stats.items()):
+            logger.info(
+                f"   {agent}: 命中率 {s['hit_rate']:.0%} ({s['hits']}/{s['hits'] + s['misses']}), "
+                f"节省 {s['latency_saved']:.2f}s"
+            )
+
+
+def _create_backend(backend: str, cache_dir: Optional[str] = None):
+    if backend == "redis":
+        from tradingagents.config.database_manager import get_redis_client
+        redis_client = get_redis_client()
+        if redis_client is not None:
+            return RedisResponseCacheBackend(redis_client)
+        logger.warning("⚠️ [LLM缓存] Redis不可用，回退到磁盘缓存")
+    return FileResponseCacheBackend(cache_dir or DEFAULT_LLM_RESPONSE_CACHE_DIR)
+
+
+_response_cache: Optional[LLMResponseCache] = None
+_response_cache_settings: Optional[tuple] = None
+_response_cache_lock = threading.Lock()
+
+
+def configure_llm_response_cache(mode: Optional[str] = None, backend: Optional[str] = None,
+                                 cache_dir: Optional[str] = None) -> LLMResponseCache:
+    """
+    配置全局LLM响应缓存，未指定的参数从环境变量读取
+    配置与当前实例相同时复用已有实例，避免替换其他分析正在使用的缓存和统计
+
+    Args:
+        mode: off / read_write / replay (LLM_RESPONSE_CACHE_MODE)
+        backend: file / redis (LLM_RESPONSE_CACHE_BACKEND)
+        cache_dir: 磁盘缓存目录 (LLM_RESPONSE_CACHE_DIR)
+    """
+    global _response_cache, _response_cache_settings
+    mode = (mode or os.getenv("LLM_RESPONSE_CACHE_MODE", "off")).lower()
+    backend = (backend or os.getenv("LLM_RESPONSE_CACHE_BACKEND", "file")).lower()
+    cache_dir = cache_dir or os.getenv("LLM_RESPONSE_CACHE_DIR") or None
+    settings = ("off",) if mode == "off" else (mode, backend, cache_dir or DEFAULT_LLM_RESPONSE_CACHE_DIR)
+
+    with _response_cache_lock:
+        if _response_cache is not None and _response_cache_settings == settings:
+            return _response_cache
+        if mode == "off":
+            _response_cache = LLMResponseCache("off")
+        else:
+            _response_cache = LLMResponseCache(mode, _create_backend(backend, cache_dir))
+            logger.info(f"🗄️ [LLM缓存] 已启用响应缓存: 模式={mode}, 后端={backend}")
+        _response_cache_settings = settings
+    return _response_cache
+
+
+def get_llm_response_cache() -> LLMResponseCache:
+    """获取全局LLM响应缓存实例（首次调用时按环境变量初始化）"""
+    if _response_cache is None:
+        return configure_llm_response_cache()
+    return _response_cache
@@ -0,0 +1,202 @@
+"""
+LLM流式输出
+在分析运行期间把模型逐token输出推送给CLI/Web进度界面，并统计各Agent的首token耗时(TTFT)
+
+用法:
+    def on_partial(agent: str, text: str, done: bool):
+        ...
+
+    with stream_listener(on_partial):
+        graph.propagate("000001", "2025-01-01")
+
+只有存在监听器时适配器才会改用流式接口，未注册监听器时行为与之前一致。
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import generate_from_stream
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+
+from tradingagents.config.env_utils import parse_bool_env
+
+from .response_cache import _current_agent_name
+
+# 导入日志模块
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('agents')
+
+
+# 监听器签名: (agent名称, 当前累计文本, 是否结束)
+StreamCallback = Callable[[str, str, bool], None]
+
+# 默认节流参数：至少间隔 0.5 秒或新增 200 个字符才推送一次
+DEFAULT_MIN_INTERVAL = 0.5
+DEFAULT_MIN_CHARS = 200
+
+
+class ThrottledStreamListener:
+    """对监听器做节流，避免每个token都触发一次UI/存储写入"""
+
+    def __init__(self, callback: StreamCallback, min_interval: float = DEFAULT_MIN_INTERVAL,
+                 min_chars: int = DEFAULT_MIN_CHARS):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.min_chars = min_chars
+        self._lock = threading.Lock()
+        # agent -> (上次推送时间, 上次推送时的文本长度)
+        self._last_emit: Dict[str, tuple] = {}
+        self.emit_count = 0
+
+    def on_partial(self, agent: str, text: str):
+        now = time.time()
+        with self._lock:
+            last_time, last_len = self._last_emit.get(agent, (0.0, 0))
+            if now - last_time < self.min_interval and len(text) - last_len < self.min_chars:
+                return
+            self._last_emit[agent] = (now, len(text))
+            self.emit_count += 1
+        self._safe_call(agent, text, False)
+
+    def on_done(self, agent: str, text: str):
+        with self._lock:
+            self._last_emit.pop(agent, None)
+            self.emit_count += 1
+        self._safe_call(agent, text, True)
+
+    def _safe_call(self, agent: str, text: str, done: bool):
+        # 界面回调出错不能影响分析本身
+        try:
+            self.callback(agent, text, done)
+        except Exception as e:
+            logger.warning(f"⚠️ [流式输出] 监听器回调失败: {e}")
+
+
+_current_listener: contextvars.ContextVar[Optional[ThrottledStreamListener]] = contextvars.ContextVar(
+    "llm_stream_listener", default=None
+)
+
+
+@contextmanager
+def stream_listener(callback: Optional[StreamCallback], min_interval: float = DEFAULT_MIN_INTERVAL,
+                    min_chars: int = DEFAULT_MIN_CHARS):
+    """
+    在上下文中注册流式输出监听器，callback 为 None 时不做任何事
+
+    LangGraph 在工作线程中执行节点时会复制上下文，因此监听器对整次分析生效
+    """
+    if callback is None:
+        yield None
+        return
+    listener = ThrottledStreamListener(callback, min_interval, min_chars)
+    token = _current_listener.set(listener)
+    try:
+        yield listener
+    finally:
+        _current_listener.reset(token)
+
+
+def get_stream_listener() -> Optional[ThrottledStreamListener]:
+    """获取当前上下文的监听器（流式输出被禁用时返回 None）"""
+    if not parse_bool_env("LLM_STREAMING_ENABLED", True):
+        return None
+    return _current_listener.get()
+
+
+class StreamingStats:
+    """分Agent的首token耗时(TTFT)和总耗时统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, List[float]]] = {}
+
+    def record(self, agent: str, ttft: Optional[float], total: float):
+        with self._lock:
+            stats = self._stats.setdefault(agent, {"ttft": [], "total": []})
+            if ttft is not None:
+                stats["ttft"].append(ttft)
+            stats["total"].append(total)
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """当前各Agent已记录的次数，作为 get_stats/log_stats 的 since 参数可只统计之后的调用"""
+        with self._lock:
+            return {agent: {key: len(values) for key, values in stats.items()}
+                    for agent, stats in self._stats.items()}
+
+    def get_stats(self, since: Optional[Dict[str, Dict[str, int]]] = None) -> Dict[str, Dict[str, float]]:
+        """
+        获取分Agent的调用次数、平均/最大首token耗时和平均总耗时
+
+        Args:
+            since: snapshot() 的返回值，指定时只统计快照之后的调用（单次分析的报告）
+        """
+        with self._lock:
+            result = {}
+            for agent, stats in self._stats.items():
+                base = (since or {}).get(agent, {})
+                ttft = stats["ttft"][base.get("ttft", 0):]
+                total = stats["total"][base.get("total", 0):]
+                if not total:
+                    continue
+                result[agent] = {
+                    "calls": len(total),
+                    "avg_ttft": sum(ttft) / len(ttft) if ttft else 0.0,
+                    "max_ttft": max(ttft) if ttft else 0.0,
+                    "avg_total": sum(total) / len(total) if total else 0.0,
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def log_stats(self, since: Optional[Dict[str, Dict[str, int]]] = None):
+        """输出分Agent的首token耗时报告，since 为 snapshot() 的返回值时只报告之后的调用"""
+        for agent, s in sorted(self.get_stats(since).items()):
+            logger.info(
+                f"⏱️ [流式输出] {agent}: {s['calls']}次调用, 平均首token {s['avg_ttft']:.2f}s, "
+                f"最大首token {s['max_ttft']:.2f}s, 平均总耗时 {s['avg_total']:.2f}s"
+            )
+
+
+_streaming_stats = StreamingStats()
+
+
+def get_streaming_stats() -> StreamingStats:
+    """获取全局流式输出统计"""
+    return _streaming_stats
+
+
+def collect_stream(chunks: Iterator[ChatGenerationChunk], listener: ThrottledStreamListener,
+                   run_manager=None) -> ChatResult:
+    """
+    消费流式chunk：累计文本推送给监听器、记录首token耗时，最终聚合为完整 ChatResult
+
+    工具调用等非文本内容由 generate_from_stream 负责合并
+    """
+    agent = _current_agent_name(run_manager)
+    start_time = time.time()
+    first_token_time = None
+    collected: List[ChatGenerationChunk] = []
+    text = ""
+
+    for chunk in chunks:
+        collected.append(chunk)
+        piece = chunk.text
+        if not piece:
+            continue
+        if first_token_time is None:
+            first_token_time = time.time()
+        text += piece
+        listener.on_partial(agent, text)
+
+    ttft = first_token_time - start_time if first_token_time is not None else None
+    _streaming_stats.record(agent, ttft, time.time() - start_time)
+    listener.on_done(agent, text)
+    if ttft is not None:
+        logger.debug(f"⏱️ [流式输出] {agent} 首token耗时: {ttft:.2f}s")
+
+    return generate_from_stream(iter(collected))
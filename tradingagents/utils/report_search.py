@@ -0,0 +1,297 @@
+"""
+分析报告全文检索
+保存分析报告时增量更新倒排索引（SQLite FTS5），查询按 BM25 排序。
+
+中文没有空格分词，索引前先把文本切分为词元：连续的中日韩文字切分为相邻二字组（单字保留单字），
+英文和数字按单词小写，文档末尾再追加全部汉字的单字；FTS5 只负责倒排索引和 BM25 计算。
+查询中的每个词切分后作为短语匹配，相邻二字组组成的短语即原文中的连续子串
+（如"产能过剩" -> "产能 能过 过剩"），单个汉字精确匹配单字词元。
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import unicodedata
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from tradingagents.config.env_utils import parse_str_env
+from tradingagents.utils.logging_manager import get_logger
+
+logger = get_logger('default')
+
+DEFAULT_REPORT_SEARCH_DB = "./data/report_search.db"
+
+_CJK_RANGES = "㐀-䶿一-鿿豈-﫿"
+_TOKEN_RE = re.compile(f"[{_CJK_RANGES}]+|[a-z0-9]+")
+_CJK_RE = re.compile(f"[{_CJK_RANGES}]")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS report_docs (
+    doc_id INTEGER PRIMARY KEY,
+    analysis_id TEXT NOT NULL UNIQUE,
+    stock_symbol TEXT,
+    timestamp REAL,
+    tokens BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_report_docs_stock ON report_docs(stock_symbol);
+CREATE VIRTUAL TABLE IF NOT EXISTS report_fts USING fts5(body, content='', tokenize='unicode61 remove_diacritics 0');
+"""
+# 索引词元格式版本（PRAGMA user_version），1: 追加单字词元
+INDEX_VERSION = 1
+
+
+def _phrase_tokens(text: str) -> List[str]:
+    """切分短语词元：中日韩文字为相邻二字组（单字保留单字），英文/数字为小写单词"""
+    tokens = []
+    for run in _TOKEN_RE.findall(unicodedata.normalize('NFKC', text or '').lower()):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def _with_unigrams(tokens: List[str]) -> List[str]:
+    """
+    在短语词元之后追加二字组覆盖的单字，单字查询才能命中词中间和词尾的字（如"减产"中的"产"）；
+    单字放在末尾，不打断二字组和单词之间的相邻关系
+    """
+    unigrams = []
+    for i, token in enumerate(tokens):
+        if len(token) != 2 or not _CJK_RE.match(token):
+            continue
+        unigrams.append(token[0])
+        following = tokens[i + 1] if i + 1 < len(tokens) else ''
+        if not (len(following) == 2 and following[0] == token[1] and _CJK_RE.match(following)):
+            unigrams.append(token[1])
+    return tokens + unigrams
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    切分索引词元：中日韩文字为相邻二字组，英文/数字为小写单词，末尾追加汉字单字
+
+    Example:
+        >>> tokenize("产能过剩 Guidance cut")
+        ['产能', '能过', '过剩', 'guidance', 'cut', '产', '能', '过', '剩']
+    """
+    return _with_unigrams(_phrase_tokens(text))
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    把用户输入转换为 FTS5 查询：按空白分隔的每个词切分后作为一个短语，多个词之间为 AND；
+    单个汉字即单字词元
+
+    Returns:
+        str: FTS5 MATCH 表达式；没有可检索的词元时返回 None
+    """
+    phrases = []
+    for word in (query or '').split():
+        tokens = _phrase_tokens(word)
+        if tokens:
+            phrases.append('"' + ' '.join(tokens) + '"')
+    return ' AND '.join(phrases) if phrases else None
+
+
+def extract_report_text(data: Any) -> str:
+    """收集分析结果中的全部文本（报告、摘要、辩论记录等），用于建立索引"""
+    parts = []
+
+    def collect(value):
+        if isinstance(value, str):
+            parts.append(value)
+        elif isinstance(value, dict):
+            for item in value.values():
+                collect(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                collect(item)
+
+    collect(data)
+    return "\n".join(parts)
+
+
+class ReportSearchIndex:
+    """
+    报告倒排索引（SQLite FTS5，无内容表）
+
+    FTS5 表只保存倒排列表和文档长度（BM25 需要），文档元数据保存在 report_docs；
+    重新索引同一分析时需要用旧词元删除旧文档，旧词元压缩保存在 report_docs.tokens
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(_SCHEMA)
+        self._upgrade(conn)
+
+    @staticmethod
+    def _upgrade(conn: sqlite3.Connection):
+        """旧版本索引只有二字组，用保存的词元补上单字后重新写入（不需要原文）"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < INDEX_VERSION:
+                rows = conn.execute("SELECT doc_id, tokens FROM report_docs").fetchall()
+                for doc_id, blob in rows:
+                    old_tokens = zlib.decompress(blob).decode('utf-8')
+                    tokens = ' '.join(_with_unigrams(old_tokens.split()))
+                    conn.execute("INSERT INTO report_fts (report_fts, rowid, body) VALUES ('delete', ?, ?)",
+                                 (doc_id, old_tokens))
+                    conn.execute("INSERT INTO report_fts (rowid, body) VALUES (?, ?)", (doc_id, tokens))
+                    conn.execute("UPDATE report_docs SET tokens=? WHERE doc_id=?",
+                                 (zlib.compress(tokens.encode('utf-8')), doc_id))
+                conn.execute(f"PRAGMA user_version={INDEX_VERSION}")
+                if rows:
+                    logger.info(f"🔎 [报告检索] 索引已升级（追加单字词元）: {len(rows)} 篇")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程使用独立连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM report_docs").fetchone()[0]
+
+    def indexed_ids(self, analysis_ids: Iterable[str]) -> set:
+        """返回其中已建立索引的分析ID"""
+        rows = self._connection().execute(
+            "SELECT analysis_id FROM report_docs WHERE analysis_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(analysis_ids)),)).fetchall()
+        return {row[0] for row in rows}
+
+    def add(self, analysis_id: str, text: str, stock_symbol: str = '', timestamp: Optional[float] = None):
+        """索引一个分析的报告文本；同一分析再次保存时替换旧索引"""
+        self.add_many([(analysis_id, text, stock_symbol, timestamp)])
+
+    def add_many(self, documents: Iterable[tuple]):
+        """
+        批量索引，documents 为 (analysis_id, text, stock_symbol, timestamp)，在一个事务中写入
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for analysis_id, text, stock_symbol, timestamp in documents:
+                self._delete(conn, analysis_id)
+                tokens = ' '.join(tokenize(text))
+                cursor = conn.execute(
+                    "INSERT INTO report_docs (analysis_id, stock_symbol, timestamp, tokens) VALUES (?, ?, ?, ?)",
+                    (analysis_id, stock_symbol, timestamp or datetime.now().timestamp(),
+                     zlib.compress(tokens.encode('utf-8'))))
+                conn.execute("INSERT INTO report_fts (rowid, body) VALUES (?, ?)", (cursor.lastrowid, tokens))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _delete(conn: sqlite3.Connection, analysis_id: str) -> bool:
+        row = conn.execute("SELECT doc_id, tokens FROM report_docs WHERE analysis_id=?", (analysis_id,)).fetchone()
+        if row is None:
+            return False
+        conn.execute("INSERT INTO report_fts (report_fts, rowid, body) VALUES ('delete', ?, ?)",
+                     (row[0], zlib.decompress(row[1]).decode('utf-8')))
+        conn.execute("DELETE FROM report_docs WHERE doc_id=?", (row[0],))
+        return True
+
+    def remove(self, analysis_id: str) -> bool:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removed = self._delete(conn, analysis_id)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return removed
+
+    def optimize(self):
+        """合并 FTS5 索引段（批量导入后执行，查询更快、索引更小）"""
+        self._connection().execute("INSERT INTO report_fts (report_fts) VALUES ('optimize')")
+
+    def search(self, query: str, limit: int = 20, stock_symbol: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        按 BM25 相关度返回匹配的分析
+
+        Returns:
+            List[Dict]: analysis_id, stock_symbol, timestamp, score（越大越相关）
+        """
+        match = build_match_query(query)
+        if match is None:
+            return []
+        conn = self._connection()
+        if stock_symbol:
+            rows = conn.execute("""
+                SELECT d.analysis_id, d.stock_symbol, d.timestamp, f.rank
+                FROM report_fts f JOIN report_docs d ON d.doc_id = f.rowid
+                WHERE report_fts MATCH ? AND d.stock_symbol = ?
+                ORDER BY f.rank LIMIT ?
+            """, (match, stock_symbol, limit)).fetchall()
+        else:
+            rows = conn.execute("""
+                SELECT d.analysis_id, d.stock_symbol, d.timestamp, hits.rank
+                FROM (SELECT rowid, rank FROM report_fts WHERE report_fts MATCH ? ORDER BY rank LIMIT ?) hits
+                JOIN report_docs d ON d.doc_id = hits.rowid
+                ORDER BY hits.rank
+            """, (match, limit)).fetchall()
+        # FTS5 的 bm25() 越相关值越小（负数），取反作为得分
+        return [{'analysis_id': analysis_id, 'stock_symbol': symbol, 'timestamp': timestamp, 'score': -rank}
+                for analysis_id, symbol, timestamp, rank in rows]
+
+
+_index: Optional[ReportSearchIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_report_search_index() -> Optional[ReportSearchIndex]:
+    """获取全局报告检索索引；当前SQLite不支持FTS5时返回 None"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                try:
+                    _index = ReportSearchIndex(parse_str_env("REPORT_SEARCH_DB", DEFAULT_REPORT_SEARCH_DB))
+                except sqlite3.OperationalError as e:
+                    logger.warning(f"⚠️ [报告检索] 全文检索不可用（SQLite需要FTS5支持）: {e}")
+                    return None
+    return _index
+
+
+def index_report(analysis_id: str, text: str, stock_symbol: str = '', timestamp: Optional[float] = None):
+    """保存报告时更新索引；索引失败不影响保存本身"""
+    try:
+        index = get_report_search_index()
+        if index is not None and analysis_id:
+            index.add(analysis_id, text, stock_symbol, timestamp)
+    except Exception as e:
+        logger.warning(f"⚠️ [报告检索] 更新索引失败 {analysis_id}: {e}")
+
+
+def remove_report(analysis_id: str):
+    """删除报告后从索引中移除"""
+    try:
+        index = get_report_search_index()
+        if index is not None:
+            index.remove(analysis_id)
+    except Exception as e:
+        logger.warning(f"⚠️ [报告检索] 移除索引失败 {analysis_id}: {e}")
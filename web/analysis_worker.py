@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+TradingAgents-CN 分析工作进程
+从跨进程任务队列（Redis或SQLite）领取Web界面提交的分析任务并执行，
+进度写入与Web界面相同的 AsyncProgressTracker 键，多个工作进程/主机可以服务同一个Web前端。
+
+用法:
+    ANALYSIS_QUEUE_BACKEND=redis python web/analysis_worker.py --concurrency 2
+"""
+
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Optional
+
+# 添加项目根目录和web目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from dotenv import load_dotenv
+
+from tradingagents.config.env_utils import parse_float_env, parse_int_env
+from tradingagents.utils.logging_manager import get_logger
+
+logger = get_logger('web')
+
+# 工作进程刷新心跳的间隔，以及判定工作进程已退出的心跳超时（秒）
+HEARTBEAT_INTERVAL = 15.0
+HEARTBEAT_TIMEOUT = 120.0
+# 取消标志的检查间隔（秒），避免每条进度都查询队列
+CANCEL_CHECK_INTERVAL = 2.0
+
+
+def _execute(backend, job: dict, runner: Optional[Callable], save_result: Optional[Callable]) -> str:
+    """执行一个已领取的任务，返回最终状态"""
+    from web.utils.analysis_jobs import run_analysis_job
+    from web.utils.async_progress_tracker import AsyncProgressTracker
+
+    analysis_id = job['job_id']
+    params = job['payload']
+    tracker = AsyncProgressTracker(
+        analysis_id=analysis_id,
+        analysts=params['analysts'],
+        research_depth=params['research_depth'],
+        llm_provider=params['llm_provider'],
+        user=job.get('user')
+    )
+
+    last_check = [0.0, False]
+
+    def cancel_check() -> bool:
+        now = time.time()
+        if not last_check[1] and now - last_check[0] >= CANCEL_CHECK_INTERVAL:
+            last_check[0] = now
+            last_check[1] = backend.is_cancel_requested(analysis_id)
+        return last_check[1]
+
+    return run_analysis_job(analysis_id, params, tracker, cancel_check=cancel_check,
+                            runner=runner, save_result=save_result)
+
+
+def run_worker(backend, concurrency: int = 1, worker_id: Optional[str] = None,
+               runner: Optional[Callable] = None, save_result: Optional[Callable] = None,
+               stop_event: Optional[threading.Event] = None, max_jobs: Optional[int] = None,
+               poll_interval: float = 1.0, heartbeat_interval: float = HEARTBEAT_INTERVAL,
+               heartbeat_timeout: float = HEARTBEAT_TIMEOUT) -> int:
+    """
+    工作进程主循环：concurrency 个线程领取并执行任务
+
+    Args:
+        backend: 跨进程任务队列 (SQLiteJobQueue / RedisJobQueue)
+        runner / save_result: 分析函数和结果保存函数，默认使用Web界面相同的实现
+        stop_event: 设置后处理完当前任务即退出
+        max_jobs: 处理指定数量的任务后退出（None 表示一直运行）
+        poll_interval: 队列为空时的轮询间隔（秒）
+
+    Returns:
+        int: 本进程处理的任务数
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    stop_event = stop_event or threading.Event()
+    lock = threading.Lock()
+    active = set()
+    processed = [0]
+
+    def take_slot() -> bool:
+        with lock:
+            if max_jobs is not None and processed[0] >= max_jobs:
+                return False
+            processed[0] += 1
+            return True
+
+    def release_slot():
+        with lock:
+            processed[0] -= 1
+
+    def loop():
+        while not stop_event.is_set():
+            if not take_slot():
+                return
+            job = backend.claim(worker_id)
+            if job is None:
+                release_slot()
+                stop_event.wait(poll_interval)
+                continue
+            with lock:
+                active.add(job['job_id'])
+            status, error = 'failed', None
+            try:
+                status = _execute(backend, job, runner, save_result)
+            except Exception as e:
+                error = str(e)
+                logger.error(f"❌ [工作进程] 任务执行异常: {job['job_id']}: {e}")
+            finally:
+                with lock:
+                    active.discard(job['job_id'])
+                backend.finish(job['job_id'], status, error)
+                logger.info(f"⏹️ [工作进程] 任务结束: {job['job_id']} -> {status}")
+
+    def heartbeat():
+        while not stop_event.wait(heartbeat_interval):
+            with lock:
+                job_ids = list(active)
+            try:
+                backend.heartbeat(job_ids)
+                stale = backend.fail_stale(heartbeat_timeout)
+                if stale:
+                    logger.warning(f"⚠️ [工作进程] 心跳超时的任务已标记失败: {stale}")
+            except Exception as e:
+                logger.warning(f"⚠️ [工作进程] 刷新心跳失败: {e}")
+
+    logger.info(f"🧵 [工作进程] 启动: {worker_id}, 并发: {concurrency}")
+    threads = [threading.Thread(target=loop, name=f"AnalysisWorker-{i + 1}", daemon=True)
+               for i in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    heartbeat_thread = threading.Thread(target=heartbeat, name="AnalysisWorkerHeartbeat", daemon=True)
+    heartbeat_thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        logger.info("🛑 [工作进程] 收到中断信号，等待当前任务结束...")
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+    stop_event.set()
+    logger.info(f"🧵 [工作进程] 退出: {worker_id}, 处理任务数: {processed[0]}")
+    return processed[0]
+
+
+def main():
+    load_dotenv(project_root / ".env", override=True)
+
+    parser = argparse.ArgumentParser(description="TradingAgents-CN 分析工作进程")
+    parser.add_argument("--concurrency", type=int, default=parse_int_env("ANALYSIS_WORKER_CONCURRENCY", 1),
+                        help="本进程同时执行的分析数")
+    parser.add_argument("--poll-interval", type=float, default=parse_float_env("ANALYSIS_WORKER_POLL_INTERVAL", 1.0),
+                        help="队列为空时的轮询间隔（秒）")
+    args = parser.parse_args()
+
+    from web.utils.distributed_queue import get_job_backend
+    backend = get_job_backend()
+    if backend is None:
+        logger.error("❌ 未配置跨进程任务队列，请设置 ANALYSIS_QUEUE_BACKEND=redis 或 sqlite")
+        return 1
+
+    run_worker(backend, concurrency=args.concurrency, poll_interval=args.poll_interval)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
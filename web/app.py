@@ -37,14 +37,14 @@ from components.analysis_form import render_analysis_form
 from components.results_display import render_results
 from components.login import render_login_form, check_authentication, render_user_info, render_sidebar_user_info, render_sidebar_logout, require_permission
 from components.user_activity_dashboard import render_user_activity_dashboard, render_activity_summary_widget
-from utils.api_checker import check_api_keys
-from utils.analysis_runner import run_stock_analysis, validate_analysis_params, format_analysis_results
-from utils.progress_tracker import SmartStreamlitProgressDisplay, create_smart_progress_callback
-from utils.async_progress_tracker import AsyncProgressTracker
+from web.utils.api_checker import check_api_keys
+from web.utils.analysis_runner import run_stock_analysis, validate_analysis_params, format_analysis_results
+from web.utils.progress_tracker import SmartStreamlitProgressDisplay, create_smart_progress_callback
+from web.utils.async_progress_tracker import AsyncProgressTracker, format_time
 from components.async_progress_display import display_unified_progress
-from utils.smart_session_manager import get_persistent_analysis_id, set_persistent_analysis_id
-from utils.auth_manager import auth_manager
-from utils.user_activity_logger import user_activity_logger
+from web.utils.smart_session_manager import get_persistent_analysis_id, set_persistent_analysis_id
+from web.utils.auth_manager import auth_manager
+from web.utils.user_activity_logger import user_activity_logger
 
 # 设置页面配置
 st.set_page_config(
@@ -341,10 +341,11 @@ def initialize_session_state():
     # 尝试从最新完成的分析中恢复结果
     if not st.session_state.analysis_results:
         try:
-            from utils.async_progress_tracker import get_latest_analysis_id, get_progress_by_id
-            from utils.analysis_runner import format_analysis_results
+            from web.utils.async_progress_tracker import get_latest_analysis_id, get_progress_by_id
+            from web.utils.analysis_runner import format_analysis_results
 
-            latest_id = get_latest_analysis_id()
+            current_user = auth_manager.get_current_user() or {}
+            latest_id = get_latest_analysis_id(user=current_user.get('username'))
             if latest_id:
                 progress_data = get_progress_by_id(latest_id)
                 if (progress_data and
@@ -376,7 +377,7 @@ def initialize_session_state():
         persistent_analysis_id = get_persistent_analysis_id()
         if persistent_analysis_id:
             # 使用线程检测来检查分析状态
-            from utils.thread_tracker import check_analysis_status
+            from web.utils.thread_tracker import check_analysis_status
             actual_status = check_analysis_status(persistent_analysis_id)
 
             # 只在状态变化时记录日志，避免重复
@@ -385,10 +386,10 @@ def initialize_session_state():
                 logger.info(f"📊 [状态检查] 分析 {persistent_analysis_id} 实际状态: {actual_status}")
                 st.session_state.last_logged_status = actual_status
 
-            if actual_status == 'running':
+            if actual_status in ['queued', 'running']:
                 st.session_state.analysis_running = True
                 st.session_state.current_analysis_id = persistent_analysis_id
-            elif actual_status in ['completed', 'failed']:
+            elif actual_status in ['completed', 'failed', 'cancelled']:
                 st.session_state.analysis_running = False
                 st.session_state.current_analysis_id = persistent_analysis_id
             else:  # not_found
@@ -403,7 +404,7 @@ def initialize_session_state():
 
     # 恢复表单配置
     try:
-        from utils.smart_session_manager import smart_session_manager
+        from web.utils.smart_session_manager import smart_session_manager
         session_data = smart_session_manager.load_analysis_state()
 
         if session_data and 'form_config' in session_data:
@@ -416,7 +417,7 @@ def initialize_session_state():
 
 def check_frontend_auth_cache():
     """检查前端缓存并尝试恢复登录状态"""
-    from utils.auth_manager import auth_manager
+    from web.utils.auth_manager import auth_manager
     
     logger.info("🔍 开始检查前端缓存恢复")
     logger.info(f"📊 当前认证状态: {st.session_state.get('authenticated', False)}")
@@ -1076,7 +1077,7 @@ def main():
             del st.session_state[key]
 
         # 清理死亡线程
-        from utils.thread_tracker import cleanup_dead_analysis_threads
+        from web.utils.thread_tracker import cleanup_dead_analysis_threads
         cleanup_dead_analysis_threads()
 
         st.sidebar.success("✅ Analysis state cleared")
@@ -1167,17 +1168,16 @@ def main():
                 )
 
                 # 创建异步进度跟踪器
+                current_user = auth_manager.get_current_user() or {}
+                username = current_user.get('username', 'anonymous')
                 async_tracker = AsyncProgressTracker(
                     analysis_id=analysis_id,
                     analysts=form_data['analysts'],
                     research_depth=form_data['research_depth'],
-                    llm_provider=config['llm_provider']
+                    llm_provider=config['llm_provider'],
+                    user=username
                 )
 
-                # 创建进度回调函数
-                def progress_callback(message: str, step: int = None, total_steps: int = None):
-                    async_tracker.update_progress(message, step)
-
                 # 显示启动成功消息和加载动效
                 st.success(f"🚀 Analysis started! Analysis ID: {analysis_id}")
 
@@ -1212,90 +1212,50 @@ def main():
                 for key in auto_refresh_keys:
                     st.session_state[key] = True
 
-                # 在后台线程中运行分析（立即启动，不等待倒计时）
-                import threading
+                # 提交到分析队列：默认由Web进程内固定大小的工作线程池执行，
+                # 配置了跨进程队列时由独立的分析工作进程执行
+                from web.utils.analysis_queue import get_analysis_queue, QueueFullError
+                from web.utils.distributed_queue import get_job_backend
+                analysis_params = {
+                    'stock_symbol': form_data['stock_symbol'],
+                    'analysis_date': form_data['analysis_date'],
+                    'analysts': form_data['analysts'],
+                    'research_depth': form_data['research_depth'],
+                    'llm_provider': config['llm_provider'],
+                    'llm_model': config['llm_model'],
+                    'market_type': form_data.get('market_type', '美股'),
+                }
+                job_backend = get_job_backend()
+                analysis_queue = job_backend or get_analysis_queue()
 
                 def run_analysis_in_background():
-                    try:
-                        results = run_stock_analysis(
-                            stock_symbol=form_data['stock_symbol'],
-                            analysis_date=form_data['analysis_date'],
-                            analysts=form_data['analysts'],
-                            research_depth=form_data['research_depth'],
-                            llm_provider=config['llm_provider'],
-                            market_type=form_data.get('market_type', '美股'),
-                            llm_model=config['llm_model'],
-                            progress_callback=progress_callback
-                        )
-
-                        # 标记分析完成并保存结果（不访问session state）
-                        async_tracker.mark_completed("✅ Analysis finished successfully!", results=results)
-
-                        # 自动保存分析结果到历史记录
-                        try:
-                            from components.analysis_results import save_analysis_result
-                            
-                            save_success = save_analysis_result(
-                                analysis_id=analysis_id,
-                                stock_symbol=form_data['stock_symbol'],
-                                analysts=form_data['analysts'],
-                                research_depth=form_data['research_depth'],
-                                result_data=results,
-                                status="completed"
-                            )
-                            
-                            if save_success:
-                                logger.info(f"💾 [后台保存] 分析结果已保存到历史记录: {analysis_id}")
-                            else:
-                                logger.warning(f"⚠️ [后台保存] 保存失败: {analysis_id}")
-                                
-                        except Exception as save_error:
-                            logger.error(f"❌ [后台保存] 保存异常: {save_error}")
-
-                        logger.info(f"✅ [Analysis completed] Stock analysis finished: {analysis_id}")
-
-                    except Exception as e:
-                        # 标记分析失败（不访问session state）
-                        async_tracker.mark_failed(str(e))
-                        
-                        # 保存失败的分析记录
-                        try:
-                            from components.analysis_results import save_analysis_result
-                            
-                            save_analysis_result(
-                                analysis_id=analysis_id,
-                                stock_symbol=form_data['stock_symbol'],
-                                analysts=form_data['analysts'],
-                                research_depth=form_data['research_depth'],
-                                result_data={"error": str(e)},
-                                status="failed"
-                            )
-                            logger.info(f"💾 [Failure record] Analysis failure saved: {analysis_id}")
-                            
-                        except Exception as save_error:
-                            logger.error(f"❌ [失败记录] 保存异常: {save_error}")
-                        
-                        logger.error(f"❌ [Analysis failed] {analysis_id}: {e}")
-
-                    finally:
-                        # 分析结束后注销线程
-                        from utils.thread_tracker import unregister_analysis_thread
-                        unregister_analysis_thread(analysis_id)
-                        logger.info(f"🧵 [Thread cleanup] Analysis thread unregistered: {analysis_id}")
-
-                # 启动后台分析线程
-                analysis_thread = threading.Thread(target=run_analysis_in_background)
-                analysis_thread.daemon = True  # 设置为守护线程，这样主程序退出时线程也会退出
-                analysis_thread.start()
-
-                # 注册线程到跟踪器
-                from utils.thread_tracker import register_analysis_thread
-                register_analysis_thread(analysis_id, analysis_thread)
-
-                logger.info(f"🧵 [Background analysis] Analysis thread started: {analysis_id}")
-
-                # 分析已在后台线程中启动，显示启动信息并刷新页面
-                st.success("🚀 Analysis has started and is running in the background...")
+                    from web.utils.analysis_jobs import run_analysis_job
+                    job = analysis_queue.get_job(analysis_id)
+                    run_analysis_job(analysis_id, analysis_params, async_tracker,
+                                     cancel_check=lambda: job is not None and job.cancelled)
+
+                try:
+                    if job_backend is not None:
+                        job_backend.submit(analysis_id, analysis_params, user=username)
+                        # 进度由工作进程写入，Web进程内的跟踪器不再接收日志
+                        from web.utils.progress_log_handler import unregister_analysis_tracker
+                        unregister_analysis_tracker(analysis_id)
+                    else:
+                        analysis_queue.submit(analysis_id, run_analysis_in_background, user=username)
+                except QueueFullError as e:
+                    async_tracker.mark_failed(str(e))
+                    st.session_state.analysis_running = False
+                    st.error(f"🚦 {e}")
+                    st.stop()
+
+                logger.info(f"🧵 [Background analysis] Analysis job queued: {analysis_id}")
+
+                # 分析已提交到后台队列，显示启动信息并刷新页面
+                position = analysis_queue.get_position(analysis_id)
+                if position:
+                    st.success(f"🚀 Analysis queued at position {position}; it will start when a worker is free...")
+                else:
+                    st.success("🚀 Analysis has started and is running in the background...")
 
                 # 显示启动信息
                 st.info("⏱️ The page will refresh automatically to display analysis progress...")
@@ -1312,21 +1272,25 @@ def main():
             st.header("📊 Stock analysis")
 
             # 使用线程检测来获取真实状态
-            from utils.thread_tracker import check_analysis_status
+            from web.utils.thread_tracker import check_analysis_status
             actual_status = check_analysis_status(current_analysis_id)
-            is_running = (actual_status == 'running')
+            is_running = actual_status in ('queued', 'running')
 
             # 同步session state状态
             if st.session_state.get('analysis_running', False) != is_running:
                 st.session_state.analysis_running = is_running
                 logger.info(f"🔄 [Status sync] Updated analysis state: {is_running} (thread check: {actual_status})")
 
-            # 获取进度数据用于显示
-            from utils.async_progress_tracker import get_progress_by_id
-            progress_data = get_progress_by_id(current_analysis_id)
-
             # 显示分析信息
-            if is_running:
+            from web.utils.analysis_queue import get_analysis_queue
+            from web.utils.distributed_queue import get_job_backend
+            analysis_queue = get_job_backend() or get_analysis_queue()
+            if actual_status == 'queued':
+                position = analysis_queue.get_position(current_analysis_id)
+                wait_seconds = analysis_queue.estimate_wait(current_analysis_id) or 0
+                st.info(f"⏳ Analysis queued: {current_analysis_id} — position {position}, "
+                        f"estimated wait {format_time(wait_seconds)}")
+            elif is_running:
                 st.info(f"🔄 Analysis in progress: {current_analysis_id}")
             else:
                 if actual_status == 'completed':
@@ -1334,6 +1298,9 @@ def main():
 
                 elif actual_status == 'failed':
                     st.error(f"❌ Analysis failed: {current_analysis_id}")
+
+                elif actual_status == 'cancelled':
+                    st.warning(f"🛑 Analysis cancelled: {current_analysis_id}")
                 else:
                     st.warning(f"⚠️ Analysis status unknown: {current_analysis_id}")
 
@@ -1341,6 +1308,12 @@ def main():
             progress_col1, progress_col2 = st.columns([4, 1])
             with progress_col1:
                 st.markdown("### 📊 Analysis progress")
+            if is_running:
+                with progress_col2:
+                    if st.button("🛑 Cancel", key=f"cancel_analysis_{current_analysis_id}",
+                                 help="Remove a queued analysis, or stop a running one at its next step"):
+                        analysis_queue.cancel(current_analysis_id)
+                        st.rerun()
 
             is_completed = display_unified_progress(current_analysis_id, show_refresh_controls=is_running)
 
@@ -1348,11 +1321,15 @@ def main():
             if is_running:
                 st.info("⏱️ The analysis is running. Use the auto-refresh controls below to follow updates.")
 
-            # 如果分析刚完成，尝试恢复结果
-            if is_completed and not st.session_state.get('analysis_results') and progress_data:
+            # 如果分析刚完成，读取完整进度（含分析结果）尝试恢复结果；运行中的进度由推送事件更新
+            progress_data = None
+            if is_completed and not st.session_state.get('analysis_results'):
+                from web.utils.async_progress_tracker import get_progress_by_id
+                progress_data = get_progress_by_id(current_analysis_id)
+            if progress_data:
                 if 'raw_results' in progress_data:
                     try:
-                        from utils.analysis_runner import format_analysis_results
+                        from web.utils.analysis_runner import format_analysis_results
                         raw_results = progress_data['raw_results']
                         formatted_results = format_analysis_results(raw_results)
                         if formatted_results:
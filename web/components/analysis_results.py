@@ -24,6 +24,9 @@ except ImportError as e:
     MONGODB_AVAILABLE = False
     print(f"❌ MongoDB模块导入失败: {e}")
 
+from web.utils.results_catalog import (get_results_catalog, load_result_body, page_cursor, preferred_source,
+                                       record_analysis_result, search_analysis_ids)
+
 # 设置日志
 logger = logging.getLogger(__name__)
 
@@ -122,213 +125,72 @@ def get_analysis_tags(analysis_id):
     tags = load_tags()
     return tags.get(analysis_id, [])
 
-def load_analysis_results(start_date=None, end_date=None, stock_symbol=None, analyst_type=None,
-                         limit=100, search_text=None, tags_filter=None, favorites_only=False):
-    """加载分析结果 - 优先从MongoDB加载"""
-    all_results = []
-    favorites = load_favorites() if favorites_only else []
-    tags_data = load_tags()
-    mongodb_loaded = False
-
-    # 优先从MongoDB加载数据
-    if MONGODB_AVAILABLE:
-        try:
-            print("🔍 [数据加载] 从MongoDB加载分析结果")
-            mongodb_manager = MongoDBReportManager()
-            mongodb_results = mongodb_manager.get_all_reports()
-            print(f"🔍 [数据加载] MongoDB返回 {len(mongodb_results)} 个结果")
-
-            for mongo_result in mongodb_results:
-                # 转换MongoDB结果格式
-                result = {
-                    'analysis_id': mongo_result.get('analysis_id', ''),
-                    'timestamp': mongo_result.get('timestamp', 0),
-                    'stock_symbol': mongo_result.get('stock_symbol', ''),
-                    'analysts': mongo_result.get('analysts', []),
-                    'research_depth': mongo_result.get('research_depth', 1),
-                    'status': mongo_result.get('status', 'completed'),
-                    'summary': mongo_result.get('summary', ''),
-                    'performance': mongo_result.get('performance', {}),
-                    'tags': tags_data.get(mongo_result.get('analysis_id', ''), []),
-                    'is_favorite': mongo_result.get('analysis_id', '') in favorites,
-                    'reports': mongo_result.get('reports', {}),
-                    'source': 'mongodb'  # 标记数据来源
-                }
-                all_results.append(result)
-
-            mongodb_loaded = True
-            print(f"✅ 从MongoDB加载了 {len(mongodb_results)} 个分析结果")
-
-        except Exception as e:
-            print(f"❌ MongoDB加载失败: {e}")
-            logger.error(f"MongoDB加载失败: {e}")
-            mongodb_loaded = False
-    else:
-        print("⚠️ MongoDB不可用，将使用文件系统数据")
-
-    # 只有在MongoDB加载失败或不可用时才从文件系统加载
-    if not mongodb_loaded:
-        print("🔄 [备用数据源] 从文件系统加载分析结果")
-
-        # 首先尝试从Web界面的保存位置读取
-        web_results_dir = get_analysis_results_dir()
-        for result_file in web_results_dir.glob("*.json"):
-            if result_file.name in ['favorites.json', 'tags.json']:
-                continue
-
-            try:
-                with open(result_file, 'r', encoding='utf-8') as f:
-                    result = json.load(f)
-
-                    # 添加标签信息
-                    result['tags'] = tags_data.get(result.get('analysis_id', ''), [])
-                    result['is_favorite'] = result.get('analysis_id', '') in favorites
-                    result['source'] = 'file_system'  # 标记数据来源
-
-                    all_results.append(result)
-            except Exception as e:
-                st.warning(f"读取分析结果文件 {result_file.name} 失败: {e}")
-
-        # 然后从实际的分析结果保存位置读取
-        project_results_dir = Path(__file__).parent.parent.parent / "data" / "analysis_results" / "detailed"
-
-        if project_results_dir.exists():
-            # 遍历股票代码目录
-            for stock_dir in project_results_dir.iterdir():
-                if not stock_dir.is_dir():
-                    continue
-
-                stock_code = stock_dir.name
+def _catalog_filters(start_date=None, end_date=None, stock_symbol=None, analyst_type=None,
+                     search_text=None, tags_filter=None, favorites_only=False, full_text=False):
+    """
+    把页面的过滤条件转换为目录查询条件；收藏和标签保存在JSON文件中，转换为分析ID集合。
+    full_text 时关键词在报告全文中检索，得到按相关度排序的分析ID列表
+    """
+    analysis_ids = None
+    if full_text and search_text:
+        analysis_ids = search_analysis_ids(search_text)
+        search_text = None
+    if favorites_only:
+        favorites = set(load_favorites())
+        analysis_ids = favorites if analysis_ids is None else [i for i in analysis_ids if i in favorites]
+    if tags_filter:
+        tagged = {analysis_id for analysis_id, tags in load_tags().items()
+                  if any(tag in tags for tag in tags_filter)}
+        analysis_ids = tagged if analysis_ids is None else [i for i in analysis_ids if i in tagged]
+    return {
+        'source': preferred_source(),
+        'start_date': start_date,
+        'end_date': end_date,
+        'stock_symbol': stock_symbol,
+        'analyst_type': analyst_type,
+        'search_text': search_text,
+        'analysis_ids': analysis_ids,
+    }
 
-                # 遍历日期目录
-                for date_dir in stock_dir.iterdir():
-                    if not date_dir.is_dir():
-                        continue
+def load_analysis_results(start_date=None, end_date=None, stock_symbol=None, analyst_type=None,
+                         limit=100, search_text=None, tags_filter=None, favorites_only=False,
+                         sort_by='time_desc', offset=0, full_text=False, after=None):
+    """
+    加载分析结果列表 - 从结果目录按条件过滤、排序和分页
+
+    返回的结果只包含摘要字段，不包含报告正文；查看详情时通过 ensure_result_body 按需读取。
+    full_text 为 True 时 search_text 在报告全文中检索，可按相关度排序（sort_by='relevance'）。
+    after 为上一页最后一条记录的 page_cursor 时从其后继续查询（键集分页）
+    """
+    try:
+        filters = _catalog_filters(start_date, end_date, stock_symbol, analyst_type,
+                                   search_text, tags_filter, favorites_only, full_text)
+        entries = get_results_catalog().query(sort_by=sort_by, limit=limit, offset=offset, after=after, **filters)
+    except Exception as e:
+        logger.error(f"加载分析结果目录失败: {e}")
+        return []
 
-                    date_str = date_dir.name
-                    reports_dir = date_dir / "reports"
+    favorites = set(load_favorites())
+    tags_data = load_tags()
+    for entry in entries:
+        entry['tags'] = tags_data.get(entry['analysis_id'], [])
+        entry['is_favorite'] = entry['analysis_id'] in favorites
+    return entries
 
-                    if not reports_dir.exists():
-                        continue
+def summarize_analysis_results(**filter_kwargs):
+    """统计符合条件的全部分析结果（总数、股票数、成功数），不受列表分页影响"""
+    try:
+        return get_results_catalog().summarize(**_catalog_filters(**filter_kwargs))
+    except Exception as e:
+        logger.error(f"统计分析结果失败: {e}")
+        return {'total': 0, 'unique_stocks': 0, 'completed': 0}
 
-                    # 读取所有报告文件
-                    reports = {}
-                    summary_content = ""
-
-                    for report_file in reports_dir.glob("*.md"):
-                        try:
-                            with open(report_file, 'r', encoding='utf-8') as f:
-                                content = f.read()
-                                report_name = report_file.stem
-                                reports[report_name] = content
-
-                                # 如果是最终决策报告，提取摘要
-                                if report_name == "final_trade_decision":
-                                    # 提取前200个字符作为摘要
-                                    summary_content = content[:200].replace('#', '').replace('*', '').strip()
-                                    if len(content) > 200:
-                                        summary_content += "..."
-
-                        except Exception as e:
-                            continue
-
-                    if reports:
-                        # 解析日期
-                        try:
-                            analysis_date = datetime.strptime(date_str, '%Y-%m-%d')
-                            timestamp = analysis_date.timestamp()
-                        except:
-                            timestamp = datetime.now().timestamp()
-
-                        # 创建分析结果条目
-                        analysis_id = f"{stock_code}_{date_str}_{int(timestamp)}"
-
-                        # 尝试从元数据文件中读取真实的研究深度和分析师信息
-                        research_depth = 1
-                        analysts = ['market', 'fundamentals', 'trader']  # 默认值
-
-                        metadata_file = date_dir / "analysis_metadata.json"
-                        if metadata_file.exists():
-                            try:
-                                with open(metadata_file, 'r', encoding='utf-8') as f:
-                                    metadata = json.load(f)
-                                    research_depth = metadata.get('research_depth', 1)
-                                    analysts = metadata.get('analysts', analysts)
-                            except Exception as e:
-                                # 如果读取元数据失败，使用推断逻辑
-                                if len(reports) >= 5:
-                                    research_depth = 3
-                                elif len(reports) >= 3:
-                                    research_depth = 2
-                        else:
-                            # 如果没有元数据文件，使用推断逻辑
-                            if len(reports) >= 5:
-                                research_depth = 3
-                            elif len(reports) >= 3:
-                                research_depth = 2
-
-                        result = {
-                            'analysis_id': analysis_id,
-                            'timestamp': timestamp,
-                            'stock_symbol': stock_code,
-                            'analysts': analysts,
-                            'research_depth': research_depth,
-                            'status': 'completed',
-                            'summary': summary_content,
-                            'performance': {},
-                            'tags': tags_data.get(analysis_id, []),
-                            'is_favorite': analysis_id in favorites,
-                            'reports': reports,  # 保存所有报告内容
-                            'source': 'file_system'  # 标记数据来源
-                        }
-
-                        all_results.append(result)
-
-        print(f"🔄 [备用数据源] 从文件系统加载了 {len(all_results)} 个分析结果")
-    
-    # 过滤结果
-    filtered_results = []
-    for result in all_results:
-        # 收藏过滤
-        if favorites_only and not result.get('is_favorite', False):
-            continue
-            
-        # 时间过滤
-        if start_date or end_date:
-            result_time = safe_timestamp_to_datetime(result.get('timestamp', 0))
-            if start_date and result_time.date() < start_date:
-                continue
-            if end_date and result_time.date() > end_date:
-                continue
-        
-        # 股票代码过滤
-        if stock_symbol and stock_symbol.upper() not in result.get('stock_symbol', '').upper():
-            continue
-        
-        # 分析师类型过滤
-        if analyst_type and analyst_type not in result.get('analysts', []):
-            continue
-            
-        # 文本搜索过滤
-        if search_text:
-            search_text = search_text.lower()
-            searchable_text = f"{result.get('stock_symbol', '')} {result.get('summary', '')} {' '.join(result.get('analysts', []))}".lower()
-            if search_text not in searchable_text:
-                continue
-                
-        # 标签过滤
-        if tags_filter:
-            result_tags = result.get('tags', [])
-            if not any(tag in result_tags for tag in tags_filter):
-                continue
-        
-        filtered_results.append(result)
-    
-    # 按时间倒序排列 - 使用安全的时间戳转换函数确保类型一致
-    filtered_results.sort(key=lambda x: safe_timestamp_to_datetime(x.get('timestamp', 0)), reverse=True)
-    
-    # 限制数量
-    return filtered_results[:limit]
+def ensure_result_body(result):
+    """查看详情时读取分析结果正文（报告内容），读取后缓存在结果字典中"""
+    if not result.get('_body_loaded'):
+        result.update(load_result_body(result))
+        result['_body_loaded'] = True
+    return result
 
 def render_analysis_results():
     """渲染分析结果管理界面"""
@@ -338,7 +200,7 @@ def render_analysis_results():
         import sys
         import os
         sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-        from utils.auth_manager import auth_manager
+        from web.utils.auth_manager import auth_manager
         
         if not auth_manager or not auth_manager.check_permission("analysis"):
             st.error("❌ 您没有权限访问分析结果")
@@ -356,6 +218,7 @@ def render_analysis_results():
         
         # 文本搜索
         search_text = st.text_input("🔍 关键词搜索", placeholder="搜索股票代码、摘要内容...")
+        full_text = st.checkbox("📄 搜索报告全文", help="在全部报告内容中检索关键词（如: 产能过剩），按相关度排序")
         
         # 收藏过滤
         favorites_only = st.checkbox("⭐ 仅显示收藏")
@@ -400,79 +263,103 @@ def render_analysis_results():
         else:
             selected_tags = []
     
-    # 加载分析结果
-    results = load_analysis_results(
-        start_date=start_date,
-        end_date=end_date,
-        stock_symbol=stock_filter if stock_filter else None,
-        analyst_type=analyst_filter,
-        limit=200,
-        search_text=search_text if search_text else None,
-        tags_filter=selected_tags if selected_tags else None,
-        favorites_only=favorites_only
-    )
-    
-    if not results:
+    # 统计和列表都在结果目录上按条件查询，不读取报告正文
+    filter_kwargs = {
+        'start_date': start_date,
+        'end_date': end_date,
+        'stock_symbol': stock_filter if stock_filter else None,
+        'analyst_type': analyst_filter,
+        'search_text': search_text if search_text else None,
+        'tags_filter': selected_tags if selected_tags else None,
+        'favorites_only': favorites_only,
+        'full_text': full_text,
+    }
+    stats = summarize_analysis_results(**filter_kwargs)
+
+    if not stats['total']:
         st.warning("📭 未找到符合条件的分析结果")
         return
-    
+
     # 显示统计概览
     col1, col2, col3, col4 = st.columns(4)
-    
+
     with col1:
-        st.metric("📊 总分析数", len(results))
-    
+        st.metric("📊 总分析数", stats['total'])
+
     with col2:
-        unique_stocks = len(set(result.get('stock_symbol', 'unknown') for result in results))
-        st.metric("📈 分析股票", unique_stocks)
-    
+        st.metric("📈 分析股票", stats['unique_stocks'])
+
     with col3:
-        successful_analyses = sum(1 for result in results if result.get('status') == 'completed')
-        success_rate = (successful_analyses / len(results) * 100) if results else 0
+        success_rate = stats['completed'] / stats['total'] * 100
         st.metric("✅ 成功率", f"{success_rate:.1f}%")
-    
+
     with col4:
-        favorites_count = sum(1 for result in results if result.get('is_favorite', False))
+        favorites_count = summarize_analysis_results(**dict(filter_kwargs, favorites_only=True))['total']
         st.metric("⭐ 收藏数", favorites_count)
-    
+
     # 保留需要的功能按钮，移除不需要的功能
     tab1, tab2, tab3 = st.tabs([
         "📋 结果列表", "📈 统计图表", "📊 详细分析"
     ])
-    
+
     with tab1:
-        render_results_list(results)
-    
+        render_results_list(filter_kwargs, stats['total'])
+
+    # 图表和详细分析使用最近200条结果
+    results = load_analysis_results(limit=200, **filter_kwargs)
+
     with tab2:
         render_results_charts(results)
-    
+
     with tab3:
         render_detailed_analysis(results)
 
-def render_results_list(results: List[Dict[str, Any]]):
-    """渲染分析结果列表"""
-    
+def render_results_list(filter_kwargs: Dict[str, Any], total: int):
+    """渲染分析结果列表（按页从结果目录查询）"""
+
     st.subheader("📋 分析结果列表")
-    
+
     # 排序选项
     col1, col2 = st.columns([2, 1])
+    sort_map = {"时间倒序": 'time_desc', "时间正序": 'time_asc', "股票代码": 'stock_symbol', "成功率": 'status'}
+    if filter_kwargs.get('full_text') and filter_kwargs.get('search_text'):
+        sort_map = {"相关度": 'relevance', **sort_map}
     with col1:
-        sort_by = st.selectbox("排序方式", ["时间倒序", "时间正序", "股票代码", "成功率"])
+        sort_by = st.selectbox("排序方式", list(sort_map))
     with col2:
         view_mode = st.selectbox("显示模式", ["卡片视图", "表格视图"])
-    
-    # 排序结果
-    if sort_by == "时间正序":
-        results.sort(key=lambda x: safe_timestamp_to_datetime(x.get('timestamp', 0)))
-    elif sort_by == "股票代码":
-        results.sort(key=lambda x: x.get('stock_symbol', ''))
-    elif sort_by == "成功率":
-        results.sort(key=lambda x: 1 if x.get('status') == 'completed' else 0, reverse=True)
-    
+
+    # 分页设置
+    page_size = st.selectbox("每页显示", [5, 10, 20, 50], index=1)
+    total_pages = (total + page_size - 1) // page_size
+
+    if total_pages > 1:
+        page = st.number_input("页码", min_value=1, max_value=total_pages, value=1) - 1
+    else:
+        page = 0
+
+    start_idx = page * page_size
+    # 浏览过的页记录下一页的键集游标：顺序翻页时从上一页最后一条记录继续查询，
+    # 直接跳转到没有浏览过的页（或排序方式不支持键集分页）时按偏移量查询
+    cursor_key = json.dumps([filter_kwargs, sort_by, page_size], default=str, ensure_ascii=False)
+    if st.session_state.get('results_page_cursor_key') != cursor_key:
+        st.session_state['results_page_cursor_key'] = cursor_key
+        st.session_state['results_page_cursors'] = {}
+    page_cursors = st.session_state['results_page_cursors']
+    after = page_cursors.get(page)
+    page_results = load_analysis_results(sort_by=sort_map[sort_by], limit=page_size,
+                                         offset=0 if after else start_idx, after=after, **filter_kwargs)
+    if page_results:
+        page_cursors[page + 1] = page_cursor(page_results[-1], sort_map[sort_by])
+
     if view_mode == "表格视图":
-        render_results_table(results)
+        render_results_table(page_results)
     else:
-        render_results_cards(results)
+        render_results_cards(page_results, start_idx)
+
+    # 显示分页信息
+    if total_pages > 1:
+        st.info(f"第 {page + 1} 页，共 {total_pages} 页，总计 {total} 条记录")
 
 def render_results_table(results: List[Dict[str, Any]]):
     """渲染表格视图"""
@@ -494,23 +381,9 @@ def render_results_table(results: List[Dict[str, Any]]):
         df = pd.DataFrame(table_data)
         st.dataframe(df, use_container_width=True)
 
-def render_results_cards(results: List[Dict[str, Any]]):
-    """渲染卡片视图"""
-    
-    # 分页设置
-    page_size = st.selectbox("每页显示", [5, 10, 20, 50], index=1)
-    total_pages = (len(results) + page_size - 1) // page_size
-    
-    if total_pages > 1:
-        page = st.number_input("页码", min_value=1, max_value=total_pages, value=1) - 1
-    else:
-        page = 0
-    
-    # 获取当前页数据
-    start_idx = page * page_size
-    end_idx = min(start_idx + page_size, len(results))
-    page_results = results[start_idx:end_idx]
-    
+def render_results_cards(page_results: List[Dict[str, Any]], start_idx: int = 0):
+    """渲染卡片视图（当前页）"""
+
     # 显示结果卡片
     for i, result in enumerate(page_results):
         analysis_id = result.get('analysis_id', '')
@@ -579,11 +452,7 @@ def render_results_cards(results: List[Dict[str, Any]]):
                 show_expanded_detail(result)
 
             st.divider()
-    
-    # 显示分页信息
-    if total_pages > 1:
-        st.info(f"第 {page + 1} 页，共 {total_pages} 页，总计 {len(results)} 条记录")
-    
+
     # 注意：详情现在以折叠方式显示在每个结果下方
 
 # 弹窗功能已移除，详情现在以折叠方式显示
@@ -1240,6 +1109,7 @@ def render_detailed_analysis(results: List[Dict[str, Any]]):
 def render_detailed_analysis_content(selected_result):
     """渲染详细分析结果内容"""
     st.subheader("📊 完整分析数据")
+    ensure_result_body(selected_result)
 
     # 检查是否有报告数据（支持文件系统和MongoDB）
     if 'reports' in selected_result and selected_result['reports']:
@@ -1446,7 +1316,7 @@ def render_detailed_analysis_content(selected_result):
         # 排除一些基础字段，只显示分析相关的数据
         excluded_keys = {'analysis_id', 'timestamp', 'stock_symbol', 'analysts', 
                         'research_depth', 'status', 'summary', 'performance', 
-                        'is_favorite', 'tags', 'full_data'}
+                        'is_favorite', 'tags', 'full_data', 'body_ref', '_body_loaded'}
         
         # 获取所有分析相关的数据
         analysis_data = {}
@@ -1615,6 +1485,7 @@ def save_analysis_result(analysis_id: str, stock_symbol: str, analysts: List[str
 
         with open(result_file, 'w', encoding='utf-8') as f:
             json.dump(result_entry, f, ensure_ascii=False, indent=2)
+        record_analysis_result(result_entry, 'file_system', str(result_file))
 
         # 2. 保存到MongoDB（如果可用）
         if MONGODB_AVAILABLE:
@@ -1693,6 +1564,7 @@ def save_analysis_result(analysis_id: str, stock_symbol: str, analysts: List[str
 
 def show_expanded_detail(result):
     """显示展开的详情内容"""
+    ensure_result_body(result)
 
     # 创建详情容器
     with st.container():
@@ -9,10 +9,42 @@ import time
 from typing import Optional, Dict, Any
 from web.utils.async_progress_tracker import get_progress_by_id, format_time
 
+from web.utils.progress_events import ProgressViewer
+
 # 导入日志模块
 from tradingagents.utils.logging_manager import get_logger
 logger = get_logger('async_display')
 
+# 自动刷新时最长等待新进度事件的时间（秒），超时后重新读取完整进度
+AUTO_REFRESH_TIMEOUT = 3.0
+
+
+def get_progress_view(analysis_id: str) -> Optional[Dict[str, Any]]:
+    """
+    获取界面显示用的进度：首次读取完整进度作为快照，之后的刷新只合并推送的增量事件
+    """
+    viewer_key = f"progress_viewer_{analysis_id}"
+    viewer = st.session_state.get(viewer_key)
+    if viewer is None or not viewer.data:
+        viewer = ProgressViewer(analysis_id, get_progress_by_id(analysis_id))
+        st.session_state[viewer_key] = viewer
+    viewer.poll()
+    return viewer.data or None
+
+
+def wait_for_progress_update(analysis_id: str, timeout: float = AUTO_REFRESH_TIMEOUT):
+    """
+    自动刷新：有新进度事件时立即返回；超时仍无事件（例如进度由未接入推送的工作进程写入）时
+    丢弃视图，下次刷新重新读取完整进度
+    """
+    viewer_key = f"progress_viewer_{analysis_id}"
+    viewer = st.session_state.get(viewer_key)
+    if viewer is None:
+        time.sleep(timeout)
+        return
+    if not viewer.wait_for_update(timeout):
+        del st.session_state[viewer_key]
+
 class AsyncProgressDisplay:
     """Asynchronous progress display component."""
     
@@ -196,7 +228,7 @@ def streamlit_auto_refresh_progress(analysis_id: str, refresh_interval: int = 2)
     """Streamlit-native automatic progress display."""
 
     # 获取进度数据
-    progress_data = get_progress_by_id(analysis_id)
+    progress_data = get_progress_view(analysis_id)
 
     if not progress_data:
         st.error("❌ Unable to load analysis progress. Please confirm the task is still running.")
@@ -295,8 +327,7 @@ def streamlit_auto_refresh_progress(analysis_id: str, refresh_interval: int = 2)
             default_value = st.session_state.get(auto_refresh_key, True)  # 默认为True
             auto_refresh = st.checkbox("🔄 自动刷新", value=default_value, key=auto_refresh_key)
             if auto_refresh and status == 'running':  # 只在运行时自动刷新
-                import time
-                time.sleep(3)  # 等待3秒
+                wait_for_progress_update(analysis_id)  # 有新进度时立即刷新，最多等待3秒
                 st.rerun()
             elif auto_refresh and status in ['completed', 'failed']:
                 # 分析完成后自动关闭自动刷新
@@ -318,7 +349,7 @@ def display_static_progress(analysis_id: str) -> bool:
         st.session_state[progress_key] = True
 
     # 获取进度数据
-    progress_data = get_progress_by_id(analysis_id)
+    progress_data = get_progress_view(analysis_id)
 
     if not progress_data:
         st.error("❌ 无法获取分析进度，请检查分析是否正在运行")
@@ -431,8 +462,7 @@ def display_static_progress(analysis_id: str) -> bool:
                 default_value = st.session_state.get(auto_refresh_key, True)  # 默认为True
                 auto_refresh = st.checkbox("🔄 自动刷新", value=default_value, key=auto_refresh_key)
                 if auto_refresh and status == 'running':  # 只在运行时自动刷新
-                    import time
-                    time.sleep(3)  # 等待3秒
+                    wait_for_progress_update(analysis_id)  # 有新进度时立即刷新，最多等待3秒
                     st.rerun()
                 elif auto_refresh and status in ['completed', 'failed']:
                     # 分析完成后自动关闭自动刷新
@@ -470,7 +500,7 @@ def display_static_progress_with_controls(analysis_id: str, show_refresh_control
     from web.utils.async_progress_tracker import get_progress_by_id
 
     # 获取进度数据
-    progress_data = get_progress_by_id(analysis_id)
+    progress_data = get_progress_view(analysis_id)
 
     if not progress_data:
         # 如果没有进度数据，显示默认的准备状态
@@ -491,8 +521,7 @@ def display_static_progress_with_controls(analysis_id: str, show_refresh_control
                 default_value = st.session_state.get(auto_refresh_key, True)  # 默认为True
                 auto_refresh = st.checkbox("🔄 自动刷新", value=default_value, key=auto_refresh_key)
                 if auto_refresh and status == 'running':  # 只在运行时自动刷新
-                    import time
-                    time.sleep(3)  # 等待3秒
+                    wait_for_progress_update(analysis_id)  # 有新进度时立即刷新，最多等待3秒
                     st.rerun()
                 elif auto_refresh and status in ['completed', 'failed']:
                     # 分析完成后自动关闭自动刷新
@@ -586,6 +615,13 @@ def display_static_progress_with_controls(analysis_id: str, show_refresh_control
     else:
         st.info(f"{status_icon} **当前状态**: {last_message}")
 
+        # 显示模型实时输出预览
+        streaming_text = progress_data.get('streaming_text')
+        if streaming_text:
+            streaming_agent = progress_data.get('streaming_agent', '')
+            with st.expander(f"✍️ 实时输出: {streaming_agent}", expanded=True):
+                st.markdown(streaming_text)
+
     # 显示刷新控制的条件：
     # 1. 需要显示刷新控件 AND
     # 2. (分析正在运行 OR 分析刚开始还没有状态)
@@ -600,8 +636,7 @@ def display_static_progress_with_controls(analysis_id: str, show_refresh_control
             default_value = st.session_state.get(auto_refresh_key, True)  # 默认为True
             auto_refresh = st.checkbox("🔄 自动刷新", value=default_value, key=auto_refresh_key)
             if auto_refresh and status == 'running':  # 只在运行时自动刷新
-                import time
-                time.sleep(3)  # 等待3秒
+                wait_for_progress_update(analysis_id)  # 有新进度时立即刷新，最多等待3秒
                 st.rerun()
             elif auto_refresh and status in ['completed', 'failed']:
                 # 分析完成后自动关闭自动刷新
@@ -29,7 +29,7 @@ except ImportError:
     except ImportError:
         try:
             # 尝试直接从 utils 导入
-            from utils.auth_manager import AuthManager, auth_manager as imported_auth_manager
+            from web.utils.auth_manager import AuthManager, auth_manager as imported_auth_manager
             auth_manager = imported_auth_manager
         except ImportError:
             try:
@@ -9,7 +9,7 @@ import pandas as pd
 from datetime import datetime
 
 # 导入导出功能
-from utils.report_exporter import render_export_buttons
+from web.utils.report_exporter import render_export_buttons
 
 # 导入日志模块
 from tradingagents.utils.logging_manager import get_logger
@@ -18,7 +18,7 @@ sys.path.insert(0, str(project_root))
 
 # 导入UI工具函数
 sys.path.append(str(Path(__file__).parent.parent))
-from utils.ui_utils import apply_hide_deploy_button_css
+from web.utils.ui_utils import apply_hide_deploy_button_css
 
 from tradingagents.config.config_manager import (
     config_manager, ModelConfig, PricingConfig
@@ -335,19 +335,13 @@ def render_usage_statistics():
     # 使用趋势
     st.markdown("**📈 使用趋势**")
     
-    records = config_manager.load_usage_records()
-    if records:
-        # 按日期聚合
-        daily_stats = {}
-        for record in records:
-            try:
-                date = datetime.fromisoformat(record.timestamp).date()
-                if date not in daily_stats:
-                    daily_stats[date] = {"cost": 0, "requests": 0}
-                daily_stats[date]["cost"] += record.cost
-                daily_stats[date]["requests"] += 1
-            except:
-                continue
+    # 按天汇总查询，不加载原始记录
+    daily_rollups = config_manager.get_usage_rollups(days, "day", group_by=())
+    if daily_rollups:
+        daily_stats = {
+            datetime.strptime(row["bucket"], "%Y-%m-%d").date(): {"cost": row["cost"], "requests": row["requests"]}
+            for row in daily_rollups
+        }
         
         if daily_stats:
             dates = sorted(daily_stats.keys())
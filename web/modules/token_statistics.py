@@ -24,7 +24,7 @@ if project_root not in sys.path:
 # 导入UI工具函数
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
-from utils.ui_utils import apply_hide_deploy_button_css
+from web.utils.ui_utils import apply_hide_deploy_button_css
 
 from tradingagents.config.config_manager import config_manager, token_tracker, UsageRecord
 
@@ -64,10 +64,16 @@ def render_token_statistics():
         if st.button("📥 导出统计数据", use_container_width=True):
             export_statistics_data(days)
     
-    # 获取统计数据
+    # 获取统计数据（来自按小时/按天的汇总，不加载原始记录）
     try:
         stats = config_manager.get_usage_statistics(days)
-        records = load_detailed_records(days)
+        # "今天"按小时展示趋势，其余按天
+        trend_granularity = "hour" if days == 1 else "day"
+        trend_rollups = config_manager.get_usage_rollups(days, trend_granularity, group_by=())
+        # 散点图只展示成本最高的会话
+        session_rollups = config_manager.get_usage_rollups(
+            days, "day", group_by=("session_id", "provider", "model_name"), by_bucket=False, limit=2000
+        )
         
         if not stats or stats.get('total_requests', 0) == 0:
             st.info(f"📊 {time_range}内暂无Token使用记录")
@@ -86,18 +92,18 @@ def render_token_statistics():
         render_overview_metrics(stats, time_range)
         
         # 显示详细图表
-        if records:
-            render_detailed_charts(records, stats)
+        if session_rollups:
+            render_detailed_charts(session_rollups, stats)
         
         # 显示供应商统计
         render_provider_statistics(stats)
         
         # 显示成本趋势
-        if records:
-            render_cost_trends(records)
+        if trend_rollups:
+            render_cost_trends(trend_rollups, trend_granularity)
         
-        # 显示详细记录表
-        render_detailed_records_table(records)
+        # 显示详细记录表（分页查询原始记录）
+        render_detailed_records_table(days)
         
     except Exception as e:
         st.error(f"❌ 获取统计数据失败: {str(e)}")
@@ -157,7 +163,7 @@ def render_overview_metrics(stats: Dict[str, Any], time_range: str):
             delta=f"{stats['total_output_tokens']/(stats['total_input_tokens']+stats['total_output_tokens'])*100:.1f}%"
         )
 
-def render_detailed_charts(records: List[UsageRecord], stats: Dict[str, Any]):
+def render_detailed_charts(session_rollups: List[Dict[str, Any]], stats: Dict[str, Any]):
     """渲染详细图表"""
     st.markdown("**📊 详细分析图表**")
     
@@ -185,25 +191,27 @@ def render_detailed_charts(records: List[UsageRecord], stats: Dict[str, Any]):
     with col2:
         st.markdown("**📈 成本vs Token关系**")
         
-        # 创建散点图
-        df_records = pd.DataFrame([
+        # 创建散点图（每个点为一个会话在一个模型上的用量）
+        df_sessions = pd.DataFrame([
             {
-                'total_tokens': record.input_tokens + record.output_tokens,
-                'cost': record.cost,
-                'provider': record.provider,
-                'model': record.model_name
+                'total_tokens': row['input_tokens'] + row['output_tokens'],
+                'cost': row['cost'],
+                'provider': row['provider'],
+                'model': row['model_name'],
+                'session': row['session_id'],
+                'requests': row['requests']
             }
-            for record in records
+            for row in session_rollups
         ])
         
-        if not df_records.empty:
+        if not df_sessions.empty:
             fig_scatter = px.scatter(
-                df_records,
+                df_sessions,
                 x='total_tokens',
                 y='cost',
                 color='provider',
-                hover_data=['model'],
-                title="成本与Token使用量关系",
+                hover_data=['model', 'session', 'requests'],
+                title="各会话成本与Token使用量关系",
                 labels={'total_tokens': 'Token总数', 'cost': '成本(¥)'}
             )
             st.plotly_chart(fig_scatter, use_container_width=True)
@@ -262,35 +270,30 @@ def render_provider_statistics(stats: Dict[str, Any]):
         )
         st.plotly_chart(fig_requests, use_container_width=True)
 
-def render_cost_trends(records: List[UsageRecord]):
-    """渲染成本趋势图"""
+def render_cost_trends(trend_rollups: List[Dict[str, Any]], granularity: str = "day"):
+    """渲染成本趋势图（数据来自按小时/按天的汇总）"""
     st.markdown("**📈 成本趋势分析**")
     
-    # 按日期聚合数据
-    df_records = pd.DataFrame([
-        {
-            'date': datetime.fromisoformat(record.timestamp).date(),
-            'cost': record.cost,
-            'tokens': record.input_tokens + record.output_tokens,
-            'provider': record.provider
-        }
-        for record in records
-    ])
-    
-    if df_records.empty:
+    if not trend_rollups:
         st.info("暂无趋势数据")
         return
     
-    # 按日期聚合
-    daily_stats = df_records.groupby('date').agg({
-        'cost': 'sum',
-        'tokens': 'sum'
-    }).reset_index()
+    # 时间桶格式: 按天 YYYY-MM-DD，按小时 YYYY-MM-DDTHH
+    bucket_format = '%Y-%m-%dT%H' if granularity == "hour" else '%Y-%m-%d'
+    period = "每小时" if granularity == "hour" else "每日"
+    daily_stats = pd.DataFrame([
+        {
+            'date': datetime.strptime(row['bucket'], bucket_format),
+            'cost': row['cost'],
+            'tokens': row['input_tokens'] + row['output_tokens']
+        }
+        for row in trend_rollups
+    ])
     
     # 创建双轴图表
     fig = make_subplots(
         specs=[[{"secondary_y": True}]],
-        subplot_titles=["每日成本和Token使用趋势"]
+        subplot_titles=[f"{period}成本和Token使用趋势"]
     )
     
     # 添加成本趋势线
@@ -299,7 +302,7 @@ def render_cost_trends(records: List[UsageRecord]):
             x=daily_stats['date'],
             y=daily_stats['cost'],
             mode='lines+markers',
-            name='每日成本(¥)',
+            name=f'{period}成本(¥)',
             line=dict(color='#FF6B6B', width=3)
         ),
         secondary_y=False,
@@ -311,30 +314,42 @@ def render_cost_trends(records: List[UsageRecord]):
             x=daily_stats['date'],
             y=daily_stats['tokens'],
             mode='lines+markers',
-            name='每日Token数',
+            name=f'{period}Token数',
             line=dict(color='#4ECDC4', width=3)
         ),
         secondary_y=True,
     )
     
     # 设置轴标签
-    fig.update_xaxes(title_text="日期")
+    fig.update_xaxes(title_text="时间" if granularity == "hour" else "日期")
     fig.update_yaxes(title_text="成本(¥)", secondary_y=False)
     fig.update_yaxes(title_text="Token数量", secondary_y=True)
     
     fig.update_layout(height=400)
     st.plotly_chart(fig, use_container_width=True)
 
-def render_detailed_records_table(records: List[UsageRecord]):
-    """渲染详细记录表"""
+def render_detailed_records_table(days: int, page_size: int = 20):
+    """渲染详细记录表（只查询当前页的原始记录）"""
     st.markdown("**📋 详细使用记录**")
     
-    if not records:
+    # 页码由下方的分页选择框写入 session_state，切换页面时重新运行只查询新的一页
+    page = st.session_state.get("token_records_page", 1)
+    records, total_records = config_manager.load_usage_records_page(days, page, page_size)
+    if total_records == 0:
         st.info("暂无详细记录")
         return
     
+    # 分页显示
+    total_pages = (total_records + page_size - 1) // page_size
+    if page > total_pages:
+        page = st.session_state["token_records_page"] = total_pages
+        records, _ = config_manager.load_usage_records_page(days, page, page_size)
+    if total_pages > 1:
+        st.selectbox(f"页面 (共{total_pages}页, {total_records}条记录)", range(1, total_pages + 1),
+                     key="token_records_page")
+    
     # 创建记录表格
-    records_df = pd.DataFrame([
+    display_df = pd.DataFrame([
         {
             '时间': datetime.fromisoformat(record.timestamp).strftime('%Y-%m-%d %H:%M:%S'),
             '供应商': record.provider,
@@ -346,42 +361,15 @@ def render_detailed_records_table(records: List[UsageRecord]):
             '会话ID': record.session_id[:12] + '...' if len(record.session_id) > 12 else record.session_id,
             '分析类型': record.analysis_type
         }
-        for record in sorted(records, key=lambda x: x.timestamp, reverse=True)
+        for record in records
     ])
     
-    # 分页显示
-    page_size = 20
-    total_records = len(records_df)
-    total_pages = (total_records + page_size - 1) // page_size
-    
-    if total_pages > 1:
-        page = st.selectbox(f"页面 (共{total_pages}页, {total_records}条记录)", range(1, total_pages + 1))
-        start_idx = (page - 1) * page_size
-        end_idx = min(start_idx + page_size, total_records)
-        display_df = records_df.iloc[start_idx:end_idx]
-    else:
-        display_df = records_df
-    
     st.dataframe(display_df, use_container_width=True)
 
 def load_detailed_records(days: int) -> List[UsageRecord]:
-    """加载详细记录"""
+    """加载详细记录（用于导出）"""
     try:
-        all_records = config_manager.load_usage_records()
-        
-        # 过滤时间范围
-        cutoff_date = datetime.now() - timedelta(days=days)
-        filtered_records = []
-        
-        for record in all_records:
-            try:
-                record_date = datetime.fromisoformat(record.timestamp)
-                if record_date >= cutoff_date:
-                    filtered_records.append(record)
-            except:
-                continue
-        
-        return filtered_records
+        return config_manager.load_usage_records(days=days)
     except Exception as e:
         st.error(f"加载记录失败: {e}")
         return []
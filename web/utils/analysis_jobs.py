@@ -0,0 +1,114 @@
+"""
+分析任务执行
+Web进程内的队列工作线程和独立的分析工作进程共用同一套执行逻辑：
+运行分析、写入进度、保存结果和失败记录
+"""
+
+from typing import Any, Callable, Dict, Optional
+
+from tradingagents.utils.logging_manager import get_logger
+
+from .analysis_queue import AnalysisCancelledError
+from .progress_log_handler import analysis_context
+
+logger = get_logger('web')
+
+
+def run_analysis_job(analysis_id: str, params: Dict[str, Any], tracker,
+                     cancel_check: Optional[Callable[[], bool]] = None,
+                     runner: Optional[Callable[..., Dict[str, Any]]] = None,
+                     save_result: Optional[Callable[..., Any]] = None) -> str:
+    """
+    执行一次分析任务
+
+    Args:
+        analysis_id: 分析ID
+        params: 分析参数 (stock_symbol, analysis_date, analysts, research_depth,
+                llm_provider, llm_model, market_type)
+        tracker: AsyncProgressTracker，进度写入其Redis/文件键
+        cancel_check: 返回 True 表示分析已被取消，在每个进度节点和分析过程中的每次流式输出时检查
+        runner: 分析函数，默认 run_stock_analysis
+        save_result: 结果保存函数，默认 save_analysis_result
+
+    Returns:
+        str: completed / failed / cancelled
+    """
+    if runner is None:
+        from .analysis_runner import run_stock_analysis
+        runner = run_stock_analysis
+    if save_result is None:
+        from web.components.analysis_results import save_analysis_result
+        save_result = save_analysis_result
+
+    def raise_if_cancelled():
+        if cancel_check is not None and cancel_check():
+            raise AnalysisCancelledError(f"分析已取消: {analysis_id}")
+
+    def progress_callback(message: str, step: int = None, total_steps: int = None):
+        raise_if_cancelled()
+        tracker.update_progress(message, step)
+
+    def stream_callback(agent: str, text: str, done: bool = False):
+        # 模型生成过程中检查取消，取消后在当前LLM调用中止分析，不用等到整个分析结束
+        raise_if_cancelled()
+        tracker.update_stream(agent, text, done)
+
+    def save(result_data: Dict[str, Any], status: str) -> bool:
+        return save_result(
+            analysis_id=analysis_id,
+            stock_symbol=params['stock_symbol'],
+            analysts=params['analysts'],
+            research_depth=params['research_depth'],
+            result_data=result_data,
+            status=status
+        )
+
+    try:
+        # 绑定分析ID，分析过程中的模块日志只转发给本次分析的跟踪器
+        with analysis_context(analysis_id):
+            results = runner(
+                stock_symbol=params['stock_symbol'],
+                analysis_date=params['analysis_date'],
+                analysts=params['analysts'],
+                research_depth=params['research_depth'],
+                llm_provider=params['llm_provider'],
+                market_type=params.get('market_type', '美股'),
+                llm_model=params['llm_model'],
+                progress_callback=progress_callback,
+                stream_callback=stream_callback
+            )
+        raise_if_cancelled()
+
+        # 标记分析完成并保存结果（不访问session state）
+        tracker.mark_completed("✅ Analysis finished successfully!", results=results)
+
+        # 自动保存分析结果到历史记录
+        try:
+            if save(results, "completed"):
+                logger.info(f"💾 [后台保存] 分析结果已保存到历史记录: {analysis_id}")
+            else:
+                logger.warning(f"⚠️ [后台保存] 保存失败: {analysis_id}")
+        except Exception as save_error:
+            logger.error(f"❌ [后台保存] 保存异常: {save_error}")
+
+        logger.info(f"✅ [Analysis completed] Stock analysis finished: {analysis_id}")
+        return 'completed'
+
+    except AnalysisCancelledError:
+        tracker.mark_failed("Analysis cancelled by user")
+        logger.info(f"🛑 [Analysis cancelled] {analysis_id}")
+        return 'cancelled'
+
+    except Exception as e:
+        # 标记分析失败（不访问session state）
+        tracker.mark_failed(str(e))
+
+        # 保存失败的分析记录
+        try:
+            save({"error": str(e)}, "failed")
+            logger.info(f"💾 [Failure record] Analysis failure saved: {analysis_id}")
+        except Exception as save_error:
+            logger.error(f"❌ [失败记录] 保存异常: {save_error}")
+
+        logger.error(f"❌ [Analysis failed] {analysis_id}: {e}")
+        return 'failed'
@@ -0,0 +1,293 @@
+"""
+分析任务队列
+固定大小的工作线程池执行分析任务，限制每个用户同时运行的分析数，
+提供排队位置、预计等待时间和取消功能
+"""
+
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from tradingagents.config.env_utils import parse_float_env, parse_int_env
+from tradingagents.utils.logging_manager import get_logger
+
+logger = get_logger('web')
+
+# 尚无完成记录时使用的单个分析预计耗时（秒）
+DEFAULT_ESTIMATED_DURATION = 300.0
+
+# 已结束任务的状态保留时间（秒），之后以进度数据为准
+FINISHED_JOB_TTL = 3600
+
+
+class QueueFullError(Exception):
+    """排队任务数已达上限"""
+
+
+class AnalysisCancelledError(BaseException):
+    """
+    分析已被取消
+
+    与 KeyboardInterrupt 一样继承 BaseException：分析过程中的节点、工具和回调普遍用 except Exception 兜底，
+    取消不能被这些处理吞掉，需要一直传到任务执行层
+    """
+
+
+@dataclass
+class AnalysisJob:
+    """排队或运行中的分析任务"""
+    job_id: str
+    user: str
+    target: Callable[..., Any]
+    args: tuple = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    status: str = 'queued'  # queued / running / completed / failed / cancelled
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def raise_if_cancelled(self):
+        """运行中的分析在进度回调里调用，已取消时中止分析"""
+        if self.cancel_event.is_set():
+            raise AnalysisCancelledError(f"分析已取消: {self.job_id}")
+
+
+class AnalysisJobQueue:
+    """
+    有界分析任务队列
+
+    - max_workers 个工作线程从队列中取任务，同时运行的分析数不超过该值
+    - 每个用户同时运行的分析数不超过 max_per_user，超出的任务留在队列中，
+      不阻塞其他用户排在后面的任务
+    - 排队任务数超过 max_queued 时拒绝提交
+    """
+
+    def __init__(self, max_workers: int = 2, max_per_user: int = 1, max_queued: int = 50,
+                 estimated_duration: float = DEFAULT_ESTIMATED_DURATION):
+        self.max_workers = max(1, max_workers)
+        self.max_per_user = max(1, max_per_user)
+        self.max_queued = max(1, max_queued)
+
+        self._pending: deque = deque()
+        self._jobs: Dict[str, AnalysisJob] = {}
+        self._running_by_user: Dict[str, int] = {}
+        self._running = 0
+        self._condition = threading.Condition()
+        self._workers: List[threading.Thread] = []
+        self._closing = False
+        self._worker_ids = itertools.count(1)
+
+        # 最近完成分析耗时的指数移动平均，用于估算等待时间
+        self._average_duration = estimated_duration
+
+    # ------------------------------------------------------------------ 提交和取消
+
+    def submit(self, job_id: str, target: Callable[..., Any], *args,
+               user: str = 'anonymous', **kwargs) -> AnalysisJob:
+        """提交分析任务；排队已满时抛出 QueueFullError"""
+        with self._condition:
+            if self._closing:
+                raise QueueFullError("分析队列已关闭")
+            if len(self._pending) >= self.max_queued:
+                raise QueueFullError(f"排队分析已达上限 ({self.max_queued})，请稍后再试")
+
+            self._prune_finished()
+            job = AnalysisJob(job_id=job_id, user=user or 'anonymous', target=target,
+                              args=args, kwargs=kwargs)
+            self._jobs[job_id] = job
+            self._pending.append(job)
+            self._ensure_workers()
+            self._condition.notify()
+
+        logger.info(f"📥 [分析队列] 提交任务: {job_id} (用户: {job.user}, 排队: {len(self._pending)})")
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        取消任务：排队中的任务直接移出队列；
+        运行中的任务设置取消标志，由分析的进度回调在下一步检查后中止
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.status not in ('queued', 'running'):
+                return False
+            job.cancel_event.set()
+            if job.status == 'queued':
+                self._pending.remove(job)
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+                self._condition.notify_all()
+        logger.info(f"🛑 [分析队列] 取消任务: {job_id}")
+        return True
+
+    # ------------------------------------------------------------------ 查询
+
+    def get_job(self, job_id: str) -> Optional[AnalysisJob]:
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def get_status(self, job_id: str) -> Optional[str]:
+        """任务状态；不是由队列提交的任务返回 None"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            return job.status if job else None
+
+    def get_position(self, job_id: str) -> Optional[int]:
+        """排队位置（从1开始）；不在队列中时返回 None"""
+        with self._condition:
+            for index, job in enumerate(self._pending):
+                if job.job_id == job_id:
+                    return index + 1
+        return None
+
+    def estimate_wait(self, job_id: str) -> Optional[float]:
+        """
+        预计等待时间（秒）：前面的任务按工作线程数分批，每批按平均耗时计算，
+        再加上当前运行中最早结束的任务的剩余时间
+        """
+        with self._condition:
+            position = None
+            for index, job in enumerate(self._pending):
+                if job.job_id == job_id:
+                    position = index
+                    break
+            if position is None:
+                return None
+
+            now = time.time()
+            remaining = [max(0.0, self._average_duration - (now - job.started_at))
+                         for job in self._jobs.values()
+                         if job.status == 'running' and job.started_at]
+            if len(remaining) < self.max_workers:
+                first_slot = 0.0
+            else:
+                first_slot = min(remaining)
+            return first_slot + math.floor(position / self.max_workers) * self._average_duration
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                'queued': len(self._pending),
+                'running': self._running,
+                'max_workers': self.max_workers,
+                'max_per_user': self.max_per_user,
+                'average_duration': self._average_duration,
+            }
+
+    # ------------------------------------------------------------------ 工作线程
+
+    def _ensure_workers(self):
+        """按需启动工作线程（调用方持有锁）"""
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._worker_loop, daemon=True,
+                                      name=f"AnalysisWorker-{next(self._worker_ids)}")
+            worker.start()
+            self._workers.append(worker)
+
+    def _next_runnable(self) -> Optional[AnalysisJob]:
+        """取出第一个所属用户未达并发上限的任务（调用方持有锁）"""
+        for job in self._pending:
+            if self._running_by_user.get(job.user, 0) < self.max_per_user:
+                self._pending.remove(job)
+                return job
+        return None
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                job = None
+                while not self._closing:
+                    job = self._next_runnable()
+                    if job is not None:
+                        break
+                    self._condition.wait()
+                if job is None:
+                    return
+                job.status = 'running'
+                job.started_at = time.time()
+                self._running += 1
+                self._running_by_user[job.user] = self._running_by_user.get(job.user, 0) + 1
+
+            logger.info(f"▶️ [分析队列] 开始任务: {job.job_id} (等待 {job.started_at - job.submitted_at:.1f}s)")
+            status, error = 'completed', None
+            try:
+                job.target(*job.args, **job.kwargs)
+            except AnalysisCancelledError:
+                status = 'cancelled'
+            except Exception as e:
+                status, error = 'failed', str(e)
+                logger.error(f"❌ [分析队列] 任务异常: {job.job_id}: {e}")
+            finally:
+                with self._condition:
+                    if status == 'completed' and job.cancelled:
+                        status = 'cancelled'
+                    job.status, job.error = status, error
+                    job.finished_at = time.time()
+                    self._running -= 1
+                    self._running_by_user[job.user] -= 1
+                    if not self._running_by_user[job.user]:
+                        del self._running_by_user[job.user]
+                    if status == 'completed':
+                        duration = job.finished_at - job.started_at
+                        self._average_duration = 0.7 * self._average_duration + 0.3 * duration
+                    self._condition.notify_all()
+            logger.info(f"⏹️ [分析队列] 任务结束: {job.job_id} -> {status}")
+
+    def _prune_finished(self):
+        """删除超过保留时间的已结束任务（调用方持有锁）"""
+        cutoff = time.time() - FINISHED_JOB_TTL
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def forget(self, job_id: str):
+        """删除已结束任务的记录"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status not in ('queued', 'running'):
+                del self._jobs[job_id]
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None):
+        """停止接收任务，取消排队中的任务；wait=True 时等待运行中的任务结束"""
+        with self._condition:
+            self._closing = True
+            while self._pending:
+                job = self._pending.popleft()
+                job.cancel_event.set()
+                job.status = 'cancelled'
+            self._condition.notify_all()
+            workers = list(self._workers)
+        if wait:
+            for worker in workers:
+                worker.join(timeout)
+
+
+_analysis_queue: Optional[AnalysisJobQueue] = None
+_analysis_queue_lock = threading.Lock()
+
+
+def get_analysis_queue() -> AnalysisJobQueue:
+    """获取全局分析任务队列（按环境变量配置）"""
+    global _analysis_queue
+    if _analysis_queue is None:
+        with _analysis_queue_lock:
+            if _analysis_queue is None:
+                _analysis_queue = AnalysisJobQueue(
+                    max_workers=parse_int_env("ANALYSIS_MAX_WORKERS", 2),
+                    max_per_user=parse_int_env("ANALYSIS_MAX_PER_USER", 1),
+                    max_queued=parse_int_env("ANALYSIS_QUEUE_SIZE", 50),
+                    estimated_duration=parse_float_env("ANALYSIS_ESTIMATED_DURATION", DEFAULT_ESTIMATED_DURATION),
+                )
+    return _analysis_queue
@@ -97,7 +97,7 @@ def extract_risk_assessment(state):
         logger.info(f"提取风险评估数据时出错: {e}")
         return None
 
-def run_stock_analysis(stock_symbol, analysis_date, analysts, research_depth, llm_provider, llm_model, market_type="美股", progress_callback=None):
+def run_stock_analysis(stock_symbol, analysis_date, analysts, research_depth, llm_provider, llm_model, market_type="美股", progress_callback=None, stream_callback=None):
     """执行股票分析
 
     Args:
@@ -108,6 +108,7 @@ def run_stock_analysis(stock_symbol, analysis_date, analysts, research_depth, ll
         llm_provider: LLM提供商 (dashscope/deepseek/google)
         llm_model: 大模型名称
         progress_callback: 进度回调函数，用于更新UI状态
+        stream_callback: 流式输出回调函数 (agent, partial_text, done)，用于实时显示模型输出
     """
 
     def update_progress(message, step=None, total_steps=None):
@@ -219,6 +220,7 @@ def run_stock_analysis(stock_symbol, analysis_date, analysts, research_depth, ll
         # 导入必要的模块
         from tradingagents.graph.trading_graph import TradingAgentsGraph
         from tradingagents.default_config import DEFAULT_CONFIG
+        from tradingagents.llm_adapters.streaming import stream_listener
 
         # 创建配置
         update_progress("配置分析参数...")
@@ -459,7 +461,9 @@ def run_stock_analysis(stock_symbol, analysis_date, analysts, research_depth, ll
         logger.debug(f"🔍 [RUNNER DEBUG]   symbol: '{formatted_symbol}'")
         logger.debug(f"🔍 [RUNNER DEBUG]   date: '{analysis_date}'")
 
-        state, decision = graph.propagate(formatted_symbol, analysis_date)
+        # 注册流式输出监听，模型生成过程中的部分内容会实时推送到界面
+        with stream_listener(stream_callback):
+            state, decision = graph.propagate(formatted_symbol, analysis_date)
 
         # 调试信息
         logger.debug(f"🔍 [DEBUG] 分析完成，decision类型: {type(decision)}")
@@ -2,6 +2,10 @@
 """
 异步进度跟踪器
 支持Redis和文件两种存储方式，前端定时轮询获取进度
+
+进度按增量写入：只写入变化的字段，合并间隔内的多次更新合并为一次写入
+- Redis: 哈希 progress:<分析ID>，每个字段单独保存（JSON编码）
+- 文件: 追加写入 data/progress_<分析ID>.jsonl，每行一个增量，读取时依次合并
 """
 
 import json
@@ -13,9 +17,19 @@ import threading
 from pathlib import Path
 
 # 导入日志模块
+from tradingagents.config.env_utils import parse_float_env
 from tradingagents.utils.logging_manager import get_logger
 logger = get_logger('async_progress')
 
+# 进度写入的默认合并间隔（秒），状态变化和分析结束时立即写入
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# 流式输出预览保留的最大字符数
+STREAM_PREVIEW_CHARS = 2000
+
+# 不随进度事件推送的字段（体积大且界面只在完成后读取一次）
+EVENT_EXCLUDED_FIELDS = ('steps', 'raw_results')
+
 def safe_serialize(obj):
     """安全序列化对象，处理不可序列化的类型"""
     # 特殊处理LangChain消息对象
@@ -69,11 +83,16 @@ def safe_serialize(obj):
         except (TypeError, ValueError):
             return str(obj)  # 转换为字符串
 
+_MISSING = object()
+
+
 class AsyncProgressTracker:
     """异步进度跟踪器"""
     
-    def __init__(self, analysis_id: str, analysts: List[str], research_depth: int, llm_provider: str):
+    def __init__(self, analysis_id: str, analysts: List[str], research_depth: int, llm_provider: str,
+                 user: Optional[str] = None):
         self.analysis_id = analysis_id
+        self.user = user
         self.analysts = analysts
         self.research_depth = research_depth
         self.llm_provider = llm_provider
@@ -85,6 +104,12 @@ class AsyncProgressTracker:
         
         # 初始化状态
         self.current_step = 0
+        # 已写入存储的字段值，用于计算增量
+        self._persisted: Dict[str, Any] = {}
+        self.flush_interval = parse_float_env('PROGRESS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        self._flush_lock = threading.RLock()
+        self._flush_timer: Optional[threading.Timer] = None
+        self._last_flush = 0.0
         self.progress_data = {
             'analysis_id': analysis_id,
             'status': 'running',
@@ -101,25 +126,26 @@ class AsyncProgressTracker:
             'start_time': self.start_time,
             'steps': self.analysis_steps
         }
+        if user:
+            self.progress_data['user'] = user
         
         # 尝试初始化Redis，失败则使用文件
         self.redis_client = None
         self.use_redis = self._init_redis()
         
         if not self.use_redis:
-            # 使用文件存储
-            self.progress_file = f"./data/progress_{analysis_id}.json"
+            # 使用文件存储（追加写入增量）
+            self.progress_file = progress_log_path(analysis_id)
             os.makedirs(os.path.dirname(self.progress_file), exist_ok=True)
         
         # 保存初始状态
-        self._save_progress()
+        self._save_progress(force=True)
         
         logger.info(f"📊 [异步进度] 初始化完成: {analysis_id}, 存储方式: {'Redis' if self.use_redis else '文件'}")
 
         # 注册到日志系统进行自动进度更新
         try:
             from .progress_log_handler import register_analysis_tracker
-            import threading
 
             # 使用超时机制避免死锁
             def register_with_timeout():
@@ -154,34 +180,13 @@ class AsyncProgressTracker:
                 logger.info(f"📊 [异步进度] Redis已禁用，使用文件存储")
                 return False
 
-            import redis
-
-            # 从环境变量获取Redis配置
-            redis_host = os.getenv('REDIS_HOST', 'localhost')
-            redis_port = int(os.getenv('REDIS_PORT', 6379))
-            redis_password = os.getenv('REDIS_PASSWORD', None)
-            redis_db = int(os.getenv('REDIS_DB', 0))
-
-            # 创建Redis连接
-            if redis_password:
-                self.redis_client = redis.Redis(
-                    host=redis_host,
-                    port=redis_port,
-                    password=redis_password,
-                    db=redis_db,
-                    decode_responses=True
-                )
-            else:
-                self.redis_client = redis.Redis(
-                    host=redis_host,
-                    port=redis_port,
-                    db=redis_db,
-                    decode_responses=True
-                )
+            # 使用共享连接池，避免每个跟踪器单独建立连接
+            from .progress_events import get_redis_client
+            self.redis_client = get_redis_client()
 
             # 测试连接
             self.redis_client.ping()
-            logger.info(f"📊 [异步进度] Redis连接成功: {redis_host}:{redis_port}")
+            logger.info(f"📊 [异步进度] Redis连接成功: {os.getenv('REDIS_HOST', 'localhost')}:{os.getenv('REDIS_PORT', 6379)}")
             return True
         except Exception as e:
             logger.warning(f"📊 [异步进度] Redis连接失败，使用文件存储: {e}")
@@ -386,6 +391,16 @@ class AsyncProgressTracker:
         logger.info(f"📊 [进度更新] {self.analysis_id}: {message[:50]}...")
         logger.debug(f"📊 [进度详情] 步骤{self.current_step + 1}/{len(self.analysis_steps)} ({step_name}), 进度{progress_percentage:.1f}%, 耗时{elapsed_time:.1f}s")
     
+    def update_stream(self, agent: str, partial_text: str, done: bool = False):
+        """更新模型流式输出的预览（调用方已做节流，这里只保留末尾部分）"""
+        self.progress_data.update({
+            'streaming_agent': agent,
+            'streaming_text': partial_text[-STREAM_PREVIEW_CHARS:],
+            'streaming_done': done,
+            'last_update': time.time()
+        })
+        self._save_progress()
+
     def _detect_step_from_message(self, message: str) -> Optional[int]:
         """根据消息内容智能检测当前步骤"""
         message_lower = message.lower()
@@ -500,61 +515,116 @@ class AsyncProgressTracker:
 
         return remaining
     
-    def _save_progress(self):
-        """保存进度到存储"""
+    def _save_progress(self, force: bool = False):
+        """
+        记录进度变化：距上次写入不足合并间隔时延后写入（期间的更新合并为一次），
+        状态变化或 force=True 时立即写入
+        """
+        with self._flush_lock:
+            status_changed = self.progress_data.get('status') != self._persisted.get('status')
+            wait = self._last_flush + self.flush_interval - time.time()
+            if force or status_changed or wait <= 0:
+                self._flush()
+            elif self._flush_timer is None:
+                self._flush_timer = threading.Timer(wait, self._flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def _flush(self):
+        """把变化的字段写入存储，并推送给界面"""
+        with self._flush_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            self._last_flush = time.time()
+            delta = {key: value for key, value in self.progress_data.items()
+                     if self._persisted.get(key, _MISSING) != value}
+            if not delta:
+                return
+            safe_delta = safe_serialize(delta)
+            if self._write_delta(safe_delta, full=not self._persisted):
+                self._persisted.update(delta)
+
+            # 推送事件不含大字段，完成结果只通知已就绪
+            event = {key: value for key, value in safe_delta.items() if key not in EVENT_EXCLUDED_FIELDS}
+            if 'raw_results' in safe_delta:
+                event['has_raw_results'] = True
+            if event:
+                from .progress_events import publish_progress_event
+                publish_progress_event(self.analysis_id, event)
+
+    def _write_delta(self, delta: Dict[str, Any], full: bool) -> bool:
+        """
+        写入增量到Redis或文件，full=True 表示这是完整进度（首次写入或写入失败后重写）
+
+        Returns:
+            bool: 是否写入成功（失败时下次写入包含所有字段）
+        """
         try:
             current_step_name = self.progress_data.get('current_step_name', '未知')
             progress_pct = self.progress_data.get('progress_percentage', 0)
             status = self.progress_data.get('status', 'running')
 
             if self.use_redis:
-                # 保存到Redis（安全序列化）
+                # 只写入变化的哈希字段，进度和最新分析索引在同一次往返中写入
                 key = f"progress:{self.analysis_id}"
-                safe_data = safe_serialize(self.progress_data)
-                data_json = json.dumps(safe_data, ensure_ascii=False)
-                self.redis_client.setex(key, 3600, data_json)  # 1小时过期
+                fields = {field: json.dumps(value, ensure_ascii=False) for field, value in delta.items()}
+                from .progress_index import PROGRESS_TTL, get_redis_progress_index
+                pipe = self.redis_client.pipeline(transaction=False)
+                if full:
+                    pipe.delete(key)
+                pipe.hset(key, mapping=fields)
+                pipe.expire(key, PROGRESS_TTL)  # 1小时过期
+                get_redis_progress_index().record(pipe, self.analysis_id,
+                                                  self.progress_data['last_update'], self.user)
+                pipe.execute()
 
                 logger.info(f"📊 [Redis写入] {self.analysis_id} -> {status} | {current_step_name} | {progress_pct:.1f}%")
-                logger.debug(f"📊 [Redis详情] 键: {key}, 数据大小: {len(data_json)} 字节")
+                logger.debug(f"📊 [Redis详情] 键: {key}, 字段: {len(fields)}, "
+                             f"数据大小: {sum(len(v) for v in fields.values())} 字节")
             else:
-                # 保存到文件（安全序列化）
-                safe_data = safe_serialize(self.progress_data)
-                with open(self.progress_file, 'w', encoding='utf-8') as f:
-                    json.dump(safe_data, f, ensure_ascii=False, indent=2)
+                # 追加写入文件，首次写入时新建
+                line = json.dumps(delta, ensure_ascii=False) + "\n"
+                with open(self.progress_file, 'w' if full else 'a', encoding='utf-8') as f:
+                    f.write(line)
+                from .progress_index import get_file_progress_index
+                get_file_progress_index().record(self.analysis_id, self.progress_data['last_update'], self.user)
 
                 logger.info(f"📊 [文件写入] {self.analysis_id} -> {status} | {current_step_name} | {progress_pct:.1f}%")
-                logger.debug(f"📊 [文件详情] 路径: {self.progress_file}")
+                logger.debug(f"📊 [文件详情] 路径: {self.progress_file}, 数据大小: {len(line)} 字节")
+            return True
 
         except Exception as e:
             logger.error(f"📊 [异步进度] 保存失败: {e}")
             # 尝试备用存储方式
             try:
+                backup_file = progress_log_path(self.analysis_id)
+                os.makedirs(os.path.dirname(backup_file), exist_ok=True)
                 if self.use_redis:
                     # Redis失败，尝试文件存储
                     logger.warning(f"📊 [异步进度] Redis保存失败，尝试文件存储")
-                    backup_file = f"./data/progress_{self.analysis_id}.json"
-                    os.makedirs(os.path.dirname(backup_file), exist_ok=True)
                     safe_data = safe_serialize(self.progress_data)
-                    with open(backup_file, 'w', encoding='utf-8') as f:
-                        json.dump(safe_data, f, ensure_ascii=False, indent=2)
-                    logger.info(f"📊 [备用存储] 文件保存成功: {backup_file}")
+                    backup_label = "文件保存成功"
                 else:
                     # 文件存储失败，尝试简化数据
                     logger.warning(f"📊 [异步进度] 文件保存失败，尝试简化数据")
-                    simplified_data = {
+                    safe_data = {
                         'analysis_id': self.analysis_id,
                         'status': self.progress_data.get('status', 'unknown'),
                         'progress_percentage': self.progress_data.get('progress_percentage', 0),
                         'last_message': str(self.progress_data.get('last_message', '')),
                         'last_update': self.progress_data.get('last_update', time.time())
                     }
-                    backup_file = f"./data/progress_{self.analysis_id}.json"
-                    with open(backup_file, 'w', encoding='utf-8') as f:
-                        json.dump(simplified_data, f, ensure_ascii=False, indent=2)
-                    logger.info(f"📊 [备用存储] 简化数据保存成功: {backup_file}")
+                    backup_label = "简化数据保存成功"
+                with open(backup_file, 'w', encoding='utf-8') as f:
+                    f.write(json.dumps(safe_data, ensure_ascii=False) + "\n")
+                logger.info(f"📊 [备用存储] {backup_label}: {backup_file}")
             except Exception as backup_e:
                 logger.error(f"📊 [异步进度] 备用存储也失败: {backup_e}")
-    
+            # 写入失败，下次重新写入完整进度
+            self._persisted.clear()
+            return False
+
     def get_progress(self) -> Dict[str, Any]:
         """获取当前进度"""
         return self.progress_data.copy()
@@ -575,7 +645,7 @@ class AsyncProgressTracker:
                 logger.warning(f"📊 [异步进度] 结果序列化失败: {e}")
                 self.progress_data['raw_results'] = str(results)  # 最后的fallback
 
-        self._save_progress()
+        self._save_progress(force=True)
         logger.info(f"📊 [异步进度] 分析完成: {self.analysis_id}")
 
         # 从日志系统注销
@@ -590,7 +660,7 @@ class AsyncProgressTracker:
         self.progress_data['status'] = 'failed'
         self.progress_data['last_message'] = f"分析失败: {error_message}"
         self.progress_data['last_update'] = time.time()
-        self._save_progress()
+        self._save_progress(force=True)
         logger.error(f"📊 [异步进度] 分析失败: {self.analysis_id}, 错误: {error_message}")
 
         # 从日志系统注销
@@ -600,6 +670,34 @@ class AsyncProgressTracker:
         except ImportError:
             pass
 
+def progress_log_path(analysis_id: str, data_dir: str = "./data") -> str:
+    """文件模式的进度增量日志路径"""
+    return os.path.join(data_dir, f"progress_{analysis_id}.jsonl")
+
+
+def read_progress_file(analysis_id: str, data_dir: str = "./data") -> Optional[Dict[str, Any]]:
+    """
+    读取文件模式的进度：依次合并增量日志的每一行；
+    最后一行可能正在写入（不完整），解析失败时忽略。兼容旧版的完整JSON文件
+    """
+    log_path = progress_log_path(analysis_id, data_dir)
+    if os.path.exists(log_path):
+        progress: Dict[str, Any] = {}
+        with open(log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    progress.update(json.loads(line))
+                except ValueError:
+                    continue
+        return progress or None
+
+    legacy_file = os.path.join(data_dir, f"progress_{analysis_id}.json")
+    if os.path.exists(legacy_file):
+        with open(legacy_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return None
+
+
 def get_progress_by_id(analysis_id: str) -> Optional[Dict[str, Any]]:
     """根据分析ID获取进度"""
     try:
@@ -609,45 +707,25 @@ def get_progress_by_id(analysis_id: str) -> Optional[Dict[str, Any]]:
         # 如果Redis启用，先尝试Redis
         if redis_enabled:
             try:
-                import redis
-
-                # 从环境变量获取Redis配置
-                redis_host = os.getenv('REDIS_HOST', 'localhost')
-                redis_port = int(os.getenv('REDIS_PORT', 6379))
-                redis_password = os.getenv('REDIS_PASSWORD', None)
-                redis_db = int(os.getenv('REDIS_DB', 0))
-
-                # 创建Redis连接
-                if redis_password:
-                    redis_client = redis.Redis(
-                        host=redis_host,
-                        port=redis_port,
-                        password=redis_password,
-                        db=redis_db,
-                        decode_responses=True
-                    )
-                else:
-                    redis_client = redis.Redis(
-                        host=redis_host,
-                        port=redis_port,
-                        db=redis_db,
-                        decode_responses=True
-                    )
+                from .progress_events import get_redis_client
+                redis_client = get_redis_client()
 
                 key = f"progress:{analysis_id}"
-                data = redis_client.get(key)
-                if data:
-                    return json.loads(data)
+                try:
+                    fields = redis_client.hgetall(key)
+                except Exception:
+                    # 旧版写入的是完整JSON字符串
+                    data = redis_client.get(key)
+                    if data:
+                        return json.loads(data)
+                    fields = None
+                if fields:
+                    return {field: json.loads(value) for field, value in fields.items()}
             except Exception as e:
                 logger.debug(f"📊 [异步进度] Redis读取失败: {e}")
 
         # 尝试文件
-        progress_file = f"./data/progress_{analysis_id}.json"
-        if os.path.exists(progress_file):
-            with open(progress_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-
-        return None
+        return read_progress_file(analysis_id)
     except Exception as e:
         logger.error(f"📊 [异步进度] 获取进度失败: {analysis_id}, 错误: {e}")
         return None
@@ -664,83 +742,43 @@ def format_time(seconds: float) -> str:
         return f"{hours:.1f}小时"
 
 
-def get_latest_analysis_id() -> Optional[str]:
-    """获取最新的分析ID"""
-    try:
-        # 检查REDIS_ENABLED环境变量
-        redis_enabled = os.getenv('REDIS_ENABLED', 'false').lower() == 'true'
+def get_recent_analysis_ids(limit: int = 10, user: Optional[str] = None) -> List[str]:
+    """
+    按最后更新时间倒序获取最近的分析ID
 
-        # 如果Redis启用，先尝试从Redis获取
-        if redis_enabled:
-            try:
-                import redis
-
-                # 从环境变量获取Redis配置
-                redis_host = os.getenv('REDIS_HOST', 'localhost')
-                redis_port = int(os.getenv('REDIS_PORT', 6379))
-                redis_password = os.getenv('REDIS_PASSWORD', None)
-                redis_db = int(os.getenv('REDIS_DB', 0))
-
-                # 创建Redis连接
-                if redis_password:
-                    redis_client = redis.Redis(
-                        host=redis_host,
-                        port=redis_port,
-                        password=redis_password,
-                        db=redis_db,
-                        decode_responses=True
-                    )
-                else:
-                    redis_client = redis.Redis(
-                        host=redis_host,
-                        port=redis_port,
-                        db=redis_db,
-                        decode_responses=True
-                    )
-
-                # 获取所有progress键
-                keys = redis_client.keys("progress:*")
-                if not keys:
-                    return None
-
-                # 获取每个键的数据，找到最新的
-                latest_time = 0
-                latest_id = None
-
-                for key in keys:
-                    try:
-                        data = redis_client.get(key)
-                        if data:
-                            progress_data = json.loads(data)
-                            last_update = progress_data.get('last_update', 0)
-                            if last_update > latest_time:
-                                latest_time = last_update
-                                # 从键名中提取analysis_id (去掉"progress:"前缀)
-                                latest_id = key.replace('progress:', '')
-                    except Exception:
-                        continue
-
-                if latest_id:
-                    logger.info(f"📊 [恢复分析] 找到最新分析ID: {latest_id}")
-                    return latest_id
+    通过进度索引查询（Redis有序集合或SQLite索引），不遍历所有进度数据；
+    指定 user 时只返回该用户的分析
+    """
+    # 检查REDIS_ENABLED环境变量
+    redis_enabled = os.getenv('REDIS_ENABLED', 'false').lower() == 'true'
 
-            except Exception as e:
-                logger.debug(f"📊 [恢复分析] Redis查找失败: {e}")
-
-        # 如果Redis失败或未启用，尝试从文件查找
-        data_dir = Path("data")
-        if data_dir.exists():
-            progress_files = list(data_dir.glob("progress_*.json"))
-            if progress_files:
-                # 按修改时间排序，获取最新的
-                latest_file = max(progress_files, key=lambda f: f.stat().st_mtime)
-                # 从文件名提取analysis_id
-                filename = latest_file.name
-                if filename.startswith("progress_") and filename.endswith(".json"):
-                    analysis_id = filename[9:-5]  # 去掉前缀和后缀
-                    logger.debug(f"📊 [恢复分析] 从文件找到最新分析ID: {analysis_id}")
-                    return analysis_id
+    # 如果Redis启用，先尝试从Redis索引获取
+    if redis_enabled:
+        try:
+            from .progress_index import get_redis_progress_index
+            analysis_ids = get_redis_progress_index().recent(limit, user)
+            if analysis_ids:
+                return analysis_ids
+        except Exception as e:
+            logger.debug(f"📊 [恢复分析] Redis索引查找失败: {e}")
 
+    # 如果Redis失败或未启用，从文件索引查找
+    try:
+        if Path("data").exists():
+            from .progress_index import get_file_progress_index
+            return get_file_progress_index().recent(limit, user)
+    except Exception as e:
+        logger.error(f"📊 [恢复分析] 文件索引查找失败: {e}")
+    return []
+
+
+def get_latest_analysis_id(user: Optional[str] = None) -> Optional[str]:
+    """获取最新的分析ID（指定 user 时为该用户最新的分析）"""
+    try:
+        analysis_ids = get_recent_analysis_ids(1, user)
+        if analysis_ids:
+            logger.debug(f"📊 [恢复分析] 找到最新分析ID: {analysis_ids[0]}")
+            return analysis_ids[0]
         return None
     except Exception as e:
         logger.error(f"📊 [恢复分析] 获取最新分析ID失败: {e}")
@@ -0,0 +1,417 @@
+"""
+跨进程分析任务队列
+Web界面把分析任务写入共享队列，由独立的分析工作进程（web/analysis_worker.py）领取执行，
+工作进程可以部署在多台主机上。支持Redis后端，单机部署可使用本地SQLite后端。
+
+任务状态: queued → running → completed / failed / cancelled
+"""
+
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from tradingagents.config.env_utils import parse_float_env, parse_int_env, parse_str_env
+from tradingagents.utils.logging_manager import get_logger
+
+from .analysis_queue import DEFAULT_ESTIMATED_DURATION, QueueFullError
+
+logger = get_logger('web')
+
+# 计算平均耗时使用的最近完成任务数
+_DURATION_SAMPLES = 20
+
+
+class JobQueueBackend:
+    """跨进程任务队列的公共接口，具体存储由子类实现"""
+
+    def __init__(self, max_per_user: int = 1, max_queued: int = 50,
+                 estimated_duration: float = DEFAULT_ESTIMATED_DURATION):
+        self.max_per_user = max(1, max_per_user)
+        self.max_queued = max(1, max_queued)
+        self.estimated_duration = estimated_duration
+
+    # 子类实现 ------------------------------------------------------------
+
+    def submit(self, job_id: str, payload: Dict[str, Any], user: str = 'anonymous'):
+        raise NotImplementedError
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """领取第一个所属用户未达并发上限的任务，返回 {job_id, user, payload}；没有可执行任务时返回 None"""
+        raise NotImplementedError
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None):
+        raise NotImplementedError
+
+    def cancel(self, job_id: str) -> bool:
+        """排队中的任务直接取消；运行中的任务设置取消标志，由工作进程在下一个进度节点中止"""
+        raise NotImplementedError
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        raise NotImplementedError
+
+    def get_status(self, job_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def get_position(self, job_id: str) -> Optional[int]:
+        raise NotImplementedError
+
+    def heartbeat(self, job_ids: List[str]):
+        """工作进程定期刷新运行中任务的心跳"""
+        raise NotImplementedError
+
+    def fail_stale(self, timeout: float) -> List[str]:
+        """心跳超时的运行中任务（工作进程已退出）标记为失败，返回这些任务ID"""
+        raise NotImplementedError
+
+    def _running_count(self) -> int:
+        raise NotImplementedError
+
+    def _average_duration(self) -> float:
+        raise NotImplementedError
+
+    # 公共逻辑 ------------------------------------------------------------
+
+    def estimate_wait(self, job_id: str) -> Optional[float]:
+        """预计等待时间（秒）：前面的任务按当前运行中的任务数分批，每批按最近完成任务的平均耗时计算"""
+        position = self.get_position(job_id)
+        if position is None:
+            return None
+        slots = max(1, self._running_count())
+        return math.ceil(position / slots) * self._average_duration()
+
+
+class SQLiteJobQueue(JobQueueBackend):
+    """
+    SQLite任务队列（单机多进程）
+
+    领取任务在 BEGIN IMMEDIATE 事务中完成，多个工作进程不会领取到同一个任务
+    """
+
+    def __init__(self, db_path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_jobs (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT UNIQUE NOT NULL,
+                user TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                error TEXT,
+                submitted_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                heartbeat_at REAL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_jobs_status ON analysis_jobs(status, seq)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def submit(self, job_id: str, payload: Dict[str, Any], user: str = 'anonymous'):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            queued = conn.execute("SELECT COUNT(*) FROM analysis_jobs WHERE status='queued'").fetchone()[0]
+            if queued >= self.max_queued:
+                raise QueueFullError(f"排队分析已达上限 ({self.max_queued})，请稍后再试")
+            conn.execute(
+                "INSERT INTO analysis_jobs (job_id, user, payload, status, submitted_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, user or 'anonymous', json.dumps(payload, ensure_ascii=False, default=str), time.time()))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info(f"📥 [分析队列] 提交任务到SQLite队列: {job_id} (用户: {user})")
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("""
+                SELECT job_id, user, payload FROM analysis_jobs
+                WHERE status='queued' AND user NOT IN (
+                    SELECT user FROM analysis_jobs WHERE status='running'
+                    GROUP BY user HAVING COUNT(*) >= ?)
+                ORDER BY seq LIMIT 1
+            """, (self.max_per_user,)).fetchone()
+            if row is not None:
+                now = time.time()
+                conn.execute(
+                    "UPDATE analysis_jobs SET status='running', worker=?, started_at=?, heartbeat_at=? WHERE job_id=?",
+                    (worker_id, now, now, row[0]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return {'job_id': row[0], 'user': row[1], 'payload': json.loads(row[2])}
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None):
+        self._connection().execute(
+            "UPDATE analysis_jobs SET status=?, error=?, finished_at=? WHERE job_id=? AND status='running'",
+            (status, error, time.time(), job_id))
+
+    def cancel(self, job_id: str) -> bool:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                "UPDATE analysis_jobs SET status='cancelled', cancel_requested=1, finished_at=? "
+                "WHERE job_id=? AND status='queued'", (time.time(), job_id))
+            if not cursor.rowcount:
+                cursor = conn.execute(
+                    "UPDATE analysis_jobs SET cancel_requested=1 WHERE job_id=? AND status='running'", (job_id,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount > 0
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        row = self._connection().execute(
+            "SELECT cancel_requested FROM analysis_jobs WHERE job_id=?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def get_status(self, job_id: str) -> Optional[str]:
+        row = self._connection().execute("SELECT status FROM analysis_jobs WHERE job_id=?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def get_position(self, job_id: str) -> Optional[int]:
+        row = self._connection().execute("""
+            SELECT (SELECT COUNT(*) FROM analysis_jobs AS ahead
+                    WHERE ahead.status='queued' AND ahead.seq <= job.seq)
+            FROM analysis_jobs AS job WHERE job.job_id=? AND job.status='queued'
+        """, (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def heartbeat(self, job_ids: List[str]):
+        if job_ids:
+            self._connection().executemany(
+                "UPDATE analysis_jobs SET heartbeat_at=? WHERE job_id=?",
+                [(time.time(), job_id) for job_id in job_ids])
+
+    def fail_stale(self, timeout: float) -> List[str]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cutoff = time.time() - timeout
+            stale = [row[0] for row in conn.execute(
+                "SELECT job_id FROM analysis_jobs WHERE status='running' AND heartbeat_at < ?", (cutoff,))]
+            conn.executemany(
+                "UPDATE analysis_jobs SET status='failed', error='工作进程已退出', finished_at=? WHERE job_id=?",
+                [(time.time(), job_id) for job_id in stale])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return stale
+
+    def _running_count(self) -> int:
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM analysis_jobs WHERE status='running'").fetchone()[0]
+
+    def _average_duration(self) -> float:
+        row = self._connection().execute("""
+            SELECT AVG(finished_at - started_at) FROM (
+                SELECT finished_at, started_at FROM analysis_jobs
+                WHERE status='completed' ORDER BY finished_at DESC LIMIT ?)
+        """, (_DURATION_SAMPLES,)).fetchone()
+        return row[0] if row and row[0] is not None else self.estimated_duration
+
+
+class RedisJobQueue(JobQueueBackend):
+    """
+    Redis任务队列（多主机）
+
+    - analysis_jobs:queued        有序集合，按提交顺序排队，排队位置为 ZRANK
+    - analysis_jobs:running_users 哈希，每个用户运行中的任务数
+    - analysis_job:<id>           哈希，任务参数和状态
+    领取和结束任务使用Lua脚本，保证多个工作进程之间的原子性
+    """
+
+    QUEUED_KEY = "analysis_jobs:queued"
+    RUNNING_USERS_KEY = "analysis_jobs:running_users"
+    RUNNING_KEY = "analysis_jobs:running"
+    DURATIONS_KEY = "analysis_jobs:durations"
+    SEQ_KEY = "analysis_jobs:seq"
+    JOB_PREFIX = "analysis_job:"
+    # 已结束任务的保留时间（秒）
+    JOB_TTL = 7 * 24 * 3600
+
+    _CLAIM_SCRIPT = """
+        local ids = redis.call('ZRANGE', KEYS[1], 0, 199)
+        for _, id in ipairs(ids) do
+            local key = ARGV[3] .. id
+            local user = redis.call('HGET', key, 'user')
+            local running = tonumber(redis.call('HGET', KEYS[2], user) or '0')
+            if running < tonumber(ARGV[1]) then
+                redis.call('ZREM', KEYS[1], id)
+                redis.call('HINCRBY', KEYS[2], user, 1)
+                redis.call('ZADD', KEYS[3], ARGV[2], id)
+                redis.call('HSET', key, 'status', 'running', 'started_at', ARGV[2], 'worker', ARGV[4])
+                return id
+            end
+        end
+        return false
+    """
+
+    _FINISH_SCRIPT = """
+        local key = ARGV[4] .. ARGV[1]
+        if redis.call('HGET', key, 'status') ~= 'running' then
+            return 0
+        end
+        local user = redis.call('HGET', key, 'user')
+        if tonumber(redis.call('HINCRBY', KEYS[1], user, -1)) <= 0 then
+            redis.call('HDEL', KEYS[1], user)
+        end
+        redis.call('ZREM', KEYS[2], ARGV[1])
+        redis.call('HSET', key, 'status', ARGV[2], 'finished_at', ARGV[3], 'error', ARGV[5])
+        redis.call('EXPIRE', key, ARGV[6])
+        if ARGV[2] == 'completed' then
+            local started = tonumber(redis.call('HGET', key, 'started_at'))
+            redis.call('LPUSH', KEYS[3], tonumber(ARGV[3]) - started)
+            redis.call('LTRIM', KEYS[3], 0, ARGV[7] - 1)
+        end
+        return 1
+    """
+
+    def __init__(self, redis_client, **kwargs):
+        super().__init__(**kwargs)
+        self.redis = redis_client
+        self._claim = self.redis.register_script(self._CLAIM_SCRIPT)
+        self._finish = self.redis.register_script(self._FINISH_SCRIPT)
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.JOB_PREFIX}{job_id}"
+
+    def submit(self, job_id: str, payload: Dict[str, Any], user: str = 'anonymous'):
+        if self.redis.zcard(self.QUEUED_KEY) >= self.max_queued:
+            raise QueueFullError(f"排队分析已达上限 ({self.max_queued})，请稍后再试")
+        seq = self.redis.incr(self.SEQ_KEY)
+        pipe = self.redis.pipeline()
+        pipe.hset(self._job_key(job_id), mapping={
+            'user': user or 'anonymous',
+            'payload': json.dumps(payload, ensure_ascii=False, default=str),
+            'status': 'queued',
+            'submitted_at': time.time(),
+            'cancel_requested': 0,
+        })
+        pipe.zadd(self.QUEUED_KEY, {job_id: seq})
+        pipe.execute()
+        logger.info(f"📥 [分析队列] 提交任务到Redis队列: {job_id} (用户: {user})")
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        job_id = self._claim(keys=[self.QUEUED_KEY, self.RUNNING_USERS_KEY, self.RUNNING_KEY],
+                             args=[self.max_per_user, time.time(), self.JOB_PREFIX, worker_id])
+        if not job_id:
+            return None
+        job_id = job_id.decode() if isinstance(job_id, bytes) else job_id
+        job = self.redis.hgetall(self._job_key(job_id))
+        job = {(k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+               for k, v in job.items()}
+        return {'job_id': job_id, 'user': job.get('user'), 'payload': json.loads(job.get('payload', '{}'))}
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None):
+        self._finish(keys=[self.RUNNING_USERS_KEY, self.RUNNING_KEY, self.DURATIONS_KEY],
+                     args=[job_id, status, time.time(), self.JOB_PREFIX, error or '',
+                           self.JOB_TTL, _DURATION_SAMPLES])
+
+    def cancel(self, job_id: str) -> bool:
+        key = self._job_key(job_id)
+        if self.redis.zrem(self.QUEUED_KEY, job_id):
+            self.redis.hset(key, mapping={'status': 'cancelled', 'cancel_requested': 1, 'finished_at': time.time()})
+            self.redis.expire(key, self.JOB_TTL)
+            return True
+        if self._decode(self.redis.hget(key, 'status')) == 'running':
+            self.redis.hset(key, 'cancel_requested', 1)
+            return True
+        return False
+
+    @staticmethod
+    def _decode(value):
+        return value.decode() if isinstance(value, bytes) else value
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        return self._decode(self.redis.hget(self._job_key(job_id), 'cancel_requested')) == '1'
+
+    def get_status(self, job_id: str) -> Optional[str]:
+        return self._decode(self.redis.hget(self._job_key(job_id), 'status'))
+
+    def get_position(self, job_id: str) -> Optional[int]:
+        rank = self.redis.zrank(self.QUEUED_KEY, job_id)
+        return rank + 1 if rank is not None else None
+
+    def heartbeat(self, job_ids: List[str]):
+        if job_ids:
+            now = time.time()
+            self.redis.zadd(self.RUNNING_KEY, {job_id: now for job_id in job_ids}, xx=True)
+
+    def fail_stale(self, timeout: float) -> List[str]:
+        stale = [self._decode(job_id) for job_id in
+                 self.redis.zrangebyscore(self.RUNNING_KEY, '-inf', time.time() - timeout)]
+        for job_id in stale:
+            self.finish(job_id, 'failed', '工作进程已退出')
+        return stale
+
+    def _running_count(self) -> int:
+        return self.redis.zcard(self.RUNNING_KEY)
+
+    def _average_duration(self) -> float:
+        durations = [float(value) for value in self.redis.lrange(self.DURATIONS_KEY, 0, -1)]
+        return sum(durations) / len(durations) if durations else self.estimated_duration
+
+
+_job_backend: Optional[JobQueueBackend] = None
+_job_backend_lock = threading.Lock()
+
+
+def get_job_backend() -> Optional[JobQueueBackend]:
+    """
+    获取跨进程任务队列（ANALYSIS_QUEUE_BACKEND=redis/sqlite）；
+    默认 local 时返回 None，分析在Web进程内的工作线程池执行
+    """
+    global _job_backend
+    backend = parse_str_env("ANALYSIS_QUEUE_BACKEND", "local").lower()
+    if backend not in ('redis', 'sqlite'):
+        return None
+    if _job_backend is None:
+        with _job_backend_lock:
+            if _job_backend is None:
+                options = dict(
+                    max_per_user=parse_int_env("ANALYSIS_MAX_PER_USER", 1),
+                    max_queued=parse_int_env("ANALYSIS_QUEUE_SIZE", 50),
+                    estimated_duration=parse_float_env("ANALYSIS_ESTIMATED_DURATION", DEFAULT_ESTIMATED_DURATION),
+                )
+                if backend == 'redis':
+                    import redis
+                    client = redis.Redis(
+                        host=os.getenv('REDIS_HOST', 'localhost'),
+                        port=int(os.getenv('REDIS_PORT', 6379)),
+                        password=os.getenv('REDIS_PASSWORD') or None,
+                        db=int(os.getenv('REDIS_DB', 0)),
+                        decode_responses=True
+                    )
+                    _job_backend = RedisJobQueue(client, **options)
+                else:
+                    db_path = parse_str_env("ANALYSIS_QUEUE_DB", "./data/analysis_jobs.db")
+                    _job_backend = SQLiteJobQueue(db_path, **options)
+                logger.info(f"🧵 [分析队列] 使用跨进程任务队列: {backend}")
+    return _job_backend
@@ -5,13 +5,32 @@ MongoDB报告管理器
 """
 
 import os
+import json
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# 列表查询只返回摘要字段，报告正文（reports）在查看详情时通过 get_report_by_id 读取
+SUMMARY_PROJECTION = {
+    "_id": 0,
+    "analysis_id": 1,
+    "stock_symbol": 1,
+    "analysis_date": 1,
+    "timestamp": 1,
+    "status": 1,
+    "summary": 1,
+    "analysts": 1,
+    "research_depth": 1,
+}
+# 列表按 (timestamp, analysis_id) 倒序，analysis_id 用于同一时间戳的报告之间确定顺序
+LIST_SORT = [("timestamp", -1), ("analysis_id", -1)]
+# 列表游标中 timestamp 的类型，按MongoDB排序时的类型顺序从小到大（缺失/null < 数字 < 字符串 < 日期）；
+# 早期版本保存的报告 timestamp 可能是数字或缺失
+CURSOR_TYPES = ("null", "number", "string", "date")
+
 try:
     from pymongo import MongoClient
     from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
@@ -96,6 +115,10 @@ class MongoDBReportManager:
                 ("analysis_date", -1),
                 ("timestamp", -1)
             ])
+            # 列表分页：按股票过滤 / 不过滤时按 (timestamp, analysis_id) 范围翻页；按分析日期过滤
+            self.collection.create_index([("stock_symbol", 1), ("timestamp", -1), ("analysis_id", -1)])
+            self.collection.create_index(LIST_SORT)
+            self.collection.create_index([("analysis_date", -1)])
             
             # 创建单字段索引
             self.collection.create_index("analysis_id")
@@ -145,6 +168,8 @@ class MongoDBReportManager:
             
             if result.inserted_id:
                 logger.info(f"✅ 分析报告已保存到MongoDB: {analysis_id}")
+                from web.utils.results_catalog import record_analysis_result
+                record_analysis_result(document, 'mongodb', analysis_id)
                 return True
             else:
                 logger.error("❌ MongoDB插入失败")
@@ -154,61 +179,73 @@ class MongoDBReportManager:
             logger.error(f"❌ 保存分析报告到MongoDB失败: {e}")
             return False
     
+    @staticmethod
+    def _build_query(stock_symbol: str = None, start_date: str = None, end_date: str = None) -> Dict[str, Any]:
+        """构建列表查询条件"""
+        query = {}
+
+        if stock_symbol:
+            query["stock_symbol"] = stock_symbol
+
+        if start_date or end_date:
+            date_query = {}
+            if start_date:
+                date_query["$gte"] = start_date
+            if end_date:
+                date_query["$lte"] = end_date
+            query["analysis_date"] = date_query
+
+        return query
+
+    @staticmethod
+    def _to_web_result(doc: Dict[str, Any]) -> Dict[str, Any]:
+        """转换为Web应用期望的格式"""
+        # 处理timestamp字段，兼容不同的数据类型
+        timestamp_value = doc.get("timestamp")
+        if hasattr(timestamp_value, 'timestamp'):
+            # datetime对象
+            timestamp = timestamp_value.timestamp()
+        elif isinstance(timestamp_value, (int, float)):
+            # 已经是时间戳
+            timestamp = float(timestamp_value)
+        else:
+            # 其他情况，使用当前时间
+            timestamp = datetime.now().timestamp()
+
+        result = {
+            "analysis_id": doc["analysis_id"],
+            "timestamp": timestamp,
+            "stock_symbol": doc["stock_symbol"],
+            "analysts": doc.get("analysts", []),
+            "research_depth": doc.get("research_depth", 0),
+            "status": doc.get("status", "completed"),
+            "summary": doc.get("summary", ""),
+            "performance": {},
+            "tags": [],
+            "is_favorite": False,
+            "source": "mongodb"
+        }
+        if "reports" in doc:
+            result["reports"] = doc["reports"]
+        return result
+
     def get_analysis_reports(self, limit: int = 100, stock_symbol: str = None,
-                           start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
-        """从MongoDB获取分析报告"""
+                           start_date: str = None, end_date: str = None,
+                           include_reports: bool = True) -> List[Dict[str, Any]]:
+        """
+        从MongoDB获取分析报告
+
+        Args:
+            include_reports: 是否返回报告正文；列表展示请使用 False 或 list_analysis_reports
+        """
         if not self.connected:
             return []
         
         try:
-            # 构建查询条件
-            query = {}
-            
-            if stock_symbol:
-                query["stock_symbol"] = stock_symbol
-            
-            if start_date or end_date:
-                date_query = {}
-                if start_date:
-                    date_query["$gte"] = start_date
-                if end_date:
-                    date_query["$lte"] = end_date
-                query["analysis_date"] = date_query
-            
-            # 查询数据
-            cursor = self.collection.find(query).sort("timestamp", -1).limit(limit)
-            
-            results = []
-            for doc in cursor:
-                # 处理timestamp字段，兼容不同的数据类型
-                timestamp_value = doc.get("timestamp")
-                if hasattr(timestamp_value, 'timestamp'):
-                    # datetime对象
-                    timestamp = timestamp_value.timestamp()
-                elif isinstance(timestamp_value, (int, float)):
-                    # 已经是时间戳
-                    timestamp = float(timestamp_value)
-                else:
-                    # 其他情况，使用当前时间
-                    from datetime import datetime
-                    timestamp = datetime.now().timestamp()
-                
-                # 转换为Web应用期望的格式
-                result = {
-                    "analysis_id": doc["analysis_id"],
-                    "timestamp": timestamp,
-                    "stock_symbol": doc["stock_symbol"],
-                    "analysts": doc.get("analysts", []),
-                    "research_depth": doc.get("research_depth", 0),
-                    "status": doc.get("status", "completed"),
-                    "summary": doc.get("summary", ""),
-                    "performance": {},
-                    "tags": [],
-                    "is_favorite": False,
-                    "reports": doc.get("reports", {}),
-                    "source": "mongodb"
-                }
-                results.append(result)
+            query = self._build_query(stock_symbol, start_date, end_date)
+            projection = None if include_reports else SUMMARY_PROJECTION
+            cursor = self.collection.find(query, projection).sort(LIST_SORT).limit(limit)
+            results = [self._to_web_result(doc) for doc in cursor]
             
             logger.info(f"✅ 从MongoDB获取到 {len(results)} 个分析报告")
             return results
@@ -216,7 +253,92 @@ class MongoDBReportManager:
         except Exception as e:
             logger.error(f"❌ 从MongoDB获取分析报告失败: {e}")
             return []
-    
+
+    @staticmethod
+    def _cursor_type(value) -> str:
+        if value is None:
+            return "null"
+        if isinstance(value, datetime):
+            return "date"
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return "number"
+        if isinstance(value, str):
+            return "string"
+        raise ValueError(f"不支持的timestamp类型: {type(value).__name__}")
+
+    @classmethod
+    def _encode_cursor(cls, doc: Dict[str, Any]) -> str:
+        """游标记录最后一条报告的排序值 (timestamp 类型, timestamp, analysis_id)"""
+        value = doc.get("timestamp")
+        kind = cls._cursor_type(value)
+        if kind == "date":
+            value = value.isoformat()
+        return json.dumps([kind, value, doc["analysis_id"]], ensure_ascii=False)
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[str, Any, str]:
+        try:
+            kind, value, analysis_id = json.loads(cursor)
+            if kind not in CURSOR_TYPES:
+                raise ValueError(kind)
+            if kind == "date":
+                value = datetime.fromisoformat(value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"无效的分页游标: {cursor!r}") from e
+        return kind, value, analysis_id
+
+    @classmethod
+    def _after_cursor(cls, cursor: str) -> List[Dict[str, Any]]:
+        """
+        按 LIST_SORT 排在游标之后的报告条件（$or）：同一 timestamp 中 analysis_id 更小的、
+        同类型中 timestamp 更小的，以及 timestamp 类型排在更后面的（MongoDB 的 $lt 只比较同类型的值）
+        """
+        kind, value, analysis_id = cls._decode_cursor(cursor)
+        conditions = [{"timestamp": value, "analysis_id": {"$lt": analysis_id}}]
+        if kind != "null":
+            conditions.append({"timestamp": {"$lt": value}})
+            lower_types = list(CURSOR_TYPES[1:CURSOR_TYPES.index(kind)])
+            if lower_types:
+                conditions.append({"timestamp": {"$type": lower_types}})
+            conditions.append({"timestamp": None})
+        return conditions
+
+    def list_analysis_reports(self, limit: int = 50, stock_symbol: str = None,
+                              start_date: str = None, end_date: str = None,
+                              cursor: str = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        分页获取分析报告列表（只含摘要字段，不含报告正文）
+
+        按 (timestamp, analysis_id) 倒序，翻页使用上一页最后一条记录的范围条件而不是 skip，
+        翻到后面的页时不需要扫描并跳过前面的记录
+
+        Args:
+            limit: 每页数量
+            cursor: 上一页返回的 next_cursor，None 表示第一页
+
+        Returns:
+            (当前页报告列表, next_cursor)，没有下一页时 next_cursor 为 None
+
+        Raises:
+            ValueError: 游标无效
+            Exception: 查询失败时抛出MongoDB的异常（不返回空页，避免调用方误以为已经翻完）
+        """
+        if not self.connected:
+            return [], None
+
+        try:
+            query = self._build_query(stock_symbol, start_date, end_date)
+            if cursor:
+                query["$or"] = self._after_cursor(cursor)
+            # 多取一条判断是否还有下一页
+            docs = list(self.collection.find(query, SUMMARY_PROJECTION).sort(LIST_SORT).limit(limit + 1))
+            next_cursor = self._encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+            return [self._to_web_result(doc) for doc in docs[:limit]], next_cursor
+
+        except Exception as e:
+            logger.error(f"❌ 从MongoDB分页获取分析报告失败: {e}")
+            raise
+
     def get_report_by_id(self, analysis_id: str) -> Optional[Dict[str, Any]]:
         """根据ID获取单个分析报告"""
         if not self.connected:
@@ -259,6 +381,8 @@ class MongoDBReportManager:
             
             if result.deleted_count > 0:
                 logger.info(f"✅ 已删除分析报告: {analysis_id}")
+                from web.utils.results_catalog import remove_analysis_result
+                remove_analysis_result(analysis_id)
                 return True
             else:
                 logger.warning(f"⚠️ 未找到要删除的报告: {analysis_id}")
@@ -366,6 +490,8 @@ class MongoDBReportManager:
                 report_data,
                 upsert=True
             )
+            from web.utils.results_catalog import record_analysis_result
+            record_analysis_result(report_data, 'mongodb', report_data['analysis_id'])
 
             if result.upserted_id or result.modified_count > 0:
                 logger.info(f"✅ 报告保存成功: {report_data['analysis_id']}")
@@ -0,0 +1,315 @@
+"""
+分析进度事件推送
+跟踪器每次保存进度时发布一条增量事件（只含变化的字段），界面等待事件到达后再刷新，
+不再固定间隔 sleep + 重新读取整个进度文档。
+
+- Redis启用时事件写入 Redis Stream (progress_events:<分析ID>)，Web进程内只有一个分发线程
+  用一条连接阻塞读取所有被查看分析的事件，再分发给各个查看者
+- 未启用Redis时使用进程内事件总线（分析在Web进程内执行时可直接推送）
+所有Redis访问共用一个连接池
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from tradingagents.utils.logging_manager import get_logger
+
+logger = get_logger('async_progress')
+
+# 每个分析在内存中保留的最近事件数
+MAX_BUFFERED_EVENTS = 200
+# Redis Stream 保留的最大事件数和过期时间（秒）
+STREAM_MAXLEN = 500
+STREAM_TTL = 3600
+# 没有查看者等待超过该时间（秒）后，分发线程停止读取该分析的事件
+WATCH_IDLE_TIMEOUT = 60.0
+# 分发线程单次阻塞读取的时长（毫秒）
+DISPATCH_BLOCK_MS = 1000
+# 分析结束的状态，查看者收到后立即刷新
+FINAL_STATUSES = ('completed', 'failed')
+# 进程内总线清理：已结束的分析空闲超过 FINISHED_EVENT_TTL 秒、其他分析空闲超过 IDLE_EVENT_TTL 秒
+# （既没有新事件也没有查看者等待）后丢弃缓冲的事件；重新打开的查看者先读取完整进度快照
+FINISHED_EVENT_TTL = 120.0
+IDLE_EVENT_TTL = 1800.0
+# 两次清理之间的最小间隔（秒）
+PRUNE_INTERVAL = 30.0
+
+_redis_pool = None
+_redis_pool_lock = threading.Lock()
+
+
+def get_redis_client():
+    """
+    获取使用共享连接池的Redis客户端；REDIS_ENABLED 不为 true 时返回 None
+
+    每次调用只创建轻量的客户端对象，连接由连接池复用
+    """
+    global _redis_pool
+    if os.getenv('REDIS_ENABLED', 'false').lower() != 'true':
+        return None
+    import redis
+    if _redis_pool is None:
+        with _redis_pool_lock:
+            if _redis_pool is None:
+                _redis_pool = redis.ConnectionPool(
+                    host=os.getenv('REDIS_HOST', 'localhost'),
+                    port=int(os.getenv('REDIS_PORT', 6379)),
+                    password=os.getenv('REDIS_PASSWORD') or None,
+                    db=int(os.getenv('REDIS_DB', 0)),
+                    decode_responses=True
+                )
+    return redis.Redis(connection_pool=_redis_pool)
+
+
+def stream_key(analysis_id: str) -> str:
+    return f"progress_events:{analysis_id}"
+
+
+class LocalProgressEventBus:
+    """
+    进程内进度事件总线
+
+    每个分析保留最近的事件（递增序号），查看者用上次收到的序号等待新事件。
+    序号在整个总线内递增，清理掉的分析再有新事件时序号不会回退
+    """
+
+    def __init__(self, max_buffered: int = MAX_BUFFERED_EVENTS):
+        self.max_buffered = max_buffered
+        self._condition = threading.Condition()
+        # 每个分析一个条件变量（共用同一把锁），发布事件只唤醒该分析的查看者
+        self._waiters: Dict[str, threading.Condition] = {}
+        # {分析ID: deque[(序号, 事件)]}
+        self._events: Dict[str, deque] = {}
+        self._seq = 0
+        # {分析ID: 最近一次发布事件或查看者等待的时间}
+        self._last_active: Dict[str, float] = {}
+        self._last_prune = time.monotonic()
+
+    def publish(self, analysis_id: str, event: Dict[str, Any]):
+        self._append(analysis_id, event)
+
+    def _waiter(self, analysis_id: str) -> threading.Condition:
+        """调用方持有锁"""
+        waiter = self._waiters.get(analysis_id)
+        if waiter is None:
+            waiter = self._waiters[analysis_id] = threading.Condition(self._condition)
+        return waiter
+
+    def _append(self, analysis_id: str, event: Dict[str, Any]):
+        with self._condition:
+            now = time.monotonic()
+            self._prune(now)
+            events = self._events.get(analysis_id)
+            if events is None:
+                events = self._events[analysis_id] = deque(maxlen=self.max_buffered)
+            self._seq += 1
+            events.append((self._seq, event))
+            self._last_active[analysis_id] = now
+            waiter = self._waiters.get(analysis_id)
+            if waiter is not None:
+                waiter.notify_all()
+
+    def _prune(self, now: float):
+        """丢弃空闲分析的缓冲事件（调用方持有锁）"""
+        if now - self._last_prune < PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        for analysis_id, last_active in list(self._last_active.items()):
+            events = self._events.get(analysis_id)
+            finished = bool(events) and events[-1][1].get('status') in FINAL_STATUSES
+            if now - last_active > (FINISHED_EVENT_TTL if finished else IDLE_EVENT_TTL):
+                self._drop(analysis_id)
+
+    def _drop(self, analysis_id: str):
+        """调用方持有锁"""
+        self._events.pop(analysis_id, None)
+        self._waiters.pop(analysis_id, None)
+        self._last_active.pop(analysis_id, None)
+
+    def _collect(self, analysis_id: str, after: int) -> Tuple[List[Dict[str, Any]], int]:
+        """调用方持有锁"""
+        events = self._events.get(analysis_id)
+        if not events or events[-1][0] <= after:
+            return [], after
+        return [event for seq, event in events if seq > after], events[-1][0]
+
+    def last_seq(self, analysis_id: str) -> int:
+        with self._condition:
+            events = self._events.get(analysis_id)
+            return events[-1][0] if events else 0
+
+    def wait(self, analysis_id: str, after: int = 0, timeout: float = 0.0) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        返回序号大于 after 的事件和最新序号；没有新事件时最多等待 timeout 秒
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._watch(analysis_id)
+            self._last_active[analysis_id] = time.monotonic()
+            waiter = self._waiter(analysis_id)
+            while True:
+                events, last = self._collect(analysis_id, after)
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    return events, last
+                waiter.wait(remaining)
+
+    def _watch(self, analysis_id: str):
+        """查看者开始等待某个分析（调用方持有锁），Redis总线据此决定读取哪些Stream"""
+
+    def forget(self, analysis_id: str):
+        with self._condition:
+            self._drop(analysis_id)
+
+
+class RedisProgressEventBus(LocalProgressEventBus):
+    """
+    基于 Redis Stream 的进度事件总线
+
+    发布: XADD 到分析自己的Stream（跨进程/主机的工作进程也能推送）；
+    订阅: 本进程一个分发线程用一条连接 XREAD BLOCK 所有被查看的Stream，
+    收到的事件放入本地缓冲并唤醒等待的查看者，查看者数量不影响Redis连接数
+    """
+
+    def __init__(self, client_factory=get_redis_client, max_buffered: int = MAX_BUFFERED_EVENTS):
+        super().__init__(max_buffered)
+        self._client_factory = client_factory
+        # {分析ID: (已读取的Stream ID, 最近一次有查看者等待的时间)}
+        self._watched: Dict[str, List] = {}
+        self._dispatcher: Optional[threading.Thread] = None
+        self._closing = False
+
+    def publish(self, analysis_id: str, event: Dict[str, Any]):
+        client = self._client_factory()
+        key = stream_key(analysis_id)
+        pipe = client.pipeline(transaction=False)
+        pipe.xadd(key, {'data': json.dumps(event, ensure_ascii=False)}, maxlen=STREAM_MAXLEN, approximate=True)
+        pipe.expire(key, STREAM_TTL)
+        pipe.execute()
+
+    def _watch(self, analysis_id: str):
+        watch = self._watched.get(analysis_id)
+        if watch is None:
+            # 新的查看者从Stream开头读取，初始快照之后的事件都能收到
+            self._watched[analysis_id] = ['0-0', time.monotonic()]
+        else:
+            watch[1] = time.monotonic()
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True,
+                                                name="ProgressEventDispatcher")
+            self._dispatcher.start()
+
+    def _dispatch_loop(self):
+        client = self._client_factory()
+        while not self._closing:
+            with self._condition:
+                now = time.monotonic()
+                for analysis_id in [a for a, (_, seen) in self._watched.items()
+                                    if now - seen > WATCH_IDLE_TIMEOUT]:
+                    del self._watched[analysis_id]
+                    self._drop(analysis_id)
+                streams = {stream_key(a): last_id for a, (last_id, _) in self._watched.items()}
+            if not streams:
+                with self._condition:
+                    self._condition.wait(DISPATCH_BLOCK_MS / 1000)
+                continue
+            try:
+                response = client.xread(streams, block=DISPATCH_BLOCK_MS, count=100)
+            except Exception as e:
+                logger.warning(f"📡 [进度推送] 读取Redis Stream失败: {e}")
+                time.sleep(1)
+                continue
+            for key, entries in response or []:
+                analysis_id = key[len("progress_events:"):]
+                for entry_id, fields in entries:
+                    try:
+                        event = json.loads(fields['data'])
+                    except Exception:
+                        continue
+                    self._append(analysis_id, event)
+                with self._condition:
+                    if analysis_id in self._watched and entries:
+                        self._watched[analysis_id][0] = entries[-1][0]
+
+    def close(self):
+        self._closing = True
+        with self._condition:
+            self._condition.notify_all()
+
+
+_event_bus: Optional[LocalProgressEventBus] = None
+_event_bus_lock = threading.Lock()
+
+
+def get_progress_event_bus() -> LocalProgressEventBus:
+    """获取进度事件总线：Redis启用时使用Redis Stream，否则使用进程内总线"""
+    global _event_bus
+    if _event_bus is None:
+        with _event_bus_lock:
+            if _event_bus is None:
+                if os.getenv('REDIS_ENABLED', 'false').lower() == 'true':
+                    _event_bus = RedisProgressEventBus()
+                else:
+                    _event_bus = LocalProgressEventBus()
+    return _event_bus
+
+
+def publish_progress_event(analysis_id: str, event: Dict[str, Any]):
+    """发布进度事件；推送失败不影响分析本身（界面仍会按超时刷新）"""
+    try:
+        get_progress_event_bus().publish(analysis_id, event)
+    except Exception as e:
+        logger.debug(f"📡 [进度推送] 发布事件失败: {e}")
+
+
+class ProgressViewer:
+    """
+    界面端的进度视图：先读取一次完整进度作为快照，之后只合并增量事件
+
+    wait_for_update 在有新事件时立即返回，否则最多等待 timeout 秒；
+    min_interval 限制两次刷新的最小间隔，事件密集时合并为一次刷新
+    """
+
+    def __init__(self, analysis_id: str, snapshot: Optional[Dict[str, Any]] = None,
+                 bus: Optional[LocalProgressEventBus] = None, min_interval: float = 0.5):
+        self.analysis_id = analysis_id
+        self.bus = bus or get_progress_event_bus()
+        self.min_interval = min_interval
+        self.data: Dict[str, Any] = dict(snapshot or {})
+        self.last_seq = 0
+        self.last_refresh = 0.0
+
+    def apply(self, events: List[Dict[str, Any]]) -> bool:
+        for event in events:
+            self.data.update(event)
+        return bool(events)
+
+    def poll(self) -> bool:
+        """合并已到达的事件（不等待），返回是否有更新"""
+        events, self.last_seq = self.bus.wait(self.analysis_id, self.last_seq, 0)
+        return self.apply(events)
+
+    def wait_for_update(self, timeout: float) -> bool:
+        """
+        等待新事件，返回是否有更新；收到事件后继续合并到 min_interval 再返回，
+        分析结束（completed/failed）的事件立即返回
+        """
+        now = time.monotonic()
+        deadline = now + timeout
+        earliest = self.last_refresh + self.min_interval
+        updated = False
+        while True:
+            limit = min(deadline, max(earliest, now)) if updated else deadline
+            events, self.last_seq = self.bus.wait(self.analysis_id, self.last_seq, max(limit - now, 0))
+            updated = self.apply(events) or updated
+            now = time.monotonic()
+            if self.data.get('status') in FINAL_STATUSES:
+                break
+            if now >= deadline or (updated and now >= earliest):
+                break
+        self.last_refresh = now
+        return updated
@@ -0,0 +1,225 @@
+"""
+分析进度索引
+按最后更新时间排序的分析ID索引（全局 + 每个用户），"最新分析"和"最近N个分析"
+不再需要遍历所有进度键（Redis KEYS 会阻塞整个Redis服务器）或所有进度文件。
+
+- Redis模式: 有序集合 progress_index（分值为 last_update）和 progress_index:user:<用户>
+- 文件模式: SQLite表 data/progress_index.db，last_update 和 (user, last_update) 上有索引
+"""
+
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from tradingagents.utils.logging_manager import get_logger
+
+from .progress_events import get_redis_client
+
+logger = get_logger('async_progress')
+
+# 进度数据在Redis中的过期时间（秒），与 AsyncProgressTracker 写入时一致
+PROGRESS_TTL = 3600
+PROGRESS_KEY_PREFIX = "progress:"
+INDEX_KEY = "progress_index"
+
+
+def user_index_key(user: str) -> str:
+    return f"{INDEX_KEY}:user:{user}"
+
+
+class RedisProgressIndex:
+    """
+    Redis有序集合索引
+
+    写入进度时在同一个pipeline中 ZADD，查询为 ZREVRANGE（O(log n + N)）；
+    分值早于 PROGRESS_TTL 的成员对应的进度键已过期，查询时按分值范围清理
+    """
+
+    def __init__(self, client_factory=get_redis_client):
+        self._client_factory = client_factory
+        self._rebuilt = False
+
+    def record(self, pipe, analysis_id: str, last_update: float, user: Optional[str] = None):
+        """把索引更新加入写入进度的pipeline"""
+        pipe.zadd(INDEX_KEY, {analysis_id: last_update})
+        if user:
+            pipe.zadd(user_index_key(user), {analysis_id: last_update})
+            pipe.expire(user_index_key(user), PROGRESS_TTL)
+
+    def recent(self, limit: int = 10, user: Optional[str] = None) -> List[str]:
+        """按最后更新时间倒序返回最多 limit 个仍有进度数据的分析ID"""
+        client = self._client_factory()
+        if not self._rebuilt:
+            self._rebuilt = True
+            if not client.exists(INDEX_KEY):
+                self.rebuild(client)
+        key = user_index_key(user) if user else INDEX_KEY
+        pipe = client.pipeline(transaction=False)
+        pipe.zremrangebyscore(key, '-inf', time.time() - PROGRESS_TTL)
+        pipe.zrevrange(key, 0, limit - 1)
+        candidates = pipe.execute()[1]
+        if not candidates:
+            return []
+
+        # 进度键可能被提前删除，索引中对应的成员一并移除
+        pipe = client.pipeline(transaction=False)
+        for analysis_id in candidates:
+            pipe.exists(PROGRESS_KEY_PREFIX + analysis_id)
+        alive = [analysis_id for analysis_id, exists in zip(candidates, pipe.execute()) if exists]
+        if len(alive) < len(candidates):
+            stale = [analysis_id for analysis_id in candidates if analysis_id not in alive]
+            client.zrem(key, *stale)
+            if len(candidates) == limit:
+                return self.recent(limit, user)
+        return alive
+
+    def rebuild(self, client=None) -> int:
+        """
+        从现有进度键重建索引（升级前写入的进度没有索引）
+
+        使用 SCAN 分批遍历，不会像 KEYS 一样阻塞Redis；只在索引不存在时执行一次
+        """
+        client = client or self._client_factory()
+        count = 0
+        pipe = client.pipeline(transaction=False)
+        for key in client.scan_iter(match=f"{PROGRESS_KEY_PREFIX}*", count=1000):
+            try:
+                meta = client.hmget(key, 'last_update', 'user')
+                data = {'last_update': json.loads(meta[0] or '0'), 'user': json.loads(meta[1] or 'null')}
+            except Exception:
+                # 旧版写入的是完整JSON字符串
+                try:
+                    data = json.loads(client.get(key) or 'null')
+                except Exception:
+                    continue
+            if not isinstance(data, dict):
+                continue
+            self.record(pipe, key[len(PROGRESS_KEY_PREFIX):], data.get('last_update', 0), data.get('user'))
+            count += 1
+            if count % 1000 == 0:
+                pipe.execute()
+        pipe.execute()
+        if count:
+            logger.info(f"📊 [进度索引] 已从现有进度键重建Redis索引: {count} 个分析")
+        return count
+
+
+class SQLiteProgressIndex:
+    """
+    文件模式的进度索引（SQLite，多进程共享）
+
+    进度文件保存在 data_dir/progress_<分析ID>.jsonl（旧版为 .json），索引库保存在 data_dir/progress_index.db
+    """
+
+    def __init__(self, data_dir: str = "./data"):
+        self.data_dir = data_dir
+        self.db_path = os.path.join(data_dir, "progress_index.db")
+        os.makedirs(data_dir, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS progress_index (
+                analysis_id TEXT PRIMARY KEY,
+                user TEXT,
+                last_update REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_progress_index_time ON progress_index(last_update)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_progress_index_user ON progress_index(user, last_update)")
+        if conn.execute("PRAGMA user_version").fetchone()[0] == 0:
+            self.rebuild()
+            conn.execute("PRAGMA user_version=1")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def has_progress(self, analysis_id: str) -> bool:
+        base = os.path.join(self.data_dir, f"progress_{analysis_id}")
+        return os.path.exists(base + ".jsonl") or os.path.exists(base + ".json")
+
+    def record(self, analysis_id: str, last_update: float, user: Optional[str] = None):
+        self._connection().execute("""
+            INSERT INTO progress_index (analysis_id, user, last_update) VALUES (?, ?, ?)
+            ON CONFLICT(analysis_id) DO UPDATE SET
+                last_update=excluded.last_update, user=COALESCE(excluded.user, user)
+        """, (analysis_id, user, last_update))
+
+    def recent(self, limit: int = 10, user: Optional[str] = None) -> List[str]:
+        """按最后更新时间倒序返回最多 limit 个仍有进度文件的分析ID"""
+        conn = self._connection()
+        if user:
+            rows = conn.execute("SELECT analysis_id FROM progress_index WHERE user=? "
+                                "ORDER BY last_update DESC LIMIT ?", (user, limit)).fetchall()
+        else:
+            rows = conn.execute("SELECT analysis_id FROM progress_index "
+                                "ORDER BY last_update DESC LIMIT ?", (limit,)).fetchall()
+        candidates = [row[0] for row in rows]
+        alive = [analysis_id for analysis_id in candidates if self.has_progress(analysis_id)]
+        if len(alive) < len(candidates):
+            conn.executemany("DELETE FROM progress_index WHERE analysis_id=?",
+                             [(analysis_id,) for analysis_id in candidates if analysis_id not in alive])
+            if len(candidates) == limit:
+                return self.recent(limit, user)
+        return alive
+
+    def rebuild(self) -> int:
+        """从现有进度文件重建索引（按文件修改时间），只在索引库首次创建时执行"""
+        rows = []
+        for path in glob.glob(os.path.join(glob.escape(self.data_dir), "progress_*.json*")):
+            name = os.path.basename(path)
+            if not name.endswith((".json", ".jsonl")):
+                continue
+            analysis_id = name[len("progress_"):name.rindex(".json")]
+            try:
+                rows.append((analysis_id, None, os.path.getmtime(path)))
+            except OSError:
+                continue
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT OR IGNORE INTO progress_index (analysis_id, user, last_update) "
+                             "VALUES (?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if rows:
+            logger.info(f"📊 [进度索引] 已从现有进度文件重建索引: {len(rows)} 个分析")
+        return len(rows)
+
+
+_redis_index: Optional[RedisProgressIndex] = None
+_file_indexes: Dict[str, SQLiteProgressIndex] = {}
+_index_lock = threading.Lock()
+
+
+def get_redis_progress_index() -> RedisProgressIndex:
+    global _redis_index
+    if _redis_index is None:
+        with _index_lock:
+            if _redis_index is None:
+                _redis_index = RedisProgressIndex()
+    return _redis_index
+
+
+def get_file_progress_index(data_dir: str = "./data") -> SQLiteProgressIndex:
+    """文件模式的进度索引，按数据目录的绝对路径缓存（进度文件使用相对当前目录的 ./data）"""
+    path = os.path.abspath(data_dir)
+    index = _file_indexes.get(path)
+    if index is None:
+        with _index_lock:
+            index = _file_indexes.get(path)
+            if index is None:
+                index = _file_indexes[path] = SQLiteProgressIndex(path)
+    return index
@@ -1,13 +1,42 @@
 """
 进度日志处理器
 将日志系统中的模块完成消息转发给进度跟踪器
+
+执行分析时用 analysis_context(analysis_id) 把分析ID绑定到当前上下文（contextvars），
+日志记录按上下文中的分析ID直接交给对应的跟踪器；LangGraph 在工作线程中执行节点时会复制上下文，
+自建线程池时用 contextvars.copy_context().run 提交任务即可继承分析ID
 """
 
 
+import contextvars
 import logging
 import threading
+from contextlib import contextmanager
 from typing import Dict, Optional
 
+# 模块开始/完成日志的结构化事件类型（见 LoggingManager.log_module_start/log_module_complete）
+PROGRESS_EVENT_TYPES = ('module_start', 'module_complete')
+
+_current_analysis_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "progress_analysis_id", default=None
+)
+
+
+@contextmanager
+def analysis_context(analysis_id: str):
+    """在上下文中绑定正在执行的分析ID，其中产生的进度日志只转发给该分析的跟踪器"""
+    token = _current_analysis_id.set(analysis_id)
+    try:
+        yield
+    finally:
+        _current_analysis_id.reset(token)
+
+
+def get_current_analysis_id() -> Optional[str]:
+    """获取当前上下文绑定的分析ID（不在分析中时返回 None）"""
+    return _current_analysis_id.get()
+
+
 class ProgressLogHandler(logging.Handler):
     """
     自定义日志处理器，将模块开始/完成消息转发给进度跟踪器
@@ -44,45 +73,21 @@ class ProgressLogHandler(logging.Handler):
             print(f"❌ [进度集成] 注销跟踪器失败: {e}")
     
     def emit(self, record):
-        """处理日志记录"""
+        """处理日志记录：按上下文中的分析ID找到跟踪器，只转发模块开始/完成事件"""
         try:
-            message = record.getMessage()
-            
-            # 只处理模块开始和完成的消息
-            if "[模块开始]" in message or "[模块完成]" in message:
-                # 尝试从消息中提取股票代码来匹配分析
-                stock_symbol = self._extract_stock_symbol(message)
-                
-                # 查找匹配的跟踪器（减少锁持有时间）
-                trackers_copy = {}
-                with self._lock:
-                    trackers_copy = self._trackers.copy()
-
-                # 在锁外面处理跟踪器更新
-                for analysis_id, tracker in trackers_copy.items():
-                    # 简单匹配：如果跟踪器存在且状态为running，就更新
-                    if hasattr(tracker, 'progress_data') and tracker.progress_data.get('status') == 'running':
-                        try:
-                            tracker.update_progress(message)
-                            print(f"📊 [进度集成] 转发消息到 {analysis_id}: {message[:50]}...")
-                            break  # 只更新第一个匹配的跟踪器
-                        except Exception as e:
-                            print(f"❌ [进度集成] 更新失败: {e}")
-                        
+            analysis_id = _current_analysis_id.get()
+            if analysis_id is None or getattr(record, 'event_type', None) not in PROGRESS_EVENT_TYPES:
+                return
+
+            # 按分析ID直接查找（字典读取是原子操作，不需要加锁）
+            tracker = self._trackers.get(analysis_id)
+            if tracker is None or tracker.progress_data.get('status') != 'running':
+                return
+            tracker.update_progress(record.getMessage())
+
         except Exception as e:
             # 不要让日志处理器的错误影响主程序
             print(f"❌ [进度集成] 日志处理错误: {e}")
-    
-    def _extract_stock_symbol(self, message: str) -> Optional[str]:
-        """从消息中提取股票代码"""
-        import re
-        
-        # 尝试匹配 "股票: XXXXX" 格式
-        match = re.search(r'股票:\s*([A-Za-z0-9]+)', message)
-        if match:
-            return match.group(1)
-        
-        return None
 
 # 全局日志处理器实例
 _progress_handler = None
@@ -791,6 +791,10 @@ def save_modular_reports_to_results_dir(results: Dict[str, Any], stock_symbol: s
             json.dump(metadata, f, ensure_ascii=False, indent=2)
 
         logger.info(f"✅ 保存分析元数据: {metadata_file}")
+
+        # 保存到 detailed 目录时登记到历史记录目录
+        from web.utils.results_catalog import record_detailed_result
+        record_detailed_result(stock_dir)
         logger.info(f"✅ 分模块报告保存完成，共保存 {len(saved_files)} 个文件")
         logger.info(f"📁 保存目录: {os.path.normpath(str(reports_dir))}")
 
@@ -0,0 +1,582 @@
+"""
+分析结果目录（历史记录索引）
+保存分析结果时登记一条只含摘要字段的目录记录，历史记录页面的过滤、排序、分页和统计都在目录上完成，
+不再每次加载页面都读取所有结果文件和报告正文；正文在查看详情时由 load_result_body 按需读取。
+
+- 本地: SQLite (web/data/analysis_results/catalog.db)
+- MongoDB可用时: 与分析报告同库的 analysis_catalog 集合
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, time as dt_time, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from tradingagents.config.env_utils import parse_str_env
+from tradingagents.utils.logging_manager import get_logger
+from tradingagents.utils.report_search import (extract_report_text, get_report_search_index, index_report,
+                                               remove_report)
+
+logger = get_logger('web')
+
+# 目录记录的字段（不含报告正文）
+CATALOG_FIELDS = ('analysis_id', 'timestamp', 'stock_symbol', 'analysts', 'research_depth',
+                  'status', 'summary', 'performance', 'source', 'body_ref')
+# 可按键集翻页的排序方式 -> 排序键 [(字段, 方向)]，最后以 analysis_id 确定相同取值之间的顺序；
+# 翻页时从上一页最后一条记录的排序键之后继续查询，不需要跳过前面的记录
+KEYSET_SORTS = {
+    'time_desc': [('timestamp', -1), ('analysis_id', -1)],
+    'time_asc': [('timestamp', 1), ('analysis_id', 1)],
+    'stock_symbol': [('stock_symbol', 1), ('timestamp', -1), ('analysis_id', -1)],
+}
+# 排序方式 -> (SQLite ORDER BY, MongoDB sort)
+SORT_ORDERS = {
+    **{name: (", ".join(f"{field} {'ASC' if direction > 0 else 'DESC'}" for field, direction in keys), keys)
+       for name, keys in KEYSET_SORTS.items()},
+    'status': ("status = 'completed' DESC, timestamp DESC", [('status', 1), ('timestamp', -1)]),
+}
+# 全文检索时按检索结果的相关度排序（analysis_ids 中的顺序）
+RELEVANCE_SORT = 'relevance'
+
+# 目录中保存的摘要最大长度
+SUMMARY_MAX_CHARS = 500
+
+
+def _to_epoch(value) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return 0.0
+    return 0.0
+
+
+def _date_range(start_date: Optional[date], end_date: Optional[date]):
+    """日期过滤条件（按天，包含结束日期）转换为时间戳范围 [start, end)"""
+    start = datetime.combine(start_date, dt_time.min).timestamp() if start_date else None
+    end = datetime.combine(end_date + timedelta(days=1), dt_time.min).timestamp() if end_date else None
+    return start, end
+
+
+def make_catalog_entry(result: Dict[str, Any], source: str, body_ref: str) -> Dict[str, Any]:
+    """从分析结果（或其摘要）生成目录记录"""
+    summary = result.get('summary') or ''
+    if not isinstance(summary, str):
+        summary = json.dumps(summary, ensure_ascii=False)
+    return {
+        'analysis_id': result.get('analysis_id', ''),
+        'timestamp': _to_epoch(result.get('timestamp', 0)),
+        'stock_symbol': result.get('stock_symbol', '') or '',
+        'analysts': list(result.get('analysts') or []),
+        'research_depth': result.get('research_depth', 1),
+        'status': result.get('status', 'completed'),
+        'summary': summary[:SUMMARY_MAX_CHARS],
+        'performance': result.get('performance') or {},
+        'source': source,
+        'body_ref': body_ref,
+    }
+
+
+def page_cursor(entry: Dict[str, Any], sort_by: str) -> Optional[Dict[str, Any]]:
+    """键集分页游标：当前页最后一条记录的排序键；排序方式不支持键集分页时返回 None"""
+    keys = KEYSET_SORTS.get(sort_by)
+    return {field: entry[field] for field, _ in keys} if keys else None
+
+
+def _keyset_conditions(sort_by: str, after: Dict[str, Any]) -> List[List[tuple]]:
+    """
+    排在游标之后的条件：[[(字段, 比较, 值), ...], ...]，内层为 AND、外层为 OR，
+    如 (a, b) 倒序时为 a < x OR (a = x AND b < y)
+    """
+    keys = KEYSET_SORTS.get(sort_by)
+    if keys is None:
+        raise ValueError(f"排序方式 {sort_by} 不支持键集分页")
+    return [[(field, '=', after[field]) for field, _ in keys[:i]] +
+            [(keys[i][0], '<' if keys[i][1] < 0 else '>', after[keys[i][0]])]
+            for i in range(len(keys))]
+
+
+def _search_text(entry: Dict[str, Any]) -> str:
+    """关键词搜索匹配的文本，与原来的内存过滤一致：股票代码、摘要、分析师"""
+    return f"{entry['stock_symbol']} {entry['summary']} {' '.join(entry['analysts'])}".lower()
+
+
+class SQLiteResultsCatalog:
+    """SQLite分析结果目录，timestamp 和 (stock_symbol, timestamp) 上有索引，分析师单独建表"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS analysis_catalog (
+                analysis_id TEXT PRIMARY KEY,
+                timestamp REAL NOT NULL,
+                stock_symbol TEXT NOT NULL,
+                analysts TEXT NOT NULL,
+                research_depth INTEGER,
+                status TEXT,
+                summary TEXT,
+                performance TEXT,
+                source TEXT NOT NULL,
+                body_ref TEXT,
+                search_text TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_catalog_time ON analysis_catalog(source, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_catalog_stock ON analysis_catalog(stock_symbol, timestamp);
+            CREATE TABLE IF NOT EXISTS analysis_catalog_analysts (
+                analyst TEXT NOT NULL,
+                analysis_id TEXT NOT NULL,
+                PRIMARY KEY (analyst, analysis_id)
+            );
+        """)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def is_empty(self) -> bool:
+        return self._connection().execute("SELECT 1 FROM analysis_catalog LIMIT 1").fetchone() is None
+
+    def upsert(self, entry: Dict[str, Any]):
+        self.upsert_many([entry])
+
+    def upsert_many(self, entries: Iterable[Dict[str, Any]]):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for entry in entries:
+                conn.execute("""
+                    INSERT OR REPLACE INTO analysis_catalog (analysis_id, timestamp, stock_symbol, analysts,
+                        research_depth, status, summary, performance, source, body_ref, search_text)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (entry['analysis_id'], entry['timestamp'], entry['stock_symbol'],
+                      json.dumps(entry['analysts'], ensure_ascii=False), entry['research_depth'],
+                      entry['status'], entry['summary'], json.dumps(entry['performance'], ensure_ascii=False),
+                      entry['source'], entry['body_ref'], _search_text(entry)))
+                conn.execute("DELETE FROM analysis_catalog_analysts WHERE analysis_id=?", (entry['analysis_id'],))
+                conn.executemany("INSERT OR IGNORE INTO analysis_catalog_analysts (analyst, analysis_id) VALUES (?, ?)",
+                                 [(analyst, entry['analysis_id']) for analyst in entry['analysts']])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def remove(self, analysis_id: str):
+        conn = self._connection()
+        conn.execute("DELETE FROM analysis_catalog WHERE analysis_id=?", (analysis_id,))
+        conn.execute("DELETE FROM analysis_catalog_analysts WHERE analysis_id=?", (analysis_id,))
+
+    def _where(self, source=None, start_date=None, end_date=None, stock_symbol=None, analyst_type=None,
+               search_text=None, analysis_ids=None):
+        clauses, params = [], []
+        if source:
+            clauses.append("source = ?")
+            params.append(source)
+        start, end = _date_range(start_date, end_date)
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("timestamp < ?")
+            params.append(end)
+        if stock_symbol:
+            clauses.append("instr(upper(stock_symbol), ?) > 0")
+            params.append(stock_symbol.upper())
+        if analyst_type:
+            clauses.append("analysis_id IN (SELECT analysis_id FROM analysis_catalog_analysts WHERE analyst = ?)")
+            params.append(analyst_type)
+        if search_text:
+            clauses.append("instr(search_text, ?) > 0")
+            params.append(search_text.lower())
+        if analysis_ids is not None:
+            clauses.append("analysis_id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(analysis_ids)))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, sort_by: str = 'time_desc', limit: int = 100, offset: int = 0,
+              after: Optional[Dict[str, Any]] = None, **filters) -> List[Dict[str, Any]]:
+        """
+        按过滤条件、排序和分页返回目录记录
+
+        Args:
+            after: 上一页最后一条记录的 page_cursor，给出时返回排在其后的记录（offset 从其后计算）
+        """
+        where, params = self._where(**filters)
+        if after is not None:
+            conditions = _keyset_conditions(sort_by, after)
+            keyset = " OR ".join("(" + " AND ".join(f"{field} {op} ?" for field, op, _ in condition) + ")"
+                                 for condition in conditions)
+            where = f"{where} AND ({keyset})" if where else f" WHERE ({keyset})"
+            params = params + [value for condition in conditions for _, _, value in condition]
+        order = SORT_ORDERS.get(sort_by, SORT_ORDERS['time_desc'])[0]
+        if sort_by == RELEVANCE_SORT and filters.get('analysis_ids') is not None:
+            order = "(SELECT CAST(key AS INTEGER) FROM json_each(?) WHERE value = analysis_id)"
+            params = params + [json.dumps(list(filters['analysis_ids']))]
+        rows = self._connection().execute(
+            f"SELECT {', '.join(CATALOG_FIELDS)} FROM analysis_catalog{where} ORDER BY {order} LIMIT ? OFFSET ?",
+            params + [limit, offset]).fetchall()
+        results = []
+        for row in rows:
+            entry = dict(zip(CATALOG_FIELDS, row))
+            entry['analysts'] = json.loads(entry['analysts'])
+            entry['performance'] = json.loads(entry['performance'] or '{}')
+            results.append(entry)
+        return results
+
+    def summarize(self, **filters) -> Dict[str, int]:
+        """过滤结果的统计：总数、股票数、成功数"""
+        where, params = self._where(**filters)
+        total, stocks, completed = self._connection().execute(
+            f"SELECT COUNT(*), COUNT(DISTINCT stock_symbol), COALESCE(SUM(status = 'completed'), 0) "
+            f"FROM analysis_catalog{where}", params).fetchone()
+        return {'total': total, 'unique_stocks': stocks, 'completed': completed}
+
+
+class MongoResultsCatalog:
+    """MongoDB分析结果目录（analysis_catalog 集合）"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.collection.create_index('analysis_id', unique=True)
+        self.collection.create_index([('source', 1), ('timestamp', -1), ('analysis_id', -1)])
+        self.collection.create_index([('stock_symbol', 1), ('timestamp', -1)])
+        self.collection.create_index([('analysts', 1), ('timestamp', -1)])
+
+    def is_empty(self) -> bool:
+        return self.collection.find_one({}, {'_id': 1}) is None
+
+    def upsert(self, entry: Dict[str, Any]):
+        self.upsert_many([entry])
+
+    def upsert_many(self, entries: Iterable[Dict[str, Any]]):
+        from pymongo import ReplaceOne
+        operations = [ReplaceOne({'analysis_id': entry['analysis_id']},
+                                 dict(entry, search_text=_search_text(entry)), upsert=True)
+                      for entry in entries]
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+    def remove(self, analysis_id: str):
+        self.collection.delete_one({'analysis_id': analysis_id})
+
+    @staticmethod
+    def _filter(source=None, start_date=None, end_date=None, stock_symbol=None, analyst_type=None,
+                search_text=None, analysis_ids=None) -> Dict[str, Any]:
+        import re
+        query: Dict[str, Any] = {}
+        if source:
+            query['source'] = source
+        start, end = _date_range(start_date, end_date)
+        if start is not None or end is not None:
+            query['timestamp'] = {k: v for k, v in (('$gte', start), ('$lt', end)) if v is not None}
+        if stock_symbol:
+            query['stock_symbol'] = {'$regex': re.escape(stock_symbol), '$options': 'i'}
+        if analyst_type:
+            query['analysts'] = analyst_type
+        if search_text:
+            query['search_text'] = {'$regex': re.escape(search_text.lower())}
+        if analysis_ids is not None:
+            query['analysis_id'] = {'$in': list(analysis_ids)}
+        return query
+
+    def query(self, sort_by: str = 'time_desc', limit: int = 100, offset: int = 0,
+              after: Optional[Dict[str, Any]] = None, **filters) -> List[Dict[str, Any]]:
+        projection = {field: 1 for field in CATALOG_FIELDS}
+        projection['_id'] = 0
+        if sort_by == RELEVANCE_SORT and filters.get('analysis_ids') is not None:
+            # 检索结果数量有限，取回后按相关度顺序排列
+            rank = {analysis_id: i for i, analysis_id in enumerate(filters['analysis_ids'])}
+            entries = sorted(self.collection.find(self._filter(**filters), projection),
+                             key=lambda entry: rank.get(entry['analysis_id'], len(rank)))
+            return entries[offset:offset + limit]
+        query = self._filter(**filters)
+        if after is not None:
+            operators = {'=': '$eq', '<': '$lt', '>': '$gt'}
+            query['$or'] = [{field: {operators[op]: value} for field, op, value in condition}
+                            for condition in _keyset_conditions(sort_by, after)]
+        sort = SORT_ORDERS.get(sort_by, SORT_ORDERS['time_desc'])[1]
+        cursor = self.collection.find(query, projection).sort(sort)
+        if offset:
+            cursor = cursor.skip(offset)
+        return list(cursor.limit(limit))
+
+    def summarize(self, **filters) -> Dict[str, int]:
+        query = self._filter(**filters)
+        return {
+            'total': self.collection.count_documents(query),
+            'unique_stocks': len(self.collection.distinct('stock_symbol', query)),
+            'completed': self.collection.count_documents(dict(query, status='completed')),
+        }
+
+
+def get_detailed_results_dir() -> Path:
+    """按股票/日期保存的分模块报告目录: data/analysis_results/detailed/<股票代码>/<日期>/reports/*.md"""
+    return Path(__file__).parent.parent.parent / "data" / "analysis_results" / "detailed"
+
+
+def detailed_result_entry(date_dir: Path) -> Optional[Dict[str, Any]]:
+    """
+    为分模块报告目录生成目录记录，只读取元数据和最终决策报告的开头作为摘要，不读取其他报告
+
+    Returns:
+        dict: 目录记录；目录中没有报告时返回 None
+    """
+    date_dir = Path(date_dir)
+    report_files = list((date_dir / "reports").glob("*.md"))
+    if not report_files:
+        return None
+    stock_code, date_str = date_dir.parent.name, date_dir.name
+    try:
+        timestamp = datetime.strptime(date_str, '%Y-%m-%d').timestamp()
+    except ValueError:
+        timestamp = datetime.now().timestamp()
+
+    summary = ""
+    decision_file = date_dir / "reports" / "final_trade_decision.md"
+    if decision_file.exists():
+        try:
+            with open(decision_file, 'r', encoding='utf-8') as f:
+                content = f.read(201)
+            summary = content[:200].replace('#', '').replace('*', '').strip()
+            if len(content) > 200:
+                summary += "..."
+        except Exception:
+            pass
+
+    # 没有元数据文件时按报告数量推断研究深度
+    research_depth = 3 if len(report_files) >= 5 else 2 if len(report_files) >= 3 else 1
+    analysts = ['market', 'fundamentals', 'trader']
+    metadata_file = date_dir / "analysis_metadata.json"
+    if metadata_file.exists():
+        try:
+            with open(metadata_file, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            research_depth = metadata.get('research_depth', 1)
+            analysts = metadata.get('analysts', analysts)
+        except Exception:
+            pass
+
+    return make_catalog_entry({
+        'analysis_id': f"{stock_code}_{date_str}_{int(timestamp)}",
+        'timestamp': timestamp,
+        'stock_symbol': stock_code,
+        'analysts': analysts,
+        'research_depth': research_depth,
+        'status': 'completed',
+        'summary': summary,
+    }, 'file_system', str(date_dir))
+
+
+def rebuild_results_catalog(catalog, mongodb_manager=None, web_results_dir: Optional[Path] = None,
+                            detailed_dir: Optional[Path] = None) -> int:
+    """
+    从已有的分析结果导入目录（升级前保存的结果没有目录记录）
+
+    MongoDB报告按摘要字段分页读取，不读取报告正文；结果文件逐个读取一次，分模块报告目录只读取元数据和摘要。
+    读取MongoDB报告失败时抛出异常，不写入部分导入的目录（目录保持为空，下次使用时重新导入）
+    """
+    if web_results_dir is None:
+        from web.components.analysis_results import get_analysis_results_dir
+        web_results_dir = get_analysis_results_dir()
+    detailed_dir = Path(detailed_dir) if detailed_dir else get_detailed_results_dir()
+    entries = []
+
+    if mongodb_manager is not None:
+        cursor = None
+        try:
+            while True:
+                reports, cursor = mongodb_manager.list_analysis_reports(limit=500, cursor=cursor)
+                entries.extend(make_catalog_entry(report, 'mongodb', report['analysis_id']) for report in reports)
+                if cursor is None:
+                    break
+        except Exception as e:
+            logger.error(f"❌ [历史记录] 读取MongoDB报告失败，已读取 {len(entries)} 个，放弃本次目录导入: {e}")
+            raise
+
+    for result_file in Path(web_results_dir).glob("*.json"):
+        if result_file.name in ('favorites.json', 'tags.json'):
+            continue
+        try:
+            with open(result_file, 'r', encoding='utf-8') as f:
+                entries.append(make_catalog_entry(json.load(f), 'file_system', str(result_file)))
+        except Exception as e:
+            logger.warning(f"⚠️ [历史记录] 读取分析结果文件 {result_file.name} 失败: {e}")
+
+    if detailed_dir.exists():
+        for date_dir in detailed_dir.glob("*/*"):
+            if date_dir.is_dir():
+                entry = detailed_result_entry(date_dir)
+                if entry:
+                    entries.append(entry)
+
+    entries = [entry for entry in entries if entry['analysis_id']]
+    catalog.upsert_many(entries)
+    if entries:
+        logger.info(f"📚 [历史记录] 已从现有分析结果导入目录: {len(entries)} 个分析")
+    return len(entries)
+
+
+def load_result_body(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    按目录记录读取分析结果正文
+
+    Returns:
+        dict: 结果文件为 full_data 等完整字段，报告目录和MongoDB为 reports（报告名 -> Markdown）
+    """
+    source, body_ref = entry.get('source'), entry.get('body_ref') or ''
+    try:
+        if source == 'mongodb':
+            from web.utils.mongodb_report_manager import mongodb_report_manager
+            report = mongodb_report_manager.get_report_by_id(body_ref or entry['analysis_id'])
+            return {'reports': (report or {}).get('reports', {})}
+
+        path = Path(body_ref)
+        if path.is_file():
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {key: value for key, value in data.items() if key not in CATALOG_FIELDS}
+        reports_dir = path / "reports"
+        if reports_dir.is_dir():
+            reports = {}
+            for report_file in reports_dir.glob("*.md"):
+                with open(report_file, 'r', encoding='utf-8') as f:
+                    reports[report_file.stem] = f.read()
+            return {'reports': reports}
+    except Exception as e:
+        logger.warning(f"⚠️ [历史记录] 读取分析结果正文失败 {entry.get('analysis_id')}: {e}")
+    return {}
+
+
+_catalog = None
+_catalog_source = 'file_system'
+_catalog_lock = threading.Lock()
+
+
+def get_results_catalog():
+    """
+    获取分析结果目录：MongoDB已连接时使用 analysis_catalog 集合，否则使用本地SQLite；
+    首次使用且目录为空时从已有的分析结果导入一次（导入失败时抛出异常，下次调用重新导入）
+    """
+    global _catalog, _catalog_source
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                catalog, mongodb_manager = None, None
+                try:
+                    from web.utils.mongodb_report_manager import mongodb_report_manager
+                    if mongodb_report_manager.connected:
+                        mongodb_manager = mongodb_report_manager
+                        catalog = MongoResultsCatalog(mongodb_manager.db['analysis_catalog'])
+                except Exception as e:
+                    logger.debug(f"📚 [历史记录] MongoDB目录不可用: {e}")
+                if catalog is None:
+                    from web.components.analysis_results import get_analysis_results_dir
+                    default_path = str(get_analysis_results_dir() / "catalog.db")
+                    catalog = SQLiteResultsCatalog(parse_str_env("RESULTS_CATALOG_DB", default_path))
+                if catalog.is_empty():
+                    rebuild_results_catalog(catalog, mongodb_manager)
+                _catalog_source = 'mongodb' if mongodb_manager is not None else 'file_system'
+                _catalog = catalog
+    return _catalog
+
+
+def preferred_source() -> str:
+    """历史记录页面展示的数据来源：MongoDB已连接时只展示MongoDB中的报告（与原来的加载逻辑一致）"""
+    get_results_catalog()
+    return _catalog_source
+
+
+def record_analysis_result(result: Dict[str, Any], source: str, body_ref: str):
+    """保存分析结果后登记到目录；登记失败不影响保存本身"""
+    try:
+        entry = make_catalog_entry(result, source, body_ref)
+        get_results_catalog().upsert(entry)
+    except Exception as e:
+        logger.warning(f"⚠️ [历史记录] 登记分析结果目录失败 {result.get('analysis_id')}: {e}")
+        return
+    body = {key: value for key, value in result.items() if key not in CATALOG_FIELDS}
+    index_report(entry['analysis_id'], extract_report_text([result.get('summary'), body]),
+                 entry['stock_symbol'], entry['timestamp'])
+
+
+def record_detailed_result(date_dir):
+    """分模块报告保存到 detailed 目录下时登记到目录（保存到其他结果目录时不在历史记录中展示）"""
+    date_dir = Path(date_dir).resolve()
+    if get_detailed_results_dir().resolve() not in date_dir.parents:
+        return
+    try:
+        entry = detailed_result_entry(date_dir)
+        if entry:
+            get_results_catalog().upsert(entry)
+            index_report(entry['analysis_id'], extract_report_text(load_result_body(entry)),
+                         entry['stock_symbol'], entry['timestamp'])
+    except Exception as e:
+        logger.warning(f"⚠️ [历史记录] 登记分模块报告目录失败 {date_dir}: {e}")
+
+
+def remove_analysis_result(analysis_id: str):
+    """删除分析结果后从目录中移除"""
+    try:
+        get_results_catalog().remove(analysis_id)
+    except Exception as e:
+        logger.warning(f"⚠️ [历史记录] 移除目录记录失败 {analysis_id}: {e}")
+    remove_report(analysis_id)
+
+
+def backfill_report_search(catalog=None, batch_size: int = 500) -> int:
+    """
+    为还没有全文索引的分析（升级前保存的结果）建立索引，只读取缺少索引的分析的正文
+    """
+    index = get_report_search_index()
+    catalog = catalog or get_results_catalog()
+    if index is None:
+        return 0
+    count, offset = 0, 0
+    while True:
+        entries = catalog.query(sort_by='time_asc', limit=batch_size, offset=offset)
+        if not entries:
+            break
+        offset += batch_size
+        indexed = index.indexed_ids(entry['analysis_id'] for entry in entries)
+        missing = [entry for entry in entries if entry['analysis_id'] not in indexed]
+        if missing:
+            index.add_many((entry['analysis_id'], extract_report_text([entry['summary'], load_result_body(entry)]),
+                            entry['stock_symbol'], entry['timestamp']) for entry in missing)
+            count += len(missing)
+    if count:
+        index.optimize()
+        logger.info(f"🔎 [报告检索] 已为现有分析结果建立全文索引: {count} 个分析")
+    return count
+
+
+_backfilled = False
+
+
+def search_analysis_ids(query: str, limit: int = 200) -> List[str]:
+    """全文检索报告，按相关度返回分析ID（历史记录页面的"搜索报告全文"）"""
+    global _backfilled
+    if not _backfilled:
+        _backfilled = True
+        try:
+            backfill_report_search()
+        except Exception as e:
+            logger.warning(f"⚠️ [报告检索] 建立现有分析的全文索引失败: {e}")
+    index = get_report_search_index()
+    if index is None:
+        return []
+    return [hit['analysis_id'] for hit in index.search(query, limit=limit)]
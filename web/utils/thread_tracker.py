@@ -127,8 +127,15 @@ def get_all_analysis_threads() -> Dict[str, Dict]:
 def check_analysis_status(analysis_id: str) -> str:
     """
     检查分析状态
-    返回: 'running', 'completed', 'failed', 'not_found'
+    返回: 'queued', 'running', 'completed', 'failed', 'cancelled', 'not_found'
     """
+    # 由分析队列（或跨进程队列的工作进程）执行的任务，以队列状态为准
+    from .analysis_queue import get_analysis_queue
+    from .distributed_queue import get_job_backend
+    queue_status = (get_job_backend() or get_analysis_queue()).get_status(analysis_id)
+    if queue_status in ('queued', 'running', 'cancelled'):
+        return queue_status
+
     # 首先检查线程是否存活
     if is_analysis_thread_alive(analysis_id):
         return 'running'